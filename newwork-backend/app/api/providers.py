@@ -11,7 +11,13 @@ import logging
 
 from app.schemas import ProviderInfo, ModelInfo, ModelCapabilities
 from app.services.config_service import ConfigService, settings
-from app.services.llm import get_provider, get_available_providers
+from app.services.llm import (
+    get_available_providers,
+    get_completion_cache,
+    get_provider,
+    get_rate_limiter_states,
+    get_route_stats,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +63,12 @@ PROVIDER_DEFINITIONS = {
         "description": "ZAI AI models",
         "icon_url": "/icons/zai.svg",
     },
+    "replay": {
+        "id": "replay",
+        "name": "Replay",
+        "description": "Replays recorded responses for offline load testing",
+        "icon_url": None,
+    },
 }
 
 
@@ -189,6 +201,55 @@ async def list_models(
         )
 
 
+@router.get("/rate-limits")
+async def get_rate_limits():
+    """
+    Get rate limiter state for each provider API key in use.
+
+    Reports remaining request/token budget, in-flight requests,
+    cooldowns and retry counters.
+    """
+    return {
+        "enabled": settings.LLM_RATE_LIMIT_ENABLED,
+        "limiters": get_rate_limiter_states(),
+    }
+
+
+@router.get("/completion-cache")
+async def get_completion_cache_stats():
+    """
+    Get completion cache statistics.
+
+    The cache only answers deterministic requests and is opt-in
+    through LLM_COMPLETION_CACHE_ENABLED.
+    """
+    if not settings.LLM_COMPLETION_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_completion_cache().get_stats()}
+
+
+@router.delete("/completion-cache")
+async def clear_completion_cache():
+    """Remove all cached completions."""
+    if settings.LLM_COMPLETION_CACHE_ENABLED:
+        get_completion_cache().clear()
+    return {"success": True}
+
+
+@router.get("/routes")
+async def get_routes():
+    """
+    Get routing statistics for the configured equivalent models.
+
+    Reports rolling time to first token and error rate per route.
+    """
+    return {
+        "routes": settings.LLM_ROUTES,
+        "hedge_delay": settings.LLM_HEDGE_DELAY or None,
+        "stats": get_route_stats(),
+    }
+
+
 @router.get("/health")
 async def check_providers_health():
     """
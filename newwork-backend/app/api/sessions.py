@@ -4,7 +4,7 @@ Session API endpoints.
 This module provides endpoints for managing AI conversation sessions.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from fastapi.responses import PlainTextResponse, JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
@@ -21,12 +21,29 @@ from app.schemas import (
     SessionResponse,
     PromptRequest,
     PromptResponse,
+    RunPermissionRequest,
+    RunResponse,
+)
+from app.services.agent_run_service import AgentRun, RunRejectedError, agent_run_service
+from app.services.cancellation import cancel_on_disconnect, cancellation_metrics
+from app.services.tool_scheduler import speculation_metrics, tool_scheduler_metrics
+from app.services.work_scheduler import work_scheduler
+from app.services.event_log import (
+    event_log_service,
+    follow_with_broadcasts,
+    parse_last_event_id,
 )
 from app.services.event_service import event_service, EventType
 from app.services.config_service import settings, ConfigService
 from app.services.session_export_service import SessionExportService
 from app.services.conversation_service import conversation_service
-from app.services.streaming_handler import create_streaming_handler, SSEEvent
+from app.services.streaming_handler import (
+    STREAM_PROTOCOL_HEADER,
+    SSEEvent,
+    create_streaming_handler,
+    negotiate_stream_protocol,
+)
+from app.services.tool_output_store import get_tool_output_store
 
 logger = logging.getLogger(__name__)
 
@@ -97,6 +114,51 @@ async def create_session(session_data: SessionCreate, db: Session = Depends(get_
         )
 
 
+@router.get("/cancellation-metrics")
+async def get_cancellation_metrics():
+    """
+    Get what cancelling requests of disconnected clients has saved.
+
+    Returns:
+        Cancelled request, stream and tool counts with estimated savings
+    """
+    return cancellation_metrics.to_dict()
+
+
+@router.get("/tool-metrics")
+async def get_tool_metrics():
+    """
+    Get how much running tool calls concurrently, and early, has saved.
+
+    Returns:
+        Batch and call counts, wall time against summed tool time, speedup,
+        and the calls started before their message ended with the time saved
+    """
+    return {**tool_scheduler_metrics.to_dict(), **speculation_metrics.to_dict()}
+
+
+@router.get("/run-metrics")
+async def get_run_metrics():
+    """
+    Get the agent runs in each state.
+
+    Returns:
+        Run counts by state, runs executing and the concurrency limit
+    """
+    return agent_run_service.stats()
+
+
+@router.get("/scheduler-metrics")
+async def get_scheduler_metrics():
+    """
+    Get the work scheduler's pools.
+
+    Returns:
+        Capacity, running work, and queue depth and wait times per lane, by pool
+    """
+    return work_scheduler.to_dict()
+
+
 @router.get("/{session_id}", response_model=SessionResponse)
 async def get_session(session_id: str, db: Session = Depends(get_db)):
     """
@@ -138,18 +200,45 @@ async def delete_session(session_id: str, db: Session = Depends(get_db)):
 
     # Clean up conversation
     conversation_service.delete_conversation(session_id)
+    agent_run_service.forget(session_id)
+    event_log_service.discard(session_id)
 
     return None
 
 
-@router.post("/{session_id}/prompt", response_model=PromptResponse)
+def _run_rejected(error: RunRejectedError) -> HTTPException:
+    """Map a refused run to 503 while shutting down, 409 otherwise."""
+    status_code = (
+        status.HTTP_503_SERVICE_UNAVAILABLE
+        if agent_run_service.draining
+        else status.HTTP_409_CONFLICT
+    )
+    return HTTPException(status_code=status_code, detail=str(error))
+
+
+def _get_run(session_id: str, run_id: str) -> AgentRun:
+    """Get a session's run or raise 404."""
+    run = agent_run_service.get(run_id)
+    if run is None or run.session_id != session_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found")
+    return run
+
+
+@router.post(
+    "/{session_id}/prompt",
+    response_model=PromptResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
 async def send_prompt(
     session_id: str, prompt_data: PromptRequest, db: Session = Depends(get_db)
 ):
     """
-    Send a prompt to a session (non-streaming).
+    Send a prompt to a session without waiting for the answer.
 
-    For streaming responses, use the /events endpoint with SSE.
+    The prompt runs in the background; the response carries its run ID.
+    Query the run with /runs/{run_id} and follow its events with
+    /runs/{run_id}/events (or /events) from `start_event_id`. The run is
+    not cancelled when no client follows it.
 
     Args:
         session_id: Session ID
@@ -157,7 +246,7 @@ async def send_prompt(
         db: Database session
 
     Returns:
-        Prompt response
+        Prompt response with the run ID
     """
     session = session_repository.get(db, session_id)
     if not session:
@@ -176,16 +265,10 @@ async def send_prompt(
             model=prompt_data.model,
         )
 
-        # Process prompt (collect all events)
-        last_message = None
-        async for event in handler.process_prompt(prompt_data.prompt):
-            if event.type == "message" and event.data.get("role") == "assistant":
-                last_message = event.data.get("content", "")
-            elif event.type == "error":
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=event.data.get("error", "Unknown error"),
-                )
+        try:
+            run = agent_run_service.submit(session_id, handler, prompt_data.prompt)
+        except RunRejectedError as e:
+            raise _run_rejected(e)
 
         # Broadcast event
         await event_service.broadcast(
@@ -201,8 +284,10 @@ async def send_prompt(
 
         return {
             "session_id": session_id,
-            "message": "Prompt processed successfully",
-            "status": "success",
+            "message": "Prompt accepted",
+            "status": run.state.value,
+            "run_id": run.id,
+            "start_event_id": run.start_event_id,
         }
 
     except HTTPException:
@@ -216,14 +301,33 @@ async def send_prompt(
 
 @router.post("/{session_id}/prompt/stream")
 async def send_prompt_stream(
-    session_id: str, prompt_data: PromptRequest, db: Session = Depends(get_db)
+    session_id: str,
+    prompt_data: PromptRequest,
+    request: Request,
+    db: Session = Depends(get_db),
 ):
     """
     Send a prompt to a session with streaming response.
 
+    Events carry IDs from the session event log. A client that lost the
+    connection can send the same request with a `Last-Event-ID` header to
+    receive the events it missed and follow the run to its end; the prompt
+    is then not sent again. The run keeps going for SSE_RESUME_GRACE_SECONDS
+    without a connected client before it is cancelled.
+
+    A new prompt while a run is still going is refused with 409; a resume
+    when there is no run left to follow gets 404. The prompt runs on the
+    agent run service, whose run ID is returned in the X-Run-ID header.
+
+    Stream chunks carry only text deltas with sequence numbers and checksum
+    checkpoints. Older clients can send `X-Stream-Protocol: accumulated` to
+    also receive the full text so far with every chunk. The protocol used is
+    returned in the same response header.
+
     Args:
         session_id: Session ID
         prompt_data: Prompt data
+        request: HTTP request, watched for client disconnects
         db: Database session
 
     Returns:
@@ -237,21 +341,57 @@ async def send_prompt_stream(
 
     # Get workspace path
     workspace_path = Path(session.path) if session.path else Path.cwd()
+    stream_protocol = negotiate_stream_protocol(request.headers.get(STREAM_PROTOCOL_HEADER))
+    event_log = event_log_service.get(session_id)
+    last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID"))
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+        STREAM_PROTOCOL_HEADER: stream_protocol,
+    }
+
+    if last_event_id is None:
+        if event_log.running:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A prompt is already running for this session",
+            )
+        handler = create_streaming_handler(
+            session_id=session_id,
+            workspace_path=workspace_path,
+            model=prompt_data.model,
+            stream_protocol=stream_protocol,
+        )
+        try:
+            run = agent_run_service.submit(
+                session_id, handler, prompt_data.prompt, detached=False
+            )
+        except RunRejectedError as e:
+            raise _run_rejected(e)
+        after = run.start_event_id
+        headers["X-Run-ID"] = run.id
+    elif not event_log.running and last_event_id >= event_log.last_id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No run to resume for this session",
+        )
+    else:
+        after = last_event_id
 
     async def event_stream():
         """Generate SSE events."""
         try:
-            handler = create_streaming_handler(
-                session_id=session_id,
-                workspace_path=workspace_path,
-                model=prompt_data.model,
-            )
-
-            async for event in handler.process_prompt(prompt_data.prompt):
-                yield event.to_sse()
+            async with cancel_on_disconnect(request.is_disconnected) as watch:
+                async for frame in event_log.follow(after, until_idle=True):
+                    yield frame
+            if watch.disconnected:
+                logger.info(f"Client disconnected from stream for session {session_id}")
 
         except asyncio.CancelledError:
             logger.info(f"Stream cancelled for session {session_id}")
+            raise
         except Exception as e:
             logger.error(f"Error in stream: {e}")
             error_event = SSEEvent(
@@ -259,7 +399,79 @@ async def send_prompt_stream(
                 session_id=session_id,
                 data={"error": str(e)},
             )
-            yield error_event.to_sse()
+            event_log.append(error_event)
+            yield error_event.sse_frame()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+
+@router.get("/{session_id}/runs", response_model=List[RunResponse])
+async def list_session_runs(session_id: str, db: Session = Depends(get_db)):
+    """
+    List a session's agent runs, oldest first.
+
+    Args:
+        session_id: Session ID
+        db: Database session
+
+    Returns:
+        Run states
+    """
+    session = session_repository.get(db, session_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    return [run.to_dict() for run in agent_run_service.for_session(session_id)]
+
+
+@router.get("/{session_id}/runs/{run_id}", response_model=RunResponse)
+async def get_session_run(session_id: str, run_id: str):
+    """
+    Get the state of an agent run.
+
+    Args:
+        session_id: Session ID
+        run_id: Run ID
+
+    Returns:
+        Run state
+    """
+    return _get_run(session_id, run_id).to_dict()
+
+
+@router.get("/{session_id}/runs/{run_id}/events")
+async def get_session_run_events(session_id: str, run_id: str, request: Request):
+    """
+    Attach to an agent run's events.
+
+    Streams the session's events from the start of the run (or after the
+    `Last-Event-ID` header) until no run is writing any more. Detaching
+    does not affect runs started with POST /prompt.
+
+    Args:
+        session_id: Session ID
+        run_id: Run ID
+        request: HTTP request carrying Last-Event-ID
+
+    Returns:
+        SSE stream of events
+    """
+    run = _get_run(session_id, run_id)
+    event_log = event_log_service.get(session_id)
+    last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID"))
+    after = run.start_event_id if last_event_id is None else last_event_id
+
+    async def event_stream():
+        """Generate SSE events."""
+        async with cancel_on_disconnect(request.is_disconnected):
+            async for frame in event_log.follow(after, until_idle=True):
+                yield frame
 
     return StreamingResponse(
         event_stream(),
@@ -272,16 +484,85 @@ async def send_prompt_stream(
     )
 
 
+@router.post("/{session_id}/runs/{run_id}/cancel", response_model=RunResponse)
+async def cancel_session_run(session_id: str, run_id: str):
+    """
+    Cancel an agent run.
+
+    Partial progress is kept in the conversation, as for a client that
+    disconnected.
+
+    Args:
+        session_id: Session ID
+        run_id: Run ID
+
+    Returns:
+        Run state
+    """
+    run = _get_run(session_id, run_id)
+    if agent_run_service.cancel(run) and run.task is not None:
+        # Wait for the run to record its progress
+        await asyncio.gather(run.task, return_exceptions=True)
+    return run.to_dict()
+
+
+@router.post(
+    "/{session_id}/runs/{run_id}/permission",
+    response_model=RunResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def respond_run_permission(
+    session_id: str, run_id: str, respond_data: RunPermissionRequest
+):
+    """
+    Answer the permission request a run is waiting for.
+
+    The run continues in the background.
+
+    Args:
+        session_id: Session ID
+        run_id: Run ID
+        respond_data: Permission ID and 'allow_once', 'allow_always' or 'deny'
+
+    Returns:
+        Run state
+    """
+    run = _get_run(session_id, run_id)
+    valid_responses = ["allow_once", "allow_always", "deny"]
+    if respond_data.reply not in valid_responses:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid response. Must be one of: {valid_responses}",
+        )
+
+    try:
+        agent_run_service.respond_permission(
+            run,
+            respond_data.permission_id,
+            approved=respond_data.reply != "deny",
+            always=respond_data.reply == "allow_always",
+        )
+    except RunRejectedError as e:
+        raise _run_rejected(e)
+    return run.to_dict()
+
+
 @router.get("/{session_id}/events")
-async def get_session_events(session_id: str, db: Session = Depends(get_db)):
+async def get_session_events(
+    session_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+):
     """
     SSE endpoint for real-time session events.
 
     This endpoint provides a persistent connection for receiving
-    session events (messages, tool calls, etc.).
+    session events (messages, tool calls, etc.). Reconnecting with a
+    `Last-Event-ID` header first replays the events that were missed.
 
     Args:
         session_id: Session ID
+        request: HTTP request carrying Last-Event-ID
 
     Returns:
         SSE stream of events
@@ -292,18 +573,15 @@ async def get_session_events(session_id: str, db: Session = Depends(get_db)):
             status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
         )
 
-    # Generate unique listener ID for this client connection
-    listener_id = f"session_{session_id}_{uuid.uuid4().hex[:8]}"
+    event_log = event_log_service.get(session_id)
+    last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID"))
+    after = event_log.last_id if last_event_id is None else last_event_id
 
     async def event_stream():
         """Generate SSE events."""
         try:
-            async for event in event_service.event_generator(listener_id, timeout=30):
-                # Only send events for this session
-                if "session_id" in event and event["session_id"] != session_id:
-                    continue
-
-                yield f"data: {json.dumps(event)}\n\n"
+            async for frame in follow_with_broadcasts(event_log, after, keepalive=30):
+                yield frame
 
         except asyncio.CancelledError:
             logger.info(f"Event stream cancelled for session {session_id}")
@@ -342,7 +620,41 @@ async def get_session_messages(session_id: str, db: Session = Depends(get_db)):
     if not conversation:
         return []
 
-    return [msg.to_dict() for msg in conversation.messages]
+    # Include the originals of compacted turns
+    return [msg.to_dict() for msg in conversation.get_full_history()]
+
+
+@router.get("/{session_id}/tool-outputs/{handle}")
+async def get_session_tool_output(
+    session_id: str,
+    handle: str,
+    db: Session = Depends(get_db),
+):
+    """
+    Get the full output of a tool call elided from the LLM context.
+
+    Args:
+        session_id: Session ID
+        handle: Handle from the elided tool result
+
+    Returns:
+        The stored tool output as plain text
+    """
+    session = session_repository.get(db, session_id)
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    conversation = conversation_service.get_conversation(session_id)
+    known = conversation is not None and conversation.has_tool_output_handle(handle)
+    content = get_tool_output_store().get(handle) if known else None
+    if content is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Tool output not found"
+        )
+
+    return PlainTextResponse(content=content)
 
 
 @router.get("/{session_id}/todos")
@@ -412,13 +724,19 @@ async def export_session_json(
         }
 
         if conversation:
-            session_data["messages"] = [msg.to_dict() for msg in conversation.messages]
+            session_data["messages"] = [msg.to_dict() for msg in conversation.get_full_history()]
             session_data["todos"] = conversation.metadata.get("todos", [])
             session_data["model"] = conversation.model
             session_data["provider"] = conversation.provider
             session_data["total_tokens"] = {
                 "input": conversation.total_input_tokens,
                 "output": conversation.total_output_tokens,
+                "cache_read": conversation.total_cache_read_tokens,
+                "cache_creation": conversation.total_cache_creation_tokens,
+            }
+            session_data["tool_output_saved"] = {
+                "bytes": conversation.total_tool_output_bytes_saved,
+                "tokens": conversation.total_tool_output_tokens_saved,
             }
 
         json_content = SessionExportService.to_json(session_data, pretty=pretty)
@@ -483,7 +801,7 @@ async def export_session_markdown(
         if conversation:
             # Convert messages for markdown export
             messages = []
-            for msg in conversation.messages:
+            for msg in conversation.get_full_history():
                 messages.append({
                     "role": msg.role.value,
                     "content": msg.content,
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import uuid
@@ -11,7 +12,17 @@ from app.schemas import (
     TemplateResponse,
     TemplateRunRequest,
     TemplateRunResponse,
+    TemplateBatchRunRequest,
 )
+from app.services.batch_run_service import (
+    BatchRunner,
+    CheckpointMismatchError,
+    get_checkpoint,
+    render_template,
+    stream_batch_ndjson,
+)
+from app.services.config_service import ConfigService, settings
+from app.services.llm import get_provider
 import logging
 
 logger = logging.getLogger(__name__)
@@ -198,14 +209,7 @@ async def run_template(
 
     try:
         # Substitute variables in template content
-        prompt = template.content
-        if run_data.variables:
-            for key, value in run_data.variables.items():
-                prompt = prompt.replace(f"{{{key}}}", str(value))
-
-        # Increment usage count
-        template.usage_count = (template.usage_count or 0) + 1
-        db.commit()
+        prompt = render_template(template.prompt, run_data.variables)
 
         return {
             "prompt": prompt,
@@ -218,3 +222,80 @@ async def run_template(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
         )
+
+
+@router.post("/{template_id}/batch-run")
+async def batch_run_template(
+    template_id: str, run_data: TemplateBatchRunRequest, db: Session = Depends(get_db)
+):
+    """
+    Run a template over many variable sets.
+
+    Each variable set is rendered into a prompt and sent to the LLM with
+    bounded concurrency. Results stream back as NDJSON in completion order:
+    a "start" line, one "item" line per variable set and a "summary" line.
+    Completed items are checkpointed; repeating the request with the same
+    run_id only runs items that did not complete. Resuming with a different
+    provider, model, system prompt, temperature or max_tokens is refused
+    with 409, since the checkpointed outputs would not match.
+
+    Args:
+        template_id: Template ID
+        run_data: Variable sets and LLM options
+        db: Database session
+
+    Returns:
+        NDJSON stream of batch progress
+    """
+    template = template_repository.get(db, template_id)
+    if not template:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Template not found"
+        )
+
+    provider_name = run_data.provider or ConfigService.get_default_provider()
+    api_key = ConfigService.get_api_key(provider_name)
+    if not api_key:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"No API key configured for provider: {provider_name}",
+        )
+    try:
+        provider = get_provider(provider_name, api_key)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    prompts = [render_template(template.prompt, v) for v in run_data.variable_sets]
+    run_id = run_data.run_id or str(uuid.uuid4())
+    model = run_data.model or ConfigService.get_default_model()
+    checkpoint = get_checkpoint(
+        run_id,
+        {
+            "provider": provider_name,
+            "model": model,
+            "system_prompt": run_data.system_prompt,
+            "temperature": run_data.temperature,
+            "max_tokens": run_data.max_tokens,
+        },
+    )
+    try:
+        checkpoint.check()
+    except CheckpointMismatchError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    runner = BatchRunner(
+        provider=provider,
+        model=model,
+        concurrency=run_data.concurrency or settings.BATCH_RUN_CONCURRENCY,
+        max_tokens=run_data.max_tokens,
+        temperature=run_data.temperature,
+        system_prompt=run_data.system_prompt,
+        checkpoint=checkpoint,
+        flow=f"batch:{run_id}",
+    )
+
+    return StreamingResponse(
+        stream_batch_ndjson(runner, prompts, run_id=run_id, template_id=template_id),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Run-Id": run_id},
+    )
@@ -0,0 +1,70 @@
+"""
+WebSocket API endpoint.
+
+This module provides a single WebSocket that multiplexes the streams of
+many sessions, see app.services.ws_multiplexer for the message protocol.
+"""
+
+from pathlib import Path
+from typing import Optional
+import logging
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+from sqlalchemy.orm import Session
+
+from app.db.database import get_db
+from app.db.repositories import session_repository
+from app.services.config_service import settings
+from app.services.ws_multiplexer import ENCODING_JSON, ENCODINGS, SessionMultiplexer
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["websocket"])
+
+
+@router.websocket("/ws")
+async def session_socket(
+    websocket: WebSocket,
+    encoding: str = ENCODING_JSON,
+    db: Session = Depends(get_db),
+):
+    """
+    WebSocket carrying prompts, events, permission responses and
+    cancellation for any number of sessions.
+
+    Args:
+        websocket: WebSocket connection
+        encoding: Event encoding, "json" or "binary"
+        db: Database session
+    """
+    if encoding not in ENCODINGS:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    def lookup(session_id: str) -> Optional[Path]:
+        session = session_repository.get(db, session_id)
+        if session is None:
+            return None
+        return Path(session.path) if session.path else Path.cwd()
+
+    async def send(frame) -> None:
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+
+    multiplexer = SessionMultiplexer(
+        send,
+        lookup,
+        encoding=encoding,
+        window=settings.WS_CHANNEL_WINDOW,
+        max_channels=settings.WS_MAX_CHANNELS,
+    )
+    try:
+        while True:
+            await multiplexer.handle(await websocket.receive_text())
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket closed with {len(multiplexer.channels)} channels open")
+    finally:
+        await multiplexer.close()
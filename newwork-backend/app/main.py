@@ -8,12 +8,16 @@ AI-powered coding assistance through multiple LLM providers.
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
 import logging
 
 from app.services.config_service import settings, ConfigService
 from app.db.database import init_db
 from app.tools import initialize_tools
-from app.services.llm import close_all_providers
+from app.services.llm import close_all_providers, prewarm_providers
+from app.services.context_budget import token_counter
+from app.services.agent_run_service import agent_run_service
+from app.services.message_store import message_store
 
 # Import routers
 from app.api import (
@@ -26,6 +30,7 @@ from app.api import (
     permissions,
     providers,
     files,
+    ws,
 )
 
 # Configure logging
@@ -60,16 +65,27 @@ async def startup_event():
     init_db()
     logger.info("Database initialized successfully")
 
+    # Write conversation messages to the database
+    if settings.MESSAGE_PERSISTENCE_ENABLED:
+        message_store.start()
+
     # Initialize tools
     initialize_tools()
     logger.info("Tool system initialized")
 
+    # Load the tokenizer off the event loop; counts are estimated until it is ready
+    app.state.tokenizer_task = asyncio.create_task(token_counter.load_async())
+
     # Check configured providers
     available_providers = ConfigService.get_available_providers()
     if available_providers:
         logger.info(f"Available LLM providers: {', '.join(available_providers)}")
         logger.info(f"Default provider: {ConfigService.get_default_provider()}")
         logger.info(f"Default model: {ConfigService.get_default_model()}")
+
+        # Open provider connections in the background so startup is not delayed
+        if settings.LLM_HTTP_PREWARM:
+            app.state.prewarm_task = asyncio.create_task(prewarm_providers())
     else:
         logger.warning("No LLM providers configured. Set API keys in environment.")
 
@@ -82,6 +98,18 @@ async def shutdown_event():
     """Cleanup on application shutdown."""
     logger.info("Shutting down NewWork API...")
 
+    # Stop pre-warming if it is still running
+    prewarm_task = getattr(app.state, "prewarm_task", None)
+    if prewarm_task is not None and not prewarm_task.done():
+        prewarm_task.cancel()
+
+    # Let in-flight agent runs finish; cancelling the rest saves their progress
+    drained = await agent_run_service.drain()
+    logger.info(f"Agent runs drained: {drained}")
+
+    # Write the messages still queued, including those of cancelled runs
+    await message_store.close()
+
     # Close LLM provider connections
     await close_all_providers()
     logger.info("LLM providers closed")
@@ -156,6 +184,9 @@ app.include_router(permissions.router, prefix=API_V1_PREFIX)
 app.include_router(providers.router, prefix=API_V1_PREFIX)
 app.include_router(files.router, prefix=API_V1_PREFIX)
 
+# The multiplexed WebSocket lives at /ws
+app.include_router(ws.router)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -2,6 +2,8 @@ from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
+from app.services.batch_run_service import RUN_ID_PATTERN
+
 
 class SessionBase(BaseModel):
     """Base schema for Session."""
@@ -59,6 +61,35 @@ class PromptResponse(BaseModel):
     session_id: str
     message: str
     status: str
+    run_id: Optional[str] = Field(None, description="Agent run executing the prompt")
+    start_event_id: Optional[int] = Field(
+        None, description="Last-Event-ID to attach to the run's events from its start"
+    )
+
+
+class RunResponse(BaseModel):
+    """Schema for agent run state."""
+
+    run_id: str
+    session_id: str
+    state: str = Field(
+        ..., description="queued, running, waiting_permission, done, failed or cancelled"
+    )
+    start_event_id: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+class RunPermissionRequest(BaseModel):
+    """Schema for answering a run's permission request."""
+
+    permission_id: str = Field(..., description="Permission request ID")
+    reply: str = Field(
+        ...,
+        description="Response: 'allow_once', 'allow_always', or 'deny'",
+    )
 
 
 # Template schemas
@@ -129,6 +160,27 @@ class TemplateRunResponse(BaseModel):
     template_id: str
 
 
+class TemplateBatchRunRequest(BaseModel):
+    """Schema for running a template over many variable sets."""
+
+    variable_sets: List[Dict[str, Any]] = Field(
+        ..., min_length=1, description="One variable set per batch item"
+    )
+    run_id: Optional[str] = Field(
+        None,
+        pattern=RUN_ID_PATTERN,
+        description="Batch run ID (letters, digits, '-' and '_'); pass a previous run's ID to resume it",
+    )
+    provider: Optional[str] = Field(None, description="LLM provider (default from settings)")
+    model: Optional[str] = Field(None, description="Model (default from settings)")
+    system_prompt: Optional[str] = Field(None, description="Optional system prompt")
+    max_tokens: int = Field(4096, ge=1, description="Maximum output tokens per item")
+    temperature: float = Field(0.7, ge=0.0, le=2.0, description="Sampling temperature")
+    concurrency: Optional[int] = Field(
+        None, ge=1, le=64, description="Items run in parallel (default from settings)"
+    )
+
+
 # Workspace schemas
 class WorkspaceBase(BaseModel):
     """Base schema for Workspace."""
@@ -0,0 +1,419 @@
+"""
+Agent Run Service.
+
+Runs prompts as background tasks that do not depend on an HTTP request.
+Each run gets an ID and writes its events to the session event log, where
+clients attach and detach at will (SSE with Last-Event-ID, or a WebSocket
+channel). A global limit bounds how many runs execute at once; runs over
+the limit wait in order as "queued".
+
+A run that needs a permission response stays suspended in place and gives
+its concurrency slot back until the response arrives; it takes a slot again
+before going on. On shutdown, runs waiting for permission are cancelled at
+once and in-flight runs are given AGENT_RUN_DRAIN_SECONDS to finish; runs
+still going after that are cancelled, which records their partial progress
+in the conversation like any other cancellation.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from enum import Enum
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional
+
+from app.services.event_log import event_log_service
+from app.services.streaming_handler import SSEEvent, SSEEventType, StreamingHandler
+
+logger = logging.getLogger(__name__)
+
+
+class RunState(str, Enum):
+    """Lifecycle of an agent run."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    WAITING_PERMISSION = "waiting_permission"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+# States in which a run has no task and will not get one again
+FINISHED_STATES = (RunState.DONE, RunState.FAILED, RunState.CANCELLED)
+
+
+class RunRejectedError(RuntimeError):
+    """Raised when a run cannot be started."""
+
+
+@dataclass
+class AgentRun:
+    """A prompt executing (or waiting) in the background."""
+
+    id: str
+    session_id: str
+    state: RunState = RunState.QUEUED
+    # Last event ID before the run's first event; attach with it as Last-Event-ID
+    start_event_id: int = 0
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+    handler: Optional[StreamingHandler] = field(default=None, repr=False)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        """Whether the run has ended for good."""
+        return self.state in FINISHED_STATES
+
+    @property
+    def active(self) -> bool:
+        """Whether the run is queued or running."""
+        return self.task is not None and not self.task.done()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+
+        def iso(value: Optional[datetime]) -> Optional[str]:
+            return value.isoformat() if value else None
+
+        return {
+            "run_id": self.id,
+            "session_id": self.session_id,
+            "state": self.state.value,
+            "start_event_id": self.start_event_id,
+            "created_at": iso(self.created_at),
+            "started_at": iso(self.started_at),
+            "finished_at": iso(self.finished_at),
+            "error": self.error,
+        }
+
+
+class AgentRunService:
+    """
+    Background agent runs with a global concurrency limit.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None, history: Optional[int] = None):
+        """
+        Initialize the service.
+
+        Args:
+            max_concurrent: Runs executing at once (default from settings, 0 = unlimited)
+            history: Finished runs kept for queries (default from settings)
+        """
+        self._max_concurrent = max_concurrent
+        self._history = history
+        self._runs: "OrderedDict[str, AgentRun]" = OrderedDict()
+        self._executing = 0
+        self._waiting: Deque[asyncio.Future] = deque()
+        self._draining = False
+
+    @property
+    def max_concurrent(self) -> int:
+        """Runs executing at once (0 = unlimited)."""
+        if self._max_concurrent is not None:
+            return self._max_concurrent
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        return settings.AGENT_MAX_CONCURRENT_RUNS
+
+    @property
+    def draining(self) -> bool:
+        """Whether new runs are refused because the server is shutting down."""
+        return self._draining
+
+    def get(self, run_id: str) -> Optional[AgentRun]:
+        """Get a run by ID."""
+        return self._runs.get(run_id)
+
+    def for_session(self, session_id: str) -> List[AgentRun]:
+        """Get a session's runs, oldest first."""
+        return [run for run in self._runs.values() if run.session_id == session_id]
+
+    def current(self, session_id: str) -> Optional[AgentRun]:
+        """Get a session's run that has not finished, if any."""
+        for run in reversed(self._runs.values()):
+            if run.session_id == session_id and not run.finished:
+                return run
+        return None
+
+    def submit(
+        self,
+        session_id: str,
+        handler: StreamingHandler,
+        prompt: str,
+        *,
+        detached: bool = True,
+    ) -> AgentRun:
+        """
+        Start a prompt run.
+
+        Args:
+            session_id: Session the prompt belongs to
+            handler: Streaming handler for the session
+            prompt: User prompt
+            detached: Keep running without attached clients. Runs streamed
+                to the client that started them pass False, so they are
+                cancelled once that client is gone for good.
+
+        Returns:
+            The queued run
+
+        Raises:
+            RunRejectedError: If the session is already running a prompt or
+                the server is shutting down
+        """
+        self._check_accepting(session_id)
+        previous = self.current(session_id)
+        if previous is not None:
+            # A new prompt abandons the permission request of the previous one
+            self.cancel(previous)
+        run = AgentRun(
+            id=uuid.uuid4().hex,
+            session_id=session_id,
+            start_event_id=event_log_service.get(session_id).last_id,
+            handler=handler,
+        )
+        after = previous.task if previous is not None else None
+        self._start(run, handler.process_prompt(prompt), detached, after)
+        self._runs[run.id] = run
+        self._trim()
+        return run
+
+    def respond_permission(
+        self,
+        run: AgentRun,
+        permission_id: str,
+        approved: bool,
+        always: bool = False,
+    ) -> AgentRun:
+        """
+        Answer the permission request a run is waiting for.
+
+        The run resumes where it stopped.
+
+        Args:
+            run: Run in the WAITING_PERMISSION state
+            permission_id: Permission request ID
+            approved: Whether permission was granted
+            always: If approved, whether to always approve this tool
+
+        Returns:
+            The run
+
+        Raises:
+            RunRejectedError: If the run is not waiting for that permission
+        """
+        if run.state != RunState.WAITING_PERMISSION or run.handler is None:
+            raise RunRejectedError("The run is not waiting for permission")
+        if not run.handler.respond_permission(permission_id, approved, always):
+            raise RunRejectedError(f"Unknown permission request: {permission_id}")
+        return run
+
+    def cancel(self, run: AgentRun) -> bool:
+        """
+        Cancel a run.
+
+        Args:
+            run: Run to cancel
+
+        Returns:
+            True if the run had not finished
+        """
+        if run.active:
+            run.task.cancel()
+            return True
+        return False
+
+    def forget(self, session_id: str) -> None:
+        """
+        Cancel and drop a session's runs.
+
+        Args:
+            session_id: Session identifier
+        """
+        for run in self.for_session(session_id):
+            self.cancel(run)
+            del self._runs[run.id]
+
+    async def drain(self, timeout: Optional[float] = None) -> Dict[str, int]:
+        """
+        Wait for in-flight runs, then cancel those still going.
+
+        New runs are refused while draining.
+
+        Args:
+            timeout: Seconds to wait (default AGENT_RUN_DRAIN_SECONDS)
+
+        Returns:
+            Counts of runs that finished and runs that were cancelled
+        """
+        if timeout is None:
+            # Import here to avoid circular imports
+            from app.services.config_service import settings
+
+            timeout = settings.AGENT_RUN_DRAIN_SECONDS
+
+        self._draining = True
+        try:
+            active = [run for run in self._runs.values() if run.active]
+            # Runs waiting for a permission response cannot finish on their own
+            waiting = [run.task for run in active if run.state == RunState.WAITING_PERMISSION]
+            tasks = [run.task for run in active if run.task not in waiting]
+            for task in waiting:
+                task.cancel()
+            done, pending = set(), set()
+            if tasks:
+                logger.info(f"Waiting up to {timeout}s for {len(tasks)} agent run(s)")
+                done, pending = await asyncio.wait(tasks, timeout=timeout or None)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*waiting, *pending, return_exceptions=True)
+            cancelled = len(waiting) + len(pending)
+            if cancelled:
+                logger.warning(f"Cancelled {cancelled} agent run(s) at shutdown")
+            return {"drained": len(done), "cancelled": cancelled}
+        finally:
+            self._draining = False
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of runs in each state and the concurrency limit."""
+        counts = {state.value: 0 for state in RunState}
+        for run in self._runs.values():
+            counts[run.state.value] += 1
+        return {"max_concurrent": self.max_concurrent, "executing": self._executing, **counts}
+
+    def _check_accepting(self, session_id: str) -> None:
+        if self._draining:
+            raise RunRejectedError("The server is shutting down")
+        current = self.current(session_id)
+        if current is not None and current.state == RunState.WAITING_PERMISSION:
+            return  # Replaced by the new prompt
+        if event_log_service.get(session_id).running:
+            raise RunRejectedError("A prompt is already running for this session")
+
+    def _start(
+        self,
+        run: AgentRun,
+        events: AsyncGenerator[SSEEvent, None],
+        detached: bool,
+        after: Optional[asyncio.Task] = None,
+    ) -> None:
+        run.state = RunState.QUEUED
+        log = event_log_service.get(run.session_id)
+        run.task = log.start_run(self._execute(run, events, after), detached=detached)
+        run.task.add_done_callback(lambda task: self._task_done(run, task))
+
+    def _task_done(self, run: AgentRun, task: asyncio.Task) -> None:
+        # A task cancelled before it started never reaches _execute
+        if task is run.task and not run.finished:
+            self._finish(run, RunState.CANCELLED if task.cancelled() else RunState.FAILED)
+
+    async def _execute(
+        self,
+        run: AgentRun,
+        events: AsyncGenerator[SSEEvent, None],
+        after: Optional[asyncio.Task] = None,
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """Run a run's events inside a concurrency slot."""
+        acquired = False
+        try:
+            if after is not None:
+                # Let the replaced run record its cancellation first
+                await asyncio.gather(after, return_exceptions=True)
+            if self._full():
+                yield SSEEvent(
+                    type=SSEEventType.STATUS,
+                    session_id=run.session_id,
+                    data={"status": "queued", "run_id": run.id, "position": len(self._waiting) + 1},
+                )
+            await self._acquire()
+            acquired = True
+            run.state = RunState.RUNNING
+            run.started_at = run.started_at or datetime.utcnow()
+
+            async for event in events:
+                waiting = (
+                    event.type == SSEEventType.STATUS
+                    and event.data.get("status") == "waiting_permission"
+                )
+                if waiting and acquired:
+                    # Idle until the response: let other runs have the slot
+                    self._release()
+                    acquired = False
+                elif not waiting and not acquired:
+                    await self._acquire()
+                    acquired = True
+                if event.type == SSEEventType.ERROR:
+                    run.error = str(event.data.get("error", "Unknown error"))
+                run.state = RunState.WAITING_PERMISSION if waiting else RunState.RUNNING
+                yield event
+        except asyncio.CancelledError:
+            self._finish(run, RunState.CANCELLED)
+            raise
+        except Exception as e:
+            run.error = str(e)
+            self._finish(run, RunState.FAILED)
+            raise
+        else:
+            self._finish(run, RunState.FAILED if run.error else RunState.DONE)
+        finally:
+            if acquired:
+                self._release()
+            await events.aclose()
+
+    def _finish(self, run: AgentRun, state: RunState) -> None:
+        run.state = state
+        run.finished_at = datetime.utcnow()
+        run.handler = None
+
+    def _full(self) -> bool:
+        limit = self.max_concurrent
+        return bool(self._waiting) or (limit > 0 and self._executing >= limit)
+
+    async def _acquire(self) -> None:
+        if not self._full():
+            self._executing += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release()
+            else:
+                self._waiting.remove(waiter)
+            raise
+
+    def _release(self) -> None:
+        # Hand the slot to the next waiting run, if any
+        while self._waiting:
+            waiter = self._waiting.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._executing -= 1
+
+    def _trim(self) -> None:
+        history = self._history
+        if history is None:
+            # Import here to avoid circular imports
+            from app.services.config_service import settings
+
+            history = settings.AGENT_RUN_HISTORY
+        finished = [run_id for run_id, run in self._runs.items() if run.finished]
+        for run_id in finished[:max(0, len(finished) - history)]:
+            del self._runs[run_id]
+
+
+# Global agent run service instance
+agent_run_service = AgentRunService()
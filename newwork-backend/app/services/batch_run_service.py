@@ -0,0 +1,340 @@
+"""
+Batch Run Service.
+
+This module runs a prompt template over many variable sets: it renders the
+prompts, calls the LLM with bounded concurrency (provider rate limits apply
+through the provider), and checkpoints finished items so an interrupted run
+can be resumed without paying for them again.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional, TextIO
+
+from app.services.llm.base import LLMProvider, Message, MessageRole
+from app.services.work_scheduler import Lane, work_context
+
+logger = logging.getLogger(__name__)
+
+# Run IDs name checkpoint files, so they are restricted to a safe alphabet
+RUN_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+
+class CheckpointMismatchError(ValueError):
+    """Raised when a checkpoint was written with different request parameters."""
+
+
+def render_template(text: str, variables: Optional[Dict[str, Any]]) -> str:
+    """
+    Substitute {name} placeholders in a template.
+
+    Args:
+        text: Template text
+        variables: Values by placeholder name
+
+    Returns:
+        Rendered prompt
+    """
+    for key, value in (variables or {}).items():
+        text = text.replace(f"{{{key}}}", str(value))
+    return text
+
+
+def _prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()[:16]
+
+
+@dataclass
+class BatchItemResult:
+    """Outcome of one item of a batch run."""
+
+    index: int
+    status: str  # "completed" or "failed"
+    prompt_hash: str
+    output: Optional[str] = None
+    error: Optional[str] = None
+    usage: Optional[Dict[str, int]] = None
+    duration: float = 0.0
+    resumed: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary."""
+        return {"type": "item", **asdict(self)}
+
+
+class BatchCheckpoint:
+    """
+    Append-only JSON Lines record of completed batch items.
+
+    The first line is a header with the request parameters (provider, model,
+    system prompt, temperature, max tokens); a resume with different
+    parameters is refused. Only completed items are recorded, so failed items
+    are retried on resume. An item is only reused if its rendered prompt is
+    unchanged.
+    """
+
+    def __init__(self, path: Path, params: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the checkpoint.
+
+        Args:
+            path: Checkpoint file
+            params: Request parameters the recorded outputs depend on
+        """
+        self.path = path
+        self.params = params or {}
+        self._file: Optional[TextIO] = None
+
+    def check(self) -> None:
+        """
+        Verify that an existing checkpoint matches the request parameters.
+
+        Raises:
+            CheckpointMismatchError: If the checkpoint was written with
+                different parameters
+        """
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            first = f.readline()
+        if not first.strip():
+            return
+        try:
+            header = json.loads(first)
+        except json.JSONDecodeError:
+            header = {}
+        if header.get("type") != "header" or header.get("params") != self.params:
+            raise CheckpointMismatchError(
+                f"Checkpoint {self.path.name} was written with different parameters"
+            )
+
+    def load(self) -> Dict[int, BatchItemResult]:
+        """
+        Load completed items.
+
+        Returns:
+            Completed results by item index
+
+        Raises:
+            CheckpointMismatchError: If the checkpoint was written with
+                different parameters
+        """
+        results: Dict[int, BatchItemResult] = {}
+        self.check()
+        if not self.path.exists():
+            return results
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partial last line
+                    logger.warning(f"Skipping corrupt checkpoint line in {self.path}")
+                    continue
+                if data.pop("type", None) != "item":
+                    continue
+                results[data["index"]] = BatchItemResult(**data)
+        return results
+
+    def append(self, result: BatchItemResult) -> None:
+        """
+        Record a completed item.
+
+        The file stays open until close(); each line is flushed so a crash
+        loses at most the line being written.
+
+        Args:
+            result: Item result
+        """
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() == 0:
+                header = {"type": "header", "params": self.params}
+                self._file.write(json.dumps(header, ensure_ascii=False) + "\n")
+        self._file.write(json.dumps(result.to_dict(), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        """Close the checkpoint file if it was opened."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+@dataclass
+class BatchRunner:
+    """
+    Runs rendered prompts against a provider with bounded concurrency.
+
+    Results are yielded as items finish, not in input order.
+    """
+
+    provider: LLMProvider
+    model: str
+    concurrency: int = 4
+    max_tokens: int = 4096
+    temperature: float = 0.7
+    system_prompt: Optional[str] = None
+    checkpoint: Optional[BatchCheckpoint] = None
+    # Fair-queuing flow of the run's LLM calls in the work scheduler
+    flow: str = "batch"
+
+    # Totals of the current run
+    totals: Dict[str, int] = field(default_factory=dict, init=False)
+
+    async def _run_item(self, index: int, prompt: str) -> BatchItemResult:
+        start = time.monotonic()
+        prompt_hash = _prompt_hash(prompt)
+        try:
+            response = await self.provider.complete(
+                [Message(role=MessageRole.USER, content=prompt)],
+                self.model,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                system_prompt=self.system_prompt,
+            )
+        except Exception as e:
+            logger.warning(f"Batch item {index} failed: {e}")
+            return BatchItemResult(
+                index=index,
+                status="failed",
+                prompt_hash=prompt_hash,
+                error=str(e),
+                duration=round(time.monotonic() - start, 3),
+            )
+        return BatchItemResult(
+            index=index,
+            status="completed",
+            prompt_hash=prompt_hash,
+            output=response.text,
+            usage=response.usage,
+            duration=round(time.monotonic() - start, 3),
+        )
+
+    def _count(self, result: BatchItemResult) -> None:
+        key = "resumed" if result.resumed else result.status
+        self.totals[key] = self.totals.get(key, 0) + 1
+        if result.usage and not result.resumed:
+            for name in ("input_tokens", "output_tokens"):
+                self.totals[name] = self.totals.get(name, 0) + result.usage.get(name, 0)
+
+    async def run(self, prompts: List[str]) -> AsyncGenerator[BatchItemResult, None]:
+        """
+        Run all prompts, skipping items completed in the checkpoint.
+
+        Closing the generator cancels items still in flight.
+
+        Args:
+            prompts: Rendered prompts in item order
+
+        Yields:
+            BatchItemResult for every item
+        """
+        self.totals = {"completed": 0, "failed": 0, "resumed": 0}
+        done = self.checkpoint.load() if self.checkpoint else {}
+
+        pending: asyncio.Queue = asyncio.Queue()
+        for index, prompt in enumerate(prompts):
+            previous = done.get(index)
+            if previous is not None and previous.prompt_hash == _prompt_hash(prompt):
+                previous.resumed = True
+                self._count(previous)
+                yield previous
+            else:
+                pending.put_nowait((index, prompt))
+
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            while True:
+                try:
+                    index, prompt = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await self._run_item(index, prompt)
+                if result.status == "completed" and self.checkpoint:
+                    self.checkpoint.append(result)
+                await results.put(result)
+
+        remaining = pending.qsize()
+        # Items wait in the batch lane, behind interactive and background work
+        workers = [
+            asyncio.create_task(worker(), context=work_context(self.flow, Lane.BATCH))
+            for _ in range(min(max(1, self.concurrency), remaining))
+        ]
+        try:
+            for _ in range(remaining):
+                result = await results.get()
+                self._count(result)
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.checkpoint:
+                self.checkpoint.close()
+
+
+def get_checkpoint(run_id: str, params: Optional[Dict[str, Any]] = None) -> BatchCheckpoint:
+    """
+    Get the checkpoint for a batch run.
+
+    Args:
+        run_id: Batch run identifier matching RUN_ID_PATTERN
+        params: Request parameters the recorded outputs depend on
+
+    Returns:
+        BatchCheckpoint stored under the data directory
+
+    Raises:
+        ValueError: If the run ID does not match RUN_ID_PATTERN
+    """
+    # Import here to avoid circular imports
+    from app.services.config_service import settings
+
+    if not re.match(RUN_ID_PATTERN, run_id):
+        raise ValueError(f"Invalid batch run ID: {run_id!r}")
+    return BatchCheckpoint(settings.data_dir / "batch_runs" / f"{run_id}.jsonl", params)
+
+
+async def stream_batch_ndjson(
+    runner: BatchRunner,
+    prompts: List[str],
+    *,
+    run_id: str,
+    template_id: str,
+) -> AsyncGenerator[str, None]:
+    """
+    Run a batch and encode progress as NDJSON lines.
+
+    Emits a "start" line, one "item" line per item and a final "summary".
+
+    Args:
+        runner: Configured batch runner
+        prompts: Rendered prompts
+        run_id: Batch run identifier (used to resume)
+        template_id: Template being run
+
+    Yields:
+        JSON lines terminated by newlines
+    """
+    yield json.dumps({
+        "type": "start",
+        "run_id": run_id,
+        "template_id": template_id,
+        "total": len(prompts),
+    }) + "\n"
+
+    async for result in runner.run(prompts):
+        yield json.dumps(result.to_dict(), ensure_ascii=False) + "\n"
+
+    yield json.dumps({"type": "summary", "run_id": run_id, **runner.totals}) + "\n"
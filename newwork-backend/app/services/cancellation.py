@@ -0,0 +1,159 @@
+"""
+Request Cancellation.
+
+This module cancels the work behind a streaming request when its client
+goes away, and keeps metrics on what cancellation saved: output tokens the
+LLM did not have to generate and tool time that was not spent.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+# Completed responses and tool runs used to estimate what cancellation saved
+HISTORY_SIZE = 100
+
+
+@dataclass
+class CancellationMetrics:
+    """
+    Counters for cancelled requests.
+
+    Savings are estimates: a cancelled stream is assumed to have gone on to
+    produce an average-sized response, and a cancelled tool to have run for
+    its average duration.
+    """
+
+    cancelled_requests: int = 0
+    cancelled_streams: int = 0
+    cancelled_tools: int = 0
+    output_tokens_generated: int = 0  # Produced by cancelled streams before they stopped
+    output_tokens_saved: int = 0
+    tool_seconds_used: float = 0.0  # Spent by cancelled tools before they stopped
+    tool_seconds_saved: float = 0.0
+
+    _response_tokens: Deque[int] = field(
+        default_factory=lambda: deque(maxlen=HISTORY_SIZE), repr=False
+    )
+    _tool_seconds: Dict[str, Deque[float]] = field(default_factory=dict, repr=False)
+
+    def record_response(self, output_tokens: int) -> None:
+        """Record the size of a completed LLM response."""
+        if output_tokens > 0:
+            self._response_tokens.append(output_tokens)
+
+    def record_tool(self, tool_name: str, seconds: float) -> None:
+        """Record the duration of a completed tool run."""
+        history = self._tool_seconds.setdefault(tool_name, deque(maxlen=HISTORY_SIZE))
+        history.append(seconds)
+
+    def record_stream_cancelled(self, generated_tokens: int) -> None:
+        """
+        Record an LLM stream stopped by cancellation.
+
+        Args:
+            generated_tokens: Output tokens received before the stream stopped
+        """
+        self.cancelled_streams += 1
+        self.output_tokens_generated += generated_tokens
+        if self._response_tokens:
+            average = sum(self._response_tokens) / len(self._response_tokens)
+            self.output_tokens_saved += max(0, round(average) - generated_tokens)
+
+    def record_tool_cancelled(self, tool_name: str, elapsed: float) -> None:
+        """
+        Record a tool run stopped (or never started) because of cancellation.
+
+        Args:
+            tool_name: Name of the tool
+            elapsed: Seconds the tool ran before it was stopped
+        """
+        self.cancelled_tools += 1
+        self.tool_seconds_used += elapsed
+        history = self._tool_seconds.get(tool_name)
+        if history:
+            average = sum(history) / len(history)
+            self.tool_seconds_saved += max(0.0, average - elapsed)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary."""
+        return {
+            "cancelled_requests": self.cancelled_requests,
+            "cancelled_streams": self.cancelled_streams,
+            "cancelled_tools": self.cancelled_tools,
+            "output_tokens_generated": self.output_tokens_generated,
+            "output_tokens_saved": self.output_tokens_saved,
+            "tool_seconds_used": round(self.tool_seconds_used, 3),
+            "tool_seconds_saved": round(self.tool_seconds_saved, 3),
+        }
+
+
+@dataclass
+class DisconnectWatch:
+    """State of a cancel_on_disconnect block."""
+
+    disconnected: bool = False
+
+
+@asynccontextmanager
+async def cancel_on_disconnect(
+    is_disconnected: Callable[[], Awaitable[bool]],
+    *,
+    poll_interval: float = 0.5,
+) -> AsyncIterator[DisconnectWatch]:
+    """
+    Cancel the current task when the client disconnects.
+
+    The work inside the block (LLM streams, tool runs, subprocesses) is
+    cancelled wherever it is waiting, not only at the next write to the
+    client. The resulting CancelledError is absorbed by the block; any
+    other cancellation propagates.
+
+    The watcher stops on an event rather than relying on its own
+    cancellation, since `is_disconnected` implementations such as
+    Starlette's may swallow it, and leaving the block waits for the watcher
+    for at most one poll interval.
+
+    Args:
+        is_disconnected: Coroutine function reporting whether the client left
+        poll_interval: Seconds between disconnect checks
+
+    Yields:
+        DisconnectWatch telling whether the block was cancelled by a disconnect
+    """
+    task = asyncio.current_task()
+    watch = DisconnectWatch()
+    stop = asyncio.Event()
+
+    async def poll() -> None:
+        while not stop.is_set():
+            if await is_disconnected():
+                if not stop.is_set() and task is not None and not task.done():
+                    watch.disconnected = True
+                    task.cancel()
+                return
+            try:
+                await asyncio.wait_for(stop.wait(), poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    watcher = asyncio.create_task(poll())
+    try:
+        yield watch
+    except asyncio.CancelledError:
+        if not watch.disconnected or task is None:
+            raise
+        task.uncancel()
+    finally:
+        stop.set()
+        watcher.cancel()
+        await asyncio.wait({watcher}, timeout=poll_interval)
+
+
+# Global cancellation metrics
+cancellation_metrics = CancellationMetrics()
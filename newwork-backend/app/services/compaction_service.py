@@ -0,0 +1,336 @@
+"""
+History Compaction Service.
+
+This module keeps long sessions cheap: once a conversation crosses a token
+threshold, its older turns are summarized with the provider's cheapest model
+into a single synthetic message. The originals are kept on the conversation
+for export. Compaction runs in the background after a turn has finished.
+"""
+
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.services.context_budget import TokenCounter, split_turns, token_counter
+from app.services.conversation_service import Conversation, ConversationMessage
+from app.services.llm.base import LLMProvider, Message, MessageRole
+from app.services.llm.router import RoutedProvider
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You compress the history of a conversation between a user and a coding "
+    "assistant. Write a concise summary that lets the assistant continue the "
+    "work: the user's goals and constraints, decisions made, files and commands "
+    "involved, results of tool calls that still matter, and open tasks. Do not "
+    "address the user and do not add anything that is not in the transcript."
+)
+
+# Characters of each tool result included in the transcript
+TRANSCRIPT_TOOL_RESULT_CHARS = 2000
+
+# Tokens left free in the summarizer's context window
+SUMMARY_SAFETY_MARGIN_TOKENS = 1024
+
+
+@dataclass
+class CompactionResult:
+    """Outcome of compacting a conversation."""
+
+    summary: ConversationMessage
+    replaced_messages: int
+    original_tokens: int
+    summary_tokens: int
+    model: str
+    duration: float
+
+    @property
+    def saved_tokens(self) -> int:
+        """Tokens removed from every following request."""
+        return max(0, self.original_tokens - self.summary_tokens)
+
+
+def select_summary_model(
+    provider: LLMProvider,
+    current_model: str,
+    preferred: Optional[str] = None,
+) -> str:
+    """
+    Pick the model used to write summaries.
+
+    Chooses the provider's catalog model with the lowest input price
+    (e.g. Claude 3.5 Haiku or GPT-4o Mini), unless the session's model is
+    already as cheap or no prices are known.
+
+    Args:
+        provider: Provider of the session
+        current_model: Model of the session
+        preferred: Configured summary model, used if the provider serves it
+
+    Returns:
+        Model identifier
+    """
+    try:
+        models = provider.get_available_models()
+    except Exception as e:
+        logger.debug(f"Model catalog unavailable for summaries: {e}")
+        return preferred or current_model
+
+    if preferred:
+        if any(m.id == preferred for m in models):
+            return preferred
+        logger.warning(f"Summary model {preferred} is not served by {provider.provider_name}")
+
+    priced = [m for m in models if m.input_cost_per_million > 0]
+    if not priced:
+        return current_model
+
+    cheapest = min(priced, key=lambda m: (m.input_cost_per_million, m.output_cost_per_million))
+    current = provider.get_model_info(current_model)
+    if current is not None and 0 < current.input_cost_per_million <= cheapest.input_cost_per_million:
+        return current_model
+    return cheapest.id
+
+
+def resolve_summary_provider(provider: LLMProvider, model: str) -> LLMProvider:
+    """
+    Get the provider to call for a summary model.
+
+    A routed provider serves every request with the model of the route it
+    picks, so a specific model is requested from its route directly.
+
+    Args:
+        provider: Provider of the session
+        model: Summary model
+
+    Returns:
+        Provider that serves the model
+    """
+    if isinstance(provider, RoutedProvider):
+        target = provider.target_for(model)
+        if target is not None:
+            return target.provider
+    return provider
+
+
+def render_transcript(messages: List[ConversationMessage]) -> str:
+    """
+    Render messages as a plain-text transcript for the summarizer.
+
+    Tool results are truncated; earlier summaries are included verbatim.
+
+    Args:
+        messages: Messages to render
+
+    Returns:
+        Transcript text
+    """
+    lines: List[str] = []
+    for msg in messages:
+        compaction = msg.metadata.get("compaction")
+        if compaction:
+            if "replaces" in compaction:
+                lines.append(f"Earlier summary:\n{msg.content}")
+            continue
+
+        speaker = "User" if msg.role == MessageRole.USER else "Assistant"
+        if msg.content:
+            lines.append(f"{speaker}: {msg.content}")
+        for tu in msg.tool_uses:
+            lines.append(f"Assistant called {tu.name}: {json.dumps(tu.arguments)}")
+        for tr in msg.tool_results:
+            content = tr.content
+            if len(content) > TRANSCRIPT_TOOL_RESULT_CHARS:
+                content = (
+                    content[:TRANSCRIPT_TOOL_RESULT_CHARS]
+                    + f"\n[... {len(tr.content) - TRANSCRIPT_TOOL_RESULT_CHARS} more characters]"
+                )
+            label = "Tool error" if tr.is_error else "Tool result"
+            lines.append(f"{label}:\n{content}")
+    return "\n\n".join(lines)
+
+
+class HistoryCompactor:
+    """
+    Summarizes the older turns of a conversation.
+
+    The most recent turns are always kept verbatim, and only whole turns are
+    compacted so tool_use/tool_result pairs stay intact.
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold_tokens: int = 60000,
+        keep_recent_turns: int = 4,
+        max_summary_tokens: int = 1024,
+        model: Optional[str] = None,
+        counter: Optional[TokenCounter] = None,
+    ):
+        """
+        Initialize the compactor.
+
+        Args:
+            threshold_tokens: History size that triggers compaction
+            keep_recent_turns: Turns never compacted
+            max_summary_tokens: Output limit of the summary request
+            model: Summary model (defaults to the provider's cheapest)
+            counter: Token counter to use (defaults to the shared counter)
+        """
+        self.threshold_tokens = threshold_tokens
+        self.keep_recent_turns = max(1, keep_recent_turns)
+        self.max_summary_tokens = max_summary_tokens
+        self.model = model
+        self.counter = counter or token_counter
+
+    @classmethod
+    def from_settings(cls) -> "HistoryCompactor":
+        """Create a compactor from application settings."""
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        return cls(
+            threshold_tokens=settings.COMPACTION_THRESHOLD_TOKENS,
+            keep_recent_turns=settings.COMPACTION_KEEP_RECENT_TURNS,
+            max_summary_tokens=settings.COMPACTION_MAX_SUMMARY_TOKENS,
+            model=settings.COMPACTION_MODEL or None,
+        )
+
+    def count_tokens(self, messages: List[ConversationMessage]) -> int:
+        """Count the tokens of a list of messages."""
+        return sum(self.counter.count_message(msg) for msg in messages)
+
+    def select_messages(self, conversation: Conversation) -> List[ConversationMessage]:
+        """
+        Get the leading messages that would be compacted.
+
+        Args:
+            conversation: Conversation to compact
+
+        Returns:
+            Prefix of the history, empty if there is nothing to compact
+        """
+        turns = split_turns(conversation.messages)
+        if len(turns) <= self.keep_recent_turns:
+            return []
+
+        prefix = [msg for turn in turns[:-self.keep_recent_turns] for msg in turn]
+        if all(msg.metadata.get("compaction") for msg in prefix):
+            return []
+        return prefix
+
+    def should_compact(self, conversation: Conversation) -> bool:
+        """
+        Check whether the conversation has grown past the threshold.
+
+        Args:
+            conversation: Conversation to check
+
+        Returns:
+            True if there are older turns to compact
+        """
+        if self.count_tokens(conversation.messages) < self.threshold_tokens:
+            return False
+        return bool(self.select_messages(conversation))
+
+    def _fit_transcript(self, transcript: str, provider: LLMProvider, model: str) -> str:
+        """Drop the oldest part of a transcript that exceeds the summary model's window."""
+        info = provider.get_model_info(model)
+        if info is None:
+            return transcript
+        available = info.context_window - self.max_summary_tokens - SUMMARY_SAFETY_MARGIN_TOKENS
+        tokens = self.counter.count_text(transcript)
+        if tokens <= available:
+            return transcript
+        keep_chars = int(len(transcript) * available / tokens)
+        return "[... earlier conversation truncated]\n\n" + transcript[-keep_chars:]
+
+    async def compact(
+        self,
+        conversation: Conversation,
+        provider: LLMProvider,
+    ) -> Optional[CompactionResult]:
+        """
+        Summarize older turns and swap them for a single summary message.
+
+        The summary is only applied if the compacted messages are still the
+        start of the history once the summary arrives; new turns may be
+        appended in the meantime.
+
+        Args:
+            conversation: Conversation to compact
+            provider: Provider used for the summary request
+
+        Returns:
+            CompactionResult, or None if nothing was compacted
+        """
+        replaced = self.select_messages(conversation)
+        if not replaced:
+            return None
+
+        model = select_summary_model(provider, conversation.model, self.model)
+        provider = resolve_summary_provider(provider, model)
+        transcript = self._fit_transcript(render_transcript(replaced), provider, model)
+        original_tokens = self.count_tokens(replaced)
+        start = time.monotonic()
+
+        try:
+            response = await provider.complete(
+                [Message(
+                    role=MessageRole.USER,
+                    content=f"Summarize this conversation:\n\n{transcript}",
+                )],
+                model,
+                max_tokens=self.max_summary_tokens,
+                temperature=0.0,
+                system_prompt=SUMMARY_SYSTEM_PROMPT,
+            )
+        except Exception as e:
+            logger.warning(f"History compaction failed for {conversation.session_id}: {e}")
+            return None
+
+        summary = response.text.strip()
+        if not summary:
+            return None
+
+        metadata: Dict[str, Any] = {
+            "model": model,
+            "original_tokens": original_tokens,
+            "usage": response.usage,
+        }
+        message = conversation.apply_compaction(replaced, summary, metadata)
+        if message is None:
+            logger.info(f"History of {conversation.session_id} changed during compaction")
+            return None
+
+        result = CompactionResult(
+            summary=message,
+            replaced_messages=len(replaced),
+            original_tokens=original_tokens,
+            summary_tokens=self.counter.count_message(message),
+            model=model,
+            duration=round(time.monotonic() - start, 3),
+        )
+        message.metadata["compaction"]["summary_tokens"] = result.summary_tokens
+        logger.info(
+            f"Compacted {result.replaced_messages} messages of {conversation.session_id} "
+            f"with {model}: {result.original_tokens} -> {result.summary_tokens} tokens"
+        )
+        return result
+
+
+def get_history_compactor() -> Optional[HistoryCompactor]:
+    """
+    Get a compactor configured from settings.
+
+    Returns:
+        HistoryCompactor, or None if compaction is disabled
+    """
+    # Import here to avoid circular imports
+    from app.services.config_service import settings
+
+    if not settings.COMPACTION_ENABLED:
+        return None
+    return HistoryCompactor.from_settings()
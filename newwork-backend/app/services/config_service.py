@@ -35,6 +35,116 @@ class Settings(BaseSettings):
     DEFAULT_PROVIDER: str = "anthropic"
     DEFAULT_MODEL: str = "claude-sonnet-4-20250514"
 
+    # Sampling
+    LLM_TEMPERATURE: float = 0.7
+
+    # Context window management
+    MAX_OUTPUT_TOKENS: int = 4096
+    CONTEXT_SAFETY_MARGIN_TOKENS: int = 1024
+
+    # History compaction: summarize older turns with a cheap model between turns
+    COMPACTION_ENABLED: bool = True
+    COMPACTION_THRESHOLD_TOKENS: int = 60000
+    COMPACTION_KEEP_RECENT_TURNS: int = 4
+    COMPACTION_MAX_SUMMARY_TOKENS: int = 1024
+    COMPACTION_MODEL: str = ""  # Empty picks the cheapest model of the provider
+
+    # Stale tool output elision: large outputs are replaced by a stub after N turns
+    TOOL_OUTPUT_ELISION_ENABLED: bool = True
+    TOOL_OUTPUT_ELIDE_AFTER_TURNS: int = 3
+    TOOL_OUTPUT_ELIDE_MIN_CHARS: int = 2000
+    TOOL_OUTPUT_ELIDE_TOOLS: str = "read_file,bash,web_fetch,read_tool_output"
+
+    # Tool calls of one turn that may run at once (conflicting calls still wait)
+    TOOL_MAX_CONCURRENCY: int = 8
+    # Start read-only tool calls while the rest of the LLM message streams
+    TOOL_SPECULATIVE_EXECUTION: bool = True
+
+    # Server-wide work scheduler: slots per pool (0 = unlimited)
+    SCHEDULER_LLM_CONCURRENCY: int = 32
+    SCHEDULER_CPU_CONCURRENCY: int = 4
+    SCHEDULER_SUBPROCESS_CONCURRENCY: int = 4
+    # Fair-queuing flows: "workspace" or "session"
+    SCHEDULER_FAIR_SHARE: str = "workspace"
+    # Flow shares, e.g. "workspace:/srv/app=2,session:abc=0.5" (default 1)
+    SCHEDULER_FLOW_WEIGHTS: str = ""
+
+    # Provider rate limiting (per API key)
+    LLM_RATE_LIMIT_ENABLED: bool = True
+    LLM_REQUESTS_PER_MINUTE: float = 500
+    LLM_TOKENS_PER_MINUTE: float = 1_000_000
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_MAX_RETRIES: int = 4
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 60.0
+
+    # Provider routing: comma-separated provider:model list of equivalent models
+    LLM_ROUTES: str = ""
+    LLM_HEDGE_DELAY: float = 0.0  # Seconds without a token before hedging (0 disables)
+    LLM_ROUTE_MAX_ERROR_RATE: float = 0.5
+
+    # Shared HTTP connection pools for provider APIs
+    LLM_HTTP2: bool = True
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    LLM_HTTP_CONNECT_TIMEOUT: float = 10.0
+    LLM_HTTP_READ_TIMEOUT: float = 600.0
+    LLM_HTTP_PREWARM: bool = True
+
+    # Completion cache for deterministic requests (opt-in). Only requests at or
+    # below LLM_COMPLETION_CACHE_MAX_TEMPERATURE are cached; chat turns use
+    # LLM_TEMPERATURE, so set it to 0 as well to cache them
+    LLM_COMPLETION_CACHE_ENABLED: bool = False
+    LLM_COMPLETION_CACHE_MAX_BYTES: int = 100 * 1024 * 1024
+    LLM_COMPLETION_CACHE_TTL: float = 7 * 24 * 3600
+    LLM_COMPLETION_CACHE_MAX_TEMPERATURE: float = 0.0
+
+    # SSE text delta coalescing (0 ms disables)
+    SSE_COALESCE_INTERVAL_MS: float = 50.0
+    SSE_COALESCE_MAX_BYTES: int = 4096
+    # Stream protocol when the client does not ask for one ("delta" or "accumulated")
+    SSE_STREAM_PROTOCOL: str = "delta"
+    # Delta chunks between checksum checkpoints
+    SSE_CHECKPOINT_INTERVAL: int = 32
+
+    # Resumable SSE: per-session event log (Last-Event-ID replay)
+    SSE_EVENT_LOG_MAX_EVENTS: int = 2000
+    SSE_EVENT_LOG_MAX_BYTES: int = 4 * 1024 * 1024
+    # Events evicted from memory are spilled to data_dir/event_logs (0 disables)
+    SSE_EVENT_LOG_MAX_SPILL_BYTES: int = 64 * 1024 * 1024
+    # Seconds a prompt run keeps going without a connected client
+    SSE_RESUME_GRACE_SECONDS: float = 15.0
+    # Seconds an unused event log is kept before it is dropped
+    SSE_EVENT_LOG_IDLE_SECONDS: float = 600.0
+
+    # WebSocket multiplexing: events a channel may send before the client acks
+    WS_CHANNEL_WINDOW: int = 256
+    # Sessions one WebSocket connection may follow
+    WS_MAX_CHANNELS: int = 64
+
+    # Background agent runs: runs executing at once (0 = unlimited)
+    AGENT_MAX_CONCURRENT_RUNS: int = 8
+    # Seconds shutdown waits for in-flight runs before cancelling them
+    AGENT_RUN_DRAIN_SECONDS: float = 30.0
+    # Finished runs kept for state queries
+    AGENT_RUN_HISTORY: int = 1000
+
+    # Conversation messages written to the database behind the request
+    MESSAGE_PERSISTENCE_ENABLED: bool = True
+    # Queued messages that trigger a write
+    MESSAGE_FLUSH_BATCH_SIZE: int = 64
+    # Milliseconds a queued message may wait before it is written
+    MESSAGE_FLUSH_INTERVAL_MS: int = 500
+
+    # Template batch runs
+    BATCH_RUN_CONCURRENCY: int = 4
+
+    # Record/replay provider for offline load testing
+    LLM_RECORD_CASSETTE: str = ""  # Record all provider responses to this file
+    LLM_REPLAY_CASSETTE: str = ""  # Enables the "replay" provider
+    LLM_REPLAY_SPEED: float = 1.0  # 0 replays as fast as possible
+
     # Database (동적 경로 사용)
     _DATABASE_URL: Optional[str] = None
 
@@ -118,6 +228,8 @@ class ConfigService:
             "deepseek": settings.DEEPSEEK_API_KEY,
             "minimax": settings.MINIMAX_API_KEY,
             "zai": settings.ZAI_API_KEY,
+            # The replay provider needs no key, only a cassette
+            "replay": "replay" if settings.LLM_REPLAY_CASSETTE else None,
         }
         return key_map.get(provider.lower())
 
@@ -160,6 +272,8 @@ class ConfigService:
             providers.append("minimax")
         if settings.ZAI_API_KEY:
             providers.append("zai")
+        if settings.LLM_REPLAY_CASSETTE:
+            providers.append("replay")
         return providers
 
     @staticmethod
@@ -0,0 +1,345 @@
+"""
+Context Budget Service.
+
+This module counts tokens for conversation messages and assembles
+an LLM prompt that fits within the model's context window.
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, replace
+from typing import Any, List, Optional
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    tiktoken = None
+
+from app.services.conversation_service import ConversationMessage
+from app.services.llm.base import (
+    Message,
+    MessageRole,
+    ModelInfo,
+    ToolDefinition,
+    ToolResult as LLMToolResult,
+)
+
+logger = logging.getLogger(__name__)
+
+# Context window assumed for models missing from the provider catalog
+DEFAULT_CONTEXT_WINDOW = 128000
+
+# Framing overhead per message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Placeholder sent instead of a tool result that no longer fits
+ELIDED_TOOL_RESULT = "[Tool output elided to fit the context window ({tokens} tokens)]"
+
+
+def split_turns(messages: List[ConversationMessage]) -> List[List[ConversationMessage]]:
+    """
+    Group messages into turns, each starting at a user prompt.
+
+    Tool result messages belong to the turn of the tool call they answer.
+
+    Args:
+        messages: Conversation history
+
+    Returns:
+        Messages grouped by turn, oldest first
+    """
+    turns: List[List[ConversationMessage]] = []
+    for msg in messages:
+        starts_turn = msg.role == MessageRole.USER and not msg.tool_results
+        if starts_turn or not turns:
+            turns.append([msg])
+        else:
+            turns[-1].append(msg)
+    return turns
+
+
+class TokenCounter:
+    """
+    Counts tokens for text and conversation messages.
+
+    Uses tiktoken once its encoding has been loaded with `load()` and falls
+    back to a character-based estimate until then, or for good if the
+    encoding is unavailable (e.g. offline without the BPE file). Loading may
+    download the encoding, so it is done at startup and never lazily on the
+    request path.
+    """
+
+    def __init__(self, encoding_name: Optional[str] = "cl100k_base"):
+        """
+        Initialize the token counter.
+
+        Args:
+            encoding_name: tiktoken encoding to use, or None to always estimate
+        """
+        self.encoding_name = encoding_name
+        self._encoding: Any = None
+        self._load_attempted = not TIKTOKEN_AVAILABLE or encoding_name is None
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from the tiktoken encoding."""
+        return self._encoding is not None
+
+    def load(self) -> bool:
+        """
+        Load the tiktoken encoding (blocking; may download the BPE file).
+
+        Only the first call tries; a failure is logged once and the counter
+        keeps estimating.
+
+        Returns:
+            True if the encoding is available
+        """
+        if not self._load_attempted:
+            self._load_attempted = True
+            try:
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.info(f"tiktoken encoding unavailable, estimating tokens: {e}")
+        return self._encoding is not None
+
+    async def load_async(self) -> bool:
+        """Load the tiktoken encoding in a worker thread."""
+        return await asyncio.to_thread(self.load)
+
+    def count_text(self, text: Optional[str]) -> int:
+        """
+        Count tokens in a piece of text.
+
+        Args:
+            text: Text to count
+
+        Returns:
+            Token count (estimated if no encoding is available)
+        """
+        if not text:
+            return 0
+
+        encoding = self._encoding
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+
+        # Roughly four characters per token for English text and code
+        return (len(text) + 3) // 4
+
+    def count_message(self, message: ConversationMessage) -> int:
+        """
+        Count tokens in a conversation message.
+
+        The result is cached on the message until it is invalidated.
+
+        Args:
+            message: Message to count
+
+        Returns:
+            Token count including per-message overhead
+        """
+        if message._token_count is None:
+            tokens = MESSAGE_OVERHEAD_TOKENS + self.count_text(message.content)
+            for tu in message.tool_uses:
+                tokens += self.count_text(tu.name)
+                tokens += self.count_text(json.dumps(tu.arguments))
+            for tr in message.tool_results:
+                tokens += self.count_text(tr.content)
+            message._token_count = tokens
+        return message._token_count
+
+    def count_tools(self, tools: Optional[List[ToolDefinition]]) -> int:
+        """
+        Count tokens used by tool definitions.
+
+        Args:
+            tools: Tool definitions sent with the request
+
+        Returns:
+            Token count for all tool schemas
+        """
+        if not tools:
+            return 0
+
+        return sum(tool.token_count(self) for tool in tools)
+
+
+@dataclass
+class ContextBudget:
+    """Token budget for the conversation history of a single LLM request."""
+
+    context_window: int
+    max_output_tokens: int
+    reserved_tokens: int = 0  # System prompt and tool definitions
+    safety_margin: int = 1024
+
+    @property
+    def available(self) -> int:
+        """Tokens left for conversation messages."""
+        return max(
+            0,
+            self.context_window
+            - self.max_output_tokens
+            - self.reserved_tokens
+            - self.safety_margin,
+        )
+
+    @classmethod
+    def for_model(
+        cls,
+        model_info: Optional[ModelInfo],
+        *,
+        max_output_tokens: int,
+        reserved_tokens: int = 0,
+        safety_margin: int = 1024,
+    ) -> "ContextBudget":
+        """
+        Derive a budget from model catalog information.
+
+        Args:
+            model_info: Catalog entry for the model, if known
+            max_output_tokens: Tokens reserved for the response
+            reserved_tokens: Tokens used by system prompt and tools
+            safety_margin: Extra headroom for counting inaccuracies
+
+        Returns:
+            ContextBudget for the model
+        """
+        context_window = DEFAULT_CONTEXT_WINDOW
+        if isinstance(model_info, ModelInfo):
+            context_window = model_info.context_window
+
+        return cls(
+            context_window=context_window,
+            max_output_tokens=max_output_tokens,
+            reserved_tokens=reserved_tokens,
+            safety_margin=safety_margin,
+        )
+
+
+@dataclass
+class ContextWindow:
+    """Messages selected to fit a context budget."""
+
+    messages: List[ConversationMessage]
+    total_tokens: int
+    original_tokens: int
+    dropped_messages: int = 0
+    elided_results: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        """Tokens removed from the prompt by the budgeter."""
+        return self.original_tokens - self.total_tokens
+
+    def to_llm_messages(self) -> List[Message]:
+        """Convert the selected messages to LLM format."""
+        return [msg.to_llm_message() for msg in self.messages]
+
+
+class ContextBudgeter:
+    """
+    Fits conversation history into a context budget.
+
+    Whole turns (a user prompt plus the assistant and tool messages that
+    follow it) are dropped oldest first, so tool_use/tool_result pairs stay
+    intact. If the remaining turns still do not fit, older tool results are
+    replaced with a short placeholder.
+    """
+
+    def __init__(self, counter: Optional[TokenCounter] = None):
+        """
+        Initialize the budgeter.
+
+        Args:
+            counter: Token counter to use (defaults to the shared counter)
+        """
+        self.counter = counter or token_counter
+
+    def _elide_tool_results(self, message: ConversationMessage) -> ConversationMessage:
+        """Return a copy of the message with its tool results replaced by stubs."""
+        elided = [
+            LLMToolResult(
+                tool_use_id=tr.tool_use_id,
+                content=ELIDED_TOOL_RESULT.format(tokens=self.counter.count_text(tr.content)),
+                is_error=tr.is_error,
+            )
+            for tr in message.tool_results
+        ]
+        return replace(message, tool_results=elided)
+
+    def fit(
+        self,
+        messages: List[ConversationMessage],
+        budget: ContextBudget,
+    ) -> ContextWindow:
+        """
+        Select messages that fit the budget.
+
+        Args:
+            messages: Full conversation history
+            budget: Token budget for the request
+
+        Returns:
+            ContextWindow with the selected messages and token accounting
+        """
+        counts = [self.counter.count_message(msg) for msg in messages]
+        original_tokens = sum(counts)
+        available = budget.available
+
+        if original_tokens <= available:
+            return ContextWindow(
+                messages=list(messages),
+                total_tokens=original_tokens,
+                original_tokens=original_tokens,
+            )
+
+        # Drop oldest turns, always keeping the current one
+        turns = split_turns(messages)
+        total = original_tokens
+        dropped = 0
+        while total > available and len(turns) > 1:
+            turn = turns.pop(0)
+            total -= sum(self.counter.count_message(msg) for msg in turn)
+            dropped += len(turn)
+
+        selected = [msg for turn in turns for msg in turn]
+
+        # Elide older tool results, keeping the most recent ones verbatim
+        elided = 0
+        last_result_idx = max(
+            (i for i, msg in enumerate(selected) if msg.tool_results),
+            default=-1,
+        )
+        for i in range(last_result_idx):
+            if total <= available:
+                break
+            msg = selected[i]
+            if not msg.tool_results:
+                continue
+            stub = self._elide_tool_results(msg)
+            total += self.counter.count_message(stub) - self.counter.count_message(msg)
+            selected[i] = stub
+            elided += len(msg.tool_results)
+
+        if total > available:
+            logger.warning(
+                f"Conversation still exceeds context budget after trimming "
+                f"({total} > {available} tokens)"
+            )
+
+        return ContextWindow(
+            messages=selected,
+            total_tokens=total,
+            original_tokens=original_tokens,
+            dropped_messages=dropped,
+            elided_results=elided,
+        )
+
+
+# Global token counter instance
+token_counter = TokenCounter()
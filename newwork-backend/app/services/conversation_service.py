@@ -4,22 +4,31 @@ Conversation Service.
 This module manages conversation history and context for LLM interactions.
 """
 
+import asyncio
 import logging
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from uuid import uuid4
 
 from app.services.llm.base import (
     ContentBlock,
+    LLMProvider,
     Message,
     MessageRole,
     ToolResult as LLMToolResult,
     ToolUse,
 )
+from app.services.work_scheduler import Lane, work_context
 
 logger = logging.getLogger(__name__)
 
+# Heading of the synthetic message that replaces compacted turns
+COMPACTION_SUMMARY_PREFIX = "[Summary of the earlier conversation]"
+
+# Assistant reply following the summary, so user and assistant turns alternate
+COMPACTION_SUMMARY_ACK = "Understood. I'll continue from this summary."
+
 
 @dataclass
 class ConversationMessage:
@@ -38,8 +47,42 @@ class ConversationMessage:
     created_at: datetime = field(default_factory=datetime.utcnow)
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    # Cached token estimate, filled in lazily by the context budgeter
+    _token_count: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+    # Memoized LLM message; it in turn memoizes its provider payloads
+    _llm_message: Optional[Message] = field(default=None, init=False, repr=False, compare=False)
+    # LLM view with stale tool outputs elided, built by the tool output policy
+    _elided_view: Any = field(default=None, init=False, repr=False, compare=False)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            self.invalidate_cache()
+
+    def invalidate_cache(self) -> None:
+        """
+        Drop cached derived data.
+
+        Called automatically when a field is reassigned. Call it explicitly
+        after mutating tool_uses or tool_results in place.
+        """
+        self._token_count = None
+        self._llm_message = None
+        self._elided_view = None
+
     def to_llm_message(self) -> Message:
-        """Convert to LLM Message format."""
+        """
+        Convert to LLM Message format.
+
+        The result is memoized until the message is mutated, so repeated
+        requests only convert messages added since the previous call.
+        """
+        if self._llm_message is None:
+            self._llm_message = self._build_llm_message()
+        return self._llm_message
+
+    def _build_llm_message(self) -> Message:
+        """Build the LLM Message for this conversation message."""
         # Simple text message
         if not self.tool_uses and not self.tool_results:
             return Message(role=self.role, content=self.content)
@@ -140,9 +183,28 @@ class Conversation:
     updated_at: datetime = field(default_factory=datetime.utcnow)
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    # Original messages replaced by compaction summaries, oldest first
+    compacted_messages: List[ConversationMessage] = field(default_factory=list)
+
     # Token tracking
     total_input_tokens: int = 0
     total_output_tokens: int = 0
+    total_cache_read_tokens: int = 0
+    total_cache_creation_tokens: int = 0
+
+    # Size of the stale tool outputs elided from the LLM context, each counted once
+    total_tool_output_bytes_saved: int = 0
+    total_tool_output_tokens_saved: int = 0
+
+    # Called with each message added to the history (see app.services.message_store)
+    on_message: Optional[Callable[["Conversation", ConversationMessage], None]] = field(
+        default=None, repr=False, compare=False
+    )
+
+    def _message_added(self, message: ConversationMessage) -> None:
+        self.updated_at = datetime.utcnow()
+        if self.on_message is not None:
+            self.on_message(self, message)
 
     def add_user_message(self, content: str) -> ConversationMessage:
         """
@@ -160,7 +222,7 @@ class Conversation:
             content=content,
         )
         self.messages.append(message)
-        self.updated_at = datetime.utcnow()
+        self._message_added(message)
         return message
 
     def add_assistant_message(
@@ -188,11 +250,11 @@ class Conversation:
             tokens_used=tokens_used,
         )
         self.messages.append(message)
-        self.updated_at = datetime.utcnow()
 
         if tokens_used:
             self.total_output_tokens += tokens_used
 
+        self._message_added(message)
         return message
 
     def add_tool_results(
@@ -215,7 +277,7 @@ class Conversation:
             tool_results=tool_results,
         )
         self.messages.append(message)
-        self.updated_at = datetime.utcnow()
+        self._message_added(message)
         return message
 
     def get_llm_messages(self) -> List[Message]:
@@ -227,6 +289,87 @@ class Conversation:
         """
         return [msg.to_llm_message() for msg in self.messages]
 
+    def apply_compaction(
+        self,
+        replaced: List[ConversationMessage],
+        summary: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Optional[ConversationMessage]:
+        """
+        Replace leading messages with a summary.
+
+        The summary is a user message followed by a short assistant
+        acknowledgement, so the kept history, which starts with a user
+        prompt, still alternates between user and assistant turns. The
+        replaced originals are moved to compacted_messages so they stay
+        available for export. Earlier summaries are dropped, as their
+        originals are already archived.
+
+        Args:
+            replaced: Messages to replace; must be the current prefix of messages
+            summary: Summary text
+            metadata: Extra metadata for the summary message
+
+        Returns:
+            The summary message, or None if the history changed so that
+            `replaced` is no longer its prefix
+        """
+        if not replaced or len(replaced) > len(self.messages):
+            return None
+        if any(a is not b for a, b in zip(self.messages, replaced)):
+            return None
+
+        replaced_ids: List[str] = []
+        for msg in replaced:
+            previous = msg.metadata.get("compaction")
+            if previous:
+                replaced_ids.extend(previous.get("replaces", []))
+            else:
+                replaced_ids.append(msg.id)
+                self.compacted_messages.append(msg)
+
+        message = ConversationMessage(
+            id=str(uuid4()),
+            role=MessageRole.USER,
+            content=f"{COMPACTION_SUMMARY_PREFIX}\n\n{summary}",
+            metadata={"compaction": {**(metadata or {}), "replaces": replaced_ids}},
+        )
+        ack = ConversationMessage(
+            id=str(uuid4()),
+            role=MessageRole.ASSISTANT,
+            content=COMPACTION_SUMMARY_ACK,
+            metadata={"compaction": {"acknowledges": message.id}},
+        )
+        self.messages[:len(replaced)] = [message, ack]
+        self.updated_at = datetime.utcnow()
+        return message
+
+    def get_full_history(self) -> List[ConversationMessage]:
+        """
+        Get the history as originally recorded, without compaction summaries.
+
+        Returns:
+            Archived originals followed by the live messages
+        """
+        return self.compacted_messages + [
+            msg for msg in self.messages if not msg.metadata.get("compaction")
+        ]
+
+    def has_tool_output_handle(self, handle: str) -> bool:
+        """
+        Check whether a tool output of this conversation was stored under a handle.
+
+        Args:
+            handle: Tool output store handle
+
+        Returns:
+            True if one of the conversation's elided tool outputs has the handle
+        """
+        return any(
+            handle in msg.metadata.get("tool_output_handles", {}).values()
+            for msg in self.get_full_history()
+        )
+
     def get_last_assistant_message(self) -> Optional[ConversationMessage]:
         """Get the last assistant message."""
         for msg in reversed(self.messages):
@@ -253,16 +396,26 @@ class Conversation:
 
         return last_assistant.tool_uses
 
-    def update_token_usage(self, input_tokens: int, output_tokens: int) -> None:
+    def update_token_usage(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        *,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0,
+    ) -> None:
         """Update token usage tracking."""
         self.total_input_tokens += input_tokens
         self.total_output_tokens += output_tokens
+        self.total_cache_read_tokens += cache_read_tokens
+        self.total_cache_creation_tokens += cache_creation_tokens
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert conversation to dictionary for storage."""
         return {
             "session_id": self.session_id,
             "messages": [msg.to_dict() for msg in self.messages],
+            "compacted_messages": [msg.to_dict() for msg in self.compacted_messages],
             "system_prompt": self.system_prompt,
             "model": self.model,
             "provider": self.provider,
@@ -271,6 +424,10 @@ class Conversation:
             "metadata": self.metadata,
             "total_input_tokens": self.total_input_tokens,
             "total_output_tokens": self.total_output_tokens,
+            "total_cache_read_tokens": self.total_cache_read_tokens,
+            "total_cache_creation_tokens": self.total_cache_creation_tokens,
+            "total_tool_output_bytes_saved": self.total_tool_output_bytes_saved,
+            "total_tool_output_tokens_saved": self.total_tool_output_tokens_saved,
         }
 
     @classmethod
@@ -286,11 +443,19 @@ class Conversation:
             metadata=data.get("metadata", {}),
             total_input_tokens=data.get("total_input_tokens", 0),
             total_output_tokens=data.get("total_output_tokens", 0),
+            total_cache_read_tokens=data.get("total_cache_read_tokens", 0),
+            total_cache_creation_tokens=data.get("total_cache_creation_tokens", 0),
+            total_tool_output_bytes_saved=data.get("total_tool_output_bytes_saved", 0),
+            total_tool_output_tokens_saved=data.get("total_tool_output_tokens_saved", 0),
         )
         conv.messages = [
             ConversationMessage.from_dict(msg)
             for msg in data.get("messages", [])
         ]
+        conv.compacted_messages = [
+            ConversationMessage.from_dict(msg)
+            for msg in data.get("compacted_messages", [])
+        ]
         return conv
 
 
@@ -299,10 +464,14 @@ class ConversationService:
     Service for managing conversations.
 
     Provides methods for creating, loading, and updating conversations.
+    Conversations are kept in memory; when the message store is running,
+    their messages are also written to the database, and conversations of
+    earlier server processes are loaded from it on first access.
     """
 
     def __init__(self):
         self._conversations: Dict[str, Conversation] = {}
+        self._compaction_tasks: Dict[str, asyncio.Task] = {}
 
     def create_conversation(
         self,
@@ -330,12 +499,28 @@ class ConversationService:
             model=model,
             provider=provider,
         )
-        self._conversations[session_id] = conv
+        self._track(session_id, conv)
         return conv
 
     def get_conversation(self, session_id: str) -> Optional[Conversation]:
-        """Get a conversation by session ID."""
-        return self._conversations.get(session_id)
+        """Get a conversation by session ID, loading stored messages if needed."""
+        conv = self._conversations.get(session_id)
+        if conv is not None:
+            return conv
+
+        # Import here to avoid circular imports
+        from app.services.message_store import message_store
+
+        if not message_store.active:
+            return None
+        try:
+            conv = message_store.load(session_id)
+        except Exception as e:
+            logger.error(f"Failed to load stored messages of session {session_id}: {e}")
+            return None
+        if conv is not None:
+            self._track(session_id, conv)
+        return conv
 
     def get_or_create_conversation(
         self,
@@ -350,11 +535,74 @@ class ConversationService:
 
     def delete_conversation(self, session_id: str) -> bool:
         """Delete a conversation."""
+        # Import here to avoid circular imports
+        from app.services.message_store import message_store
+
+        message_store.discard(session_id)
+        task = self._compaction_tasks.pop(session_id, None)
+        if task is not None:
+            task.cancel()
         if session_id in self._conversations:
             del self._conversations[session_id]
             return True
         return False
 
+    def schedule_compaction(
+        self,
+        conversation: Conversation,
+        provider: LLMProvider,
+    ) -> Optional[asyncio.Task]:
+        """
+        Start compacting the conversation history in the background.
+
+        Meant to be called when a turn has finished. Nothing is started if
+        compaction is disabled, the history is below the threshold, or a
+        compaction of the session is already running.
+
+        Args:
+            conversation: Conversation to compact
+            provider: Provider of the session, used for the summary
+
+        Returns:
+            The compaction task, or None if nothing was started
+        """
+        # Import here to avoid circular imports
+        from app.services.compaction_service import get_history_compactor
+
+        compactor = get_history_compactor()
+        if compactor is None or not compactor.should_compact(conversation):
+            return None
+
+        session_id = conversation.session_id
+        running = self._compaction_tasks.get(session_id)
+        if running is not None and not running.done():
+            return None
+
+        # Summaries wait behind the LLM calls of interactive prompts
+        task = asyncio.create_task(
+            compactor.compact(conversation, provider),
+            context=work_context(lane=Lane.BACKGROUND),
+        )
+        self._compaction_tasks[session_id] = task
+
+        def _done(t: asyncio.Task) -> None:
+            if self._compaction_tasks.get(session_id) is t:
+                del self._compaction_tasks[session_id]
+
+        task.add_done_callback(_done)
+        return task
+
+    async def wait_for_compaction(self, session_id: str) -> None:
+        """
+        Wait until a running compaction of the session has finished.
+
+        Args:
+            session_id: Session identifier
+        """
+        task = self._compaction_tasks.get(session_id)
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
     def load_conversation(self, session_id: str, data: Dict[str, Any]) -> Conversation:
         """
         Load a conversation from stored data.
@@ -367,9 +615,29 @@ class ConversationService:
             Loaded Conversation instance
         """
         conv = Conversation.from_dict(data)
-        self._conversations[session_id] = conv
+        self._track(session_id, conv)
         return conv
 
+    def end_turn(self, conversation: Conversation) -> None:
+        """
+        Write the messages of a finished (or cancelled) turn to the database.
+
+        Args:
+            conversation: Conversation whose turn ended
+        """
+        # Import here to avoid circular imports
+        from app.services.message_store import message_store
+
+        message_store.end_turn(conversation)
+
+    def _track(self, session_id: str, conv: Conversation) -> None:
+        """Keep a conversation in memory and persist the messages added to it."""
+        # Import here to avoid circular imports
+        from app.services.message_store import message_store
+
+        conv.on_message = message_store.enqueue
+        self._conversations[session_id] = conv
+
 
 # Global conversation service instance
 conversation_service = ConversationService()
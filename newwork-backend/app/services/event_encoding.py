@@ -0,0 +1,138 @@
+"""
+Event Encoding.
+
+Serializes events to JSON once. Every consumer slices the resulting bytes
+instead of serializing the event again: SSE writers send the payload, the
+WebSocket multiplexer sends the payload or just its data, and the session
+event log spills the same frames to disk.
+
+orjson is used when it is installed; the standard json module is the
+fallback and produces equivalent (compact, UTF-8) output.
+"""
+
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+# Reused encoders: json.dumps() with non-default options builds a new one per call
+_COMPACT_ENCODER = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+_PRETTY_ENCODER = json.JSONEncoder(indent=2, ensure_ascii=False)
+
+
+def dumps(obj: Any, *, pretty: bool = False) -> bytes:
+    """
+    Serialize an object to UTF-8 JSON.
+
+    Args:
+        obj: JSON-serializable object
+        pretty: Indent with two spaces
+
+    Returns:
+        JSON bytes
+    """
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            # Values orjson rejects (e.g. integers over 64 bits) still work below
+            pass
+    encoder = _PRETTY_ENCODER if pretty else _COMPACT_ENCODER
+    return encoder.encode(obj).encode()
+
+
+@lru_cache(maxsize=4096)
+def _dumps_key(value: Optional[str]) -> bytes:
+    """Serialize an event type or session ID; there are few distinct ones."""
+    return dumps(value)
+
+
+@dataclass(frozen=True)
+class EncodedEvent:
+    """
+    An event serialized once.
+
+    `payload` is the JSON object {"type", "data", "session_id", "timestamp"};
+    `data_start` and `data_end` locate the "data" value inside it.
+    """
+
+    type: str
+    payload: bytes
+    data_start: int
+    data_end: int
+
+    @property
+    def data(self) -> memoryview:
+        """The JSON of the event data, without copying it."""
+        return memoryview(self.payload)[self.data_start:self.data_end]
+
+    def sse(self, event_id: Optional[int] = None) -> bytes:
+        """
+        Build the SSE frame of the event.
+
+        Args:
+            event_id: Value of the `id:` field (None leaves it out)
+
+        Returns:
+            SSE frame bytes
+        """
+        if event_id is None:
+            return b"data: " + self.payload + b"\n\n"
+        return b"id: %d\ndata: %s\n\n" % (event_id, self.payload)
+
+    @classmethod
+    def from_payload(cls, payload: bytes) -> "EncodedEvent":
+        """
+        Locate the parts of a payload built by encode_event.
+
+        Args:
+            payload: Event JSON from EncodedEvent.payload
+
+        Returns:
+            EncodedEvent over the same bytes
+        """
+        data_start = payload.index(b',"data":') + len(b',"data":')
+        data_end = payload.rindex(b',"session_id":')
+        event_type = json.loads(payload[len(b'{"type":'):data_start - len(b',"data":')])
+        return cls(type=event_type, payload=payload, data_start=data_start, data_end=data_end)
+
+
+def encode_event(
+    event_type: str,
+    data: Any,
+    session_id: Optional[str],
+    timestamp: str,
+) -> EncodedEvent:
+    """
+    Serialize an event.
+
+    Only the data is run through the JSON encoder; the envelope around it
+    is assembled from its parts.
+
+    Args:
+        event_type: Event type
+        data: Event data
+        session_id: Session the event belongs to
+        timestamp: ISO timestamp
+
+    Returns:
+        EncodedEvent
+    """
+    head = b'{"type":' + _dumps_key(event_type) + b',"data":'
+    body = dumps(data)
+    # ISO timestamps need no escaping
+    tail = b',"session_id":%s,"timestamp":"%s"}' % (_dumps_key(session_id), timestamp.encode())
+    return EncodedEvent(
+        type=event_type,
+        payload=head + body + tail,
+        data_start=len(head),
+        data_end=len(head) + len(body),
+    )
@@ -0,0 +1,613 @@
+"""
+Session Event Log.
+
+This module keeps a bounded log of the SSE events emitted for each session,
+so a client whose connection drops can reconnect with `Last-Event-ID` and
+receive the events it missed instead of re-running the prompt.
+
+Every event gets a per-session, monotonically increasing ID, sent as the
+`id:` field of the SSE frame. Recent events are kept in memory as encoded
+SSE frames; events evicted by the memory limits are spilled to disk as the
+same bytes, where they are kept up to a size limit of their own.
+
+Prompt runs write into the log and HTTP responses follow it, so a run
+survives a short disconnect. A run nobody follows for longer than the
+resume grace period is cancelled, and logs left unused are dropped.
+"""
+
+import asyncio
+import logging
+import struct
+import time
+import uuid
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import AsyncGenerator, BinaryIO, Deque, Dict, List, Optional, Set
+
+from app.services.event_encoding import EncodedEvent
+from app.services.event_service import event_service
+from app.services.streaming_handler import SSEEvent, SSEEventType
+
+logger = logging.getLogger(__name__)
+
+
+# Spill file record header: event ID, frame length
+SPILL_RECORD = struct.Struct(">QI")
+
+
+@dataclass
+class LoggedEvent:
+    """An encoded event and its SSE frame."""
+
+    id: Optional[int]  # None for status frames that are not logged
+    encoded: EncodedEvent
+    frame: bytes
+
+    @classmethod
+    def create(cls, event_id: Optional[int], encoded: EncodedEvent) -> "LoggedEvent":
+        """Build the entry of an encoded event."""
+        return cls(id=event_id, encoded=encoded, frame=encoded.sse(event_id))
+
+    @classmethod
+    def from_frame(cls, event_id: int, frame: bytes) -> "LoggedEvent":
+        """Rebuild an entry from its SSE frame (e.g. read from a spill file)."""
+        payload = frame[frame.index(b"data: ") + len(b"data: "):-2]
+        return cls(id=event_id, encoded=EncodedEvent.from_payload(payload), frame=frame)
+
+    @property
+    def size(self) -> int:
+        return len(self.frame)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """
+    Parse a Last-Event-ID header.
+
+    Args:
+        value: Header value
+
+    Returns:
+        The event ID, or None if the header is missing or not an ID
+    """
+    if value is None:
+        return None
+    try:
+        return max(0, int(value.strip()))
+    except ValueError:
+        return None
+
+
+class SessionEventLog:
+    """
+    Bounded, resumable log of one session's SSE events.
+
+    Up to `max_events` events and `max_bytes` of frames are kept in memory.
+    Older events are appended to a spill file under `spill_dir` when one is
+    given; the spill file is rotated once it reaches half of
+    `max_spill_bytes`, so at most that much is kept on disk.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        *,
+        max_events: int = 2000,
+        max_bytes: int = 4 * 1024 * 1024,
+        spill_dir: Optional[Path] = None,
+        max_spill_bytes: int = 64 * 1024 * 1024,
+        resume_grace: float = 15.0,
+    ):
+        """
+        Initialize the log.
+
+        Args:
+            session_id: Session identifier
+            max_events: Most events kept in memory
+            max_bytes: Most frame bytes kept in memory
+            spill_dir: Directory for evicted events (None drops them)
+            max_spill_bytes: Most bytes kept on disk
+            resume_grace: Seconds a run may go unfollowed before it is cancelled
+        """
+        self.session_id = session_id
+        self.max_events = max(1, max_events)
+        self.max_bytes = max_bytes
+        self.max_spill_bytes = max_spill_bytes
+        self.resume_grace = resume_grace
+
+        self._events: Deque[LoggedEvent] = deque()
+        self._bytes = 0
+        self._last_id = 0
+
+        self._spill_path: Optional[Path] = None
+        self._spill_file: Optional[BinaryIO] = None
+        self._spill_bytes = 0
+        # First IDs of the spill files, so first_id needs no disk reads
+        self._spill_first_id: Optional[int] = None
+        self._rotated_first_id: Optional[int] = None
+        if spill_dir is not None:
+            safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+            self._spill_path = spill_dir / f"{safe_id}.events"
+            # Spilled events of an earlier process do not match the new IDs
+            self._remove_spill_files()
+
+        self._changed = asyncio.Event()
+        self._runs: Set[asyncio.Task] = set()
+        self._detached: Set[asyncio.Task] = set()  # Runs kept without followers
+        self._followers = 0
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+        self._last_active = time.monotonic()
+
+    @property
+    def last_id(self) -> int:
+        """ID of the newest event (0 if the log is empty)."""
+        return self._last_id
+
+    @property
+    def first_id(self) -> int:
+        """ID of the oldest event still available."""
+        for first_id in (self._rotated_first_id, self._spill_first_id):
+            if first_id is not None:
+                return first_id
+        if self._events:
+            return self._events[0].id
+        return self._last_id + 1
+
+    @property
+    def running(self) -> bool:
+        """Whether a prompt run is writing to the log."""
+        return bool(self._runs)
+
+    @property
+    def followers(self) -> int:
+        """Number of responses following the log."""
+        return self._followers
+
+    def idle_for(self, now: Optional[float] = None) -> float:
+        """
+        Get how long the log has gone unused.
+
+        Args:
+            now: time.monotonic() value to measure against
+
+        Returns:
+            Seconds since the last event or follower, 0 while in use
+        """
+        if self._runs or self._followers:
+            return 0.0
+        return (time.monotonic() if now is None else now) - self._last_active
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes of frames held in memory."""
+        return self._bytes
+
+    def append(self, event: SSEEvent) -> int:
+        """
+        Add an event, assigning its ID.
+
+        Args:
+            event: Event to log (its `id` is set)
+
+        Returns:
+            The event ID
+        """
+        self._last_id += 1
+        event.id = self._last_id
+        entry = LoggedEvent.create(event.id, event.encode())
+        self._events.append(entry)
+        self._bytes += entry.size
+
+        while len(self._events) > 1 and (
+            len(self._events) > self.max_events or self._bytes > self.max_bytes
+        ):
+            evicted = self._events.popleft()
+            self._bytes -= evicted.size
+            self._spill(evicted)
+
+        self._last_active = time.monotonic()
+        self._notify()
+        return event.id
+
+    def since(self, last_id: int) -> List[LoggedEvent]:
+        """
+        Get the events after an ID.
+
+        Args:
+            last_id: Last event the client received
+
+        Returns:
+            Available events with a greater ID, oldest first
+        """
+        if last_id >= self._last_id:
+            return []
+        events: List[LoggedEvent] = []
+        first_in_memory = self._events[0].id if self._events else self._last_id + 1
+        if last_id + 1 < first_in_memory:
+            events.extend(self._read_spill(last_id))
+        start = max(0, last_id + 1 - first_in_memory)
+        events.extend(islice(self._events, start, None))
+        return events
+
+    async def follow(
+        self,
+        last_id: int,
+        *,
+        until_idle: bool = False,
+        keepalive: Optional[float] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Replay the events after an ID, then continue with new ones.
+
+        If events after `last_id` are no longer available, a status event
+        with `"status": "resync"` is sent first so the client can reload the
+        session state.
+
+        Args:
+            last_id: Last event the client received
+            until_idle: Stop once no run is writing and everything was sent
+            keepalive: Seconds of silence after which a keepalive is sent
+
+        Yields:
+            SSE frames
+        """
+        async with aclosing(
+            self.follow_entries(last_id, until_idle=until_idle, keepalive=keepalive)
+        ) as entries:
+            async for entry in entries:
+                yield entry.frame
+
+    async def follow_entries(
+        self,
+        last_id: int,
+        *,
+        until_idle: bool = False,
+        keepalive: Optional[float] = None,
+    ) -> AsyncGenerator[LoggedEvent, None]:
+        """
+        Like follow(), but yield the log entries instead of their frames.
+
+        Args:
+            last_id: Last event the client received
+            until_idle: Stop once no run is writing and everything was sent
+            keepalive: Seconds of silence after which a keepalive is sent
+
+        Yields:
+            LoggedEvent objects (status entries have no ID)
+        """
+        self._attach()
+        try:
+            if last_id > self._last_id or (last_id < self._last_id and last_id + 1 < self.first_id):
+                yield self._status_entry({
+                    "status": "resync",
+                    "first_event_id": self.first_id,
+                    "last_event_id": self._last_id,
+                })
+                last_id = min(last_id, self._last_id)
+
+            while True:
+                for entry in self.since(last_id):
+                    last_id = entry.id
+                    yield entry
+
+                if until_idle and not self._runs:
+                    return
+
+                changed = self._changed
+                if self._last_id > last_id:
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield self._status_entry({"status": "keepalive"})
+        finally:
+            self._detach()
+
+    def start_run(
+        self,
+        events: AsyncGenerator[SSEEvent, None],
+        *,
+        detached: bool = False,
+    ) -> asyncio.Task:
+        """
+        Write a prompt run's events to the log in a background task.
+
+        The run keeps going while its client reconnects; it is cancelled
+        when no response has followed the log for `resume_grace` seconds,
+        counting from the start if no response ever attaches. Detached runs
+        are never cancelled for lack of followers.
+
+        Args:
+            events: Events of the run (e.g. StreamingHandler.process_prompt)
+            detached: Keep the run going without followers
+
+        Returns:
+            The run task
+        """
+        task = asyncio.create_task(self._record(events))
+        self._runs.add(task)
+        if detached:
+            self._detached.add(task)
+        task.add_done_callback(self._run_done)
+        if not self._followers and self._attended_runs():
+            self._schedule_abandon()
+        return task
+
+    async def _record(self, events: AsyncGenerator[SSEEvent, None]) -> None:
+        try:
+            async for event in events:
+                self.append(event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in run for session {self.session_id}: {e}")
+            self.append(SSEEvent(
+                type=SSEEventType.ERROR,
+                session_id=self.session_id,
+                data={"error": str(e)},
+            ))
+        finally:
+            await events.aclose()
+
+    def _run_done(self, task: asyncio.Task) -> None:
+        self._runs.discard(task)
+        self._detached.discard(task)
+        if not self._attended_runs():
+            self._cancel_abandon()
+        self._notify()
+
+    def cancel_runs(self) -> None:
+        """Cancel the runs writing to the log."""
+        for task in list(self._runs):
+            task.cancel()
+
+    def close(self) -> None:
+        """Cancel runs and release the spill files."""
+        self.cancel_runs()
+        self._cancel_abandon()
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._remove_spill_files()
+
+    def _attach(self) -> None:
+        self._followers += 1
+        self._last_active = time.monotonic()
+        self._cancel_abandon()
+
+    def _detach(self) -> None:
+        self._followers -= 1
+        self._last_active = time.monotonic()
+        if not self._followers and self._attended_runs():
+            self._schedule_abandon()
+
+    def _schedule_abandon(self) -> None:
+        self._cancel_abandon()
+        if self.resume_grace <= 0:
+            self._abandon()
+            return
+        loop = asyncio.get_running_loop()
+        self._abandon_timer = loop.call_later(self.resume_grace, self._abandon)
+
+    def _cancel_abandon(self) -> None:
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+
+    def _attended_runs(self) -> Set[asyncio.Task]:
+        """Runs that are cancelled when nobody follows them."""
+        return self._runs - self._detached
+
+    def _abandon(self) -> None:
+        self._abandon_timer = None
+        runs = self._attended_runs()
+        if not self._followers and runs:
+            logger.info(f"No client resumed session {self.session_id}, cancelling its run")
+            for task in runs:
+                task.cancel()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _status_entry(self, data: Dict[str, object]) -> LoggedEvent:
+        event = SSEEvent(type=SSEEventType.STATUS, session_id=self.session_id, data=data)
+        return LoggedEvent.create(None, event.encode())
+
+    @property
+    def _rotated_path(self) -> Path:
+        assert self._spill_path is not None
+        return self._spill_path.with_suffix(".1.events")
+
+    def _spill(self, entry: LoggedEvent) -> None:
+        """Move an evicted event to the spill file."""
+        if self._spill_path is None:
+            return
+        size = SPILL_RECORD.size + entry.size
+        try:
+            if self._spill_bytes + size > self.max_spill_bytes // 2 and self._spill_bytes:
+                self._rotate_spill()
+            if self._spill_file is None:
+                self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+                self._spill_file = self._spill_path.open("ab")
+            self._spill_file.write(SPILL_RECORD.pack(entry.id, entry.size))
+            self._spill_file.write(entry.frame)
+            self._spill_file.flush()
+            self._spill_bytes += size
+            if self._spill_first_id is None:
+                self._spill_first_id = entry.id
+        except OSError as e:
+            logger.warning(f"Could not spill events of session {self.session_id}: {e}")
+
+    def _rotate_spill(self) -> None:
+        assert self._spill_path is not None
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._spill_path.replace(self._rotated_path)
+        self._spill_bytes = 0
+        self._rotated_first_id = self._spill_first_id
+        self._spill_first_id = None
+
+    def _read_spill(self, last_id: int) -> List[LoggedEvent]:
+        """Read spilled events after an ID."""
+        if self._spill_path is None:
+            return []
+        events: List[LoggedEvent] = []
+        for path in (self._rotated_path, self._spill_path):
+            if not path.exists():
+                continue
+            with path.open("rb") as f:
+                while header := f.read(SPILL_RECORD.size):
+                    event_id, size = SPILL_RECORD.unpack(header)
+                    frame = f.read(size)
+                    if event_id > last_id:
+                        events.append(LoggedEvent.from_frame(event_id, frame))
+        return events
+
+    def _remove_spill_files(self) -> None:
+        if self._spill_path is None:
+            return
+        for path in (self._spill_path, self._rotated_path):
+            path.unlink(missing_ok=True)
+        self._spill_bytes = 0
+        self._spill_first_id = None
+        self._rotated_first_id = None
+
+
+class EventLogService:
+    """Keeps the event logs of all sessions."""
+
+    # Seconds between sweeps for idle logs
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(self):
+        """Initialize the event log service."""
+        self._logs: Dict[str, SessionEventLog] = {}
+        self._last_sweep = time.monotonic()
+
+    def get(self, session_id: str) -> SessionEventLog:
+        """
+        Get or create the event log of a session.
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            SessionEventLog configured from settings
+        """
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        now = time.monotonic()
+        if now - self._last_sweep >= self.SWEEP_INTERVAL:
+            self.evict_idle(settings.SSE_EVENT_LOG_IDLE_SECONDS, now=now)
+
+        log = self._logs.get(session_id)
+        if log is None:
+            log = SessionEventLog(
+                session_id,
+                max_events=settings.SSE_EVENT_LOG_MAX_EVENTS,
+                max_bytes=settings.SSE_EVENT_LOG_MAX_BYTES,
+                spill_dir=(
+                    settings.data_dir / "event_logs"
+                    if settings.SSE_EVENT_LOG_MAX_SPILL_BYTES > 0 else None
+                ),
+                max_spill_bytes=settings.SSE_EVENT_LOG_MAX_SPILL_BYTES,
+                resume_grace=settings.SSE_RESUME_GRACE_SECONDS,
+            )
+            self._logs[session_id] = log
+        return log
+
+    def logs(self) -> List[SessionEventLog]:
+        """Get all event logs."""
+        return list(self._logs.values())
+
+    def evict_idle(self, max_idle: float, *, now: Optional[float] = None) -> int:
+        """
+        Drop logs without runs or followers that went unused too long.
+
+        Args:
+            max_idle: Seconds a log may go unused
+            now: time.monotonic() value to measure against
+
+        Returns:
+            Number of logs dropped
+        """
+        now = time.monotonic() if now is None else now
+        self._last_sweep = now
+        idle = [
+            session_id for session_id, log in self._logs.items()
+            if log.idle_for(now) > max_idle
+        ]
+        for session_id in idle:
+            self.discard(session_id)
+        return len(idle)
+
+    def discard(self, session_id: str) -> None:
+        """
+        Drop a session's event log, cancelling its runs.
+
+        Args:
+            session_id: Session identifier
+        """
+        log = self._logs.pop(session_id, None)
+        if log is not None:
+            log.close()
+
+
+async def follow_with_broadcasts(
+    log: SessionEventLog,
+    last_id: int,
+    *,
+    keepalive: Optional[float] = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Follow a session's event log together with broadcast events.
+
+    Broadcasts from the event service that belong to the session, or to no
+    session, are sent between the logged events. They are not logged, so
+    they are not replayed after a reconnect.
+
+    Args:
+        log: Session event log
+        last_id: Last event the client received
+        keepalive: Seconds of silence after which a keepalive is sent
+
+    Yields:
+        SSE frames
+    """
+    listener_id = f"session_{log.session_id}_{uuid.uuid4().hex[:8]}"
+    queue = event_service.register_listener(listener_id)
+    frames = log.follow(last_id, keepalive=keepalive)
+    next_frame = asyncio.ensure_future(frames.__anext__())
+    next_broadcast = asyncio.ensure_future(queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {next_frame, next_broadcast}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_broadcast in done:
+                item = next_broadcast.result()
+                next_broadcast = asyncio.ensure_future(queue.get())
+                if item.event.get("session_id", log.session_id) == log.session_id:
+                    yield b"data: " + item.payload + b"\n\n"
+            if next_frame in done:
+                try:
+                    frame = next_frame.result()
+                except StopAsyncIteration:
+                    return
+                next_frame = asyncio.ensure_future(frames.__anext__())
+                yield frame
+    finally:
+        event_service.unregister_listener(listener_id)
+        next_broadcast.cancel()
+        next_frame.cancel()
+        await asyncio.gather(next_frame, next_broadcast, return_exceptions=True)
+        await frames.aclose()
+
+
+# Global event log service instance
+event_log_service = EventLogService()
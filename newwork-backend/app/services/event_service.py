@@ -1,8 +1,11 @@
 from typing import Callable, Dict, Any, Optional
 from enum import Enum
+from dataclasses import dataclass
 import asyncio
 from datetime import datetime
 
+from app.services.event_encoding import dumps
+
 
 class EventType(str, Enum):
     """
@@ -18,6 +21,25 @@ class EventType(str, Enum):
     STREAM_CHUNK = "stream_chunk"
 
 
+@dataclass
+class BroadcastEvent:
+    """
+    An event as queued for listeners.
+
+    The event is serialized once when it is queued; `payload` is shared by
+    every listener.
+    """
+
+    event: Dict[str, Any]
+    payload: bytes
+
+    @classmethod
+    def create(cls, event: Dict[str, Any]) -> "BroadcastEvent":
+        """Timestamp and serialize an event."""
+        event["timestamp"] = datetime.utcnow().isoformat()
+        return cls(event=event, payload=dumps(event))
+
+
 class EventService:
     """
     Service for managing and broadcasting events.
@@ -60,13 +82,13 @@ class EventService:
         Args:
             event: Event data to broadcast
         """
-        # Add timestamp to event
-        event["timestamp"] = datetime.utcnow().isoformat()
+        # Timestamp and serialize once for all listeners
+        item = BroadcastEvent.create(event)
 
         # Send to all listeners
         for queue in self._listeners.values():
             try:
-                await queue.put(event)
+                await queue.put(item)
             except Exception:
                 pass  # Listener might have been removed
 
@@ -84,10 +106,8 @@ class EventService:
         if listener_id not in self._listeners:
             return False
 
-        event["timestamp"] = datetime.utcnow().isoformat()
-
         try:
-            await self._listeners[listener_id].put(event)
+            await self._listeners[listener_id].put(BroadcastEvent.create(event))
             return True
         except Exception:
             return False
@@ -109,8 +129,8 @@ class EventService:
             while True:
                 try:
                     # Wait for event with timeout
-                    event = await asyncio.wait_for(queue.get(), timeout=timeout)
-                    yield event
+                    item = await asyncio.wait_for(queue.get(), timeout=timeout)
+                    yield item.event
                 except asyncio.TimeoutError:
                     yield {"type": EventType.STATUS, "data": {"status": "keepalive"}}
                 except Exception:
@@ -14,6 +14,8 @@ Usage:
     response = await provider.complete(messages, model="claude-sonnet-4-20250514")
 """
 
+import logging
+from pathlib import Path
 from typing import Dict, List, Optional, Type
 
 from .base import (
@@ -28,6 +30,7 @@ from .base import (
     ModelInfo,
     ModelNotFoundError,
     RateLimitError,
+    ServiceUnavailableError,
     StreamEvent,
     StreamEventType,
     ToolDefinition,
@@ -39,6 +42,39 @@ from .openai_provider import OpenAIProvider
 from .deepseek_provider import DeepSeekProvider
 from .minimax_provider import MinimaxProvider
 from .zai_provider import ZAIProvider
+from .rate_limiter import (
+    ProviderRateLimiter,
+    RateLimitConfig,
+    RateLimitedProvider,
+    get_rate_limiter,
+    get_rate_limiter_states,
+)
+from .transport import (
+    TransportConfig,
+    close_http_clients,
+    get_http_client,
+    prewarm_http_clients,
+)
+from .replay_provider import RecordingProvider, ReplayProvider
+from .scheduled_provider import ScheduledProvider
+from app.services.work_scheduler import work_scheduler
+from .completion_cache import (
+    CachedProvider,
+    CompletionCache,
+    close_completion_cache,
+    get_completion_cache,
+)
+from .router import (
+    RoutedProvider,
+    RouteStats,
+    RouteTarget,
+    clear_routed_provider,
+    get_route_stats,
+    get_routed_provider,
+    parse_routes,
+)
+
+logger = logging.getLogger(__name__)
 
 # Registry of available providers
 _PROVIDERS: Dict[str, Type[LLMProvider]] = {
@@ -64,6 +100,10 @@ def register_provider(name: str, provider_class: Type[LLMProvider]) -> None:
     _PROVIDERS[name] = provider_class
 
 
+# Offline provider for load testing (see replay_provider)
+register_provider(ReplayProvider.provider_name, ReplayProvider)
+
+
 def get_provider(
     provider_name: str,
     api_key: str,
@@ -95,9 +135,32 @@ def get_provider(
     if use_cache and cache_key in _provider_instances:
         return _provider_instances[cache_key]
 
+    # Import here to avoid circular imports
+    from app.services.config_service import settings
+
     provider_class = _PROVIDERS[provider_name]
     instance = provider_class(api_key=api_key)
 
+    # Replays do not reach a provider API and are not rate limited
+    if settings.LLM_RATE_LIMIT_ENABLED and provider_name != ReplayProvider.provider_name:
+        instance = RateLimitedProvider(instance, get_rate_limiter(provider_name, api_key))
+
+    # Share LLM capacity fairly between sessions; retries keep their slot
+    if provider_name != ReplayProvider.provider_name:
+        instance = ScheduledProvider(instance, work_scheduler)
+
+    # Record outside the limiter so retried attempts are not recorded
+    if settings.LLM_RECORD_CASSETTE and provider_name != ReplayProvider.provider_name:
+        instance = RecordingProvider(instance, Path(settings.LLM_RECORD_CASSETTE))
+
+    # Cache hits skip rate limiting entirely
+    if settings.LLM_COMPLETION_CACHE_ENABLED:
+        instance = CachedProvider(
+            instance,
+            get_completion_cache(),
+            max_temperature=settings.LLM_COMPLETION_CACHE_MAX_TEMPERATURE,
+        )
+
     if use_cache:
         _provider_instances[cache_key] = instance
 
@@ -171,11 +234,43 @@ def get_all_models() -> List[ModelInfo]:
     return all_models
 
 
+async def prewarm_providers() -> Dict[str, bool]:
+    """
+    Open connections to the APIs of all configured providers.
+
+    Returns:
+        Whether a connection could be established, keyed by API origin
+    """
+    # Import here to avoid circular imports
+    from app.services.config_service import ConfigService
+
+    base_urls = []
+    for provider_name in ConfigService.get_available_providers():
+        api_key = ConfigService.get_api_key(provider_name)
+        if not api_key or provider_name not in _PROVIDERS:
+            continue
+        try:
+            provider = get_provider(provider_name, api_key)
+        except Exception as e:
+            logger.warning(f"Could not create provider {provider_name}: {e}")
+            continue
+        base_url = getattr(provider, "base_url", None)
+        if base_url:
+            # Create the SDK client so its shared connection pool exists
+            getattr(provider, "client", None)
+            base_urls.append(base_url)
+
+    return await prewarm_http_clients(base_urls)
+
+
 async def close_all_providers() -> None:
-    """Close all cached provider instances."""
+    """Close all cached provider instances and the shared HTTP clients."""
     for provider in _provider_instances.values():
         await provider.close()
     _provider_instances.clear()
+    clear_routed_provider()
+    await close_http_clients()
+    close_completion_cache()
 
 
 __all__ = [
@@ -185,6 +280,7 @@ __all__ = [
     "LLMError",
     "AuthenticationError",
     "RateLimitError",
+    "ServiceUnavailableError",
     "InvalidRequestError",
     "ModelNotFoundError",
     # Message types
@@ -206,10 +302,37 @@ __all__ = [
     "DeepSeekProvider",
     "MinimaxProvider",
     "ZAIProvider",
+    "ReplayProvider",
+    "RecordingProvider",
+    # Rate limiting
+    "RateLimitConfig",
+    "ProviderRateLimiter",
+    "RateLimitedProvider",
+    "ScheduledProvider",
+    "get_rate_limiter",
+    "get_rate_limiter_states",
+    # Transport
+    "TransportConfig",
+    "get_http_client",
+    "prewarm_http_clients",
+    "close_http_clients",
+    # Completion cache
+    "CompletionCache",
+    "CachedProvider",
+    "get_completion_cache",
+    "close_completion_cache",
+    # Routing
+    "RoutedProvider",
+    "RouteTarget",
+    "RouteStats",
+    "get_route_stats",
+    "get_routed_provider",
+    "parse_routes",
     # Factory functions
     "get_provider",
     "get_available_providers",
     "get_all_models",
     "register_provider",
     "close_all_providers",
+    "prewarm_providers",
 ]
@@ -27,14 +27,22 @@ from .base import (
     StreamEvent,
     StreamEventType,
     ToolDefinition,
+    tool_payloads,
     ToolUse,
     AuthenticationError,
     RateLimitError,
     InvalidRequestError,
+    ServiceUnavailableError,
+    get_retry_after,
 )
+from .json_stream import IncrementalJSONParser
+from .transport import get_http_client
 
 logger = logging.getLogger(__name__)
 
+# Marks the end of a prompt prefix that Anthropic should cache
+CACHE_CONTROL: Dict[str, str] = {"type": "ephemeral"}
+
 
 # Available Claude models with their capabilities
 CLAUDE_MODELS: List[ModelInfo] = [
@@ -44,6 +52,7 @@ CLAUDE_MODELS: List[ModelInfo] = [
         provider="anthropic",
         description="Best balance of intelligence and speed",
         max_tokens=8192,
+        context_window=200000,
         supports_tools=True,
         supports_vision=True,
         supports_streaming=True,
@@ -56,6 +65,7 @@ CLAUDE_MODELS: List[ModelInfo] = [
         provider="anthropic",
         description="Most capable model for complex tasks",
         max_tokens=8192,
+        context_window=200000,
         supports_tools=True,
         supports_vision=True,
         supports_streaming=True,
@@ -68,6 +78,7 @@ CLAUDE_MODELS: List[ModelInfo] = [
         provider="anthropic",
         description="Previous generation balanced model",
         max_tokens=8192,
+        context_window=200000,
         supports_tools=True,
         supports_vision=True,
         supports_streaming=True,
@@ -80,6 +91,7 @@ CLAUDE_MODELS: List[ModelInfo] = [
         provider="anthropic",
         description="Fast and efficient for simple tasks",
         max_tokens=8192,
+        context_window=200000,
         supports_tools=True,
         supports_vision=True,
         supports_streaming=True,
@@ -97,13 +109,15 @@ class AnthropicProvider(LLMProvider):
     """
 
     provider_name = "anthropic"
+    base_url = "https://api.anthropic.com"
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, *, prompt_caching: bool = True):
         """
         Initialize the Anthropic provider.
 
         Args:
             api_key: Anthropic API key
+            prompt_caching: Add cache_control breakpoints to requests
 
         Raises:
             ImportError: If the anthropic package is not installed
@@ -115,32 +129,87 @@ class AnthropicProvider(LLMProvider):
             )
 
         self.api_key = api_key
+        self.prompt_caching = prompt_caching
         self._client: Optional[AsyncAnthropic] = None
 
     @property
     def client(self) -> AsyncAnthropic:
-        """Get or create the async client."""
+        """Get or create the async client on the shared connection pool."""
         if self._client is None:
-            self._client = AsyncAnthropic(api_key=self.api_key)
+            self._client = AsyncAnthropic(
+                api_key=self.api_key,
+                http_client=get_http_client(
+                    self.base_url, client_class=anthropic.DefaultAsyncHttpxClient
+                ),
+            )
         return self._client
 
     async def close(self) -> None:
-        """Close the client connection."""
-        if self._client is not None:
-            await self._client.close()
-            self._client = None
+        """Release the client; the shared connection pool is closed separately."""
+        self._client = None
 
     def _convert_messages(self, messages: List[Message]) -> List[Dict[str, Any]]:
-        """Convert internal message format to Anthropic API format."""
-        return [msg.to_anthropic_format() for msg in messages]
+        """
+        Convert internal message format to Anthropic API format.
+
+        With prompt caching enabled, the last message gets a cache breakpoint.
+        The history only grows between tool-loop iterations, so everything up
+        to and including this message is the stable prefix of the next request.
+        """
+        api_messages = [msg.to_anthropic_format() for msg in messages]
+
+        if self.prompt_caching and api_messages:
+            last = api_messages[-1]
+            content = last["content"]
+            if isinstance(content, str):
+                blocks = [{"type": "text", "text": content}] if content else []
+            else:
+                blocks = list(content)
+
+            if blocks:
+                blocks[-1] = {**blocks[-1], "cache_control": CACHE_CONTROL}
+                api_messages[-1] = {**last, "content": blocks}
+
+        return api_messages
 
     def _convert_tools(
         self, tools: Optional[List[ToolDefinition]]
     ) -> Optional[List[Dict[str, Any]]]:
-        """Convert tool definitions to Anthropic API format."""
+        """
+        Convert tool definitions to Anthropic API format.
+
+        With prompt caching enabled, the last tool gets a cache breakpoint so
+        the whole tool list is cached as one prefix.
+        """
         if not tools:
             return None
-        return [tool.to_anthropic_format() for tool in tools]
+
+        api_tools = tool_payloads(tools, "anthropic")
+        if self.prompt_caching:
+            api_tools = api_tools[:-1] + [{**api_tools[-1], "cache_control": CACHE_CONTROL}]
+        return api_tools
+
+    def _convert_system(self, system_prompt: Optional[str]) -> Any:
+        """Convert the system prompt, adding a cache breakpoint if enabled."""
+        if not system_prompt or not self.prompt_caching:
+            return system_prompt
+        return [
+            {
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": CACHE_CONTROL,
+            }
+        ]
+
+    @staticmethod
+    def _convert_usage(usage: Any) -> Dict[str, int]:
+        """Convert an Anthropic usage object, including prompt cache counts."""
+        return {
+            "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+        }
 
     def _parse_response(self, response: Any) -> LLMResponse:
         """Parse Anthropic API response to internal format."""
@@ -164,10 +233,7 @@ class AnthropicProvider(LLMProvider):
 
         usage = None
         if hasattr(response, "usage") and response.usage:
-            usage = {
-                "input_tokens": response.usage.input_tokens,
-                "output_tokens": response.usage.output_tokens,
-            }
+            usage = self._convert_usage(response.usage)
 
         return LLMResponse(
             content=content_blocks,
@@ -192,6 +258,13 @@ class AnthropicProvider(LLMProvider):
             raise RateLimitError(
                 "Anthropic rate limit exceeded",
                 provider=self.provider_name,
+                retry_after=get_retry_after(error),
+            )
+        elif isinstance(error, (anthropic.InternalServerError, anthropic.APIConnectionError)):
+            raise ServiceUnavailableError(
+                f"Anthropic service unavailable: {error_msg}",
+                provider=self.provider_name,
+                retry_after=get_retry_after(error),
             )
         elif isinstance(error, anthropic.BadRequestError):
             raise InvalidRequestError(
@@ -224,7 +297,7 @@ class AnthropicProvider(LLMProvider):
             }
 
             if system_prompt:
-                kwargs["system"] = system_prompt
+                kwargs["system"] = self._convert_system(system_prompt)
 
             if api_tools:
                 kwargs["tools"] = api_tools
@@ -260,19 +333,25 @@ class AnthropicProvider(LLMProvider):
             }
 
             if system_prompt:
-                kwargs["system"] = system_prompt
+                kwargs["system"] = self._convert_system(system_prompt)
 
             if api_tools:
                 kwargs["tools"] = api_tools
 
-            # Track current tool use state for accumulating input
+            # Track current tool use state for parsing input incrementally
             current_tool_id: Optional[str] = None
             current_tool_name: Optional[str] = None
-            current_tool_input: str = ""
+            tool_input = IncrementalJSONParser()
+
+            # Input and cache counts arrive with message_start, output with message_delta
+            usage: Dict[str, int] = {}
 
             async with self.client.messages.stream(**kwargs) as stream:
                 async for event in stream:
                     if event.type == "message_start":
+                        message = getattr(event, "message", None)
+                        if message is not None and getattr(message, "usage", None):
+                            usage = self._convert_usage(message.usage)
                         yield StreamEvent(type=StreamEventType.MESSAGE_START)
 
                     elif event.type == "content_block_start":
@@ -281,7 +360,7 @@ class AnthropicProvider(LLMProvider):
                             if block.type == "tool_use":
                                 current_tool_id = block.id
                                 current_tool_name = block.name
-                                current_tool_input = ""
+                                tool_input = IncrementalJSONParser()
                                 yield StreamEvent(
                                     type=StreamEventType.TOOL_USE_START,
                                     tool_use_id=block.id,
@@ -297,18 +376,19 @@ class AnthropicProvider(LLMProvider):
                                     text=delta.text,
                                 )
                             elif delta.type == "input_json_delta":
-                                current_tool_input += delta.partial_json
+                                completed = tool_input.feed(delta.partial_json)
                                 yield StreamEvent(
                                     type=StreamEventType.TOOL_USE_DELTA,
                                     tool_use_id=current_tool_id,
                                     tool_input_delta=delta.partial_json,
+                                    partial_input=dict(tool_input.partial) if completed else None,
                                 )
 
                     elif event.type == "content_block_stop":
                         if current_tool_id and current_tool_name:
                             # Parse the accumulated tool input
                             try:
-                                tool_args = json.loads(current_tool_input) if current_tool_input else {}
+                                tool_args = tool_input.result()
                             except json.JSONDecodeError:
                                 tool_args = {}
 
@@ -322,28 +402,29 @@ class AnthropicProvider(LLMProvider):
                             )
                             current_tool_id = None
                             current_tool_name = None
-                            current_tool_input = ""
+                            tool_input = IncrementalJSONParser()
 
                     elif event.type == "message_delta":
-                        usage = None
+                        delta_usage = None
                         if hasattr(event, "usage") and event.usage:
-                            usage = {
+                            delta_usage = {
                                 "output_tokens": event.usage.output_tokens,
                             }
+                            usage["output_tokens"] = event.usage.output_tokens
                         yield StreamEvent(
                             type=StreamEventType.MESSAGE_DELTA,
-                            usage=usage,
+                            usage=delta_usage,
                         )
 
                     elif event.type == "message_stop":
-                        yield StreamEvent(type=StreamEventType.MESSAGE_END)
+                        yield StreamEvent(
+                            type=StreamEventType.MESSAGE_END,
+                            usage=usage or None,
+                        )
 
         except Exception as e:
             logger.error(f"Anthropic streaming error: {e}")
-            yield StreamEvent(
-                type=StreamEventType.ERROR,
-                error=str(e),
-            )
+            yield self._error_event(e)
 
     def get_available_models(self) -> List[ModelInfo]:
         """Get available Claude models."""
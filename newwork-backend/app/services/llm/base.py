@@ -5,8 +5,10 @@ This module defines the abstract interface that all LLM providers must implement
 along with common data structures for messages, tools, and responses.
 """
 
+import json
 from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
 from enum import Enum
 from typing import (
     Any,
@@ -14,6 +16,7 @@ from typing import (
     Dict,
     List,
     Optional,
+    Tuple,
     Union,
 )
 
@@ -42,30 +45,129 @@ class StreamEventType(str, Enum):
 
 @dataclass
 class ToolDefinition:
-    """Definition of a tool that can be used by the LLM."""
+    """
+    Definition of a tool that can be used by the LLM.
+
+    Provider payloads are memoized per format like Message payloads;
+    returned payloads are shared and must not be modified.
+    """
 
     name: str
     description: str
     input_schema: Dict[str, Any]
 
+    # Memoized provider payloads keyed by format name
+    _format_cache: Dict[str, Dict[str, Any]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    # Cached token count, see token_count()
+    _token_count: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if not name.startswith("_") and "_format_cache" in self.__dict__:
+            self._format_cache.clear()
+            self._token_count = None
+
     def to_anthropic_format(self) -> Dict[str, Any]:
         """Convert to Anthropic API format."""
-        return {
-            "name": self.name,
-            "description": self.description,
-            "input_schema": self.input_schema,
-        }
+        payload = self._format_cache.get("anthropic")
+        if payload is None:
+            payload = {
+                "name": self.name,
+                "description": self.description,
+                "input_schema": self.input_schema,
+            }
+            self._format_cache["anthropic"] = payload
+        return payload
 
     def to_openai_format(self) -> Dict[str, Any]:
         """Convert to OpenAI API format."""
-        return {
-            "type": "function",
-            "function": {
-                "name": self.name,
-                "description": self.description,
-                "parameters": self.input_schema,
-            },
-        }
+        payload = self._format_cache.get("openai")
+        if payload is None:
+            payload = {
+                "type": "function",
+                "function": {
+                    "name": self.name,
+                    "description": self.description,
+                    "parameters": self.input_schema,
+                },
+            }
+            self._format_cache["openai"] = payload
+        return payload
+
+    def to_format(self, provider_format: str) -> Dict[str, Any]:
+        """
+        Convert to the named provider format.
+
+        Args:
+            provider_format: "anthropic" or "openai"
+
+        Returns:
+            Provider payload
+
+        Raises:
+            ValueError: If the format is unknown
+        """
+        if provider_format == "anthropic":
+            return self.to_anthropic_format()
+        if provider_format == "openai":
+            return self.to_openai_format()
+        raise ValueError(f"Unknown provider format: {provider_format}")
+
+    def token_count(self, counter: Any) -> int:
+        """
+        Count the tokens of this tool's schema, memoized until it changes.
+
+        Args:
+            counter: Token counter with a count_text(text) method
+
+        Returns:
+            Token count of the Anthropic payload
+        """
+        if self._token_count is None:
+            self._token_count = counter.count_text(json.dumps(self.to_anthropic_format()))
+        return self._token_count
+
+
+TOOL_PAYLOAD_FORMATS = ("anthropic", "openai")
+
+# Payload lists of recently used tool sets, keyed by format and tool identity.
+# Entries hold the definitions so their ids cannot be reused while cached.
+_TOOL_PAYLOAD_CACHE_SIZE = 16
+_tool_payload_cache: "OrderedDict[Tuple[str, Tuple[int, ...]], Tuple[List[ToolDefinition], List[Dict[str, Any]]]]" = OrderedDict()
+
+
+def tool_payloads(tools: List[ToolDefinition], provider_format: str) -> List[Dict[str, Any]]:
+    """
+    Get the provider payloads for a list of tool definitions.
+
+    The registry hands out the same definition objects until the tool set
+    changes, so the payload list is built once per tool set and format.
+
+    Args:
+        tools: Tool definitions (shared; do not modify)
+        provider_format: "anthropic" or "openai"
+
+    Returns:
+        List of tool payloads (shared; do not modify)
+
+    Raises:
+        ValueError: If the format is unknown
+    """
+    if provider_format not in TOOL_PAYLOAD_FORMATS:
+        raise ValueError(f"Unknown provider format: {provider_format}")
+    key = (provider_format, tuple(id(tool) for tool in tools))
+    cached = _tool_payload_cache.get(key)
+    if cached is not None:
+        _tool_payload_cache.move_to_end(key)
+        return cached[1]
+
+    payloads = [tool.to_format(provider_format) for tool in tools]
+    _tool_payload_cache[key] = (list(tools), payloads)
+    if len(_tool_payload_cache) > _TOOL_PAYLOAD_CACHE_SIZE:
+        _tool_payload_cache.popitem(last=False)
+    return payloads
 
 
 @dataclass
@@ -100,13 +202,50 @@ class ContentBlock:
 
 @dataclass
 class Message:
-    """A message in the conversation."""
+    """
+    A message in the conversation.
+
+    Provider payloads are memoized per format, so a message that is sent on
+    every tool-loop iteration is only converted once. Assigning to a field
+    invalidates the memo; call invalidate_cache() after mutating content
+    blocks in place. Returned payloads are shared and must not be modified.
+    """
 
     role: MessageRole
     content: Union[str, List[ContentBlock]]
 
+    # Memoized provider payloads keyed by format name
+    _format_cache: Dict[str, Dict[str, Any]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if not name.startswith("_") and "_format_cache" in self.__dict__:
+            self._format_cache.clear()
+
+    def invalidate_cache(self) -> None:
+        """Drop memoized provider payloads."""
+        self._format_cache.clear()
+
     def to_anthropic_format(self) -> Dict[str, Any]:
         """Convert to Anthropic API format."""
+        payload = self._format_cache.get("anthropic")
+        if payload is None:
+            payload = self._build_anthropic_format()
+            self._format_cache["anthropic"] = payload
+        return payload
+
+    def to_openai_format(self) -> Dict[str, Any]:
+        """Convert to OpenAI API format."""
+        payload = self._format_cache.get("openai")
+        if payload is None:
+            payload = self._build_openai_format()
+            self._format_cache["openai"] = payload
+        return payload
+
+    def _build_anthropic_format(self) -> Dict[str, Any]:
+        """Build the Anthropic API payload."""
         if isinstance(self.content, str):
             return {
                 "role": self.role.value,
@@ -150,8 +289,8 @@ class Message:
             "content": content_blocks,
         }
 
-    def to_openai_format(self) -> Dict[str, Any]:
-        """Convert to OpenAI API format."""
+    def _build_openai_format(self) -> Dict[str, Any]:
+        """Build the OpenAI API payload."""
         if isinstance(self.content, str):
             return {
                 "role": self.role.value,
@@ -203,9 +342,47 @@ class StreamEvent:
     tool_use_id: Optional[str] = None
     tool_name: Optional[str] = None
     tool_input_delta: Optional[str] = None
+    # Top-level arguments parsed so far; set on TOOL_USE_DELTA when a field completes
+    partial_input: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    error_code: Optional[str] = None  # LLMError code, e.g. "rate_limit"
+    retry_after: Optional[float] = None  # Seconds suggested by the provider
     usage: Optional[Dict[str, int]] = None
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dictionary, omitting unset fields."""
+        data: Dict[str, Any] = {"type": self.type.value}
+        for name in (
+            "text",
+            "tool_use_id",
+            "tool_name",
+            "tool_input_delta",
+            "partial_input",
+            "error",
+            "error_code",
+            "retry_after",
+            "usage",
+        ):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        if self.tool_use is not None:
+            data["tool_use"] = {
+                "id": self.tool_use.id,
+                "name": self.tool_use.name,
+                "arguments": self.tool_use.arguments,
+            }
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamEvent":
+        """Create from a dictionary produced by to_dict."""
+        fields = dict(data)
+        fields["type"] = StreamEventType(fields["type"])
+        if fields.get("tool_use") is not None:
+            fields["tool_use"] = ToolUse(**fields["tool_use"])
+        return cls(**fields)
+
 
 @dataclass
 class LLMResponse:
@@ -216,6 +393,33 @@ class LLMResponse:
     usage: Optional[Dict[str, int]] = None
     model: Optional[str] = None
 
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dictionary."""
+        return {
+            "content": [asdict(block) for block in self.content],
+            "stop_reason": self.stop_reason,
+            "usage": self.usage,
+            "model": self.model,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LLMResponse":
+        """Create from a dictionary produced by to_dict."""
+        content = []
+        for block in data.get("content", []):
+            block = dict(block)
+            if block.get("tool_use") is not None:
+                block["tool_use"] = ToolUse(**block["tool_use"])
+            if block.get("tool_result") is not None:
+                block["tool_result"] = ToolResult(**block["tool_result"])
+            content.append(ContentBlock(**block))
+        return cls(
+            content=content,
+            stop_reason=data.get("stop_reason"),
+            usage=data.get("usage"),
+            model=data.get("model"),
+        )
+
     @property
     def text(self) -> str:
         """Get the text content of the response."""
@@ -249,6 +453,7 @@ class ModelInfo:
     provider: str
     description: Optional[str] = None
     max_tokens: int = 4096
+    context_window: int = 128000
     supports_tools: bool = True
     supports_vision: bool = False
     supports_streaming: bool = True
@@ -355,6 +560,54 @@ class LLMProvider(ABC):
         """
         pass
 
+    def get_model_info(self, model: str) -> Optional[ModelInfo]:
+        """
+        Look up catalog information for a model.
+
+        Args:
+            model: Model identifier
+
+        Returns:
+            ModelInfo if the model is in this provider's catalog, None otherwise
+        """
+        for m in self.get_available_models():
+            if m.id == model:
+                return m
+        return None
+
+    def _handle_error(self, error: Exception) -> None:
+        """
+        Convert a provider SDK error to an LLMError and raise it.
+
+        Override this method to map provider-specific error types.
+        """
+        if isinstance(error, LLMError):
+            raise error
+        raise LLMError(str(error), provider=self.provider_name)
+
+    def _error_event(self, error: Exception) -> StreamEvent:
+        """
+        Build an ERROR stream event for an exception raised while streaming.
+
+        Args:
+            error: The exception raised by the provider SDK
+
+        Returns:
+            StreamEvent carrying the error message, code and retry hint
+        """
+        try:
+            self._handle_error(error)
+            llm_error = LLMError(str(error), provider=self.provider_name)
+        except LLMError as e:
+            llm_error = e
+
+        return StreamEvent(
+            type=StreamEventType.ERROR,
+            error=str(error),
+            error_code=llm_error.code,
+            retry_after=llm_error.retry_after,
+        )
+
     async def close(self) -> None:
         """
         Close any resources held by the provider.
@@ -364,30 +617,84 @@ class LLMProvider(ABC):
         pass
 
 
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Extract a retry-after hint in seconds from an SDK error.
+
+    Args:
+        error: Exception raised by an HTTP-based SDK
+
+    Returns:
+        Seconds to wait, or None if the response carries no usable hint
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    for header in ("retry-after-ms", "retry-after"):
+        value = headers.get(header)
+        if value is None:
+            continue
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            continue
+        return seconds / 1000 if header == "retry-after-ms" else seconds
+
+    return None
+
+
 class LLMError(Exception):
     """Base exception for LLM-related errors."""
 
-    def __init__(self, message: str, provider: str = "unknown", code: Optional[str] = None):
+    default_code: Optional[str] = None
+
+    def __init__(
+        self,
+        message: str,
+        provider: str = "unknown",
+        code: Optional[str] = None,
+        retry_after: Optional[float] = None,
+    ):
         super().__init__(message)
         self.provider = provider
-        self.code = code
+        self.code = code or self.default_code
+        self.retry_after = retry_after
 
 
 class AuthenticationError(LLMError):
     """Raised when authentication fails."""
-    pass
+
+    default_code = "authentication"
 
 
 class RateLimitError(LLMError):
     """Raised when rate limit is exceeded."""
-    pass
+
+    default_code = "rate_limit"
+
+
+class ServiceUnavailableError(LLMError):
+    """Raised when the provider is overloaded or temporarily unreachable."""
+
+    default_code = "unavailable"
 
 
 class InvalidRequestError(LLMError):
     """Raised when the request is invalid."""
-    pass
+
+    default_code = "invalid_request"
 
 
 class ModelNotFoundError(LLMError):
     """Raised when the requested model is not found."""
-    pass
+
+    default_code = "model_not_found"
+
+
+# Error codes worth retrying after a backoff
+RETRYABLE_ERROR_CODES = frozenset({
+    RateLimitError.default_code,
+    ServiceUnavailableError.default_code,
+})
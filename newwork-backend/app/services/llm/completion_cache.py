@@ -0,0 +1,418 @@
+"""
+Deterministic completion cache.
+
+This module caches completions of deterministic (low temperature) requests
+in a SQLite file, so byte-identical requests from template runs, re-executed
+prompts and CI are answered without calling the provider. Streams are stored
+as StreamEvent sequences and replayed unchanged.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from .base import (
+    LLMProvider,
+    LLMResponse,
+    Message,
+    ModelInfo,
+    StreamEvent,
+    StreamEventType,
+    ToolDefinition,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached payload format changes
+CACHE_FORMAT_VERSION = 1
+
+
+def make_cache_key(
+    kind: str,
+    provider_name: str,
+    model: str,
+    messages: List[Message],
+    *,
+    tools: Optional[List[ToolDefinition]],
+    max_tokens: int,
+    temperature: float,
+    system_prompt: Optional[str],
+) -> str:
+    """
+    Build a stable hash of a request.
+
+    Messages and tools are hashed in their (memoized) Anthropic wire format,
+    which is a lossless canonical form for every provider.
+
+    Args:
+        kind: "complete" or "stream"
+        provider_name: Provider identifier
+        model: Model identifier
+        messages: Request messages
+        tools: Tool definitions
+        max_tokens: Maximum output tokens
+        temperature: Sampling temperature
+        system_prompt: System prompt
+
+    Returns:
+        Hex digest identifying the request
+    """
+    request = {
+        "version": CACHE_FORMAT_VERSION,
+        "kind": kind,
+        "provider": provider_name,
+        "model": model,
+        "messages": [msg.to_anthropic_format() for msg in messages],
+        "tools": [tool.to_anthropic_format() for tool in tools or []],
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "system_prompt": system_prompt,
+    }
+    encoded = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class CompletionCache:
+    """
+    SQLite-backed cache with LRU eviction by total size and a TTL.
+
+    The synchronous methods do blocking file I/O; async callers use aget and
+    aput, which run them in a worker thread. Hits only record their access
+    time in memory, and the pending times are written in one batch before
+    eviction runs, so lookups do not commit.
+    """
+
+    def __init__(self, path: Path, *, max_bytes: int, ttl_seconds: float):
+        """
+        Initialize the cache.
+
+        Args:
+            path: SQLite database file
+            max_bytes: Maximum total size of cached payloads
+            ttl_seconds: Age after which entries expire
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._accessed: Dict[str, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Open the database on first use."""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, "
+                "payload TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_completions_accessed_at "
+                "ON completions (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up an entry, refreshing its LRU position.
+
+        Args:
+            key: Request hash
+
+        Returns:
+            Cached value, or None if missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT payload, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self.conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self.conn.commit()
+                self._accessed.pop(key, None)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            self.hits += 1
+        return json.loads(row[0])
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Look up an entry without blocking the event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    def _flush_accessed(self) -> None:
+        """Write pending access times. Caller holds the lock."""
+        if self._accessed:
+            self.conn.executemany(
+                "UPDATE completions SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()],
+            )
+            self._accessed.clear()
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Store an entry and evict expired and least recently used entries.
+
+        Args:
+            key: Request hash
+            value: JSON-serializable value
+        """
+        payload = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+        size = len(payload.encode())
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            self._flush_accessed()
+            conn.execute(
+                "INSERT OR REPLACE INTO completions "
+                "(key, payload, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now),
+            )
+            self.evictions += conn.execute(
+                "DELETE FROM completions WHERE created_at < ?", (now - self.ttl_seconds,)
+            ).rowcount
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            if total > self.max_bytes:
+                evict = []
+                for old_key, old_size in conn.execute(
+                    "SELECT key, size FROM completions ORDER BY accessed_at"
+                ):
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((old_key,))
+                    total -= old_size
+                conn.executemany("DELETE FROM completions WHERE key = ?", evict)
+                self.evictions += len(evict)
+
+            conn.commit()
+            self.stores += 1
+
+    async def aput(self, key: str, value: Any) -> None:
+        """Store an entry without blocking the event loop."""
+        await asyncio.to_thread(self.put, key, value)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self.conn.execute("DELETE FROM completions")
+            self.conn.commit()
+            self._accessed.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dictionary with entry count, size and hit/miss counters
+        """
+        with self._lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._flush_accessed()
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+
+class CachedProvider(LLMProvider):
+    """
+    LLMProvider wrapper that answers repeated deterministic requests from cache.
+
+    Only requests with a temperature at or below max_temperature are cached.
+    Streams are stored when they complete without error and are replayed
+    without usage, since replays are not billed.
+    """
+
+    def __init__(
+        self,
+        provider: LLMProvider,
+        cache: CompletionCache,
+        *,
+        max_temperature: float = 0.0,
+    ):
+        """
+        Initialize the wrapper.
+
+        Args:
+            provider: Provider to wrap
+            cache: Completion cache
+            max_temperature: Highest temperature considered deterministic
+        """
+        self.provider = provider
+        self.cache = cache
+        self.max_temperature = max_temperature
+        self.provider_name = provider.provider_name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+
+    def _key(self, kind: str, messages: List[Message], model: str, **kwargs: Any) -> Optional[str]:
+        if kwargs["temperature"] > self.max_temperature:
+            return None
+        return make_cache_key(kind, self.provider_name, model, messages, **kwargs)
+
+    async def complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> LLMResponse:
+        """Generate a completion, using the cache for deterministic requests."""
+        kwargs = {
+            "tools": tools,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "system_prompt": system_prompt,
+        }
+        key = self._key("complete", messages, model, **kwargs)
+        if key is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                response = LLMResponse.from_dict(cached)
+                response.usage = None
+                return response
+
+        response = await self.provider.complete(messages, model, **kwargs)
+        if key is not None:
+            await self.cache.aput(key, response.to_dict())
+        return response
+
+    async def stream_complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Stream a completion, replaying cached streams for deterministic requests."""
+        kwargs = {
+            "tools": tools,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "system_prompt": system_prompt,
+        }
+        key = self._key("stream", messages, model, **kwargs)
+        if key is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                for data in cached:
+                    event = StreamEvent.from_dict(data)
+                    event.usage = None
+                    yield event
+                return
+
+        recorded: List[Dict[str, Any]] = []
+        completed = False
+        async for event in self.provider.stream_complete(messages, model, **kwargs):
+            if key is not None:
+                if event.type == StreamEventType.ERROR:
+                    key = None
+                else:
+                    recorded.append(event.to_dict())
+                    completed = event.type == StreamEventType.MESSAGE_END
+            yield event
+
+        if key is not None and completed:
+            await self.cache.aput(key, recorded)
+
+    def get_available_models(self) -> List[ModelInfo]:
+        """Get available models of the wrapped provider."""
+        return self.provider.get_available_models()
+
+    def get_model_info(self, model: str) -> Optional[ModelInfo]:
+        """Look up catalog information in the wrapped provider."""
+        return self.provider.get_model_info(model)
+
+    def supports_tools(self, model: str) -> bool:
+        """Check tool support in the wrapped provider."""
+        return self.provider.supports_tools(model)
+
+    def supports_vision(self, model: str) -> bool:
+        """Check vision support in the wrapped provider."""
+        return self.provider.supports_vision(model)
+
+    async def close(self) -> None:
+        """Close the wrapped provider."""
+        await self.provider.close()
+
+
+# Global completion cache, created on first use
+_completion_cache: Optional[CompletionCache] = None
+
+
+def get_completion_cache() -> CompletionCache:
+    """
+    Get the shared completion cache configured from settings.
+
+    Returns:
+        CompletionCache instance
+    """
+    global _completion_cache
+    if _completion_cache is None:
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        _completion_cache = CompletionCache(
+            settings.data_dir / "completion_cache.db",
+            max_bytes=settings.LLM_COMPLETION_CACHE_MAX_BYTES,
+            ttl_seconds=settings.LLM_COMPLETION_CACHE_TTL,
+        )
+    return _completion_cache
+
+
+def close_completion_cache() -> None:
+    """Close the shared completion cache if it was opened."""
+    global _completion_cache
+    if _completion_cache is not None:
+        _completion_cache.close()
+        _completion_cache = None
@@ -28,6 +28,7 @@ DEEPSEEK_MODELS: List[ModelInfo] = [
         provider="deepseek",
         description="DeepSeek's conversational AI model",
         max_tokens=4096,
+        context_window=64000,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
@@ -40,6 +41,7 @@ DEEPSEEK_MODELS: List[ModelInfo] = [
         provider="deepseek",
         description="Specialized model for coding tasks",
         max_tokens=4096,
+        context_window=64000,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
@@ -52,6 +54,7 @@ DEEPSEEK_MODELS: List[ModelInfo] = [
         provider="deepseek",
         description="Model with enhanced reasoning capabilities",
         max_tokens=8192,
+        context_window=64000,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
@@ -0,0 +1,234 @@
+"""
+Incremental JSON parsing for streamed tool-call arguments.
+
+Providers stream tool arguments as fragments of one JSON object. This module
+scans the fragments as they arrive, keeping them in a list instead of
+re-concatenating a growing string, and parses each top-level field as soon
+as its value is complete.
+"""
+
+import json
+import re
+from typing import Any, Dict, List
+
+# Characters that end a run of plain string content
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+# Characters that end a scalar (number, true, false, null)
+_SCALAR_END = re.compile(r"[,}\s]")
+
+# Scanner states
+_START = 0
+_EXPECT_KEY = 1
+_IN_KEY = 2
+_EXPECT_COLON = 3
+_EXPECT_VALUE = 4
+_IN_STRING_VALUE = 5
+_IN_CONTAINER_VALUE = 6
+_IN_SCALAR_VALUE = 7
+_DONE = 8
+_NOT_OBJECT = 9
+
+
+class IncrementalJSONParser:
+    """
+    Streaming parser for a JSON object sent in fragments.
+
+    feed() returns the top-level keys whose values completed within the
+    fragment; their parsed values are available in `partial`. result()
+    parses the full document once at the end.
+
+    Example:
+        parser = IncrementalJSONParser()
+        parser.feed('{"file_path": "a.py", "con')   # -> ["file_path"]
+        parser.partial                               # -> {"file_path": "a.py"}
+        parser.feed('tent": "x"}')                   # -> ["content"]
+    """
+
+    def __init__(self) -> None:
+        """Initialize an empty parser."""
+        self.partial: Dict[str, Any] = {}
+        self._chunks: List[str] = []
+        self._state = _START
+        self._key_parts: List[str] = []
+        self._value_parts: List[str] = []
+        self._key = ""
+        self._escape = False
+        self._in_string = False  # Inside a string nested in a container value
+        self._depth = 0
+
+    @property
+    def is_object(self) -> bool:
+        """False once the input is known not to be a JSON object."""
+        return self._state != _NOT_OBJECT
+
+    @property
+    def text(self) -> str:
+        """All input received so far."""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def _finish_value(self, completed: List[str]) -> None:
+        raw = "".join(self._value_parts)
+        self._value_parts = []
+        try:
+            self.partial[self._key] = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        completed.append(self._key)
+
+    def _scan_string(self, chunk: str, i: int, parts: List[str]) -> int:
+        """
+        Consume string content up to and including the closing quote.
+
+        Returns the index after the closing quote, or -1 if the chunk ended
+        inside the string.
+        """
+        n = len(chunk)
+        while i < n:
+            if self._escape:
+                self._escape = False
+                parts.append(chunk[i])
+                i += 1
+                continue
+            match = _STRING_SPECIAL.search(chunk, i)
+            if match is None:
+                parts.append(chunk[i:])
+                return -1
+            j = match.start()
+            parts.append(chunk[i:j + 1])
+            if chunk[j] == "\\":
+                self._escape = True
+                i = j + 1
+                continue
+            return j + 1
+        return -1
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Consume the next fragment.
+
+        Args:
+            chunk: Next piece of the JSON text
+
+        Returns:
+            Top-level keys whose values completed in this fragment
+        """
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+
+        completed: List[str] = []
+        i = 0
+        n = len(chunk)
+        while i < n and self._state not in (_DONE, _NOT_OBJECT):
+            c = chunk[i]
+            state = self._state
+
+            if state == _START:
+                if c == "{":
+                    self._state = _EXPECT_KEY
+                elif not c.isspace():
+                    self._state = _NOT_OBJECT
+                i += 1
+
+            elif state == _EXPECT_KEY:
+                if c == '"':
+                    self._key_parts = ['"']
+                    self._state = _IN_KEY
+                elif c == "}":
+                    self._state = _DONE
+                i += 1
+
+            elif state == _IN_KEY:
+                end = self._scan_string(chunk, i, self._key_parts)
+                if end < 0:
+                    break
+                self._key = json.loads("".join(self._key_parts))
+                self._key_parts = []
+                self._state = _EXPECT_COLON
+                i = end
+
+            elif state == _EXPECT_COLON:
+                if c == ":":
+                    self._state = _EXPECT_VALUE
+                i += 1
+
+            elif state == _EXPECT_VALUE:
+                if c.isspace():
+                    i += 1
+                elif c == '"':
+                    self._value_parts = ['"']
+                    self._state = _IN_STRING_VALUE
+                    i += 1
+                elif c in "{[":
+                    self._value_parts = [c]
+                    self._depth = 1
+                    self._in_string = False
+                    self._state = _IN_CONTAINER_VALUE
+                    i += 1
+                else:
+                    self._value_parts = []
+                    self._state = _IN_SCALAR_VALUE
+
+            elif state == _IN_STRING_VALUE:
+                end = self._scan_string(chunk, i, self._value_parts)
+                if end < 0:
+                    break
+                self._finish_value(completed)
+                self._state = _EXPECT_KEY
+                i = end
+
+            elif state == _IN_CONTAINER_VALUE:
+                if self._in_string:
+                    end = self._scan_string(chunk, i, self._value_parts)
+                    if end < 0:
+                        break
+                    self._in_string = False
+                    i = end
+                    continue
+                start = i
+                while i < n:
+                    c = chunk[i]
+                    i += 1
+                    if c == '"':
+                        self._in_string = True
+                        break
+                    if c in "{[":
+                        self._depth += 1
+                    elif c in "}]":
+                        self._depth -= 1
+                        if self._depth == 0:
+                            break
+                self._value_parts.append(chunk[start:i])
+                if self._depth == 0:
+                    self._finish_value(completed)
+                    self._state = _EXPECT_KEY
+
+            elif state == _IN_SCALAR_VALUE:
+                match = _SCALAR_END.search(chunk, i)
+                if match is None:
+                    self._value_parts.append(chunk[i:])
+                    break
+                self._value_parts.append(chunk[i:match.start()])
+                self._finish_value(completed)
+                self._state = _DONE if chunk[match.start()] == "}" else _EXPECT_KEY
+                i = match.start() + 1
+
+        return completed
+
+    def result(self) -> Any:
+        """
+        Parse the complete input.
+
+        Returns:
+            The parsed JSON value, or an empty dict for empty input
+
+        Raises:
+            json.JSONDecodeError: If the input is not valid JSON
+        """
+        text = self.text
+        if not text.strip():
+            return {}
+        return json.loads(text)
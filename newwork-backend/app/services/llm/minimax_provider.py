@@ -22,6 +22,7 @@ MINIMAX_MODELS: List[ModelInfo] = [
         provider="minimax",
         description="Minimax's conversational AI model",
         max_tokens=8192,
+        context_window=245760,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
@@ -34,6 +35,7 @@ MINIMAX_MODELS: List[ModelInfo] = [
         provider="minimax",
         description="Minimax's turbo chat model",
         max_tokens=8192,
+        context_window=8192,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
@@ -46,6 +48,7 @@ MINIMAX_MODELS: List[ModelInfo] = [
         provider="minimax",
         description="Previous generation Minimax model",
         max_tokens=4096,
+        context_window=16384,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
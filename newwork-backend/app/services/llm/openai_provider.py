@@ -9,10 +9,12 @@ import logging
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
 try:
+    import openai
     from openai import AsyncOpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
     OPENAI_AVAILABLE = False
+    openai = None
     AsyncOpenAI = None
 
 from .base import (
@@ -25,11 +27,16 @@ from .base import (
     StreamEvent,
     StreamEventType,
     ToolDefinition,
+    tool_payloads,
     ToolUse,
     AuthenticationError,
     RateLimitError,
     InvalidRequestError,
+    ServiceUnavailableError,
+    get_retry_after,
 )
+from .json_stream import IncrementalJSONParser
+from .transport import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +49,7 @@ GPT_MODELS: List[ModelInfo] = [
         provider="openai",
         description="Most capable GPT-4 model with vision",
         max_tokens=4096,
+        context_window=128000,
         supports_tools=True,
         supports_vision=True,
         supports_streaming=True,
@@ -54,6 +62,7 @@ GPT_MODELS: List[ModelInfo] = [
         provider="openai",
         description="Smaller, faster, and cheaper GPT-4o",
         max_tokens=4096,
+        context_window=128000,
         supports_tools=True,
         supports_vision=True,
         supports_streaming=True,
@@ -66,6 +75,7 @@ GPT_MODELS: List[ModelInfo] = [
         provider="openai",
         description="GPT-4 with improved performance",
         max_tokens=4096,
+        context_window=128000,
         supports_tools=True,
         supports_vision=True,
         supports_streaming=True,
@@ -78,6 +88,7 @@ GPT_MODELS: List[ModelInfo] = [
         provider="openai",
         description="Fast and efficient for simpler tasks",
         max_tokens=4096,
+        context_window=16385,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
@@ -95,6 +106,7 @@ class OpenAIProvider(LLMProvider):
     """
 
     provider_name = "openai"
+    OPENAI_BASE_URL = "https://api.openai.com/v1"
 
     def __init__(self, api_key: str, base_url: Optional[str] = None):
         """
@@ -114,24 +126,25 @@ class OpenAIProvider(LLMProvider):
             )
 
         self.api_key = api_key
-        self.base_url = base_url
+        self.base_url = base_url or self.OPENAI_BASE_URL
         self._client: Optional[AsyncOpenAI] = None
 
     @property
     def client(self) -> AsyncOpenAI:
-        """Get or create the async client."""
+        """Get or create the async client on the shared connection pool."""
         if self._client is None:
-            kwargs = {"api_key": self.api_key}
-            if self.base_url:
-                kwargs["base_url"] = self.base_url
-            self._client = AsyncOpenAI(**kwargs)
+            self._client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                http_client=get_http_client(
+                    self.base_url, client_class=openai.DefaultAsyncHttpxClient
+                ),
+            )
         return self._client
 
     async def close(self) -> None:
-        """Close the client connection."""
-        if self._client is not None:
-            await self._client.close()
-            self._client = None
+        """Release the client; the shared connection pool is closed separately."""
+        self._client = None
 
     def _convert_messages(self, messages: List[Message]) -> List[Dict[str, Any]]:
         """Convert internal message format to OpenAI API format."""
@@ -143,7 +156,7 @@ class OpenAIProvider(LLMProvider):
         """Convert tool definitions to OpenAI API format."""
         if not tools:
             return None
-        return [tool.to_openai_format() for tool in tools]
+        return tool_payloads(tools, "openai")
 
     def _parse_response(self, response: Any) -> LLMResponse:
         """Parse OpenAI API response to internal format."""
@@ -197,6 +210,8 @@ class OpenAIProvider(LLMProvider):
         from openai import AuthenticationError as OAIAuthError
         from openai import RateLimitError as OAIRateLimitError
         from openai import BadRequestError as OAIBadRequestError
+        from openai import APIConnectionError as OAIConnectionError
+        from openai import InternalServerError as OAIServerError
 
         error_msg = str(error)
 
@@ -209,6 +224,13 @@ class OpenAIProvider(LLMProvider):
             raise RateLimitError(
                 "OpenAI rate limit exceeded",
                 provider=self.provider_name,
+                retry_after=get_retry_after(error),
+            )
+        elif isinstance(error, (OAIServerError, OAIConnectionError)):
+            raise ServiceUnavailableError(
+                f"OpenAI service unavailable: {error_msg}",
+                provider=self.provider_name,
+                retry_after=get_retry_after(error),
             )
         elif isinstance(error, OAIBadRequestError):
             raise InvalidRequestError(
@@ -296,73 +318,76 @@ class OpenAIProvider(LLMProvider):
 
             yield StreamEvent(type=StreamEventType.MESSAGE_START)
 
-            async for chunk in await self.client.chat.completions.create(**kwargs):
-                if not chunk.choices:
-                    continue
-
-                delta = chunk.choices[0].delta
-
-                # Handle text content
-                if delta.content:
-                    yield StreamEvent(
-                        type=StreamEventType.TEXT_DELTA,
-                        text=delta.content,
-                    )
-
-                # Handle tool calls
-                if delta.tool_calls:
-                    for tool_call in delta.tool_calls:
-                        idx = tool_call.index
-
-                        if idx not in current_tool_calls:
-                            # New tool call
-                            current_tool_calls[idx] = {
-                                "id": tool_call.id or "",
-                                "name": tool_call.function.name if tool_call.function else "",
-                                "arguments": "",
-                            }
-                            if tool_call.function and tool_call.function.name:
+            stream = await self.client.chat.completions.create(**kwargs)
+
+            # Closing the stream releases the connection if the consumer stops early
+            async with stream:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+
+                    delta = chunk.choices[0].delta
+
+                    # Handle text content
+                    if delta.content:
+                        yield StreamEvent(
+                            type=StreamEventType.TEXT_DELTA,
+                            text=delta.content,
+                        )
+
+                    # Handle tool calls
+                    if delta.tool_calls:
+                        for tool_call in delta.tool_calls:
+                            idx = tool_call.index
+
+                            if idx not in current_tool_calls:
+                                # New tool call
+                                current_tool_calls[idx] = {
+                                    "id": tool_call.id or "",
+                                    "name": tool_call.function.name if tool_call.function else "",
+                                    "arguments": IncrementalJSONParser(),
+                                }
+                                if tool_call.function and tool_call.function.name:
+                                    yield StreamEvent(
+                                        type=StreamEventType.TOOL_USE_START,
+                                        tool_use_id=current_tool_calls[idx]["id"],
+                                        tool_name=current_tool_calls[idx]["name"],
+                                    )
+
+                            # Parse arguments as they arrive
+                            if tool_call.function and tool_call.function.arguments:
+                                parser = current_tool_calls[idx]["arguments"]
+                                completed = parser.feed(tool_call.function.arguments)
                                 yield StreamEvent(
-                                    type=StreamEventType.TOOL_USE_START,
+                                    type=StreamEventType.TOOL_USE_DELTA,
                                     tool_use_id=current_tool_calls[idx]["id"],
-                                    tool_name=current_tool_calls[idx]["name"],
+                                    tool_input_delta=tool_call.function.arguments,
+                                    partial_input=dict(parser.partial) if completed else None,
                                 )
 
-                        # Accumulate arguments
-                        if tool_call.function and tool_call.function.arguments:
-                            current_tool_calls[idx]["arguments"] += tool_call.function.arguments
+                    # Handle finish
+                    if chunk.choices[0].finish_reason:
+                        # Complete any pending tool calls
+                        for tc in current_tool_calls.values():
+                            try:
+                                args = tc["arguments"].result()
+                            except json.JSONDecodeError:
+                                args = {}
+
                             yield StreamEvent(
-                                type=StreamEventType.TOOL_USE_DELTA,
-                                tool_use_id=current_tool_calls[idx]["id"],
-                                tool_input_delta=tool_call.function.arguments,
+                                type=StreamEventType.TOOL_USE_END,
+                                tool_use=ToolUse(
+                                    id=tc["id"],
+                                    name=tc["name"],
+                                    arguments=args,
+                                ),
                             )
 
-                # Handle finish
-                if chunk.choices[0].finish_reason:
-                    # Complete any pending tool calls
-                    for tc in current_tool_calls.values():
-                        try:
-                            args = json.loads(tc["arguments"]) if tc["arguments"] else {}
-                        except json.JSONDecodeError:
-                            args = {}
-
-                        yield StreamEvent(
-                            type=StreamEventType.TOOL_USE_END,
-                            tool_use=ToolUse(
-                                id=tc["id"],
-                                name=tc["name"],
-                                arguments=args,
-                            ),
-                        )
-
-                    yield StreamEvent(type=StreamEventType.MESSAGE_END)
+                        yield StreamEvent(type=StreamEventType.MESSAGE_END)
 
         except Exception as e:
             logger.error(f"OpenAI streaming error: {e}")
-            yield StreamEvent(
-                type=StreamEventType.ERROR,
-                error=str(e),
-            )
+            yield self._error_event(e)
 
     def get_available_models(self) -> List[ModelInfo]:
         """Get available GPT models."""
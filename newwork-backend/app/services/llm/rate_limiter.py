@@ -0,0 +1,546 @@
+"""
+Provider rate limiting and retries.
+
+This module provides per-provider token-bucket rate limiting (requests and
+tokens per minute), bounded in-flight concurrency per API key, and jittered
+exponential backoff that honors retry-after hints from the provider.
+"""
+
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    TypeVar,
+)
+
+from .base import (
+    RETRYABLE_ERROR_CODES,
+    LLMError,
+    LLMProvider,
+    LLMResponse,
+    Message,
+    ModelInfo,
+    StreamEvent,
+    StreamEventType,
+    ToolDefinition,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Lower bound for the adaptive rate scale after repeated 429s
+MIN_RATE_SCALE = 0.1
+
+
+@dataclass
+class RateLimitConfig:
+    """Limits and retry policy for one provider API key."""
+
+    requests_per_minute: float = 500
+    tokens_per_minute: float = 1_000_000
+    max_concurrency: int = 8
+    max_retries: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    @classmethod
+    def from_settings(cls) -> "RateLimitConfig":
+        """Build the configuration from application settings."""
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        return cls(
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            max_retries=settings.LLM_MAX_RETRIES,
+            base_delay=settings.LLM_RETRY_BASE_DELAY,
+            max_delay=settings.LLM_RETRY_MAX_DELAY,
+        )
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously up to its capacity.
+
+    Requests larger than the capacity are admitted once the bucket is full
+    and drive the level negative, so they cannot block forever.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        """
+        Initialize the bucket.
+
+        Args:
+            capacity: Maximum number of tokens held
+            refill_per_second: Tokens added per second at full rate
+        """
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, scale: float) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._level = min(self.capacity, self._level + elapsed * self.refill_per_second * scale)
+
+    @property
+    def level(self) -> float:
+        """Tokens currently available (may be negative)."""
+        return self._level
+
+    def try_acquire(self, amount: float, scale: float = 1.0) -> float:
+        """
+        Take tokens from the bucket if enough are available.
+
+        Args:
+            amount: Tokens to take
+            scale: Multiplier applied to the refill rate
+
+        Returns:
+            0 if the tokens were taken, otherwise seconds until they will be
+        """
+        self._refill(scale)
+        needed = min(amount, self.capacity)
+        if self._level >= needed:
+            self._level -= amount
+            return 0.0
+        return (needed - self._level) / (self.refill_per_second * scale)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) tokens after the fact."""
+        self._level = min(self.capacity, self._level - amount)
+
+
+def estimate_request_tokens(messages: List[Message], max_tokens: int) -> int:
+    """
+    Roughly estimate the tokens a request will consume.
+
+    Uses about four characters per token for the input and assumes the full
+    output allowance; the estimate is corrected once actual usage is known.
+
+    Args:
+        messages: Messages sent with the request
+        max_tokens: Maximum output tokens requested
+
+    Returns:
+        Estimated total tokens
+    """
+    chars = 0
+    for msg in messages:
+        if isinstance(msg.content, str):
+            chars += len(msg.content)
+            continue
+        for block in msg.content:
+            if block.text:
+                chars += len(block.text)
+            if block.tool_use:
+                chars += len(str(block.tool_use.arguments))
+            if block.tool_result:
+                chars += len(block.tool_result.content)
+    return chars // 4 + max_tokens
+
+
+def _usage_total(usage: Optional[Dict[str, int]]) -> Optional[int]:
+    """Total billed tokens from a usage dict, or None if unknown."""
+    if not usage or "input_tokens" not in usage:
+        return None
+    return (
+        usage.get("input_tokens", 0)
+        + usage.get("output_tokens", 0)
+        + usage.get("cache_creation_input_tokens", 0)
+    )
+
+
+class ProviderRateLimiter:
+    """
+    Rate limiter and retry engine for one provider API key.
+
+    Adapts to rate limiting: each 429 halves the effective refill rate and
+    pauses new requests until the retry-after hint expires; each success
+    slowly restores the configured rate.
+    """
+
+    def __init__(self, provider_name: str, key_id: str, config: RateLimitConfig):
+        """
+        Initialize the limiter.
+
+        Args:
+            provider_name: Provider identifier
+            key_id: Non-reversible identifier of the API key
+            config: Limits and retry policy
+        """
+        self.provider_name = provider_name
+        self.key_id = key_id
+        self.config = config
+        self.request_bucket = TokenBucket(
+            config.requests_per_minute, config.requests_per_minute / 60
+        )
+        self.token_bucket = TokenBucket(
+            config.tokens_per_minute, config.tokens_per_minute / 60
+        )
+        self.rate_scale = 1.0
+        self._cooldown_until = 0.0
+        self._in_flight = 0
+        self._slot_waiters: Deque[asyncio.Future] = deque()
+
+        # Counters
+        self.total_requests = 0
+        self.total_retries = 0
+        self.total_rate_limited = 0
+        self.total_wait_seconds = 0.0
+
+    async def _acquire_slot(self) -> None:
+        while self._in_flight >= self.config.max_concurrency:
+            waiter = asyncio.get_running_loop().create_future()
+            self._slot_waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._slot_waiters:
+                    self._slot_waiters.remove(waiter)
+        self._in_flight += 1
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+        while self._slot_waiters:
+            waiter = self._slot_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    async def _acquire(self, estimated_tokens: int) -> None:
+        """Wait for a concurrency slot, cooldown expiry and bucket capacity."""
+        start = time.monotonic()
+        await self._acquire_slot()
+        try:
+            while True:
+                cooldown = self._cooldown_until - time.monotonic()
+                if cooldown > 0:
+                    await asyncio.sleep(cooldown)
+                    continue
+
+                wait = self.request_bucket.try_acquire(1, self.rate_scale)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+
+                wait = self.token_bucket.try_acquire(estimated_tokens, self.rate_scale)
+                if wait > 0:
+                    self.request_bucket.adjust(-1)
+                    await asyncio.sleep(wait)
+                    continue
+
+                break
+        except BaseException:
+            self._release_slot()
+            raise
+
+        self.total_requests += 1
+        self.total_wait_seconds += time.monotonic() - start
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Delay before the next attempt: full-jitter exponential or the provider hint."""
+        delay = min(self.config.max_delay, self.config.base_delay * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)  # noqa: S311 - jitter, not crypto
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.config.max_delay))
+        return delay
+
+    def _on_retryable_error(self, code: Optional[str], delay: float) -> None:
+        if code == "rate_limit":
+            self.total_rate_limited += 1
+            self.rate_scale = max(MIN_RATE_SCALE, self.rate_scale / 2)
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+        self.total_retries += 1
+
+    def _on_success(self) -> None:
+        self.rate_scale = min(1.0, self.rate_scale + 0.05)
+
+    def _reconcile(self, estimated_tokens: int, usage: Optional[Dict[str, int]]) -> None:
+        actual = _usage_total(usage)
+        if actual is not None:
+            self.token_bucket.adjust(actual - estimated_tokens)
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[T]],
+        *,
+        estimated_tokens: int,
+    ) -> T:
+        """
+        Run a request under the limiter, retrying retryable errors.
+
+        Args:
+            func: Factory creating the request coroutine for each attempt
+            estimated_tokens: Estimated tokens the request consumes
+
+        Returns:
+            The request result
+
+        Raises:
+            LLMError: If the request fails or retries are exhausted
+        """
+        attempt = 0
+        while True:
+            await self._acquire(estimated_tokens)
+            try:
+                result = await func()
+            except LLMError as e:
+                if e.code not in RETRYABLE_ERROR_CODES or attempt >= self.config.max_retries:
+                    raise
+                delay = self._backoff(attempt, e.retry_after)
+                self._on_retryable_error(e.code, delay)
+                logger.warning(
+                    f"{self.provider_name} request failed ({e.code}), "
+                    f"retrying in {delay:.1f}s (attempt {attempt + 1})"
+                )
+            else:
+                self._on_success()
+                if isinstance(result, LLMResponse):
+                    self._reconcile(estimated_tokens, result.usage)
+                return result
+            finally:
+                self._release_slot()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stream(
+        self,
+        factory: Callable[[], AsyncGenerator[StreamEvent, None]],
+        *,
+        estimated_tokens: int,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        Run a streaming request under the limiter.
+
+        A retryable ERROR event is retried only while no content has been
+        streamed yet; afterwards it is passed through unchanged.
+
+        Args:
+            factory: Factory creating the provider event stream for each attempt
+            estimated_tokens: Estimated tokens the request consumes
+
+        Yields:
+            StreamEvent objects from the provider
+        """
+        attempt = 0
+        started = False  # MESSAGE_START already forwarded
+        while True:
+            await self._acquire(estimated_tokens)
+            retry_delay: Optional[float] = None
+            content_seen = False
+            try:
+                async with aclosing(factory()) as events:
+                    async for event in events:
+                        if event.type == StreamEventType.MESSAGE_START:
+                            if not started:
+                                started = True
+                                yield event
+                            continue
+
+                        if (
+                            event.type == StreamEventType.ERROR
+                            and not content_seen
+                            and event.error_code in RETRYABLE_ERROR_CODES
+                            and attempt < self.config.max_retries
+                        ):
+                            retry_delay = self._backoff(attempt, event.retry_after)
+                            self._on_retryable_error(event.error_code, retry_delay)
+                            logger.warning(
+                                f"{self.provider_name} stream failed ({event.error_code}), "
+                                f"retrying in {retry_delay:.1f}s (attempt {attempt + 1})"
+                            )
+                            break
+
+                        content_seen = True
+                        if event.type == StreamEventType.MESSAGE_END:
+                            self._on_success()
+                            self._reconcile(estimated_tokens, event.usage)
+                        yield event
+            finally:
+                self._release_slot()
+
+            if retry_delay is None:
+                return
+
+            await asyncio.sleep(retry_delay)
+            attempt += 1
+
+    def get_state(self) -> Dict[str, Any]:
+        """
+        Get a snapshot of the limiter state.
+
+        Returns:
+            Dictionary with limits, current levels and counters
+        """
+        return {
+            "provider": self.provider_name,
+            "key_id": self.key_id,
+            "requests_per_minute": self.config.requests_per_minute,
+            "tokens_per_minute": self.config.tokens_per_minute,
+            "rate_scale": round(self.rate_scale, 3),
+            "available_requests": round(self.request_bucket.level, 2),
+            "available_tokens": round(self.token_bucket.level),
+            "in_flight": self._in_flight,
+            "max_concurrency": self.config.max_concurrency,
+            "queued": len(self._slot_waiters),
+            "cooldown_remaining": round(max(0.0, self._cooldown_until - time.monotonic()), 2),
+            "total_requests": self.total_requests,
+            "total_retries": self.total_retries,
+            "total_rate_limited": self.total_rate_limited,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+        }
+
+
+class RateLimitedProvider(LLMProvider):
+    """
+    LLMProvider wrapper that applies a ProviderRateLimiter.
+
+    Delegates everything else to the wrapped provider.
+    """
+
+    def __init__(self, provider: LLMProvider, limiter: ProviderRateLimiter):
+        """
+        Initialize the wrapper.
+
+        Args:
+            provider: Provider to wrap
+            limiter: Limiter shared by all users of the same API key
+        """
+        self.provider = provider
+        self.limiter = limiter
+        self.provider_name = provider.provider_name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+
+    async def complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> LLMResponse:
+        """Generate a completion under the rate limiter."""
+        return await self.limiter.call(
+            lambda: self.provider.complete(
+                messages,
+                model,
+                tools=tools,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system_prompt=system_prompt,
+            ),
+            estimated_tokens=estimate_request_tokens(messages, max_tokens),
+        )
+
+    async def stream_complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Stream a completion under the rate limiter."""
+        async for event in self.limiter.stream(
+            lambda: self.provider.stream_complete(
+                messages,
+                model,
+                tools=tools,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system_prompt=system_prompt,
+            ),
+            estimated_tokens=estimate_request_tokens(messages, max_tokens),
+        ):
+            yield event
+
+    def get_available_models(self) -> List[ModelInfo]:
+        """Get available models of the wrapped provider."""
+        return self.provider.get_available_models()
+
+    def get_model_info(self, model: str) -> Optional[ModelInfo]:
+        """Look up catalog information in the wrapped provider."""
+        return self.provider.get_model_info(model)
+
+    def supports_tools(self, model: str) -> bool:
+        """Check tool support in the wrapped provider."""
+        return self.provider.supports_tools(model)
+
+    def supports_vision(self, model: str) -> bool:
+        """Check vision support in the wrapped provider."""
+        return self.provider.supports_vision(model)
+
+    async def close(self) -> None:
+        """Close the wrapped provider."""
+        await self.provider.close()
+
+
+# Limiters keyed by provider and API key identifier
+_rate_limiters: Dict[str, ProviderRateLimiter] = {}
+
+
+def get_key_id(api_key: str) -> str:
+    """Derive a short, non-reversible identifier for an API key."""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+def get_rate_limiter(
+    provider_name: str,
+    api_key: str,
+    config: Optional[RateLimitConfig] = None,
+) -> ProviderRateLimiter:
+    """
+    Get the shared limiter for a provider API key.
+
+    Args:
+        provider_name: Provider identifier
+        api_key: API key the requests are made with
+        config: Configuration used when the limiter is first created
+
+    Returns:
+        ProviderRateLimiter instance
+    """
+    key_id = get_key_id(api_key)
+    cache_key = f"{provider_name}:{key_id}"
+    limiter = _rate_limiters.get(cache_key)
+    if limiter is None:
+        limiter = ProviderRateLimiter(
+            provider_name, key_id, config or RateLimitConfig.from_settings()
+        )
+        _rate_limiters[cache_key] = limiter
+    return limiter
+
+
+def get_rate_limiter_states() -> List[Dict[str, Any]]:
+    """
+    Get state snapshots of all limiters.
+
+    Returns:
+        List of limiter state dictionaries
+    """
+    return [limiter.get_state() for limiter in _rate_limiters.values()]
@@ -0,0 +1,361 @@
+"""
+Record/replay LLM provider.
+
+This module records real provider streams, including the time between
+events, to a cassette file and replays them without network access. It is
+meant for load testing StreamingHandler, the SSE endpoints and the tool loop.
+
+A cassette is a JSON Lines file with one recorded turn per line:
+
+    {"depth": 0, "events": [[0.41, {"type": "message_start"}], ...]}
+    {"depth": 0, "response": {...}}
+
+"depth" is the number of assistant messages since the last user prompt, so
+a recorded tool loop replays its tool_use turns and final answer in order
+even when many sessions replay the same cassette concurrently.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from .base import (
+    ContentBlock,
+    LLMError,
+    LLMProvider,
+    LLMResponse,
+    Message,
+    MessageRole,
+    ModelInfo,
+    StreamEvent,
+    StreamEventType,
+    ToolDefinition,
+)
+
+logger = logging.getLogger(__name__)
+
+REPLAY_MODEL = ModelInfo(
+    id="replay",
+    name="Replay",
+    provider="replay",
+    description="Replays recorded provider responses",
+    max_tokens=8192,
+    context_window=200000,
+    supports_tools=True,
+    supports_vision=True,
+    supports_streaming=True,
+)
+
+
+def get_turn_depth(messages: List[Message]) -> int:
+    """
+    Count assistant messages since the last user prompt.
+
+    Tool results are sent as user messages; they do not start a new prompt.
+
+    Args:
+        messages: Request messages
+
+    Returns:
+        Tool-loop iteration the request belongs to
+    """
+    depth = 0
+    for msg in reversed(messages):
+        if msg.role == MessageRole.ASSISTANT:
+            depth += 1
+        elif msg.role == MessageRole.USER:
+            is_tool_result = not isinstance(msg.content, str) and any(
+                block.type == "tool_result" for block in msg.content
+            )
+            if not is_tool_result:
+                break
+    return depth
+
+
+def append_turn(path: Path, turn: Dict[str, Any]) -> None:
+    """
+    Append a recorded turn to a cassette file.
+
+    Args:
+        path: Cassette file
+        turn: Turn dictionary with "depth" and "events" or "response"
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(turn, ensure_ascii=False) + "\n")
+
+
+def load_cassette(path: Path) -> List[Dict[str, Any]]:
+    """
+    Load the turns of a cassette file.
+
+    Args:
+        path: Cassette file
+
+    Returns:
+        Recorded turns in file order
+    """
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _response_from_events(events: List[StreamEvent]) -> LLMResponse:
+    """Assemble a non-streaming response from a recorded stream."""
+    text = "".join(e.text for e in events if e.type == StreamEventType.TEXT_DELTA and e.text)
+    content = [ContentBlock(type="text", text=text)] if text else []
+    for event in events:
+        if event.type == StreamEventType.TOOL_USE_END and event.tool_use:
+            content.append(ContentBlock(type="tool_use", tool_use=event.tool_use))
+    stop_reason = "tool_use" if any(b.type == "tool_use" for b in content) else "end_turn"
+    return LLMResponse(content=content, stop_reason=stop_reason, model=REPLAY_MODEL.id)
+
+
+class ReplayProvider(LLMProvider):
+    """
+    Provider that replays a recorded cassette.
+
+    Turns are matched by tool-loop depth and cycled round-robin. Recorded
+    delays are divided by speed; a speed of 0 replays as fast as possible.
+    """
+
+    provider_name = "replay"
+
+    def __init__(
+        self,
+        api_key: str = "",
+        *,
+        cassette: Optional[Path] = None,
+        speed: Optional[float] = None,
+    ):
+        """
+        Initialize the replay provider.
+
+        Args:
+            api_key: Unused; accepted for the provider registry
+            cassette: Cassette file (defaults to LLM_REPLAY_CASSETTE)
+            speed: Replay speed factor (defaults to LLM_REPLAY_SPEED)
+
+        Raises:
+            LLMError: If no cassette is configured or it holds no turns
+        """
+        if cassette is None or speed is None:
+            # Import here to avoid circular imports
+            from app.services.config_service import settings
+
+            if cassette is None and settings.LLM_REPLAY_CASSETTE:
+                cassette = Path(settings.LLM_REPLAY_CASSETTE)
+            if speed is None:
+                speed = settings.LLM_REPLAY_SPEED
+
+        if cassette is None:
+            raise LLMError("No replay cassette configured", provider=self.provider_name)
+
+        self.cassette = Path(cassette)
+        self.speed = speed
+        self._turns: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for turn in load_cassette(self.cassette):
+            self._turns[turn.get("depth", 0)].append(turn)
+        if not self._turns:
+            raise LLMError(f"Cassette {self.cassette} is empty", provider=self.provider_name)
+        self._cursors: Dict[int, int] = defaultdict(int)
+
+    def _next_turn(self, messages: List[Message]) -> Dict[str, Any]:
+        """Pick the next recorded turn for the request's tool-loop depth."""
+        depth = get_turn_depth(messages)
+        if depth not in self._turns:
+            # Deeper than anything recorded: use the deepest recorded turns
+            depth = max(self._turns)
+        turns = self._turns[depth]
+        turn = turns[self._cursors[depth] % len(turns)]
+        self._cursors[depth] += 1
+        return turn
+
+    async def _sleep(self, delay: float) -> None:
+        if self.speed and delay > 0:
+            await asyncio.sleep(delay / self.speed)
+
+    async def complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> LLMResponse:
+        """Replay a recorded turn as a complete response."""
+        turn = self._next_turn(messages)
+        if "response" in turn:
+            await self._sleep(turn.get("duration", 0.0))
+            return LLMResponse.from_dict(turn["response"])
+
+        events = []
+        for delay, data in turn["events"]:
+            await self._sleep(delay)
+            events.append(StreamEvent.from_dict(data))
+        return _response_from_events(events)
+
+    async def stream_complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Replay a recorded turn as stream events with recorded timing."""
+        turn = self._next_turn(messages)
+        if "response" in turn:
+            # Recorded from complete(): emit it as a minimal stream
+            await self._sleep(turn.get("duration", 0.0))
+            response = LLMResponse.from_dict(turn["response"])
+            yield StreamEvent(type=StreamEventType.MESSAGE_START)
+            if response.text:
+                yield StreamEvent(type=StreamEventType.TEXT_DELTA, text=response.text)
+            for tool_use in response.tool_uses:
+                yield StreamEvent(type=StreamEventType.TOOL_USE_END, tool_use=tool_use)
+            yield StreamEvent(type=StreamEventType.MESSAGE_END, usage=response.usage)
+            return
+
+        for delay, data in turn["events"]:
+            await self._sleep(delay)
+            yield StreamEvent.from_dict(data)
+
+    def get_available_models(self) -> List[ModelInfo]:
+        """Get the replay model."""
+        return [REPLAY_MODEL]
+
+    def get_model_info(self, model: str) -> Optional[ModelInfo]:
+        """Any model name is served by the cassette."""
+        return REPLAY_MODEL
+
+    def supports_tools(self, model: str) -> bool:
+        """Recorded turns may contain tool calls."""
+        return True
+
+    def supports_vision(self, model: str) -> bool:
+        """Images are accepted and ignored."""
+        return True
+
+
+class RecordingProvider(LLMProvider):
+    """
+    LLMProvider wrapper that records every response to a cassette file.
+
+    Streams are recorded when they complete without error, with the delay
+    before each event measured from the previous one (the first from the
+    request). Failed attempts are not recorded, so a replay follows the
+    successful path.
+    """
+
+    def __init__(self, provider: LLMProvider, cassette: Path):
+        """
+        Initialize the recorder.
+
+        Args:
+            provider: Provider to record
+            cassette: Cassette file to append to
+        """
+        self.provider = provider
+        self.cassette = Path(cassette)
+        self.provider_name = provider.provider_name
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+
+    def _append(self, turn: Dict[str, Any]) -> None:
+        with self._lock:
+            append_turn(self.cassette, turn)
+
+    async def complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> LLMResponse:
+        """Generate a completion and record it."""
+        start = time.monotonic()
+        response = await self.provider.complete(
+            messages,
+            model,
+            tools=tools,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system_prompt=system_prompt,
+        )
+        self._append({
+            "depth": get_turn_depth(messages),
+            "model": model,
+            "duration": round(time.monotonic() - start, 4),
+            "response": response.to_dict(),
+        })
+        return response
+
+    async def stream_complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Stream a completion and record its events with timings."""
+        recorded: List[List[Any]] = []
+        failed = False
+        last = time.monotonic()
+        async for event in self.provider.stream_complete(
+            messages,
+            model,
+            tools=tools,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system_prompt=system_prompt,
+        ):
+            now = time.monotonic()
+            recorded.append([round(now - last, 4), event.to_dict()])
+            failed = failed or event.type == StreamEventType.ERROR
+            last = now
+            yield event
+
+        if failed:
+            return
+        self._append({
+            "depth": get_turn_depth(messages),
+            "model": model,
+            "events": recorded,
+        })
+
+    def get_available_models(self) -> List[ModelInfo]:
+        """Get available models of the wrapped provider."""
+        return self.provider.get_available_models()
+
+    def get_model_info(self, model: str) -> Optional[ModelInfo]:
+        """Look up catalog information in the wrapped provider."""
+        return self.provider.get_model_info(model)
+
+    def supports_tools(self, model: str) -> bool:
+        """Check tool support in the wrapped provider."""
+        return self.provider.supports_tools(model)
+
+    def supports_vision(self, model: str) -> bool:
+        """Check vision support in the wrapped provider."""
+        return self.provider.supports_vision(model)
+
+    async def close(self) -> None:
+        """Close the wrapped provider."""
+        await self.provider.close()
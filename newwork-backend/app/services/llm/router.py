@@ -0,0 +1,552 @@
+"""
+Latency-aware provider routing.
+
+This module provides a RoutedProvider that spreads requests over a group of
+equivalent provider/model routes, preferring the fastest healthy one, failing
+over on errors and optionally hedging slow requests.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import (
+    Any,
+    AsyncGenerator,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .base import (
+    LLMError,
+    LLMProvider,
+    LLMResponse,
+    Message,
+    ModelInfo,
+    StreamEvent,
+    StreamEventType,
+    ToolDefinition,
+)
+
+logger = logging.getLogger(__name__)
+
+# Outcomes older than this no longer influence routing
+STATS_WINDOW_SECONDS = 300.0
+
+# Samples kept per route
+STATS_MAX_SAMPLES = 50
+
+# A route needs this many recent outcomes before it can be marked unhealthy
+MIN_HEALTH_SAMPLES = 3
+
+
+@dataclass
+class RouteStats:
+    """Rolling time-to-first-token and error statistics for one route."""
+
+    ttft_samples: Deque[Tuple[float, float]] = field(
+        default_factory=lambda: deque(maxlen=STATS_MAX_SAMPLES)
+    )
+    outcomes: Deque[Tuple[float, bool]] = field(
+        default_factory=lambda: deque(maxlen=STATS_MAX_SAMPLES)
+    )
+    hedges_won: int = 0
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - STATS_WINDOW_SECONDS
+        while self.ttft_samples and self.ttft_samples[0][0] < cutoff:
+            self.ttft_samples.popleft()
+        while self.outcomes and self.outcomes[0][0] < cutoff:
+            self.outcomes.popleft()
+
+    def record_ttft(self, seconds: float) -> None:
+        """Record the time to first token of a request."""
+        self.ttft_samples.append((time.monotonic(), seconds))
+
+    def record_outcome(self, ok: bool) -> None:
+        """Record whether a request succeeded."""
+        self.outcomes.append((time.monotonic(), ok))
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Mean recent time to first token, or None without samples."""
+        self._prune()
+        if not self.ttft_samples:
+            return None
+        return sum(s for _, s in self.ttft_samples) / len(self.ttft_samples)
+
+    @property
+    def error_rate(self) -> float:
+        """Fraction of recent requests that failed."""
+        self._prune()
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for _, ok in self.outcomes if not ok) / len(self.outcomes)
+
+    def is_healthy(self, max_error_rate: float) -> bool:
+        """Check whether the recent error rate is acceptable."""
+        self._prune()
+        if len(self.outcomes) < MIN_HEALTH_SAMPLES:
+            return True
+        return self.error_rate <= max_error_rate
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable snapshot."""
+        ttft = self.ttft
+        return {
+            "ttft": round(ttft, 3) if ttft is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "samples": len(self.outcomes),
+            "hedges_won": self.hedges_won,
+        }
+
+
+# Statistics shared by all routed providers, keyed by "provider:model"
+_route_stats: Dict[str, RouteStats] = {}
+
+
+@dataclass
+class RouteTarget:
+    """A provider/model pair that can serve a routed request."""
+
+    provider_name: str
+    model: str
+    provider: LLMProvider
+
+    @property
+    def key(self) -> str:
+        """Identifier used for statistics."""
+        return f"{self.provider_name}:{self.model}"
+
+
+class RoutedProvider(LLMProvider):
+    """
+    LLMProvider that routes each request to one of several equivalent models.
+
+    Targets are ranked by recent time to first token; unhealthy targets are
+    only used once the healthy ones have failed. With hedging enabled, a
+    second target is started when the first has produced no content after
+    hedge_delay seconds, and whichever answers first wins while the other
+    stream is cancelled.
+    """
+
+    provider_name = "routed"
+
+    def __init__(
+        self,
+        targets: Sequence[RouteTarget],
+        *,
+        hedge_delay: Optional[float] = None,
+        max_error_rate: float = 0.5,
+        stats: Optional[Dict[str, RouteStats]] = None,
+    ):
+        """
+        Initialize the routed provider.
+
+        Args:
+            targets: Equivalent routes in order of preference
+            hedge_delay: Seconds without content before hedging (None disables)
+            max_error_rate: Error rate above which a route is unhealthy
+            stats: Statistics store (defaults to the shared store)
+
+        Raises:
+            ValueError: If no targets are given
+        """
+        if not targets:
+            raise ValueError("RoutedProvider requires at least one target")
+        self.targets = list(targets)
+        self.hedge_delay = hedge_delay
+        self.max_error_rate = max_error_rate
+        self.stats = _route_stats if stats is None else stats
+
+    @classmethod
+    def from_routes(
+        cls,
+        routes: Sequence[Tuple[str, str]],
+        *,
+        api_keys: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> "RoutedProvider":
+        """
+        Build a routed provider from registered provider names.
+
+        Routes whose provider has no API key are skipped.
+
+        Args:
+            routes: (provider_name, model) pairs in order of preference
+            api_keys: API keys by provider (defaults to configured keys)
+            **kwargs: Passed to the constructor
+
+        Returns:
+            RoutedProvider instance
+        """
+        # Import here to avoid circular imports
+        from app.services.config_service import ConfigService
+        from . import get_provider
+
+        targets = []
+        for provider_name, model in routes:
+            api_key = (api_keys or {}).get(provider_name) or ConfigService.get_api_key(
+                provider_name
+            )
+            if not api_key:
+                logger.warning(f"Skipping route {provider_name}:{model}: no API key")
+                continue
+            targets.append(
+                RouteTarget(provider_name, model, get_provider(provider_name, api_key))
+            )
+        return cls(targets, **kwargs)
+
+    def target_for(self, model: str) -> Optional[RouteTarget]:
+        """
+        Find the target serving a model.
+
+        Callers that need a specific model (e.g. a cheaper summary model)
+        call that target's provider directly instead of the router.
+
+        Args:
+            model: Model identifier
+
+        Returns:
+            The best-ranked target for the model, or None if no target serves it
+        """
+        return next((t for t in self.rank_targets() if t.model == model), None)
+
+    def _stats_for(self, target: RouteTarget) -> RouteStats:
+        stats = self.stats.get(target.key)
+        if stats is None:
+            stats = RouteStats()
+            self.stats[target.key] = stats
+        return stats
+
+    def rank_targets(self) -> List[RouteTarget]:
+        """
+        Order targets for the next request.
+
+        Healthy targets come first, fastest first; targets without samples
+        are tried before measured ones so that every route gets measured.
+        Ties keep the configured order.
+
+        Returns:
+            Targets in the order they should be tried
+        """
+        def sort_key(indexed: Tuple[int, RouteTarget]) -> Tuple[bool, float, int]:
+            index, target = indexed
+            stats = self._stats_for(target)
+            ttft = stats.ttft
+            return (
+                not stats.is_healthy(self.max_error_rate),
+                ttft if ttft is not None else 0.0,
+                index,
+            )
+
+        return [t for _, t in sorted(enumerate(self.targets), key=sort_key)]
+
+    async def complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> LLMResponse:
+        """
+        Generate a completion, failing over between targets.
+
+        Raises:
+            LLMError: If every target fails
+        """
+        last_error: Optional[Exception] = None
+        for target in self.rank_targets():
+            stats = self._stats_for(target)
+            start = time.monotonic()
+            try:
+                response = await target.provider.complete(
+                    messages,
+                    target.model,
+                    tools=tools,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    system_prompt=system_prompt,
+                )
+            except Exception as e:
+                stats.record_outcome(False)
+                logger.warning(f"Route {target.key} failed, failing over: {e}")
+                last_error = e
+                continue
+            stats.record_ttft(time.monotonic() - start)
+            stats.record_outcome(True)
+            return response
+
+        if isinstance(last_error, LLMError):
+            raise last_error
+        raise LLMError(str(last_error), provider=self.provider_name)
+
+    async def _pump(
+        self,
+        target: RouteTarget,
+        queue: "asyncio.Queue[Tuple[RouteTarget, Optional[StreamEvent]]]",
+        request: Dict[str, Any],
+    ) -> None:
+        """Forward one target's stream into the shared queue, ending with None."""
+        try:
+            async for event in target.provider.stream_complete(
+                request["messages"], target.model, **request["kwargs"]
+            ):
+                await queue.put((target, event))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(
+                (target, StreamEvent(type=StreamEventType.ERROR, error=str(e)))
+            )
+        await queue.put((target, None))
+
+    async def stream_complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        Stream a completion from the fastest target, hedging and failing over.
+
+        Only the first MESSAGE_START is forwarded, and once a target produces
+        content all other streams are cancelled.
+        """
+        request = {
+            "messages": messages,
+            "kwargs": {
+                "tools": tools,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "system_prompt": system_prompt,
+            },
+        }
+        queue: "asyncio.Queue[Tuple[RouteTarget, Optional[StreamEvent]]]" = asyncio.Queue()
+        candidates = self.rank_targets()
+        tasks: Dict[str, asyncio.Task] = {}
+        retired: List[asyncio.Task] = []  # Cancelled streams still cleaning up
+        started_at: Dict[str, float] = {}
+        winner: Optional[RouteTarget] = None
+        hedged = False
+        message_started = False
+        last_error: Optional[StreamEvent] = None
+
+        def launch() -> None:
+            target = candidates.pop(0)
+            started_at[target.key] = time.monotonic()
+            tasks[target.key] = asyncio.create_task(self._pump(target, queue, request))
+
+        def cancel(key: str) -> None:
+            task = tasks.pop(key, None)
+            if task is not None:
+                task.cancel()
+                retired.append(task)
+
+        launch()
+        try:
+            while True:
+                timeout = None
+                if winner is None and not hedged and candidates and self.hedge_delay is not None:
+                    last_start = max(started_at.values())
+                    timeout = max(0.0, last_start + self.hedge_delay - time.monotonic())
+
+                try:
+                    target, event = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    hedged = True
+                    logger.info(f"No token after {self.hedge_delay}s, hedging request")
+                    launch()
+                    continue
+
+                if winner is not None and target is not winner:
+                    continue
+
+                if winner is None:
+                    if target.key not in tasks:
+                        continue  # Leftover event from a cancelled stream
+
+                    if event is None or event.type == StreamEventType.ERROR:
+                        # Failed before producing content: fail over
+                        self._stats_for(target).record_outcome(False)
+                        cancel(target.key)
+                        if event is not None:
+                            last_error = event
+                            logger.warning(f"Route {target.key} failed: {event.error}")
+                        if not tasks and candidates:
+                            launch()
+                        elif not tasks:
+                            yield last_error or StreamEvent(
+                                type=StreamEventType.ERROR,
+                                error="All routes ended without a response",
+                            )
+                            return
+                        continue
+
+                    if event.type == StreamEventType.MESSAGE_START:
+                        if not message_started:
+                            message_started = True
+                            yield event
+                        continue
+
+                    # First content wins; cancel the others
+                    winner = target
+                    stats = self._stats_for(target)
+                    stats.record_ttft(time.monotonic() - started_at[target.key])
+                    if hedged and target.key != next(iter(started_at)):
+                        stats.hedges_won += 1
+                    for key in list(tasks):
+                        if key != target.key:
+                            cancel(key)
+
+                if event is None:
+                    return
+
+                if event.type == StreamEventType.MESSAGE_END:
+                    self._stats_for(target).record_outcome(True)
+                elif event.type == StreamEventType.ERROR:
+                    self._stats_for(target).record_outcome(False)
+
+                yield event
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            # Let cancelled streams close their HTTP responses and release
+            # their rate limiter slots before returning
+            await asyncio.gather(*retired, *tasks.values(), return_exceptions=True)
+
+    def get_available_models(self) -> List[ModelInfo]:
+        """Get the models of all targets."""
+        return [
+            info
+            for target in self.targets
+            if (info := target.provider.get_model_info(target.model)) is not None
+        ]
+
+    def get_model_info(self, model: str) -> Optional[ModelInfo]:
+        """
+        Describe the routed model.
+
+        The context window is the smallest of all targets, since the request
+        may be served by any of them.
+        """
+        infos = self.get_available_models()
+        if not infos:
+            return None
+        info = next((m for m in infos if m.id == model), infos[0])
+        return replace(info, context_window=min(m.context_window for m in infos))
+
+    def supports_tools(self, model: str) -> bool:
+        """Check that every target supports tools."""
+        return all(t.provider.supports_tools(t.model) for t in self.targets)
+
+    def supports_vision(self, model: str) -> bool:
+        """Check that every target supports vision."""
+        return all(t.provider.supports_vision(t.model) for t in self.targets)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """
+        Get routing statistics for each target.
+
+        Returns:
+            List of per-route statistic dictionaries in routing order
+        """
+        return [
+            {
+                "provider": t.provider_name,
+                "model": t.model,
+                "healthy": self._stats_for(t).is_healthy(self.max_error_rate),
+                **self._stats_for(t).to_dict(),
+            }
+            for t in self.rank_targets()
+        ]
+
+    async def close(self) -> None:
+        """Targets are shared provider instances closed by close_all_providers."""
+        pass
+
+
+# Routed provider built from the configured routes, keyed by its configuration
+_routed_provider: Optional[Tuple[Tuple[Any, ...], RoutedProvider]] = None
+
+
+def get_routed_provider(
+    spec: str,
+    *,
+    hedge_delay: Optional[float] = None,
+    max_error_rate: float = 0.5,
+) -> RoutedProvider:
+    """
+    Get the routed provider for a route list, building it only once.
+
+    Args:
+        spec: Route list as accepted by parse_routes
+        hedge_delay: Seconds without content before hedging (None disables)
+        max_error_rate: Error rate above which a route is unhealthy
+
+    Returns:
+        Shared RoutedProvider instance
+    """
+    global _routed_provider
+    key = (spec, hedge_delay, max_error_rate)
+    if _routed_provider is None or _routed_provider[0] != key:
+        provider = RoutedProvider.from_routes(
+            parse_routes(spec),
+            hedge_delay=hedge_delay,
+            max_error_rate=max_error_rate,
+        )
+        _routed_provider = (key, provider)
+    return _routed_provider[1]
+
+
+def clear_routed_provider() -> None:
+    """Forget the shared routed provider (its targets are being closed)."""
+    global _routed_provider
+    _routed_provider = None
+
+
+def get_route_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Get the shared routing statistics.
+
+    Returns:
+        Statistic dictionaries keyed by "provider:model"
+    """
+    return {key: stats.to_dict() for key, stats in _route_stats.items()}
+
+
+def parse_routes(spec: str) -> List[Tuple[str, str]]:
+    """
+    Parse a route list such as "anthropic:claude-sonnet-4-20250514,openai:gpt-4o".
+
+    Args:
+        spec: Comma-separated provider:model pairs
+
+    Returns:
+        List of (provider_name, model) pairs
+
+    Raises:
+        ValueError: If an entry is not of the form provider:model
+    """
+    routes = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider_name, sep, model = entry.partition(":")
+        if not sep or not provider_name or not model:
+            raise ValueError(f"Invalid route '{entry}', expected provider:model")
+        routes.append((provider_name.strip(), model.strip()))
+    return routes
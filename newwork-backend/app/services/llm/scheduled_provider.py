@@ -0,0 +1,109 @@
+"""
+Work-scheduled provider.
+
+Wraps a provider so every request holds a slot of the work scheduler's LLM
+pool, queued fairly by the flow and lane of the calling task (see
+app.services.work_scheduler). A streamed response holds its slot until the
+stream ends.
+"""
+
+from typing import Any, AsyncGenerator, List, Optional
+
+from app.services.work_scheduler import WorkPool, WorkScheduler
+
+from .base import (
+    LLMProvider,
+    LLMResponse,
+    Message,
+    ModelInfo,
+    StreamEvent,
+    ToolDefinition,
+)
+
+
+class ScheduledProvider(LLMProvider):
+    """
+    LLMProvider wrapper that runs requests in the work scheduler's LLM pool.
+
+    Delegates everything else to the wrapped provider.
+    """
+
+    def __init__(self, provider: LLMProvider, scheduler: WorkScheduler):
+        """
+        Initialize the wrapper.
+
+        Args:
+            provider: Provider to wrap
+            scheduler: Scheduler shared by all providers
+        """
+        self.provider = provider
+        self.scheduler = scheduler
+        self.provider_name = provider.provider_name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+
+    async def complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> LLMResponse:
+        """Generate a completion in an LLM slot."""
+        async with self.scheduler.slot(WorkPool.LLM):
+            return await self.provider.complete(
+                messages,
+                model,
+                tools=tools,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system_prompt=system_prompt,
+            )
+
+    async def stream_complete(
+        self,
+        messages: List[Message],
+        model: str,
+        *,
+        tools: Optional[List[ToolDefinition]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
+        system_prompt: Optional[str] = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """Stream a completion in an LLM slot."""
+        async for event in self.scheduler.stream(
+            WorkPool.LLM,
+            self.provider.stream_complete(
+                messages,
+                model,
+                tools=tools,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                system_prompt=system_prompt,
+            ),
+        ):
+            yield event
+
+    def get_available_models(self) -> List[ModelInfo]:
+        """Get available models of the wrapped provider."""
+        return self.provider.get_available_models()
+
+    def get_model_info(self, model: str) -> Optional[ModelInfo]:
+        """Look up catalog information in the wrapped provider."""
+        return self.provider.get_model_info(model)
+
+    def supports_tools(self, model: str) -> bool:
+        """Check tool support in the wrapped provider."""
+        return self.provider.supports_tools(model)
+
+    def supports_vision(self, model: str) -> bool:
+        """Check vision support in the wrapped provider."""
+        return self.provider.supports_vision(model)
+
+    async def close(self) -> None:
+        """Close the wrapped provider."""
+        await self.provider.close()
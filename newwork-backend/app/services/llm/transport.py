@@ -0,0 +1,176 @@
+"""
+Shared HTTP transport for LLM providers.
+
+This module keeps one configured httpx.AsyncClient per API origin so that
+every provider instance talking to the same host reuses its connection pool,
+and lets the application open those connections before the first request.
+"""
+
+import asyncio
+import logging
+import sys
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Dict, Iterable, Optional, Type
+from urllib.parse import urlsplit
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TransportConfig:
+    """Connection pool settings for provider HTTP clients."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+    http2: bool = True
+
+    @classmethod
+    def from_settings(cls) -> "TransportConfig":
+        """Build the configuration from application settings."""
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        return cls(
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+            connect_timeout=settings.LLM_HTTP_CONNECT_TIMEOUT,
+            read_timeout=settings.LLM_HTTP_READ_TIMEOUT,
+            http2=settings.LLM_HTTP2,
+        )
+
+
+# Shared clients keyed by origin (scheme://host[:port])
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_origin(base_url: str) -> str:
+    """
+    Reduce a base URL to its origin.
+
+    Args:
+        base_url: API base URL, e.g. "https://api.openai.com/v1"
+
+    Returns:
+        Origin such as "https://api.openai.com"
+    """
+    parts = urlsplit(base_url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _http_module(client_class: Type[httpx.AsyncClient]) -> ModuleType:
+    """Find the httpx-compatible package a client class is built on."""
+    for cls in client_class.__mro__:
+        if cls.__name__ == "AsyncClient":
+            return sys.modules[cls.__module__.split(".")[0]]
+    return httpx
+
+
+def create_http_client(
+    config: TransportConfig,
+    client_class: Type[httpx.AsyncClient] = httpx.AsyncClient,
+) -> httpx.AsyncClient:
+    """
+    Create an HTTP client with the configured pool limits and timeouts.
+
+    HTTP/2 is only enabled when the h2 package is installed.
+
+    Args:
+        config: Transport configuration
+        client_class: Client class, e.g. an SDK's DefaultAsyncHttpxClient
+
+    Returns:
+        New client instance
+    """
+    # SDKs may ship their own httpx build; use its Limits/Timeout types
+    http = _http_module(client_class)
+    return client_class(
+        http2=config.http2 and HTTP2_AVAILABLE,
+        limits=http.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        timeout=http.Timeout(config.read_timeout, connect=config.connect_timeout),
+    )
+
+
+def get_http_client(
+    base_url: str,
+    *,
+    client_class: Type[httpx.AsyncClient] = httpx.AsyncClient,
+    config: Optional[TransportConfig] = None,
+) -> httpx.AsyncClient:
+    """
+    Get the shared HTTP client for an API base URL.
+
+    The client class and configuration only apply when the client for the
+    origin is first created. Provider SDK clients built on the shared client
+    must not close it; it is closed by close_http_clients.
+
+    Args:
+        base_url: API base URL
+        client_class: Client class used when creating the client
+        config: Configuration used when creating the client
+
+    Returns:
+        Shared client for the URL's origin
+    """
+    origin = get_origin(base_url)
+    client = _http_clients.get(origin)
+    if client is None or client.is_closed:
+        client = create_http_client(config or TransportConfig.from_settings(), client_class)
+        _http_clients[origin] = client
+    return client
+
+
+async def prewarm_http_clients(
+    base_urls: Iterable[str],
+    *,
+    timeout: float = 5.0,
+) -> Dict[str, bool]:
+    """
+    Open connections to API origins ahead of the first request.
+
+    Sends a HEAD request to each origin so that DNS resolution, TCP and TLS
+    setup are done and the connection is kept alive in the pool. The
+    response status is irrelevant; network errors are logged and ignored.
+
+    Args:
+        base_urls: API base URLs to warm
+        timeout: Per-origin timeout in seconds
+
+    Returns:
+        Whether a connection could be established, keyed by origin
+    """
+    origins = sorted({get_origin(url) for url in base_urls})
+
+    async def warm(origin: str) -> bool:
+        try:
+            await get_http_client(origin).head(origin, timeout=timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not pre-warm connection to {origin}: {e}")
+            return False
+
+    results = await asyncio.gather(*(warm(origin) for origin in origins))
+    return dict(zip(origins, results))
+
+
+async def close_http_clients() -> None:
+    """Close all shared HTTP clients."""
+    for client in _http_clients.values():
+        await client.aclose()
+    _http_clients.clear()
@@ -22,6 +22,7 @@ ZAI_MODELS: List[ModelInfo] = [
         provider="zai",
         description="ZAI's primary conversational model",
         max_tokens=4096,
+        context_window=32768,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
@@ -34,6 +35,7 @@ ZAI_MODELS: List[ModelInfo] = [
         provider="zai",
         description="Smaller, faster ZAI model",
         max_tokens=4096,
+        context_window=32768,
         supports_tools=True,
         supports_vision=False,
         supports_streaming=True,
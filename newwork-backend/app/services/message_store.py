@@ -0,0 +1,365 @@
+"""
+Message Store.
+
+Makes conversations durable by appending their messages to the `messages`
+table. Writes are batched behind the request (write-behind): messages are
+queued as they are added to a conversation and written in one transaction
+when MESSAGE_FLUSH_BATCH_SIZE messages are waiting, MESSAGE_FLUSH_INTERVAL_MS
+after the first one was queued, or when a turn ends. The same transaction
+sets the session's total_input_tokens and total_output_tokens.
+
+The table holds the history as it was recorded: compaction summaries are
+derived from it and are not written. Message metadata (e.g. the cancelled
+status) has no column and is not kept.
+
+Nothing is queued until start() is called on application startup, so
+conversations built without the application are not written anywhere.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.db import database
+from app.models.session import Message as MessageModel, Session as SessionModel
+from app.services.conversation_service import Conversation, ConversationMessage
+
+logger = logging.getLogger(__name__)
+
+# Columns rewritten when a queued message is written again
+UPDATED_COLUMNS = ("role", "content", "tool_use", "tool_result", "tokens_used")
+
+
+def message_row(session_id: str, message: ConversationMessage) -> Dict[str, Any]:
+    """
+    Convert a conversation message to a `messages` row.
+
+    Args:
+        session_id: Session the message belongs to
+        message: Message to store
+
+    Returns:
+        Column values of the row
+    """
+    data = message.to_dict()
+    return {
+        "id": message.id,
+        "session_id": session_id,
+        "role": data["role"],
+        "content": message.content,
+        "tool_use": data["tool_uses"] or None,
+        "tool_result": data["tool_results"] or None,
+        "tokens_used": message.tokens_used,
+        "created_at": message.created_at,
+    }
+
+
+def row_message(row: MessageModel) -> ConversationMessage:
+    """
+    Convert a `messages` row back to a conversation message.
+
+    Args:
+        row: Stored message
+
+    Returns:
+        The conversation message
+    """
+    return ConversationMessage.from_dict({
+        "id": row.id,
+        "role": row.role,
+        "content": row.content or "",
+        "tool_uses": row.tool_use or [],
+        "tool_results": row.tool_result or [],
+        "tokens_used": row.tokens_used,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+    })
+
+
+@dataclass
+class MessageStoreStats:
+    """Write counts of the message store."""
+
+    messages: int = 0
+    batches: int = 0
+    failures: int = 0
+    write_seconds: float = 0.0
+    flushes: Dict[str, int] = field(default_factory=dict)  # Batches by reason
+
+    def record(self, count: int, reason: str, seconds: float) -> None:
+        """Record a written batch."""
+        self.messages += count
+        self.batches += 1
+        self.write_seconds += seconds
+        self.flushes[reason] = self.flushes.get(reason, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        return {
+            "messages": self.messages,
+            "batches": self.batches,
+            "failures": self.failures,
+            "write_ms": round(self.write_seconds * 1000, 1),
+            "flushes": dict(self.flushes),
+        }
+
+
+class MessageStore:
+    """
+    Write-behind queue of conversation messages.
+    """
+
+    def __init__(
+        self,
+        *,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            batch_size: Queued messages that trigger a write (default from settings)
+            flush_interval: Seconds a message may wait (default from settings)
+        """
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._pending: List[Dict[str, Any]] = []
+        self._totals: Dict[str, Tuple[int, int]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        # Flush task that has not taken the queue yet; later triggers join it
+        self._queued_flush: Optional[asyncio.Task] = None
+        self.active = False
+        self.stats = MessageStoreStats()
+
+    @property
+    def batch_size(self) -> int:
+        """Queued messages that trigger a write."""
+        if self._batch_size is not None:
+            return self._batch_size
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        return settings.MESSAGE_FLUSH_BATCH_SIZE
+
+    @property
+    def flush_interval(self) -> float:
+        """Seconds a queued message may wait before it is written."""
+        if self._flush_interval is not None:
+            return self._flush_interval
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        return settings.MESSAGE_FLUSH_INTERVAL_MS / 1000
+
+    @property
+    def pending(self) -> int:
+        """Number of messages waiting to be written."""
+        return len(self._pending)
+
+    def start(self) -> None:
+        """Start accepting messages (on application startup)."""
+        self._lock = asyncio.Lock()
+        self.active = True
+
+    async def close(self) -> None:
+        """Write the queued messages and stop accepting new ones."""
+        if not self.active:
+            return
+        await self.flush("shutdown")
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        self.active = False
+
+    def enqueue(self, conversation: Conversation, message: ConversationMessage) -> None:
+        """
+        Queue a message that was added to a conversation.
+
+        Args:
+            conversation: Conversation the message was added to
+            message: The new message
+        """
+        if not self.active:
+            return
+        session_id = conversation.session_id
+        self._pending.append(message_row(session_id, message))
+        self._totals[session_id] = (conversation.total_input_tokens, conversation.total_output_tokens)
+        if len(self._pending) >= self.batch_size:
+            self.flush_soon("size")
+        elif self._timer is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return  # Written with the next batch or turn end
+            self._timer = loop.call_later(self.flush_interval, self.flush_soon, "time")
+
+    def end_turn(self, conversation: Conversation) -> Optional[asyncio.Task]:
+        """
+        Write the queued messages once a turn has ended.
+
+        The session totals are taken again, since usage is reported after
+        the assistant message was added.
+
+        Args:
+            conversation: Conversation whose turn ended
+
+        Returns:
+            The write task, or None if nothing is queued
+        """
+        if not self.active:
+            return None
+        self._totals[conversation.session_id] = (
+            conversation.total_input_tokens,
+            conversation.total_output_tokens,
+        )
+        return self.flush_soon("turn")
+
+    def discard(self, session_id: str) -> None:
+        """
+        Drop the queued messages of a deleted session.
+
+        Args:
+            session_id: Session identifier
+        """
+        self._pending = [row for row in self._pending if row["session_id"] != session_id]
+        self._totals.pop(session_id, None)
+
+    def flush_soon(self, reason: str = "turn") -> Optional[asyncio.Task]:
+        """
+        Write the queued messages in the background.
+
+        Args:
+            reason: Why the batch is written, for the stats
+
+        Returns:
+            The write task, or None if nothing is queued
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.active or not (self._pending or self._totals):
+            return None
+        if self._queued_flush is not None:
+            return self._queued_flush
+        try:
+            task = asyncio.get_running_loop().create_task(self.flush(reason))
+        except RuntimeError:
+            return None
+        self._queued_flush = task
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return task
+
+    async def flush(self, reason: str = "explicit") -> int:
+        """
+        Write the queued messages and session totals in one transaction.
+
+        A failed batch is queued again in front of newer messages.
+
+        Args:
+            reason: Why the batch is written, for the stats
+
+        Returns:
+            Number of messages written
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._queued_flush = None
+            rows, self._pending = self._pending, []
+            totals, self._totals = self._totals, {}
+            if not rows and not totals:
+                return 0
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.write, rows, totals)
+            except Exception as e:
+                logger.error(f"Failed to write {len(rows)} message(s): {e}")
+                self.stats.failures += 1
+                self._pending[:0] = rows
+                self._totals = {**totals, **self._totals}
+                return 0
+            self.stats.record(len(rows), reason, time.perf_counter() - start)
+            return len(rows)
+
+    def write(self, rows: List[Dict[str, Any]], totals: Dict[str, Tuple[int, int]]) -> None:
+        """
+        Insert message rows and set session totals in one transaction.
+
+        Messages written before are updated in place.
+
+        Args:
+            rows: Rows from message_row, in the order they were added
+            totals: (input, output) token totals by session
+        """
+        db = database.SessionLocal()
+        try:
+            if rows:
+                statement = sqlite_insert(MessageModel)
+                statement = statement.on_conflict_do_update(
+                    index_elements=[MessageModel.id],
+                    set_={column: statement.excluded[column] for column in UPDATED_COLUMNS},
+                )
+                db.execute(statement, rows)
+            for session_id, (input_tokens, output_tokens) in totals.items():
+                db.query(SessionModel).filter(SessionModel.id == session_id).update(
+                    {
+                        SessionModel.total_input_tokens: input_tokens,
+                        SessionModel.total_output_tokens: output_tokens,
+                    },
+                    synchronize_session=False,
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def load(self, session_id: str) -> Optional[Conversation]:
+        """
+        Rebuild a conversation from its stored messages.
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            The conversation, or None if the session has no stored messages
+        """
+        db = database.SessionLocal()
+        try:
+            session = db.query(SessionModel).filter(SessionModel.id == session_id).first()
+            if session is None:
+                return None
+            rows = (
+                db.query(MessageModel)
+                .filter(MessageModel.session_id == session_id)
+                .order_by(MessageModel.created_at, text("messages.rowid"))
+                .all()
+            )
+            if not rows:
+                return None
+            return Conversation(
+                session_id=session_id,
+                messages=[row_message(row) for row in rows],
+                system_prompt=session.system_prompt,
+                model=session.model,
+                provider=session.provider,
+                total_input_tokens=session.total_input_tokens or 0,
+                total_output_tokens=session.total_output_tokens or 0,
+            )
+        finally:
+            db.close()
+
+
+# Global message store instance
+message_store = MessageStore()
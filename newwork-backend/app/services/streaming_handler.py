@@ -6,27 +6,47 @@ and converts them to SSE events for the frontend.
 """
 
 import asyncio
-import json
 import logging
+import zlib
+from contextlib import aclosing
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Set
 
 from app.services.llm import (
     LLMProvider,
     LLMResponse,
     Message,
+    MessageRole,
     StreamEvent,
     StreamEventType,
     ToolDefinition,
     ToolUse,
     get_provider,
+    get_routed_provider,
 )
 from app.services.llm.base import ToolResult as LLMToolResult, ContentBlock
-from app.services.conversation_service import Conversation, ConversationMessage
+from app.services.cancellation import cancellation_metrics
+from app.services.conversation_service import Conversation, ConversationMessage, conversation_service
+from app.services.event_encoding import EncodedEvent, encode_event
+from app.services.context_budget import ContextBudget, ContextBudgeter, ContextWindow
 from app.services.tool_execution_service import ToolExecutionService, PendingPermission
-from app.services.config_service import ConfigService
+from app.services.tool_scheduler import (
+    SpeculationStats,
+    SpeculativeToolCalls,
+    ToolBatchTiming,
+    run_tool_calls,
+    speculation_metrics,
+    tool_scheduler_metrics,
+)
+from app.services.work_scheduler import Lane, bind_work, flow_key
+from app.services.tool_output_store import (
+    ElisionStats,
+    ToolOutputElisionPolicy,
+    get_tool_output_policy,
+)
+from app.services.config_service import ConfigService, settings
 
 logger = logging.getLogger(__name__)
 
@@ -53,16 +73,224 @@ class SSEEvent:
     data: Dict[str, Any]
     session_id: str
     timestamp: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+    id: Optional[int] = None  # Set when the event is added to the session event log
+    _encoded: Optional[EncodedEvent] = field(default=None, init=False, repr=False, compare=False)
+
+    def encode(self) -> EncodedEvent:
+        """
+        Serialize the event.
+
+        The event is serialized on the first call; later calls return the
+        same buffer, so the data must not change once it was encoded.
+        """
+        if self._encoded is None:
+            self._encoded = encode_event(self.type, self.data, self.session_id, self.timestamp)
+        return self._encoded
+
+    def sse_frame(self) -> bytes:
+        """Convert to an SSE frame."""
+        return self.encode().sse(self.id)
 
     def to_sse(self) -> str:
         """Convert to SSE format."""
-        event_data = {
-            "type": self.type,
-            "data": self.data,
-            "session_id": self.session_id,
-            "timestamp": self.timestamp,
-        }
-        return f"data: {json.dumps(event_data)}\n\n"
+        return self.sse_frame().decode()
+
+
+async def coalesce_text_deltas(
+    events: AsyncGenerator[StreamEvent, None],
+    *,
+    interval: float,
+    max_bytes: int,
+) -> AsyncGenerator[StreamEvent, None]:
+    """
+    Merge consecutive text deltas into larger frames.
+
+    Buffered text is flushed `interval` seconds after the first buffered
+    delta or once it reaches `max_bytes`, whichever comes first. Any other
+    event flushes the buffer and is passed on immediately.
+
+    Args:
+        events: Provider stream events
+        interval: Longest time text is held back, in seconds (0 disables)
+        max_bytes: Largest frame size in UTF-8 bytes
+
+    Yields:
+        StreamEvent objects with text deltas merged
+    """
+    if interval <= 0:
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump() -> None:
+        try:
+            async for event in events:
+                queue.put_nowait(event)
+        except Exception as e:
+            queue.put_nowait(e)
+        queue.put_nowait(done)
+
+    parts: List[str] = []
+    size = 0
+    deadline = 0.0
+
+    def flush() -> StreamEvent:
+        nonlocal size
+        text = "".join(parts)
+        parts.clear()
+        size = 0
+        return StreamEvent(type=StreamEventType.TEXT_DELTA, text=text)
+
+    reader = asyncio.create_task(pump())
+    try:
+        while True:
+            if parts and queue.empty():
+                try:
+                    async with asyncio.timeout_at(deadline):
+                        item = await queue.get()
+                except TimeoutError:
+                    yield flush()
+                    continue
+            else:
+                item = await queue.get()
+
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            if item.type == StreamEventType.TEXT_DELTA and item.text:
+                if not parts:
+                    deadline = loop.time() + interval
+                parts.append(item.text)
+                size += len(item.text.encode())
+                if size >= max_bytes:
+                    yield flush()
+                continue
+
+            if parts:
+                yield flush()
+            yield item
+
+        if parts:
+            yield flush()
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await events.aclose()
+
+
+# Request header a client uses to pick the STREAM_CHUNK format
+STREAM_PROTOCOL_HEADER = "X-Stream-Protocol"
+
+# Chunks carry only the new text, a sequence number and periodic checksums
+STREAM_PROTOCOL_DELTA = "delta"
+# Chunks also carry the full text so far (older app builds)
+STREAM_PROTOCOL_ACCUMULATED = "accumulated"
+
+STREAM_PROTOCOLS = (STREAM_PROTOCOL_DELTA, STREAM_PROTOCOL_ACCUMULATED)
+
+
+def negotiate_stream_protocol(requested: Optional[str]) -> str:
+    """
+    Pick the STREAM_CHUNK format for a request.
+
+    Args:
+        requested: Value of the X-Stream-Protocol header, if any
+
+    Returns:
+        The requested protocol if supported, otherwise the configured default
+    """
+    if requested and requested.strip().lower() in STREAM_PROTOCOLS:
+        return requested.strip().lower()
+    if settings.SSE_STREAM_PROTOCOL in STREAM_PROTOCOLS:
+        return settings.SSE_STREAM_PROTOCOL
+    return STREAM_PROTOCOL_DELTA
+
+
+@dataclass
+class TextChunkEncoder:
+    """
+    Builds STREAM_CHUNK payloads for one assistant message.
+
+    In the delta protocol each chunk carries only its text and a sequence
+    number starting at 0 for every assistant message. Every
+    `checkpoint_interval` chunks, and in a closing chunk with empty content,
+    a checkpoint gives the UTF-8 size and CRC-32 of the text so far, so the
+    client can verify its reassembly. The accumulated protocol sends the
+    full text so far with every chunk instead.
+    """
+
+    protocol: str = STREAM_PROTOCOL_DELTA
+    checkpoint_interval: int = 32
+
+    seq: int = field(default=0, init=False)
+    size: int = field(default=0, init=False)
+    crc: int = field(default=0, init=False)
+    _text: str = field(default="", init=False, repr=False)
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Size and checksum of the text sent so far."""
+        return {"bytes": self.size, "crc32": f"{self.crc:08x}"}
+
+    def chunk(self, text: str) -> Dict[str, Any]:
+        """
+        Build the payload for a text delta.
+
+        Args:
+            text: New text
+
+        Returns:
+            STREAM_CHUNK data
+        """
+        if self.protocol == STREAM_PROTOCOL_ACCUMULATED:
+            self._text += text
+            return {"content": text, "accumulated": self._text}
+
+        encoded = text.encode()
+        self.size += len(encoded)
+        self.crc = zlib.crc32(encoded, self.crc)
+        data: Dict[str, Any] = {"content": text, "seq": self.seq}
+        self.seq += 1
+        if self.checkpoint_interval > 0 and self.seq % self.checkpoint_interval == 0:
+            data["checkpoint"] = self.checkpoint()
+        return data
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """
+        Build the closing payload once the message's text is complete.
+
+        Returns:
+            STREAM_CHUNK data with the final checkpoint, or None if nothing
+            was streamed or the protocol has no checkpoints
+        """
+        if self.protocol == STREAM_PROTOCOL_ACCUMULATED or self.seq == 0:
+            return None
+        data = {"content": "", "seq": self.seq, "final": True, "checkpoint": self.checkpoint()}
+        self.seq += 1
+        return data
+
+
+# Marks the assistant message recorded for a cancelled request
+CANCELLED_RESPONSE = "[Response cancelled]"
+
+# Result recorded for tool calls that were cancelled or never ran
+CANCELLED_TOOL_RESULT = "Tool execution cancelled"
+
+
+@dataclass
+class _TurnProgress:
+    """Where the prompt loop is, so a cancelled request can be recorded consistently."""
+
+    phase: str = "idle"  # "streaming", "tools" or "finished"
+    text: str = ""
+    tool_uses: List[ToolUse] = field(default_factory=list)
+    tool_results: List[LLMToolResult] = field(default_factory=list)
+    running_tool_ids: Set[str] = field(default_factory=set)
 
 
 @dataclass
@@ -78,6 +306,33 @@ class StreamingHandler:
     conversation: Conversation
     tool_service: ToolExecutionService
     max_tool_iterations: int = 10
+    max_tool_concurrency: int = field(default_factory=lambda: settings.TOOL_MAX_CONCURRENCY)
+    speculative_tools: bool = field(default_factory=lambda: settings.TOOL_SPECULATIVE_EXECUTION)
+    max_output_tokens: int = field(default_factory=lambda: settings.MAX_OUTPUT_TOKENS)
+    temperature: float = field(default_factory=lambda: settings.LLM_TEMPERATURE)
+    coalesce_interval: float = field(
+        default_factory=lambda: settings.SSE_COALESCE_INTERVAL_MS / 1000
+    )
+    coalesce_max_bytes: int = field(default_factory=lambda: settings.SSE_COALESCE_MAX_BYTES)
+    stream_protocol: str = field(default_factory=lambda: negotiate_stream_protocol(None))
+    checkpoint_interval: int = field(default_factory=lambda: settings.SSE_CHECKPOINT_INTERVAL)
+    context_budgeter: ContextBudgeter = field(default_factory=ContextBudgeter)
+    tool_output_policy: Optional[ToolOutputElisionPolicy] = field(
+        default_factory=get_tool_output_policy
+    )
+    # Priority lane of the LLM calls and tools of this handler's requests
+    lane: Lane = Lane.INTERACTIVE
+
+    # Tokens trimmed from the prompt during the current request
+    _context_tokens_saved: int = field(default=0, init=False)
+    # Stale tool outputs first elided during the current request
+    _tool_output_saved: ElisionStats = field(default_factory=ElisionStats, init=False)
+    # Tool run times during the current request
+    _tool_timing: ToolBatchTiming = field(default_factory=ToolBatchTiming, init=False)
+    # Tool calls started early during the current request
+    _speculation: SpeculationStats = field(default_factory=SpeculationStats, init=False)
+    # Progress of the current request
+    _progress: _TurnProgress = field(default_factory=_TurnProgress, init=False)
 
     async def process_prompt(
         self,
@@ -89,13 +344,41 @@ class StreamingHandler:
         This is the main entry point for handling user input.
         It manages the conversation loop, including tool execution.
 
+        Tool calls that need permission pause the request in place until
+        respond_permission answers them.
+
+        If the request is cancelled (e.g. the client disconnected), the LLM
+        stream and running tools are stopped and the conversation is closed
+        with a cancelled assistant message.
+
         Args:
             prompt: The user's prompt
 
         Yields:
             SSEEvent objects for the frontend
         """
+        self._progress = _TurnProgress()
+        self._bind_work()
+        try:
+            async with aclosing(self._process_prompt(prompt)) as events:
+                async for event in events:
+                    yield event
+        except (asyncio.CancelledError, GeneratorExit):
+            if self._progress.phase != "finished":
+                self._record_cancellation()
+            raise
+        finally:
+            # Write the turn's messages without waiting for the batch to fill
+            conversation_service.end_turn(self.conversation)
+
+    async def _process_prompt(self, prompt: str) -> AsyncGenerator[SSEEvent, None]:
+        """Run the prompt loop for process_prompt."""
         session_id = self.conversation.session_id
+        self._context_tokens_saved = 0
+        self._tool_output_saved = ElisionStats()
+        self._tool_timing = ToolBatchTiming()
+        self._speculation = SpeculationStats()
+        progress = self._progress
 
         # Add user message
         self.conversation.add_user_message(prompt)
@@ -117,6 +400,10 @@ class StreamingHandler:
             # Stream LLM response
             accumulated_text = ""
             tool_uses: List[ToolUse] = []
+            chunks = self._chunk_encoder()
+            speculation = self._speculative_calls()
+            progress.phase = "streaming"
+            progress.text = ""
 
             yield SSEEvent(
                 type=SSEEventType.STATUS,
@@ -125,95 +412,107 @@ class StreamingHandler:
             )
 
             try:
-                async for event in self._stream_llm_response():
-                    if event.type == StreamEventType.TEXT_DELTA and event.text:
-                        accumulated_text += event.text
-                        yield SSEEvent(
-                            type=SSEEventType.STREAM_CHUNK,
-                            session_id=session_id,
-                            data={
-                                "content": event.text,
-                                "accumulated": accumulated_text,
-                            },
-                        )
-
-                    elif event.type == StreamEventType.TOOL_USE_START:
-                        yield SSEEvent(
-                            type=SSEEventType.TOOL_CALL,
-                            session_id=session_id,
-                            data={
-                                "status": "started",
-                                "tool_id": event.tool_use_id,
-                                "tool_name": event.tool_name,
-                            },
-                        )
-
-                    elif event.type == StreamEventType.TOOL_USE_END and event.tool_use:
-                        tool_uses.append(event.tool_use)
-                        yield SSEEvent(
-                            type=SSEEventType.TOOL_CALL,
-                            session_id=session_id,
-                            data={
-                                "status": "complete",
-                                "tool_id": event.tool_use.id,
-                                "tool_name": event.tool_use.name,
-                                "arguments": event.tool_use.arguments,
-                            },
-                        )
-
-                    elif event.type == StreamEventType.ERROR:
-                        yield SSEEvent(
-                            type=SSEEventType.ERROR,
-                            session_id=session_id,
-                            data={"error": event.error},
-                        )
-                        return
-
-                    elif event.type == StreamEventType.MESSAGE_END:
-                        if event.usage:
-                            self.conversation.update_token_usage(
-                                input_tokens=event.usage.get("input_tokens", 0),
-                                output_tokens=event.usage.get("output_tokens", 0),
+                async with aclosing(self._stream_frames()) as frames:
+                    async for event in frames:
+                        if event.type == StreamEventType.TEXT_DELTA and event.text:
+                            accumulated_text += event.text
+                            progress.text = accumulated_text
+                            yield SSEEvent(
+                                type=SSEEventType.STREAM_CHUNK,
+                                session_id=session_id,
+                                data=chunks.chunk(event.text),
+                            )
+
+                        elif event.type == StreamEventType.TOOL_USE_START:
+                            yield SSEEvent(
+                                type=SSEEventType.TOOL_CALL,
+                                session_id=session_id,
+                                data={
+                                    "status": "started",
+                                    "tool_id": event.tool_use_id,
+                                    "tool_name": event.tool_name,
+                                },
+                            )
+
+                        elif event.type == StreamEventType.TOOL_USE_DELTA and event.partial_input:
+                            # Arguments such as file_path are usable before the call completes
+                            yield SSEEvent(
+                                type=SSEEventType.TOOL_CALL,
+                                session_id=session_id,
+                                data={
+                                    "status": "input",
+                                    "tool_id": event.tool_use_id,
+                                    "arguments": event.partial_input,
+                                },
+                            )
+
+                        elif event.type == StreamEventType.TOOL_USE_END and event.tool_use:
+                            tool_uses.append(event.tool_use)
+                            speculation.offer(event.tool_use)
+                            yield SSEEvent(
+                                type=SSEEventType.TOOL_CALL,
+                                session_id=session_id,
+                                data={
+                                    "status": "complete",
+                                    "tool_id": event.tool_use.id,
+                                    "tool_name": event.tool_use.name,
+                                    "arguments": event.tool_use.arguments,
+                                },
+                            )
+
+                        elif event.type == StreamEventType.ERROR:
+                            progress.phase = "finished"
+                            yield SSEEvent(
+                                type=SSEEventType.ERROR,
+                                session_id=session_id,
+                                data={"error": event.error},
                             )
+                            return
 
+                        elif event.type == StreamEventType.MESSAGE_END:
+                            self._record_usage(event)
+
+                started, turn_speculation = speculation.finish()
             except Exception as e:
                 logger.error(f"Streaming error: {e}")
+                progress.phase = "finished"
                 yield SSEEvent(
                     type=SSEEventType.ERROR,
                     session_id=session_id,
                     data={"error": str(e)},
                 )
                 return
+            finally:
+                # Early results of a message that did not end are not used
+                self._discard_speculation(speculation)
+
+            final_chunk = chunks.finish()
+            if final_chunk:
+                yield SSEEvent(
+                    type=SSEEventType.STREAM_CHUNK,
+                    session_id=session_id,
+                    data=final_chunk,
+                )
 
             # Add assistant message
             self.conversation.add_assistant_message(
                 content=accumulated_text,
                 tool_uses=tool_uses if tool_uses else None,
             )
+            progress.phase = "tools" if tool_uses else "idle"
+            progress.tool_uses = tool_uses
+            progress.tool_results = []
 
             # If there are tool uses, execute them
             if tool_uses:
-                yield SSEEvent(
-                    type=SSEEventType.STATUS,
-                    session_id=session_id,
-                    data={"status": "executing_tools"},
-                )
+                yield self._executing_tools_event(session_id, turn_speculation)
 
-                tool_results = await self._execute_tools(tool_uses, session_id)
-
-                # Check for permission requests
-                has_pending = bool(self.tool_service.get_pending_permissions())
-                if has_pending:
-                    # Wait for permission approval (handled externally)
-                    yield SSEEvent(
-                        type=SSEEventType.STATUS,
-                        session_id=session_id,
-                        data={
-                            "status": "waiting_permission",
-                            "pending_count": len(self.tool_service.get_pending_permissions()),
-                        },
-                    )
-                    return  # Exit and wait for permission response
+                # Calls that need permission wait in place for the response
+                batch = asyncio.create_task(self._execute_tools(tool_uses, session_id, started))
+                async with aclosing(self._permission_events(batch, session_id)) as events:
+                    async for event in events:
+                        yield event
+                tool_results = batch.result()
 
                 # Send tool results
                 for result in tool_results:
@@ -229,6 +528,7 @@ class StreamingHandler:
 
                 # Add tool results to conversation
                 self.conversation.add_tool_results(tool_results)
+                progress.phase = "idle"
 
                 # Continue the loop to get next response
                 continue
@@ -246,184 +546,315 @@ class StreamingHandler:
             },
         )
 
-        yield SSEEvent(
-            type=SSEEventType.COMPLETE,
-            session_id=session_id,
-            data={
-                "total_input_tokens": self.conversation.total_input_tokens,
-                "total_output_tokens": self.conversation.total_output_tokens,
-            },
+        progress.phase = "finished"
+
+        # Summarize older turns in the background before the next prompt
+        conversation_service.schedule_compaction(self.conversation, self.provider)
+
+        yield self._complete_event(session_id)
+
+    def _bind_work(self) -> None:
+        """Schedule this request's LLM calls and tools as the session's work."""
+        bind_work(
+            flow_key(self.conversation.session_id, self.tool_service.workspace_path),
+            self.lane,
+        )
+
+    def _speculative_calls(self) -> SpeculativeToolCalls:
+        """Create the early tool calls of one LLM message."""
+        return SpeculativeToolCalls(
+            self.tool_service.execute_tool,
+            self.tool_service.get_tool_context(),
+            max_calls=self.max_tool_concurrency if self.speculative_tools else 0,
+        )
+
+    def _discard_speculation(self, speculation: SpeculativeToolCalls) -> None:
+        """Cancel early tool calls that will not be used."""
+        discarded = speculation.discard()
+        self._speculation.discarded += discarded
+        speculation_metrics.discarded += discarded
+
+    def _executing_tools_event(self, session_id: str, speculation: SpeculationStats) -> SSEEvent:
+        """Build the executing_tools status, with the latency saved by early calls."""
+        self._speculation.add(speculation)
+        speculation_metrics.add(speculation)
+        data: Dict[str, Any] = {"status": "executing_tools"}
+        if speculation.calls:
+            data["speculative_calls"] = speculation.calls
+            data["latency_saved_ms"] = round(speculation.saved_seconds * 1000, 1)
+        return SSEEvent(type=SSEEventType.STATUS, session_id=session_id, data=data)
+
+    def _record_cancellation(self) -> None:
+        """
+        Close the conversation after a cancelled request.
+
+        Unanswered tool calls get a cancelled result so every tool_use keeps
+        its tool_result, and a cancelled assistant message (with any partial
+        text) ends the turn.
+        """
+        progress = self._progress
+        text = ""
+
+        # Cancelled while the final reply, already recorded, was being sent
+        last = self.conversation.messages[-1] if self.conversation.messages else None
+        if (
+            progress.phase == "idle"
+            and last is not None
+            and last.role == MessageRole.ASSISTANT
+            and not last.tool_uses
+        ):
+            progress.phase = "finished"
+            return
+
+        if progress.phase == "streaming":
+            text = progress.text
+            cancellation_metrics.record_stream_cancelled(
+                self.context_budgeter.counter.count_text(text)
+            )
+        elif progress.phase == "tools":
+            answered = {r.tool_use_id: r for r in progress.tool_results}
+            results = []
+            for tu in progress.tool_uses:
+                if tu.id in answered:
+                    results.append(answered[tu.id])
+                    continue
+                if tu.id not in progress.running_tool_ids:
+                    cancellation_metrics.record_tool_cancelled(tu.name, 0.0)
+                results.append(LLMToolResult(
+                    tool_use_id=tu.id,
+                    content=CANCELLED_TOOL_RESULT,
+                    is_error=True,
+                ))
+            self.conversation.add_tool_results(results)
+
+        message = self.conversation.add_assistant_message(
+            content=f"{text}\n\n{CANCELLED_RESPONSE}" if text else CANCELLED_RESPONSE,
+        )
+        message.metadata["status"] = "cancelled"
+        progress.phase = "finished"
+        cancellation_metrics.cancelled_requests += 1
+        logger.info(f"Request cancelled for session {self.conversation.session_id}")
+
+    def _record_usage(self, event: StreamEvent) -> None:
+        """Add the token usage reported at the end of a message to the totals."""
+        if not event.usage:
+            return
+        cancellation_metrics.record_response(event.usage.get("output_tokens", 0))
+        self.conversation.update_token_usage(
+            input_tokens=event.usage.get("input_tokens", 0),
+            output_tokens=event.usage.get("output_tokens", 0),
+            cache_read_tokens=event.usage.get("cache_read_input_tokens", 0),
+            cache_creation_tokens=event.usage.get("cache_creation_input_tokens", 0),
+        )
+
+    def _build_context(self, tools: List[ToolDefinition]) -> ContextWindow:
+        """Select the conversation history that fits the model's context window."""
+        counter = self.context_budgeter.counter
+        budget = ContextBudget.for_model(
+            self.provider.get_model_info(self.conversation.model),
+            max_output_tokens=self.max_output_tokens,
+            reserved_tokens=(
+                counter.count_text(self.conversation.system_prompt)
+                + counter.count_tools(tools)
+            ),
+            safety_margin=settings.CONTEXT_SAFETY_MARGIN_TOKENS,
+        )
+
+        messages = self.conversation.messages
+        if self.tool_output_policy is not None:
+            messages, elided = self.tool_output_policy.apply(messages)
+            self._tool_output_saved.add(elided)
+            self.conversation.total_tool_output_bytes_saved += elided.bytes_saved
+            self.conversation.total_tool_output_tokens_saved += elided.tokens_saved
+
+        return self.context_budgeter.fit(messages, budget)
+
+    def _chunk_encoder(self) -> TextChunkEncoder:
+        """Create the STREAM_CHUNK encoder for one assistant message."""
+        return TextChunkEncoder(
+            protocol=self.stream_protocol,
+            checkpoint_interval=self.checkpoint_interval,
+        )
+
+    def _stream_frames(self) -> AsyncGenerator[StreamEvent, None]:
+        """Stream a response from the LLM with text deltas coalesced into frames."""
+        return coalesce_text_deltas(
+            self._stream_llm_response(),
+            interval=self.coalesce_interval,
+            max_bytes=self.coalesce_max_bytes,
         )
 
     async def _stream_llm_response(self) -> AsyncGenerator[StreamEvent, None]:
         """Stream a response from the LLM."""
-        messages = self.conversation.get_llm_messages()
         tools = self.tool_service.get_available_tools()
+        context = self._build_context(tools)
+        if context.saved_tokens:
+            logger.info(
+                f"Trimmed {context.saved_tokens} tokens from context "
+                f"({context.dropped_messages} messages dropped, "
+                f"{context.elided_results} tool results elided)"
+            )
+        self._context_tokens_saved += context.saved_tokens
 
         async for event in self.provider.stream_complete(
-            messages=messages,
+            messages=context.to_llm_messages(),
             model=self.conversation.model,
             tools=tools,
+            max_tokens=self.max_output_tokens,
+            temperature=self.temperature,
             system_prompt=self.conversation.system_prompt,
         ):
             yield event
 
+    def _complete_event(self, session_id: str) -> SSEEvent:
+        """Build the COMPLETE event that ends a request."""
+        return SSEEvent(
+            type=SSEEventType.COMPLETE,
+            session_id=session_id,
+            data={
+                "total_input_tokens": self.conversation.total_input_tokens,
+                "total_output_tokens": self.conversation.total_output_tokens,
+                "total_cache_read_tokens": self.conversation.total_cache_read_tokens,
+                "total_cache_creation_tokens": self.conversation.total_cache_creation_tokens,
+                "context_tokens_saved": self._context_tokens_saved,
+                "tool_output_bytes_saved": self._tool_output_saved.bytes_saved,
+                "tool_output_tokens_saved": self._tool_output_saved.tokens_saved,
+                "total_tool_output_bytes_saved": self.conversation.total_tool_output_bytes_saved,
+                "total_tool_output_tokens_saved": self.conversation.total_tool_output_tokens_saved,
+                **self._tool_timing.to_dict(),
+                **self._speculation.to_dict(),
+            },
+        )
+
     async def _execute_tools(
         self,
         tool_uses: List[ToolUse],
         session_id: str,
+        started: Optional[Dict[str, asyncio.Task]] = None,
     ) -> List[LLMToolResult]:
-        """Execute tool uses and return results."""
-        results = []
-
-        for tool_use in tool_uses:
-            result = await self.tool_service.execute_tool(tool_use)
-            results.append(result)
+        """
+        Execute tool uses and return their results in order.
 
+        Calls that cannot conflict run concurrently (see tool_scheduler).
+        Calls in `started` are already running and are only awaited.
+        """
+        progress = self._progress
+
+        def on_start(tool_use: ToolUse) -> None:
+            progress.running_tool_ids.add(tool_use.id)
+
+        def finished(tool_use: ToolUse, result: LLMToolResult) -> None:
+            progress.running_tool_ids.discard(tool_use.id)
+            progress.tool_results.append(result)
+
+        results, timing = await run_tool_calls(
+            tool_uses,
+            self.tool_service.execute_tool,
+            self.tool_service.get_tool_context(),
+            max_concurrency=self.max_tool_concurrency,
+            on_start=on_start,
+            on_result=finished,
+            started=started,
+        )
+        self._tool_timing.add(timing)
+        tool_scheduler_metrics.record(timing)
         return results
 
-    async def continue_after_permission(
+    def respond_permission(
         self,
         permission_id: str,
         approved: bool,
         always: bool = False,
-    ) -> AsyncGenerator[SSEEvent, None]:
+    ) -> bool:
         """
-        Continue processing after a permission response.
+        Answer a permission request the current request is waiting for.
+
+        The tool call waiting for it runs (or gets a denied result) and the
+        request resumes where it stopped.
 
         Args:
             permission_id: The permission request ID
             approved: Whether permission was granted
             always: If approved, whether to always approve this tool
 
-        Yields:
-            SSEEvent objects
+        Returns:
+            True if the request was pending
         """
-        session_id = self.conversation.session_id
+        return self.tool_service.respond_permission(permission_id, approved, always)
 
-        # Process permission response
-        self.tool_service.respond_permission(permission_id, approved, always)
-
-        if not approved:
-            # Permission denied, add error result
-            pending = self.tool_service.get_pending_permissions()
-            for p in pending:
-                if p.id == permission_id:
-                    # Create error result
-                    result = LLMToolResult(
-                        tool_use_id=p.id,
-                        content="Permission denied by user",
-                        is_error=True,
-                    )
-                    self.conversation.add_tool_results([result])
+    async def _permission_events(
+        self,
+        batch: asyncio.Task,
+        session_id: str,
+    ) -> AsyncGenerator[SSEEvent, None]:
+        """
+        Report the permission requests of a running tool batch until it ends.
 
+        Calls that need permission wait in place for the response, so the
+        batch only pauses: nothing runs while the request is idle but the
+        suspended tasks. Closing the generator cancels the batch.
+        """
+        requests: asyncio.Queue = asyncio.Queue()
+        previous = self.tool_service.on_permission_request
+
+        def on_request(permission: PendingPermission) -> None:
+            if previous:
+                previous(permission)
+            requests.put_nowait(permission)
+
+        self.tool_service.on_permission_request = on_request
+        waiting: Dict[asyncio.Future, PendingPermission] = {}
+        next_request = asyncio.ensure_future(requests.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {batch, next_request, *waiting},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                changed = False
+                if next_request in done:
+                    permission = next_request.result()
+                    next_request = asyncio.ensure_future(requests.get())
+                    waiting[permission.future] = permission
+                    changed = True
                     yield SSEEvent(
-                        type=SSEEventType.TOOL_RESULT,
+                        type=SSEEventType.PERMISSION_REQUEST,
                         session_id=session_id,
                         data={
-                            "tool_use_id": p.id,
-                            "content": "Permission denied",
-                            "is_error": True,
+                            "permission_id": permission.id,
+                            "tool_use_id": permission.tool_use_id,
+                            "tool_name": permission.tool_name,
+                            "description": permission.description,
+                            "arguments": permission.arguments,
                         },
                     )
-                    break
-
-            yield SSEEvent(
-                type=SSEEventType.STATUS,
-                session_id=session_id,
-                data={"status": "permission_denied"},
-            )
-            return
-
-        # Permission approved, re-execute pending tool uses
-        pending_tool_uses = self.conversation.get_pending_tool_uses()
-        if pending_tool_uses:
-            tool_results = await self.tool_service.execute_tools(
-                pending_tool_uses,
-                parallel=True,
-            )
-
-            # Send tool results
-            for result in tool_results:
-                yield SSEEvent(
-                    type=SSEEventType.TOOL_RESULT,
-                    session_id=session_id,
-                    data={
-                        "tool_use_id": result.tool_use_id,
-                        "content": result.content[:1000],
-                        "is_error": result.is_error,
-                    },
-                )
-
-            # Add to conversation
-            self.conversation.add_tool_results(tool_results)
-
-            # Continue processing
-            async for event in self._continue_conversation():
-                yield event
-
-    async def _continue_conversation(self) -> AsyncGenerator[SSEEvent, None]:
-        """Continue the conversation after tool execution."""
-        # This essentially re-runs the main loop
-        # In practice, you'd call process_prompt without a new user message
-        session_id = self.conversation.session_id
-
-        accumulated_text = ""
-        tool_uses: List[ToolUse] = []
-
-        yield SSEEvent(
-            type=SSEEventType.STATUS,
-            session_id=session_id,
-            data={"status": "thinking"},
-        )
-
-        async for event in self._stream_llm_response():
-            if event.type == StreamEventType.TEXT_DELTA and event.text:
-                accumulated_text += event.text
-                yield SSEEvent(
-                    type=SSEEventType.STREAM_CHUNK,
-                    session_id=session_id,
-                    data={
-                        "content": event.text,
-                        "accumulated": accumulated_text,
-                    },
-                )
-
-            elif event.type == StreamEventType.TOOL_USE_END and event.tool_use:
-                tool_uses.append(event.tool_use)
-
-        # Add assistant message
-        self.conversation.add_assistant_message(
-            content=accumulated_text,
-            tool_uses=tool_uses if tool_uses else None,
-        )
-
-        if tool_uses:
-            # More tools to execute
-            tool_results = await self.tool_service.execute_tools(tool_uses)
-            self.conversation.add_tool_results(tool_results)
-
-            # Continue recursively
-            async for event in self._continue_conversation():
-                yield event
-        else:
-            yield SSEEvent(
-                type=SSEEventType.MESSAGE,
-                session_id=session_id,
-                data={
-                    "role": "assistant",
-                    "content": accumulated_text,
-                },
-            )
-
-            yield SSEEvent(
-                type=SSEEventType.COMPLETE,
-                session_id=session_id,
-                data={
-                    "total_input_tokens": self.conversation.total_input_tokens,
-                    "total_output_tokens": self.conversation.total_output_tokens,
-                },
-            )
+                for future in [f for f in done if f in waiting]:
+                    permission = waiting.pop(future)
+                    approved = not future.cancelled() and future.result()
+                    changed = True
+                    yield SSEEvent(
+                        type=SSEEventType.STATUS,
+                        session_id=session_id,
+                        data={
+                            "status": "permission_granted" if approved else "permission_denied",
+                            "permission_id": permission.id,
+                            "tool_use_id": permission.tool_use_id,
+                        },
+                    )
+                if batch in done:
+                    return
+                if changed and waiting:
+                    yield SSEEvent(
+                        type=SSEEventType.STATUS,
+                        session_id=session_id,
+                        data={"status": "waiting_permission", "pending_count": len(waiting)},
+                    )
+        finally:
+            next_request.cancel()
+            self.tool_service.on_permission_request = previous
+            if not batch.done():
+                batch.cancel()
+                await asyncio.gather(batch, return_exceptions=True)
 
 
 def create_streaming_handler(
@@ -433,33 +864,55 @@ def create_streaming_handler(
     provider_name: Optional[str] = None,
     model: Optional[str] = None,
     system_prompt: Optional[str] = None,
+    stream_protocol: Optional[str] = None,
 ) -> StreamingHandler:
     """
     Create a streaming handler for a session.
 
+    When no provider is given and LLM_ROUTES is configured, requests are
+    routed over the configured equivalent models. An explicit model pins
+    the request to that model's route instead.
+
     Args:
         session_id: Session identifier
         workspace_path: Workspace path for tool execution
         provider_name: LLM provider name (default from settings)
         model: Model to use (default from settings)
         system_prompt: Optional system prompt
+        stream_protocol: STREAM_CHUNK format requested by the client
 
     Returns:
         Configured StreamingHandler
     """
-    from app.services.conversation_service import conversation_service
-
-    # Get settings
-    provider_name = provider_name or ConfigService.get_default_provider()
-    model = model or ConfigService.get_default_model()
-
-    # Get API key
-    api_key = ConfigService.get_api_key(provider_name)
-    if not api_key:
-        raise ValueError(f"No API key configured for provider: {provider_name}")
-
-    # Create provider
-    provider = get_provider(provider_name, api_key)
+    provider: Optional[LLMProvider] = None
+    if provider_name is None and settings.LLM_ROUTES:
+        # Route over equivalent models
+        routed = get_routed_provider(
+            settings.LLM_ROUTES,
+            hedge_delay=settings.LLM_HEDGE_DELAY or None,
+            max_error_rate=settings.LLM_ROUTE_MAX_ERROR_RATE,
+        )
+        if model is None:
+            provider = routed
+            provider_name = routed.provider_name
+            model = routed.targets[0].model
+        elif (target := routed.target_for(model)) is not None:
+            # The caller asked for one model: use its route only
+            provider = target.provider
+            provider_name = target.provider_name
+
+    if provider is None:
+        # Get settings
+        provider_name = provider_name or ConfigService.get_default_provider()
+        model = model or ConfigService.get_default_model()
+
+        # Get API key
+        api_key = ConfigService.get_api_key(provider_name)
+        if not api_key:
+            raise ValueError(f"No API key configured for provider: {provider_name}")
+
+        # Create provider
+        provider = get_provider(provider_name, api_key)
 
     # Get or create conversation
     conversation = conversation_service.get_or_create_conversation(
@@ -479,4 +932,5 @@ def create_streaming_handler(
         provider=provider,
         conversation=conversation,
         tool_service=tool_service,
+        stream_protocol=negotiate_stream_protocol(stream_protocol),
     )
@@ -3,10 +3,15 @@ Tool Execution Service.
 
 This module handles the execution of tools requested by the LLM,
 including permission management and result formatting.
+
+A tool call that needs permission waits in place for the response: the
+call awaits its request's future, so the rest of the request resumes exactly
+where it stopped once the permission is answered.
 """
 
 import asyncio
 import logging
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
@@ -16,15 +21,28 @@ from uuid import uuid4
 from app.tools import (
     Tool,
     ToolContext,
+    ToolResource,
     ToolResult,
     get_tool,
-    get_all_tools,
+    get_tool_definitions,
     initialize_tools,
 )
+from app.services.cancellation import cancellation_metrics
 from app.services.llm.base import ToolDefinition, ToolUse, ToolResult as LLMToolResult
+from app.services.tool_scheduler import run_tool_calls
+from app.services.work_scheduler import WorkPool, work_scheduler
 
 logger = logging.getLogger(__name__)
 
+# Result of a tool call whose permission request was denied
+PERMISSION_DENIED_RESULT = "Permission denied by user"
+
+# Work scheduler pool of each tool resource; light tools are not bounded
+RESOURCE_POOLS: Dict[ToolResource, WorkPool] = {
+    ToolResource.CPU: WorkPool.CPU,
+    ToolResource.SUBPROCESS: WorkPool.SUBPROCESS,
+}
+
 
 @dataclass
 class PendingPermission:
@@ -37,6 +55,9 @@ class PendingPermission:
     description: str
     created_at: datetime
     callback: Optional[Callable[[], None]] = None
+    tool_use_id: Optional[str] = None
+    # Resolved with True (approved) or False (denied) by respond_permission
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
 
 
 @dataclass
@@ -81,18 +102,13 @@ class ToolExecutionService:
         """
         Get all available tools as LLM tool definitions.
 
+        Definitions come from the registry cache and are only rebuilt when
+        the set of registered tools changes.
+
         Returns:
             List of ToolDefinition for LLM API
         """
-        tools = get_all_tools()
-        return [
-            ToolDefinition(
-                name=t.name,
-                description=t.description,
-                input_schema=t.input_schema,
-            )
-            for t in tools
-        ]
+        return list(get_tool_definitions())
 
     def _needs_permission(self, tool: Tool, arguments: Dict[str, Any]) -> bool:
         """
@@ -122,6 +138,7 @@ class ToolExecutionService:
         self,
         tool: Tool,
         arguments: Dict[str, Any],
+        tool_use_id: Optional[str] = None,
     ) -> PendingPermission:
         """
         Create a permission request for a tool execution.
@@ -129,6 +146,7 @@ class ToolExecutionService:
         Args:
             tool: The tool requesting permission
             arguments: The arguments for the tool
+            tool_use_id: ID of the tool call waiting for the response
 
         Returns:
             PendingPermission object
@@ -148,6 +166,8 @@ class ToolExecutionService:
             arguments=arguments,
             description=desc,
             created_at=datetime.utcnow(),
+            tool_use_id=tool_use_id,
+            future=asyncio.get_running_loop().create_future(),
         )
 
         self._pending_permissions[permission.id] = permission
@@ -179,6 +199,7 @@ class ToolExecutionService:
             return False
 
         permission = self._pending_permissions.pop(permission_id)
+        resolved = [permission]
 
         if approved:
             if always:
@@ -186,12 +207,39 @@ class ToolExecutionService:
             else:
                 self._approved_tools.add(permission.tool_name)
 
+            # The approval covers other calls of the tool waiting for a response
+            for other in list(self._pending_permissions.values()):
+                if other.tool_name == permission.tool_name:
+                    resolved.append(self._pending_permissions.pop(other.id))
+
             # Execute callback if set
             if permission.callback:
                 permission.callback()
 
+        for request in resolved:
+            if request.future is not None and not request.future.done():
+                request.future.set_result(approved)
+
         return True
 
+    async def wait_for_permission(self, permission: PendingPermission) -> bool:
+        """
+        Wait for the response to a permission request.
+
+        The request is withdrawn if the wait is cancelled.
+
+        Args:
+            permission: Request from request_permission
+
+        Returns:
+            True if the request was approved
+        """
+        try:
+            return await permission.future
+        except asyncio.CancelledError:
+            self._pending_permissions.pop(permission.id, None)
+            raise
+
     def get_pending_permissions(self) -> List[PendingPermission]:
         """Get all pending permission requests."""
         return list(self._pending_permissions.values())
@@ -230,26 +278,37 @@ class ToolExecutionService:
                 is_error=True,
             )
 
-        # Check permission
+        # Check permission, waiting here for the response
         if not skip_permission and self._needs_permission(tool, tool_use.arguments):
-            permission = await self.request_permission(tool, tool_use.arguments)
-            return LLMToolResult(
-                tool_use_id=tool_use.id,
-                content=f"Permission required for {tool.name}. Request ID: {permission.id}",
-                is_error=True,
-            )
+            permission = await self.request_permission(tool, tool_use.arguments, tool_use.id)
+            if not await self.wait_for_permission(permission):
+                return LLMToolResult(
+                    tool_use_id=tool_use.id,
+                    content=PERMISSION_DENIED_RESULT,
+                    is_error=True,
+                )
 
         # Notify tool start
         if self.on_tool_start:
             self.on_tool_start(tool_use.name, tool_use.arguments)
 
         # Execute tool
+        start = time.monotonic()
         try:
             context = self.get_tool_context()
-            result = await tool.execute(tool_use.arguments, context)
+            pool = RESOURCE_POOLS.get(tool.resource)
+            if pool is None:
+                result = await tool.execute(tool_use.arguments, context)
+            else:
+                async with work_scheduler.slot(pool):
+                    result = await tool.execute(tool_use.arguments, context)
+        except asyncio.CancelledError:
+            cancellation_metrics.record_tool_cancelled(tool.name, time.monotonic() - start)
+            raise
         except Exception as e:
             logger.error(f"Tool execution error: {e}")
             result = ToolResult.error_result(f"Execution error: {str(e)}")
+        cancellation_metrics.record_tool(tool.name, time.monotonic() - start)
 
         # Notify tool complete
         if self.on_tool_complete:
@@ -280,14 +339,16 @@ class ToolExecutionService:
 
         Args:
             tool_uses: List of tool use requests
-            parallel: Execute in parallel if possible
+            parallel: Execute calls that do not conflict concurrently
 
         Returns:
-            List of LLMToolResult
+            List of LLMToolResult, in the order of the tool uses
         """
         if parallel:
-            tasks = [self.execute_tool(tu) for tu in tool_uses]
-            return await asyncio.gather(*tasks)
+            results, _ = await run_tool_calls(
+                tool_uses, self.execute_tool, self.get_tool_context()
+            )
+            return results
         else:
             results = []
             for tu in tool_uses:
@@ -0,0 +1,298 @@
+"""
+Tool Output Store.
+
+This module keeps large tool outputs out of the LLM context once they are
+stale. Outputs of tools such as read_file, bash and web_fetch are written to
+a local content-addressed blob store, and after a number of turns the LLM
+sees a short stub with a retrieval handle instead of the full text. The
+conversation itself keeps the full output for the messages and export APIs.
+"""
+
+import hashlib
+import logging
+import re
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.context_budget import TokenCounter, split_turns, token_counter
+from app.services.conversation_service import ConversationMessage
+from app.services.llm.base import MessageRole, ToolResult as LLMToolResult
+
+logger = logging.getLogger(__name__)
+
+# Stub sent instead of a stale tool output
+STALE_TOOL_OUTPUT = (
+    "[Output of {tool} from an earlier turn elided ({chars} characters, ~{tokens} tokens). "
+    "Use read_tool_output with handle \"{handle}\" if it is needed again.]"
+)
+
+# Handles are hex SHA-256 prefixes
+_HANDLE_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ToolOutputStore:
+    """
+    Content-addressed store for tool outputs.
+
+    Outputs are saved as text files named by the hash of their content, so
+    storing the same output twice is free.
+    """
+
+    def __init__(self, root: Path):
+        """
+        Initialize the store.
+
+        Args:
+            root: Directory holding the blobs
+        """
+        self.root = root
+
+    def _path(self, handle: str) -> Path:
+        return self.root / handle[:2] / f"{handle}.txt"
+
+    def put(self, content: str) -> str:
+        """
+        Store an output.
+
+        Args:
+            content: Tool output
+
+        Returns:
+            Retrieval handle
+        """
+        handle = hashlib.sha256(content.encode()).hexdigest()[:32]
+        path = self._path(handle)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(content, encoding="utf-8")
+            tmp.replace(path)
+        return handle
+
+    def get(self, handle: str) -> Optional[str]:
+        """
+        Load an output.
+
+        Args:
+            handle: Retrieval handle
+
+        Returns:
+            The output, or None if the handle is unknown
+        """
+        if not _HANDLE_PATTERN.match(handle):
+            return None
+        path = self._path(handle)
+        if not path.exists():
+            return None
+        return path.read_text(encoding="utf-8")
+
+
+@dataclass
+class ElisionStats:
+    """Size of the tool outputs elided from one LLM request."""
+
+    results: int = 0
+    bytes_saved: int = 0
+    tokens_saved: int = 0
+
+    def add(self, other: "ElisionStats") -> None:
+        """Add another request's savings."""
+        self.results += other.results
+        self.bytes_saved += other.bytes_saved
+        self.tokens_saved += other.tokens_saved
+
+    def to_dict(self) -> Dict[str, int]:
+        """Convert to dictionary."""
+        return {
+            "results": self.results,
+            "bytes_saved": self.bytes_saved,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+@dataclass
+class ElidedView:
+    """LLM view of a message whose stale tool outputs were replaced by stubs."""
+
+    message: ConversationMessage
+    stats: ElisionStats
+
+
+class ToolOutputElisionPolicy:
+    """
+    Replaces stale, large tool outputs with stubs in the LLM view.
+
+    A tool result is stale once `after_turns` newer user prompts follow it.
+    Stale turns are elided in groups of `after_turns`, so the history sent to
+    the provider only changes every `after_turns` prompts and its cached
+    prefix stays valid in between; once elided, a message is always sent
+    with the same stub. Only results of the configured tools at or above
+    `min_chars` are elided; error results are always kept.
+    """
+
+    def __init__(
+        self,
+        store: ToolOutputStore,
+        *,
+        after_turns: int = 3,
+        min_chars: int = 2000,
+        tools: Iterable[str] = ("read_file", "bash", "web_fetch", "read_tool_output"),
+        counter: Optional[TokenCounter] = None,
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            store: Blob store for full outputs
+            after_turns: Turns after which an output is stale
+            min_chars: Smallest output worth eliding
+            tools: Names of tools whose outputs may be elided
+            counter: Token counter to use (defaults to the shared counter)
+        """
+        self.store = store
+        self.after_turns = max(1, after_turns)
+        self.min_chars = min_chars
+        self.tools = frozenset(tools)
+        self.counter = counter or token_counter
+
+    @classmethod
+    def from_settings(cls) -> "ToolOutputElisionPolicy":
+        """Create a policy from application settings."""
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        return cls(
+            get_tool_output_store(),
+            after_turns=settings.TOOL_OUTPUT_ELIDE_AFTER_TURNS,
+            min_chars=settings.TOOL_OUTPUT_ELIDE_MIN_CHARS,
+            tools=[t.strip() for t in settings.TOOL_OUTPUT_ELIDE_TOOLS.split(",") if t.strip()],
+        )
+
+    def _build_view(
+        self,
+        message: ConversationMessage,
+        tool_names: Dict[str, str],
+    ) -> ElidedView:
+        """
+        Store eligible outputs of a message and build its stubbed view.
+
+        Outputs whose handle is already recorded on the message (elided
+        before a restart) are not counted again.
+        """
+        stats = ElisionStats()
+        known = message.metadata.get("tool_output_handles", {})
+        handles: Dict[str, str] = {}
+        results: List[LLMToolResult] = []
+        elided = False
+
+        for tr in message.tool_results:
+            tool = tool_names.get(tr.tool_use_id)
+            if tr.is_error or tool not in self.tools or len(tr.content) < self.min_chars:
+                results.append(tr)
+                continue
+            try:
+                handle = self.store.put(tr.content)
+            except OSError as e:
+                logger.warning(f"Could not store output of {tool}: {e}")
+                results.append(tr)
+                continue
+
+            tokens = self.counter.count_text(tr.content)
+            stub = STALE_TOOL_OUTPUT.format(
+                tool=tool, chars=len(tr.content), tokens=tokens, handle=handle
+            )
+            results.append(replace(tr, content=stub))
+            elided = True
+            if known.get(tr.tool_use_id) == handle:
+                continue
+            handles[tr.tool_use_id] = handle
+            stats.results += 1
+            stats.bytes_saved += len(tr.content.encode()) - len(stub.encode())
+            stats.tokens_saved += tokens - self.counter.count_text(stub)
+
+        if not elided:
+            return ElidedView(message=message, stats=stats)
+
+        # Record the handles on the original, which keeps the full output
+        if handles:
+            message.metadata.setdefault("tool_output_handles", {}).update(handles)
+        return ElidedView(message=replace(message, tool_results=results), stats=stats)
+
+    def apply(
+        self,
+        messages: List[ConversationMessage],
+    ) -> Tuple[List[ConversationMessage], ElisionStats]:
+        """
+        Build the LLM view of a conversation history.
+
+        Views are cached on the messages, so stale outputs are only stored
+        and counted once and their provider payloads stay memoized.
+
+        Args:
+            messages: Full conversation history
+
+        Returns:
+            Messages to send and the size of the outputs elided for the
+            first time by this call
+        """
+        total = ElisionStats()
+        turns = split_turns(messages)
+        stale = len(turns) - self.after_turns
+        stale -= stale % self.after_turns
+        if stale <= 0:
+            return list(messages), total
+
+        tool_names: Dict[str, str] = {}
+        view: List[ConversationMessage] = []
+        for turn in turns[:stale]:
+            for msg in turn:
+                if msg.role == MessageRole.ASSISTANT:
+                    for tu in msg.tool_uses:
+                        tool_names[tu.id] = tu.name
+                if not msg.tool_results:
+                    view.append(msg)
+                    continue
+                if msg._elided_view is None:
+                    msg._elided_view = self._build_view(msg, tool_names)
+                    total.add(msg._elided_view.stats)
+                elided: Any = msg._elided_view
+                view.append(elided.message)
+
+        for turn in turns[stale:]:
+            view.extend(turn)
+        return view, total
+
+
+_store: Optional[ToolOutputStore] = None
+
+
+def get_tool_output_store() -> ToolOutputStore:
+    """
+    Get the global tool output store.
+
+    Returns:
+        ToolOutputStore under the data directory
+    """
+    global _store
+    if _store is None:
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        _store = ToolOutputStore(settings.data_dir / "tool_outputs")
+    return _store
+
+
+def get_tool_output_policy() -> Optional[ToolOutputElisionPolicy]:
+    """
+    Get an elision policy configured from settings.
+
+    Returns:
+        ToolOutputElisionPolicy, or None if elision is disabled
+    """
+    # Import here to avoid circular imports
+    from app.services.config_service import settings
+
+    if not settings.TOOL_OUTPUT_ELISION_ENABLED:
+        return None
+    return ToolOutputElisionPolicy.from_settings()
@@ -0,0 +1,347 @@
+"""
+Tool Call Scheduler.
+
+Runs the tool calls of one LLM turn concurrently where that cannot change
+their outcome. Each call is classified by its tool's ToolAccess:
+
+- read calls run alongside each other;
+- a write call waits for the earlier calls that read or write the same
+  path (or a directory containing it), and later calls touching that path
+  wait for it;
+- exclusive calls (bash, MCP and unknown tools) wait for every earlier
+  call, and every later call waits for them.
+
+Results are returned in the order of the calls. Each batch also reports its
+wall time against the summed time of its calls.
+
+Read calls of tools that need no permission can also start while the LLM
+message is still streaming, as soon as their tool_use block is complete
+(SpeculativeToolCalls). Their results are handed to the batch when the
+message ends, and thrown away if it does not.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.llm.base import ToolUse, ToolResult as LLMToolResult
+from app.tools import ToolAccess, ToolContext, get_tool
+
+
+@dataclass
+class ToolFootprint:
+    """What a tool call may touch."""
+
+    access: ToolAccess
+    path: Optional[Path] = None  # None: the whole workspace
+
+    def conflicts_with(self, other: "ToolFootprint") -> bool:
+        """Whether the two calls must not run at the same time."""
+        if ToolAccess.EXCLUSIVE in (self.access, other.access):
+            return True
+        if self.access == ToolAccess.READ and other.access == ToolAccess.READ:
+            return False
+        if self.path is None or other.path is None:
+            return True
+        return self.path.is_relative_to(other.path) or other.path.is_relative_to(self.path)
+
+
+def get_footprint(tool_use: ToolUse, context: ToolContext) -> ToolFootprint:
+    """
+    Classify a tool call.
+
+    The path is taken from the `file_path` or `path` argument. Calls whose
+    path is missing or cannot be resolved are treated as touching the
+    whole workspace.
+
+    Args:
+        tool_use: Tool call from the LLM
+        context: Context the call will run in
+
+    Returns:
+        ToolFootprint of the call
+    """
+    tool = get_tool(tool_use.name)
+    if tool is None or tool.access == ToolAccess.EXCLUSIVE:
+        return ToolFootprint(ToolAccess.EXCLUSIVE)
+
+    path_str = tool_use.arguments.get("file_path", tool_use.arguments.get("path"))
+    path = None
+    if isinstance(path_str, str):
+        try:
+            path = context.resolve_path(path_str)
+        except (ValueError, OSError):
+            path = None
+    return ToolFootprint(tool.access, path)
+
+
+@dataclass
+class ToolBatchTiming:
+    """Wall time of tool calls against their summed run time."""
+
+    calls: int = 0
+    wall_seconds: float = 0.0
+    tool_seconds: float = 0.0
+
+    @property
+    def speedup(self) -> float:
+        """Summed tool time over wall time (1.0 when run one after another)."""
+        return self.tool_seconds / self.wall_seconds if self.wall_seconds else 1.0
+
+    def add(self, other: "ToolBatchTiming") -> None:
+        """Add another batch to this one."""
+        self.calls += other.calls
+        self.wall_seconds += other.wall_seconds
+        self.tool_seconds += other.tool_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        return {
+            "tool_calls": self.calls,
+            "tool_wall_ms": round(self.wall_seconds * 1000, 1),
+            "tool_time_ms": round(self.tool_seconds * 1000, 1),
+        }
+
+
+@dataclass
+class SpeculationStats:
+    """Tool calls started before their message finished streaming."""
+
+    turns: int = 0  # Turns with at least one early call
+    calls: int = 0
+    discarded: int = 0  # Calls whose message ended in an error or was cancelled
+    saved_seconds: float = 0.0  # Tool time that overlapped the stream
+
+    def add(self, other: "SpeculationStats") -> None:
+        """Add another turn's counts to these."""
+        self.turns += other.turns
+        self.calls += other.calls
+        self.discarded += other.discarded
+        self.saved_seconds += other.saved_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        return {
+            "speculative_turns": self.turns,
+            "speculative_calls": self.calls,
+            "speculative_discarded": self.discarded,
+            "speculative_saved_ms": round(self.saved_seconds * 1000, 1),
+        }
+
+
+class SpeculativeToolCalls:
+    """
+    Read-only tool calls started while their message is still streaming.
+
+    A call starts early when its tool needs no permission, only reads, and
+    conflicts with no earlier call of the message, so running it before the
+    message ends cannot change its result.
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[ToolUse], Awaitable[LLMToolResult]],
+        context: ToolContext,
+        *,
+        max_calls: int = 8,
+    ):
+        """
+        Initialize for one message.
+
+        Args:
+            execute: Runs one call (e.g. ToolExecutionService.execute_tool)
+            context: Context the calls run in, to resolve their paths
+            max_calls: Most calls started early (0 disables early starts)
+        """
+        self.execute = execute
+        self.context = context
+        self.max_calls = max_calls
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._footprints: List[ToolFootprint] = []
+        self._started: Dict[str, float] = {}
+        self._finished: Dict[str, float] = {}
+
+    def offer(self, tool_use: ToolUse) -> bool:
+        """
+        Start a completed tool_use block now if that is safe.
+
+        Must be called for every tool_use of the message, in order.
+
+        Args:
+            tool_use: Tool call from the LLM
+
+        Returns:
+            True if the call was started
+        """
+        footprint = get_footprint(tool_use, self.context)
+        conflicts = any(footprint.conflicts_with(earlier) for earlier in self._footprints)
+        self._footprints.append(footprint)
+
+        tool = get_tool(tool_use.name)
+        if (
+            conflicts
+            or tool is None
+            or tool.requires_permission
+            or footprint.access != ToolAccess.READ
+            or len(self.tasks) >= self.max_calls
+        ):
+            return False
+        self.tasks[tool_use.id] = asyncio.create_task(self._run(tool_use))
+        return True
+
+    async def _run(self, tool_use: ToolUse) -> Tuple[LLMToolResult, float]:
+        start = self._started[tool_use.id] = time.monotonic()
+        try:
+            return await self.execute(tool_use), time.monotonic() - start
+        finally:
+            self._finished[tool_use.id] = time.monotonic()
+
+    def finish(self) -> Tuple[Dict[str, asyncio.Task], SpeculationStats]:
+        """
+        Hand over the early calls once the message has ended.
+
+        The time saved is the longest stretch an early call ran before the
+        message ended, which is how much sooner the turn's calls can finish.
+
+        Returns:
+            (early call tasks by tool_use ID, stats of this turn)
+        """
+        tasks, self.tasks = self.tasks, {}
+        if not tasks:
+            return tasks, SpeculationStats()
+        now = time.monotonic()
+        saved = max(
+            min(self._finished.get(tool_use_id, now), now) - self._started.get(tool_use_id, now)
+            for tool_use_id in tasks
+        )
+        return tasks, SpeculationStats(turns=1, calls=len(tasks), saved_seconds=max(0.0, saved))
+
+    def discard(self) -> int:
+        """
+        Cancel the early calls of a message that did not end.
+
+        Returns:
+            Number of calls discarded
+        """
+        tasks, self.tasks = self.tasks, {}
+        for task in tasks.values():
+            task.cancel()
+        return len(tasks)
+
+
+@dataclass
+class ToolSchedulerMetrics:
+    """Totals over all scheduled tool batches."""
+
+    batches: int = 0
+    concurrent_batches: int = 0  # Batches where calls overlapped
+    timing: ToolBatchTiming = field(default_factory=ToolBatchTiming)
+
+    def record(self, timing: ToolBatchTiming) -> None:
+        """Record a finished batch."""
+        self.batches += 1
+        if timing.tool_seconds > timing.wall_seconds:
+            self.concurrent_batches += 1
+        self.timing.add(timing)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        return {
+            "batches": self.batches,
+            "concurrent_batches": self.concurrent_batches,
+            **self.timing.to_dict(),
+            "speedup": round(self.timing.speedup, 2),
+        }
+
+
+async def run_tool_calls(
+    tool_uses: List[ToolUse],
+    execute: Callable[[ToolUse], Awaitable[LLMToolResult]],
+    context: ToolContext,
+    *,
+    max_concurrency: int = 8,
+    on_start: Optional[Callable[[ToolUse], None]] = None,
+    on_result: Optional[Callable[[ToolUse, LLMToolResult], None]] = None,
+    started: Optional[Dict[str, asyncio.Task]] = None,
+) -> Tuple[List[LLMToolResult], ToolBatchTiming]:
+    """
+    Run tool calls, concurrently where they do not conflict.
+
+    A call starts once every earlier call it conflicts with has finished and
+    fewer than `max_concurrency` calls are running. If the batch is
+    cancelled, running calls are cancelled and waited for.
+
+    Args:
+        tool_uses: Tool calls in the order the LLM made them
+        execute: Runs one call (e.g. ToolExecutionService.execute_tool)
+        context: Context the calls run in, to resolve their paths
+        max_concurrency: Most calls running at once
+        on_start: Called when a call starts
+        on_result: Called when a call finishes
+        started: Calls already running, by tool_use ID (see
+            SpeculativeToolCalls); they are awaited instead of executed
+
+    Returns:
+        (results in call order, timing of the batch)
+    """
+    footprints = [get_footprint(tu, context) for tu in tool_uses]
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    durations = [0.0] * len(tool_uses)
+    started = started or {}
+
+    async def run(index: int, after: Set[asyncio.Task]) -> LLMToolResult:
+        tool_use = tool_uses[index]
+        early = started.get(tool_use.id)
+        if early is not None:
+            if on_start:
+                on_start(tool_use)
+            result, durations[index] = await early
+            if on_result:
+                on_result(tool_use, result)
+            return result
+        if after:
+            await asyncio.wait(after)
+        async with semaphore:
+            if on_start:
+                on_start(tool_use)
+            start = time.monotonic()
+            try:
+                result = await execute(tool_use)
+            finally:
+                durations[index] = time.monotonic() - start
+        if on_result:
+            on_result(tool_use, result)
+        return result
+
+    start = time.monotonic()
+    tasks: List[asyncio.Task] = []
+    for index, footprint in enumerate(footprints):
+        after = {
+            tasks[earlier]
+            for earlier in range(index)
+            if footprint.conflicts_with(footprints[earlier])
+        }
+        tasks.append(asyncio.create_task(run(index, after)))
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in [*tasks, *started.values()]:
+            task.cancel()
+        await asyncio.gather(*tasks, *started.values(), return_exceptions=True)
+        raise
+
+    timing = ToolBatchTiming(
+        calls=len(tool_uses),
+        wall_seconds=time.monotonic() - start,
+        tool_seconds=sum(durations),
+    )
+    return list(results), timing
+
+
+# Global tool scheduler metrics
+tool_scheduler_metrics = ToolSchedulerMetrics()
+
+# Global early tool call metrics
+speculation_metrics = SpeculationStats()
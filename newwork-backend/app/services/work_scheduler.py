@@ -0,0 +1,405 @@
+"""
+Work Scheduler.
+
+Bounds how much LLM and tool work runs at once across all sessions, and
+shares it fairly. There is one capacity pool per kind of work:
+
+- llm: provider calls (a streamed response holds its slot until it ends);
+- cpu: tools that scan many files (grep, glob);
+- subprocess: tools that run a child process (bash).
+
+Waiting work is ordered by priority lane first, so interactive prompts go
+ahead of background work (history compaction) and batch runs (template
+batch runs). Within a lane, flows (a workspace, or a session with
+SCHEDULER_FAIR_SHARE=session) are served by weighted fair queuing: each
+request gets a virtual finish time of max(pool virtual time, the flow's
+last finish time) + 1/weight, and the smallest finish time goes first. A
+flow that sends many requests therefore queues behind flows that send few.
+
+The flow and lane of the current task are held in context variables, so
+provider wrappers and tools deep in the call stack are scheduled without
+being told who they work for. StreamingHandler binds them for its run;
+tasks inherit them.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import Enum, IntEnum
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Flow of requests with no session (e.g. tools run outside a prompt)
+DEFAULT_FLOW = "default"
+
+# Flow tags at or below the pool's virtual time carry no information
+PRUNE_FLOWS_ABOVE = 1024
+
+
+class WorkPool(str, Enum):
+    """Kinds of work with a capacity of their own."""
+
+    LLM = "llm"
+    CPU = "cpu"
+    SUBPROCESS = "subprocess"
+
+
+class Lane(IntEnum):
+    """Priority lanes; lower values are served first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    BATCH = 2
+
+
+_current_flow: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "work_flow", default=DEFAULT_FLOW
+)
+_current_lane: contextvars.ContextVar[Lane] = contextvars.ContextVar(
+    "work_lane", default=Lane.INTERACTIVE
+)
+
+
+def bind_work(flow: Optional[str] = None, lane: Optional[Lane] = None) -> None:
+    """
+    Set the flow and lane of the current task's work.
+
+    Tasks created afterwards inherit them.
+
+    Args:
+        flow: Fair-queuing flow (see flow_key)
+        lane: Priority lane
+    """
+    if flow is not None:
+        _current_flow.set(flow)
+    if lane is not None:
+        _current_lane.set(lane)
+
+
+def work_context(flow: Optional[str] = None, lane: Optional[Lane] = None) -> contextvars.Context:
+    """
+    Copy the current context with a different flow or lane.
+
+    Meant for asyncio.create_task(..., context=...).
+
+    Args:
+        flow: Fair-queuing flow
+        lane: Priority lane
+
+    Returns:
+        The copied context
+    """
+    context = contextvars.copy_context()
+    context.run(bind_work, flow, lane)
+    return context
+
+
+def current_work() -> Tuple[str, Lane]:
+    """Get the flow and lane of the current task's work."""
+    return _current_flow.get(), _current_lane.get()
+
+
+def flow_key(session_id: Optional[str], workspace_path: Any = None) -> str:
+    """
+    Get the fair-queuing flow of a session.
+
+    Sessions share the flow of their workspace unless
+    SCHEDULER_FAIR_SHARE is "session".
+
+    Args:
+        session_id: Session identifier
+        workspace_path: Workspace of the session
+
+    Returns:
+        Flow key
+    """
+    # Import here to avoid circular imports
+    from app.services.config_service import settings
+
+    if settings.SCHEDULER_FAIR_SHARE == "session" or workspace_path is None:
+        return f"session:{session_id}" if session_id else DEFAULT_FLOW
+    return f"workspace:{workspace_path}"
+
+
+def parse_flow_weights(spec: str) -> Dict[str, float]:
+    """
+    Parse a "flow=weight,flow=weight" setting.
+
+    Args:
+        spec: Comma-separated flow=weight pairs
+
+    Returns:
+        Weights by flow key
+
+    Raises:
+        ValueError: If a pair is malformed or a weight is not positive
+    """
+    weights: Dict[str, float] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        flow, sep, value = item.rpartition("=")
+        if not sep or not flow.strip():
+            raise ValueError(f"Invalid flow weight {item!r}, expected flow=weight")
+        weight = float(value)
+        if weight <= 0:
+            raise ValueError(f"Flow weight must be positive: {item!r}")
+        weights[flow.strip()] = weight
+    return weights
+
+
+@dataclass
+class LaneStats:
+    """Wait statistics of one lane of a pool."""
+
+    granted: int = 0
+    queued: int = 0  # Requests that had to wait
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def record(self, wait: float, waited: bool) -> None:
+        """Record a granted request."""
+        self.granted += 1
+        if waited:
+            self.queued += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def to_dict(self, depth: int) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        return {
+            "depth": depth,
+            "granted": self.granted,
+            "queued": self.queued,
+            "avg_wait_ms": round(self.total_wait / self.queued * 1000, 1) if self.queued else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+@dataclass(order=True)
+class _Waiter:
+    finish: float
+    seq: int
+    future: asyncio.Future = field(compare=False)
+    flow: str = field(compare=False)
+    enqueued: float = field(compare=False)
+
+
+class PoolScheduler:
+    """
+    Capacity and weighted fair queue of one pool.
+    """
+
+    def __init__(self, pool: WorkPool, capacity: int):
+        """
+        Initialize the pool.
+
+        Args:
+            pool: Kind of work
+            capacity: Requests running at once (0 = unlimited)
+        """
+        self.pool = pool
+        self.capacity = capacity
+        self.running = 0
+        self.virtual_time = 0.0
+        self._finish: Dict[str, float] = {}
+        self._queues: Dict[Lane, List[_Waiter]] = {lane: [] for lane in Lane}
+        self._seq = itertools.count()
+        self.stats: Dict[Lane, LaneStats] = {lane: LaneStats() for lane in Lane}
+
+    def depth(self, lane: Optional[Lane] = None) -> int:
+        """Get the number of waiting requests, of one lane or all."""
+        lanes = [lane] if lane is not None else list(Lane)
+        return sum(
+            1 for name in lanes for waiter in self._queues[name] if not waiter.future.done()
+        )
+
+    def _has_room(self) -> bool:
+        return self.capacity <= 0 or self.running < self.capacity
+
+    def _tag(self, flow: str, weight: float) -> float:
+        finish = max(self.virtual_time, self._finish.get(flow, 0.0)) + 1.0 / max(weight, 1e-6)
+        self._finish[flow] = finish
+        return finish
+
+    async def acquire(self, flow: str, lane: Lane, weight: float = 1.0) -> None:
+        """
+        Wait for a slot.
+
+        Args:
+            flow: Fair-queuing flow
+            lane: Priority lane
+            weight: Share of the flow relative to others
+        """
+        finish = self._tag(flow, weight)
+        if self._has_room() and not self.depth():
+            self.running += 1
+            self.virtual_time = max(self.virtual_time, finish - 1.0 / max(weight, 1e-6))
+            self.stats[lane].record(0.0, waited=False)
+            return
+
+        waiter = _Waiter(
+            finish=finish,
+            seq=next(self._seq),
+            future=asyncio.get_running_loop().create_future(),
+            flow=flow,
+            enqueued=time.monotonic(),
+        )
+        heapq.heappush(self._queues[lane], waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just before the cancellation
+                self.release()
+            else:
+                waiter.future.cancel()
+            raise
+        self.stats[lane].record(time.monotonic() - waiter.enqueued, waited=True)
+
+    def release(self) -> None:
+        """Free a slot and hand it to the next waiting request."""
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for lane in Lane:
+            queue = self._queues[lane]
+            while queue and self._has_room():
+                waiter = heapq.heappop(queue)
+                if waiter.future.done():
+                    continue  # Cancelled while waiting
+                self.running += 1
+                self.virtual_time = max(self.virtual_time, waiter.finish)
+                waiter.future.set_result(None)
+            if not self._has_room():
+                break
+        if len(self._finish) > PRUNE_FLOWS_ABOVE:
+            self._finish = {
+                flow: tag for flow, tag in self._finish.items() if tag > self.virtual_time
+            }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        return {
+            "capacity": self.capacity,
+            "running": self.running,
+            "depth": self.depth(),
+            "lanes": {lane.name.lower(): self.stats[lane].to_dict(self.depth(lane)) for lane in Lane},
+        }
+
+
+class WorkScheduler:
+    """
+    Server-wide scheduler of LLM calls and heavy tools.
+
+    Pools are created on first use with the capacities from settings.
+    """
+
+    def __init__(self, capacities: Optional[Dict[WorkPool, int]] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            capacities: Capacity per pool (default from settings)
+        """
+        self._capacities = capacities
+        self._pools: Dict[WorkPool, PoolScheduler] = {}
+        self._weights: Optional[Dict[str, float]] = {} if capacities is not None else None
+
+    def get_pool(self, pool: WorkPool) -> PoolScheduler:
+        """Get the scheduler of a pool."""
+        scheduler = self._pools.get(pool)
+        if scheduler is None:
+            scheduler = PoolScheduler(pool, self._capacity(pool))
+            self._pools[pool] = scheduler
+        return scheduler
+
+    def _capacity(self, pool: WorkPool) -> int:
+        if self._capacities is not None:
+            return self._capacities.get(pool, 0)
+        # Import here to avoid circular imports
+        from app.services.config_service import settings
+
+        return {
+            WorkPool.LLM: settings.SCHEDULER_LLM_CONCURRENCY,
+            WorkPool.CPU: settings.SCHEDULER_CPU_CONCURRENCY,
+            WorkPool.SUBPROCESS: settings.SCHEDULER_SUBPROCESS_CONCURRENCY,
+        }[pool]
+
+    def set_weight(self, flow: str, weight: float) -> None:
+        """
+        Set the share of a flow (default 1.0).
+
+        Args:
+            flow: Flow key
+            weight: Relative share
+        """
+        self._configured_weights()[flow] = weight
+
+    def weight(self, flow: str) -> float:
+        """Get the share of a flow."""
+        return self._configured_weights().get(flow, 1.0)
+
+    def _configured_weights(self) -> Dict[str, float]:
+        if self._weights is None:
+            # Import here to avoid circular imports
+            from app.services.config_service import settings
+
+            self._weights = parse_flow_weights(settings.SCHEDULER_FLOW_WEIGHTS)
+        return self._weights
+
+    @asynccontextmanager
+    async def slot(self, pool: WorkPool) -> AsyncIterator[None]:
+        """
+        Hold a slot of a pool for the current task's flow and lane.
+
+        Args:
+            pool: Kind of work
+        """
+        scheduler = self.get_pool(pool)
+        flow, lane = current_work()
+        await scheduler.acquire(flow, lane, self.weight(flow))
+        try:
+            yield
+        finally:
+            scheduler.release()
+
+    async def stream(
+        self,
+        pool: WorkPool,
+        events: AsyncGenerator[Any, None],
+    ) -> AsyncGenerator[Any, None]:
+        """
+        Iterate a stream while holding a slot.
+
+        The stream is not started before the slot is granted, and the slot
+        is released when the stream ends or is closed.
+
+        Args:
+            pool: Kind of work
+            events: Stream to iterate
+
+        Yields:
+            The stream's items
+        """
+        try:
+            async with self.slot(pool):
+                async for event in events:
+                    yield event
+        finally:
+            await events.aclose()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get queue depth and wait times of every pool."""
+        return {pool.value: self.get_pool(pool).to_dict() for pool in WorkPool}
+
+
+# Global work scheduler instance
+work_scheduler = WorkScheduler()
@@ -0,0 +1,381 @@
+"""
+WebSocket Session Multiplexer.
+
+Carries the streams of many sessions over one WebSocket connection. Each
+session is a channel, identified by its session ID in client messages and
+by a small channel number in binary frames.
+
+Client messages are JSON text frames with an "op" and a "channel":
+
+    subscribe    {"last_event_id": int}     follow the session's events
+    unsubscribe                             stop following them
+    prompt       {"prompt": str, "model": str}
+    permission   {"permission_id": str, "approved": bool, "always": bool}
+    cancel                                  cancel the running prompt
+    ack          {"event_id": int}          grant credit up to an event
+
+Events come from the session event log, so a channel behaves like the SSE
+endpoints: prompt runs keep going across a reconnect and `last_event_id`
+replays what was missed. With the JSON encoding an event is a text frame
+`{"id": ..., "event": <SSEEvent payload>}`, whose session_id names the
+channel; with the binary encoding it is a binary frame (see
+encode_binary_event). Replies to client
+messages are JSON text frames with an "op" of their own ("subscribed",
+"accepted", "cancelled", "unsubscribed" or "error"); errors name the
+failed op as "request". Prompts run on the agent run service, and their
+"accepted" reply carries the run ID.
+
+Flow control is per channel: at most `window` events are sent without an
+ack. A channel whose client falls behind pauses on its own and its events
+wait in the session event log, so other channels keep streaming.
+"""
+
+import asyncio
+import json
+import logging
+import struct
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Union
+
+from app.services.agent_run_service import RunRejectedError, agent_run_service
+from app.services.event_encoding import EncodedEvent
+from app.services.event_log import SessionEventLog, event_log_service
+from app.services.streaming_handler import (
+    STREAM_PROTOCOL_DELTA,
+    SSEEventType,
+    StreamingHandler,
+    create_streaming_handler,
+)
+
+logger = logging.getLogger(__name__)
+
+ENCODING_JSON = "json"
+ENCODING_BINARY = "binary"
+ENCODINGS = (ENCODING_JSON, ENCODING_BINARY)
+
+# Binary event header: channel number, event ID (0 if none), event type code
+BINARY_HEADER = struct.Struct(">HIB")
+# Type codes are part of the wire format: append new types, never reorder
+EVENT_TYPE_CODES: Dict[str, int] = {
+    name: code
+    for code, name in enumerate((
+        SSEEventType.MESSAGE,
+        SSEEventType.STREAM_CHUNK,
+        SSEEventType.TOOL_CALL,
+        SSEEventType.TOOL_RESULT,
+        SSEEventType.TODO_UPDATE,
+        SSEEventType.PERMISSION_REQUEST,
+        SSEEventType.STATUS,
+        SSEEventType.ERROR,
+        SSEEventType.COMPLETE,
+    ))
+}
+EVENT_TYPES = {code: name for name, code in EVENT_TYPE_CODES.items()}
+
+Frame = Union[str, bytes]
+
+
+def encode_json_event(event_id: Optional[int], encoded: EncodedEvent) -> str:
+    """
+    Encode an event as a JSON text frame.
+
+    The encoded payload is embedded as is, without being serialized again.
+
+    Args:
+        event_id: Event log ID
+        encoded: Encoded event
+
+    Returns:
+        Text frame
+    """
+    event_id_json = b"null" if event_id is None else b"%d" % event_id
+    return (b'{"id":' + event_id_json + b',"event":' + encoded.payload + b"}").decode()
+
+
+def encode_binary_event(number: int, event_id: Optional[int], encoded: EncodedEvent) -> bytes:
+    """
+    Encode an event as a compact binary frame.
+
+    The frame is a 7-byte header (channel number, event ID, event type
+    code; big-endian u16, u32, u8) followed by the UTF-8 JSON of the event
+    data. The session ID and timestamp are left out: the channel number
+    identifies the session.
+
+    Args:
+        number: Channel number
+        event_id: Event log ID
+        encoded: Encoded event
+
+    Returns:
+        Binary frame
+    """
+    header = BINARY_HEADER.pack(number, event_id or 0, EVENT_TYPE_CODES[encoded.type])
+    return b"".join((header, encoded.data))
+
+
+def decode_binary_event(frame: bytes) -> Dict[str, Any]:
+    """
+    Decode a binary event frame.
+
+    Args:
+        frame: Frame from encode_binary_event
+
+    Returns:
+        Dict with channel number, id (None if the event has none), type and data
+    """
+    number, event_id, code = BINARY_HEADER.unpack_from(frame)
+    return {
+        "channel": number,
+        "id": event_id or None,
+        "type": EVENT_TYPES[code],
+        "data": json.loads(frame[BINARY_HEADER.size:]),
+    }
+
+
+@dataclass
+class Channel:
+    """A session followed over the connection."""
+
+    session_id: str
+    number: int
+    log: SessionEventLog
+    window: int
+    task: Optional[asyncio.Task] = None
+    unacked: Deque[int] = field(default_factory=deque)
+    credit: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def ack(self, event_id: int) -> None:
+        """Release the credit of events up to an ID."""
+        while self.unacked and self.unacked[0] <= event_id:
+            self.unacked.popleft()
+        self.credit.set()
+
+    async def wait_for_credit(self) -> None:
+        """Wait until another event may be sent."""
+        while len(self.unacked) >= self.window:
+            self.credit.clear()
+            await self.credit.wait()
+
+
+class SessionMultiplexer:
+    """
+    Serves the channels of one WebSocket connection.
+
+    The connection itself is abstracted as a `send` callable, so the
+    multiplexer does not depend on the WebSocket implementation.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Frame], Awaitable[None]],
+        lookup: Callable[[str], Optional[Path]],
+        *,
+        encoding: str = ENCODING_JSON,
+        window: int = 256,
+        max_channels: int = 64,
+        create_handler: Optional[Callable[..., StreamingHandler]] = None,
+    ):
+        """
+        Initialize the multiplexer.
+
+        Args:
+            send: Sends a text (str) or binary (bytes) frame
+            lookup: Returns a session's workspace path, or None if it does not exist
+            encoding: Event encoding (json or binary)
+            window: Events a channel may send without an ack
+            max_channels: Channels allowed on the connection
+            create_handler: Handler factory (default create_streaming_handler)
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown encoding: {encoding}")
+        self._send = send
+        self._lookup = lookup
+        self.encoding = encoding
+        self.window = max(1, window)
+        self.max_channels = min(max_channels, 0xFFFF)
+        self.channels: Dict[str, Channel] = {}
+        self._create_handler = create_handler or create_streaming_handler
+        self._send_lock = asyncio.Lock()
+
+    async def handle(self, message: str) -> None:
+        """
+        Handle a client message.
+
+        Args:
+            message: JSON text frame
+        """
+        try:
+            request = json.loads(message)
+            op = request["op"]
+            session_id = request["channel"]
+        except (ValueError, TypeError, KeyError):
+            await self._reply("error", None, error="Messages need an op and a channel")
+            return
+
+        handlers = {
+            "subscribe": self._subscribe,
+            "unsubscribe": self._unsubscribe,
+            "prompt": self._prompt,
+            "permission": self._permission,
+            "cancel": self._cancel,
+            "ack": self._ack,
+        }
+        op_handler = handlers.get(op)
+        if op_handler is None:
+            await self._reply("error", session_id, error=f"Unknown op: {op}")
+            return
+        try:
+            await op_handler(session_id, request)
+        except (ValueError, TypeError, KeyError) as e:
+            await self._reply("error", session_id, request=op, error=f"Invalid {op} message: {e}")
+
+    async def close(self) -> None:
+        """Stop following all channels; their runs continue as after an SSE disconnect."""
+        tasks = [c.task for c in self.channels.values() if c.task is not None]
+        for task in tasks:
+            task.cancel()
+        self.channels.clear()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _subscribe(self, session_id: str, request: Dict[str, Any]) -> None:
+        last_event_id = request.get("last_event_id")
+        channel = await self._open(session_id, None if last_event_id is None else int(last_event_id))
+        if channel is not None:
+            await self._reply(
+                "subscribed",
+                session_id,
+                number=channel.number,
+                last_event_id=channel.log.last_id,
+            )
+
+    async def _unsubscribe(self, session_id: str, request: Dict[str, Any]) -> None:
+        channel = self.channels.pop(session_id, None)
+        if channel is not None and channel.task is not None:
+            channel.task.cancel()
+            await asyncio.gather(channel.task, return_exceptions=True)
+        await self._reply("unsubscribed", session_id)
+
+    async def _prompt(self, session_id: str, request: Dict[str, Any]) -> None:
+        prompt = request["prompt"]
+        if not isinstance(prompt, str):
+            raise TypeError("prompt must be a string")
+        channel = self.channels.get(session_id) or await self._open(session_id, None)
+        if channel is None:
+            return
+        if channel.log.running:
+            await self._reply(
+                "error", session_id, request="prompt",
+                error="A prompt is already running for this session",
+            )
+            return
+
+        workspace_path = self._lookup(session_id)
+        if workspace_path is None:
+            await self._reply("error", session_id, request="prompt", error="Session not found")
+            return
+        handler = self._create_handler(
+            session_id=session_id,
+            workspace_path=workspace_path,
+            model=request.get("model"),
+            stream_protocol=STREAM_PROTOCOL_DELTA,
+        )
+        try:
+            run = agent_run_service.submit(session_id, handler, prompt, detached=False)
+        except RunRejectedError as e:
+            await self._reply("error", session_id, request="prompt", error=str(e))
+            return
+        await self._reply("accepted", session_id, request="prompt", run_id=run.id)
+
+    async def _permission(self, session_id: str, request: Dict[str, Any]) -> None:
+        permission_id = str(request["permission_id"])
+        run = agent_run_service.current(session_id)
+        if run is None or self._lookup(session_id) is None:
+            await self._reply(
+                "error", session_id, request="permission",
+                error="No prompt is waiting for permission in this session",
+            )
+            return
+        try:
+            agent_run_service.respond_permission(
+                run,
+                permission_id,
+                approved=bool(request["approved"]),
+                always=bool(request.get("always", False)),
+            )
+        except RunRejectedError as e:
+            await self._reply("error", session_id, request="permission", error=str(e))
+            return
+        await self._reply("accepted", session_id, request="permission", run_id=run.id)
+
+    async def _cancel(self, session_id: str, request: Dict[str, Any]) -> None:
+        if self._lookup(session_id) is None:
+            await self._reply("error", session_id, request="cancel", error="Session not found")
+            return
+        log = event_log_service.get(session_id)
+        running = log.running
+        log.cancel_runs()
+        await self._reply("cancelled", session_id, running=running)
+
+    async def _ack(self, session_id: str, request: Dict[str, Any]) -> None:
+        channel = self.channels.get(session_id)
+        if channel is not None:
+            channel.ack(int(request["event_id"]))
+
+    async def _open(self, session_id: str, last_event_id: Optional[int]) -> Optional[Channel]:
+        """Start following a session, replacing an earlier subscription."""
+        if self._lookup(session_id) is None:
+            await self._reply("error", session_id, error="Session not found")
+            return None
+        previous = self.channels.pop(session_id, None)
+        if previous is not None and previous.task is not None:
+            previous.task.cancel()
+        elif len(self.channels) >= self.max_channels:
+            await self._reply("error", session_id, error="Too many channels on this connection")
+            return None
+
+        log = event_log_service.get(session_id)
+        channel = Channel(
+            session_id=session_id,
+            number=previous.number if previous is not None else self._free_number(),
+            log=log,
+            window=self.window,
+        )
+        after = log.last_id if last_event_id is None else last_event_id
+        channel.task = asyncio.create_task(self._pump(channel, after))
+        self.channels[session_id] = channel
+        return channel
+
+    def _free_number(self) -> int:
+        """Get the lowest channel number not in use."""
+        used = {c.number for c in self.channels.values()}
+        number = 1
+        while number in used:
+            number += 1
+        return number
+
+    async def _pump(self, channel: Channel, after: int) -> None:
+        """Send a channel's events while it has credit."""
+        try:
+            async for entry in channel.log.follow_entries(after):
+                if entry.id is not None:
+                    await channel.wait_for_credit()
+                    channel.unacked.append(entry.id)
+                if self.encoding == ENCODING_BINARY:
+                    data: Frame = encode_binary_event(channel.number, entry.id, entry.encoded)
+                else:
+                    data = encode_json_event(entry.id, entry.encoded)
+                await self._send_frame(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Stopped WebSocket channel {channel.session_id}: {e}")
+
+    async def _reply(self, kind: str, session_id: Optional[str], **data: Any) -> None:
+        await self._send_frame(json.dumps({"op": kind, "channel": session_id, **data}))
+
+    async def _send_frame(self, data: Frame) -> None:
+        async with self._send_lock:
+            await self._send(data)
@@ -21,13 +21,19 @@ Usage:
 from .base import (
     Tool,
     ToolCategory,
+    ToolAccess,
     ToolContext,
+    ToolResource,
     ToolResult,
     get_tool,
     get_all_tools,
+    get_registry_version,
+    get_tool_definitions,
+    get_tool_payloads,
     get_tools_by_category,
     get_tools_requiring_permission,
     register_tool,
+    unregister_tool,
 )
 from .file_tools import (
     ReadFileTool,
@@ -35,6 +41,7 @@ from .file_tools import (
     EditFileTool,
     ListDirectoryTool,
     GlobTool,
+    ReadToolOutputTool,
     register_file_tools,
 )
 from .bash_tool import BashTool, register_bash_tools
@@ -67,20 +74,27 @@ __all__ = [
     # Base types
     "Tool",
     "ToolCategory",
+    "ToolAccess",
     "ToolContext",
+    "ToolResource",
     "ToolResult",
     # Registry functions
     "get_tool",
     "get_all_tools",
     "get_tools_by_category",
     "get_tools_requiring_permission",
+    "get_registry_version",
+    "get_tool_definitions",
+    "get_tool_payloads",
     "register_tool",
+    "unregister_tool",
     # Tool classes
     "ReadFileTool",
     "WriteFileTool",
     "EditFileTool",
     "ListDirectoryTool",
     "GlobTool",
+    "ReadToolOutputTool",
     "BashTool",
     "GrepTool",
     "WebFetchTool",
@@ -9,7 +9,10 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from app.services.llm.base import ToolDefinition
 
 
 class ToolCategory(str, Enum):
@@ -22,6 +25,22 @@ class ToolCategory(str, Enum):
     MCP = "mcp"
 
 
+class ToolAccess(str, Enum):
+    """How a tool touches the workspace, used to run tool calls concurrently."""
+
+    READ = "read"  # No side effects
+    WRITE = "write"  # Changes only the file named by its file_path argument
+    EXCLUSIVE = "exclusive"  # Side effects unknown (shell commands, MCP tools)
+
+
+class ToolResource(str, Enum):
+    """What a tool spends while it runs, used to bound tool work server-wide."""
+
+    LIGHT = "light"  # Short file or network I/O
+    CPU = "cpu"  # Scans many files (grep, glob)
+    SUBPROCESS = "subprocess"  # Runs a child process (bash)
+
+
 @dataclass
 class ToolContext:
     """
@@ -124,6 +143,8 @@ class Tool(ABC):
     description: str
     category: ToolCategory
     requires_permission: bool = True
+    access: ToolAccess = ToolAccess.EXCLUSIVE
+    resource: ToolResource = ToolResource.LIGHT
 
     @property
     @abstractmethod
@@ -193,7 +214,7 @@ class Tool(ABC):
 
         return None
 
-    def to_llm_tool(self) -> Dict[str, Any]:
+    def to_llm_tool(self) -> "ToolDefinition":
         """
         Convert to LLM tool definition format.
 
@@ -212,15 +233,87 @@ class Tool(ABC):
 # Tool registry
 _TOOLS: Dict[str, Tool] = {}
 
+# Bumped whenever the set of registered tools changes
+_registry_version: int = 0
+
+# Tool definitions built for the current registry version
+_definitions_cache: Optional[Tuple[int, List["ToolDefinition"]]] = None
+
 
 def register_tool(tool: Tool) -> None:
     """
     Register a tool in the global registry.
 
+    Re-registering the same tool instance leaves the registry version unchanged.
+
     Args:
         tool: Tool instance to register
     """
+    global _registry_version
+    if _TOOLS.get(tool.name) is tool:
+        return
     _TOOLS[tool.name] = tool
+    _registry_version += 1
+
+
+def unregister_tool(name: str) -> bool:
+    """
+    Remove a tool from the global registry.
+
+    Args:
+        name: Tool name
+
+    Returns:
+        True if the tool was registered
+    """
+    global _registry_version
+    if name not in _TOOLS:
+        return False
+    del _TOOLS[name]
+    _registry_version += 1
+    return True
+
+
+def get_registry_version() -> int:
+    """
+    Get the current tool registry version.
+
+    Returns:
+        Counter that changes whenever tools are registered or removed
+    """
+    return _registry_version
+
+
+def get_tool_definitions() -> List["ToolDefinition"]:
+    """
+    Get LLM tool definitions for all registered tools.
+
+    Definitions are built once per registry version, so each tool's
+    input_schema is only evaluated when the tool set changes.
+
+    Returns:
+        List of ToolDefinition (shared; do not modify)
+    """
+    global _definitions_cache
+    if _definitions_cache is None or _definitions_cache[0] != _registry_version:
+        definitions = [tool.to_llm_tool() for tool in _TOOLS.values()]
+        _definitions_cache = (_registry_version, definitions)
+    return _definitions_cache[1]
+
+
+def get_tool_payloads(provider_format: str) -> List[Dict[str, Any]]:
+    """
+    Get provider payloads for all registered tools.
+
+    Args:
+        provider_format: "anthropic" or "openai"
+
+    Returns:
+        List of tool payloads (shared; do not modify)
+    """
+    from app.services.llm.base import tool_payloads
+
+    return tool_payloads(get_tool_definitions(), provider_format)
 
 
 def get_tool(name: str) -> Optional[Tool]:
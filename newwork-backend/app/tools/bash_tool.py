@@ -8,9 +8,10 @@ in a controlled environment.
 import asyncio
 import os
 import shlex
+import signal
 from typing import Any, Dict, Optional
 
-from .base import Tool, ToolCategory, ToolContext, ToolResult, register_tool
+from .base import Tool, ToolCategory, ToolContext, ToolResource, ToolResult, register_tool
 
 
 # Commands that are explicitly blocked for security
@@ -40,6 +41,20 @@ DANGEROUS_PATTERNS = [
 ]
 
 
+def _kill_process(process: asyncio.subprocess.Process) -> None:
+    """Kill a command and any processes it started."""
+    if process.returncode is not None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            # The shell runs in its own session, so its group holds all children
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
 class BashTool(Tool):
     """Execute bash commands."""
 
@@ -50,6 +65,7 @@ class BashTool(Tool):
     )
     category = ToolCategory.BASH
     requires_permission = True
+    resource = ToolResource.SUBPROCESS
 
     @property
     def input_schema(self) -> Dict[str, Any]:
@@ -120,6 +136,7 @@ class BashTool(Tool):
                 stderr=asyncio.subprocess.PIPE,
                 cwd=str(context.workspace_path),
                 env=env,
+                start_new_session=True,
             )
 
             try:
@@ -128,11 +145,16 @@ class BashTool(Tool):
                     timeout=timeout,
                 )
             except asyncio.TimeoutError:
-                process.kill()
+                _kill_process(process)
                 await process.wait()
                 return ToolResult.error_result(
                     f"Command timed out after {timeout} seconds"
                 )
+            except asyncio.CancelledError:
+                # The request was cancelled: don't leave the command running
+                _kill_process(process)
+                await asyncio.shield(process.wait())
+                raise
 
             # Decode output
             stdout_str = stdout.decode("utf-8", errors="replace")
@@ -16,7 +16,15 @@ try:
 except ImportError:
     AIOFILES_AVAILABLE = False
 
-from .base import Tool, ToolCategory, ToolContext, ToolResult, register_tool
+from .base import (
+    Tool,
+    ToolAccess,
+    ToolCategory,
+    ToolContext,
+    ToolResource,
+    ToolResult,
+    register_tool,
+)
 
 
 class ReadFileTool(Tool):
@@ -26,6 +34,7 @@ class ReadFileTool(Tool):
     description = "Read the contents of a file at the specified path."
     category = ToolCategory.FILE
     requires_permission = False
+    access = ToolAccess.READ
 
     @property
     def input_schema(self) -> Dict[str, Any]:
@@ -110,6 +119,7 @@ class WriteFileTool(Tool):
     description = "Write content to a file, creating it if it doesn't exist."
     category = ToolCategory.FILE
     requires_permission = True
+    access = ToolAccess.WRITE
 
     @property
     def input_schema(self) -> Dict[str, Any]:
@@ -167,6 +177,7 @@ class EditFileTool(Tool):
     description = "Edit a file by replacing old text with new text."
     category = ToolCategory.FILE
     requires_permission = True
+    access = ToolAccess.WRITE
 
     @property
     def input_schema(self) -> Dict[str, Any]:
@@ -263,6 +274,7 @@ class ListDirectoryTool(Tool):
     description = "List files and directories at the specified path."
     category = ToolCategory.FILE
     requires_permission = False
+    access = ToolAccess.READ
 
     @property
     def input_schema(self) -> Dict[str, Any]:
@@ -318,6 +330,8 @@ class GlobTool(Tool):
     description = "Find files matching a glob pattern (e.g., '**/*.py')."
     category = ToolCategory.FILE
     requires_permission = False
+    access = ToolAccess.READ
+    resource = ToolResource.CPU
 
     @property
     def input_schema(self) -> Dict[str, Any]:
@@ -393,6 +407,75 @@ class GlobTool(Tool):
             return ToolResult.error_result(str(e))
 
 
+class ReadToolOutputTool(Tool):
+    """Read the full output of an earlier tool call that was elided from context."""
+
+    name = "read_tool_output"
+    description = (
+        "Read the full output of an earlier tool call that was replaced by a "
+        "placeholder in the conversation, using the handle from the placeholder."
+    )
+    category = ToolCategory.FILE
+    requires_permission = False
+    access = ToolAccess.READ
+
+    @property
+    def input_schema(self) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "handle": {
+                    "type": "string",
+                    "description": "Handle given in the placeholder",
+                },
+                "offset": {
+                    "type": "integer",
+                    "description": "Line number to start reading from (1-based). Optional.",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of lines to read. Optional.",
+                },
+            },
+            "required": ["handle"],
+        }
+
+    async def execute(
+        self,
+        arguments: Dict[str, Any],
+        context: ToolContext,
+    ) -> ToolResult:
+        # Import here to avoid circular imports
+        from app.services.conversation_service import conversation_service
+        from app.services.tool_output_store import get_tool_output_store
+
+        handle = arguments["handle"]
+        offset = arguments.get("offset", 1)
+        limit = arguments.get("limit")
+
+        # Only outputs elided from this session's own conversation are readable
+        conversation = conversation_service.get_conversation(context.session_id)
+        if conversation is None or not conversation.has_tool_output_handle(handle):
+            return ToolResult.error_result(f"Unknown tool output handle: {handle}")
+
+        try:
+            content = get_tool_output_store().get(handle)
+        except OSError as e:
+            return ToolResult.error_result(str(e))
+        if content is None:
+            return ToolResult.error_result(f"Unknown tool output handle: {handle}")
+
+        lines = content.split("\n")
+        start_idx = max(0, offset - 1)
+        end_idx = start_idx + limit if limit else len(lines)
+
+        return ToolResult.success_result(
+            "\n".join(lines[start_idx:end_idx]),
+            handle=handle,
+            total_lines=len(lines),
+        )
+
+
 # Register all file tools
 def register_file_tools() -> None:
     """Register all file operation tools."""
@@ -401,3 +484,4 @@ def register_file_tools() -> None:
     register_tool(EditFileTool())
     register_tool(ListDirectoryTool())
     register_tool(GlobTool())
+    register_tool(ReadToolOutputTool())
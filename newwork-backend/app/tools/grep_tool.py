@@ -10,7 +10,15 @@ import re
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
-from .base import Tool, ToolCategory, ToolContext, ToolResult, register_tool
+from .base import (
+    Tool,
+    ToolAccess,
+    ToolCategory,
+    ToolContext,
+    ToolResource,
+    ToolResult,
+    register_tool,
+)
 
 
 class GrepTool(Tool):
@@ -23,6 +31,8 @@ class GrepTool(Tool):
     )
     category = ToolCategory.SEARCH
     requires_permission = False
+    access = ToolAccess.READ
+    resource = ToolResource.CPU
 
     @property
     def input_schema(self) -> Dict[str, Any]:
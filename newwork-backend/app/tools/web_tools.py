@@ -11,7 +11,7 @@ from urllib.parse import urlparse
 
 import httpx
 
-from .base import Tool, ToolCategory, ToolContext, ToolResult, register_tool
+from .base import Tool, ToolAccess, ToolCategory, ToolContext, ToolResult, register_tool
 
 
 class WebFetchTool(Tool):
@@ -24,6 +24,7 @@ class WebFetchTool(Tool):
     )
     category = ToolCategory.WEB
     requires_permission = False
+    access = ToolAccess.READ
 
     @property
     def input_schema(self) -> Dict[str, Any]:
@@ -181,6 +182,7 @@ class WebSearchTool(Tool):
     )
     category = ToolCategory.WEB
     requires_permission = False
+    access = ToolAccess.READ
 
     @property
     def input_schema(self) -> Dict[str, Any]:
@@ -0,0 +1,6 @@
+"""
+Micro-benchmarks for the NewWork backend.
+
+Run a benchmark from the newwork-backend directory, e.g.:
+    python -m benchmarks.bench_message_conversion
+"""
@@ -0,0 +1,124 @@
+"""
+Event encoding benchmark.
+
+Measures how many events per second one core can prepare for delivery.
+Every event goes to an SSE follower, a WebSocket channel (binary encoding)
+and the on-disk event log spill, the way a session's events do when a
+client follows it over both transports while the memory log overflows.
+
+- "per consumer": the previous path, where each consumer serialized the
+  event with json.dumps on its own (the WebSocket layer parsed the SSE
+  payload again to strip the envelope, the spill wrapped the frame in
+  another JSON document);
+- "encode once": SSEEvent.encode() serializes the event once and every
+  consumer slices the same bytes.
+
+The encode-once path is measured with orjson (if installed) and with the
+standard json fallback. CPU time (time.process_time) is reported, so the
+numbers are per core.
+
+Usage:
+    python -m benchmarks.bench_event_encoding [--events 50000] [--text-bytes 64]
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, List
+
+import app.services.event_encoding as event_encoding
+from app.services.event_log import SPILL_RECORD
+from app.services.streaming_handler import SSEEvent, SSEEventType
+from app.services.ws_multiplexer import BINARY_HEADER, EVENT_TYPE_CODES, encode_binary_event
+
+
+def make_events(count: int, text_bytes: int) -> List[SSEEvent]:
+    """Mostly stream chunks, with a tool call and result every 50 events."""
+    events = []
+    text = "x" * text_bytes
+    for i in range(count):
+        if i % 50 == 48:
+            data = {"tool_use_id": f"tu-{i}", "tool_name": "read_file",
+                    "arguments": {"file_path": "src/app/main.py"}}
+            event_type = SSEEventType.TOOL_CALL
+        elif i % 50 == 49:
+            data = {"tool_use_id": f"tu-{i - 1}", "content": "line\n" * 40, "is_error": False}
+            event_type = SSEEventType.TOOL_RESULT
+        else:
+            data = {"seq": i, "text": text}
+            event_type = SSEEventType.STREAM_CHUNK
+        events.append(SSEEvent(type=event_type, session_id="bench-session", data=data, id=i + 1))
+    return events
+
+
+def per_consumer(event: SSEEvent) -> int:
+    """Serialize the event separately for each consumer (previous path)."""
+    payload = json.dumps({
+        "type": event.type,
+        "data": event.data,
+        "session_id": event.session_id,
+        "timestamp": event.timestamp,
+    })
+    sse = f"id: {event.id}\ndata: {payload}\n\n".encode()
+    parsed = json.loads(payload)
+    ws = BINARY_HEADER.pack(1, event.id, EVENT_TYPE_CODES[parsed["type"]]) + json.dumps(
+        parsed["data"], separators=(",", ":")
+    ).encode()
+    spill = (json.dumps([event.id, sse.decode()]) + "\n").encode()
+    return len(sse) + len(ws) + len(spill)
+
+
+def encode_once(event: SSEEvent) -> int:
+    """Serialize the event once and share the bytes."""
+    event._encoded = None
+    encoded = event.encode()
+    sse = encoded.sse(event.id)
+    ws = encode_binary_event(1, event.id, encoded)
+    spill = SPILL_RECORD.pack(event.id, len(sse))
+    return len(sse) + len(ws) + len(spill) + len(sse)
+
+
+def measure(name: str, events: List[SSEEvent], prepare: Callable[[SSEEvent], int]) -> float:
+    """Run one path and print its rate."""
+    start = time.process_time()
+    size = sum(prepare(event) for event in events)
+    elapsed = time.process_time() - start
+    rate = len(events) / elapsed
+    print(f"{name:<26} {rate:>12,.0f} events/s/core  {size / len(events):>7.0f} B/event")
+    return rate
+
+
+def run(count: int, text_bytes: int) -> None:
+    """Run the benchmark."""
+    events = make_events(count, text_bytes)
+    # Warm up both paths
+    for event in events[:1000]:
+        per_consumer(event)
+        encode_once(event)
+
+    baseline = measure("per consumer (json)", events, per_consumer)
+    results = {}
+    if event_encoding.ORJSON_AVAILABLE:
+        results["encode once (orjson)"] = measure("encode once (orjson)", events, encode_once)
+    event_encoding.ORJSON_AVAILABLE = False
+    try:
+        results["encode once (json)"] = measure("encode once (json)", events, encode_once)
+    finally:
+        event_encoding.ORJSON_AVAILABLE = event_encoding.orjson is not None
+
+    for name, rate in results.items():
+        print(f"{name} speedup: {rate / baseline:.2f}x")
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=50000, help="events to encode")
+    parser.add_argument("--text-bytes", type=int, default=64, help="text per stream chunk")
+    args = parser.parse_args()
+
+    run(args.events, args.text_bytes)
+
+
+if __name__ == "__main__":
+    main()
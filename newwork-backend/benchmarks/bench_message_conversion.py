@@ -0,0 +1,78 @@
+"""
+Message conversion benchmark.
+
+Measures the cost of converting conversation history to provider payloads
+over an agentic turn, where the whole history is sent on every tool-loop
+iteration. "uncached" invalidates every message before conversion, which
+matches the behaviour before payloads were memoized.
+
+Usage:
+    python -m benchmarks.bench_message_conversion [--iterations 10]
+"""
+
+import argparse
+import time
+from typing import List
+
+from app.services.conversation_service import Conversation, ConversationMessage
+from app.services.llm.base import ToolResult, ToolUse
+
+
+def build_conversation(size: int) -> Conversation:
+    """Build a conversation of roughly `size` messages with tool exchanges."""
+    conv = Conversation(session_id="bench")
+    i = 0
+    while len(conv.messages) < size:
+        conv.add_user_message(f"Please look at module {i} and explain it.")
+        tool_use = ToolUse(id=f"tu-{i}", name="read_file", arguments={"file_path": f"src/m{i}.py"})
+        conv.add_assistant_message("Reading the file.", tool_uses=[tool_use])
+        conv.add_tool_results([ToolResult(tool_use_id=f"tu-{i}", content="x = 1\n" * 50)])
+        conv.add_assistant_message(f"Module {i} defines x.")
+        i += 1
+    return conv
+
+
+def convert(messages: List[ConversationMessage], provider_format: str, cached: bool) -> None:
+    """Convert all messages to the given provider format."""
+    for msg in messages:
+        if not cached:
+            msg.invalidate_cache()
+        llm_message = msg.to_llm_message()
+        if provider_format == "anthropic":
+            llm_message.to_anthropic_format()
+        else:
+            llm_message.to_openai_format()
+
+
+def run(size: int, iterations: int, provider_format: str, cached: bool) -> float:
+    """Simulate one agentic turn and return elapsed seconds."""
+    conv = build_conversation(size)
+    start = time.perf_counter()
+    for i in range(iterations):
+        convert(conv.messages, provider_format, cached)
+        # Each iteration appends an assistant tool call and its result
+        tool_use = ToolUse(id=f"loop-{i}", name="grep", arguments={"pattern": "x"})
+        conv.add_assistant_message("", tool_uses=[tool_use])
+        conv.add_tool_results([ToolResult(tool_use_id=f"loop-{i}", content="match")])
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark and print a table."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=10, help="tool-loop iterations")
+    args = parser.parse_args()
+
+    print(f"{'messages':>9} {'format':>10} {'uncached ms':>12} {'cached ms':>10} {'speedup':>8}")
+    for size in (1000, 10000):
+        for provider_format in ("anthropic", "openai"):
+            uncached = run(size, args.iterations, provider_format, cached=False)
+            cached = run(size, args.iterations, provider_format, cached=True)
+            print(
+                f"{size:>9} {provider_format:>10} {uncached * 1000:>12.1f} "
+                f"{cached * 1000:>10.1f} {uncached / cached:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
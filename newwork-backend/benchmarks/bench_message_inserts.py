@@ -0,0 +1,151 @@
+"""
+Message insert benchmark.
+
+Measures sustained message inserts per second into the `messages` table of
+an SQLite file, with conversations adding messages as fast as they can:
+
+- "commit per message": every message is written in its own transaction
+  as soon as it is added;
+- "write-behind": messages go through MessageStore's queue and are written
+  in batches of --batch-size, together with the session token totals.
+
+Wall-clock time from the first message until the last one is committed is
+reported, since the cost is dominated by SQLite's commits (fsync).
+
+Usage:
+    python -m benchmarks.bench_message_inserts [--messages 5000] [--sessions 8] [--batch-size 64]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Callable, List
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.db.database as database
+from app.models.session import Message as MessageModel, Session as SessionModel
+from app.services.conversation_service import Conversation
+from app.services.message_store import MessageStore
+
+
+def use_database(path: str) -> None:
+    """Point the app's database at a fresh SQLite file."""
+    database.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=database.engine)
+    database.Base.metadata.create_all(bind=database.engine)
+
+
+def make_conversations(store: MessageStore, count: int, prefix: str) -> List[Conversation]:
+    """Create sessions and conversations whose messages go to the store."""
+    db = database.SessionLocal()
+    try:
+        for i in range(count):
+            db.add(SessionModel(id=f"{prefix}-{i}", title="bench"))
+        db.commit()
+    finally:
+        db.close()
+    conversations = []
+    for i in range(count):
+        conversation = Conversation(session_id=f"{prefix}-{i}")
+        conversation.on_message = store.enqueue
+        conversations.append(conversation)
+    return conversations
+
+
+def add_message(conversation: Conversation, i: int, text: str) -> None:
+    """Add alternating user and assistant messages."""
+    if i % 2:
+        conversation.add_assistant_message(text, tokens_used=len(text) // 4)
+    else:
+        conversation.add_user_message(text)
+
+
+async def commit_per_message(store: MessageStore, conversations: List[Conversation], count: int, text: str) -> None:
+    """Write each message in its own transaction."""
+    for i in range(count):
+        add_message(conversations[i % len(conversations)], i, text)
+        await store.flush("message")
+
+
+async def write_behind(store: MessageStore, conversations: List[Conversation], count: int, text: str) -> None:
+    """Queue messages and let the store write them in batches."""
+    for i in range(count):
+        add_message(conversations[i % len(conversations)], i, text)
+        if i % 16 == 15:
+            await asyncio.sleep(0)  # Give queued writes a chance to start
+    await store.close()
+
+
+async def measure(
+    name: str,
+    path: Callable,
+    store: MessageStore,
+    sessions: int,
+    count: int,
+    text: str,
+) -> float:
+    """Run one path and print its rate."""
+    store.start()
+    conversations = make_conversations(store, sessions, name)
+    start = time.perf_counter()
+    await path(store, conversations, count, text)
+    elapsed = time.perf_counter() - start
+
+    db = database.SessionLocal()
+    try:
+        session_ids = [conversation.session_id for conversation in conversations]
+        stored = db.query(MessageModel).filter(MessageModel.session_id.in_(session_ids)).count()
+    finally:
+        db.close()
+    assert stored == count, f"{name}: {stored} of {count} messages stored"
+
+    rate = count / elapsed
+    stats = store.stats
+    print(f"{name:<20} {rate:>10,.0f} inserts/s  {stats.batches:>6} transactions")
+    return rate
+
+
+async def run(count: int, sessions: int, batch_size: int, interval_ms: float, text_bytes: int) -> None:
+    """Run the benchmark."""
+    text = "x" * text_bytes
+    with tempfile.TemporaryDirectory() as directory:
+        use_database(os.path.join(directory, "bench.db"))
+        baseline = await measure(
+            "commit per message",
+            commit_per_message,
+            MessageStore(batch_size=count + 1, flush_interval=3600),
+            sessions,
+            count,
+            text,
+        )
+        rate = await measure(
+            "write-behind",
+            write_behind,
+            MessageStore(batch_size=batch_size, flush_interval=interval_ms / 1000),
+            sessions,
+            count,
+            text,
+        )
+        database.engine.dispose()
+    print(f"write-behind speedup: {rate / baseline:.2f}x")
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000, help="messages to insert per path")
+    parser.add_argument("--sessions", type=int, default=8, help="conversations adding messages")
+    parser.add_argument("--batch-size", type=int, default=64, help="write-behind batch size")
+    parser.add_argument("--interval-ms", type=float, default=500, help="write-behind flush interval")
+    parser.add_argument("--text-bytes", type=int, default=400, help="content per message")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.messages, args.sessions, args.batch_size, args.interval_ms, args.text_bytes))
+
+
+if __name__ == "__main__":
+    main()
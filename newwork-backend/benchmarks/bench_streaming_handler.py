@@ -0,0 +1,136 @@
+"""
+Streaming handler throughput benchmark.
+
+Replays a synthetic cassette through StreamingHandler for many concurrent
+sessions without network access. Each prompt runs one tool-loop iteration
+(read_file) followed by a streamed text answer, and the benchmark reports
+prompts/sec, SSE events/sec, SSE bytes and the SSE encoding cost.
+
+Usage:
+    python -m benchmarks.bench_streaming_handler [--sessions 50] [--deltas 200] [--speed 0]
+        [--coalesce-ms 50] [--protocol delta|accumulated]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.conversation_service import Conversation
+from app.services.llm.base import StreamEvent, StreamEventType, ToolUse
+from app.services.llm.replay_provider import ReplayProvider, append_turn
+from app.services.streaming_handler import (
+    STREAM_PROTOCOL_DELTA,
+    STREAM_PROTOCOLS,
+    StreamingHandler,
+)
+from app.services.tool_execution_service import ToolExecutionService
+from app.tools import initialize_tools
+
+
+def write_cassette(path: Path, deltas: int, delay: float) -> None:
+    """Write a tool_use turn and a text turn with `deltas` text chunks."""
+    tool_use = ToolUse(id="tu-1", name="read_file", arguments={"file_path": "notes.txt"})
+    tool_events = [
+        StreamEvent(type=StreamEventType.MESSAGE_START),
+        StreamEvent(type=StreamEventType.TEXT_DELTA, text="Let me read the notes."),
+        StreamEvent(type=StreamEventType.TOOL_USE_START, tool_use_id="tu-1", tool_name="read_file"),
+        StreamEvent(type=StreamEventType.TOOL_USE_END, tool_use=tool_use),
+        StreamEvent(type=StreamEventType.MESSAGE_END),
+    ]
+    text_events = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+    text_events += [
+        StreamEvent(type=StreamEventType.TEXT_DELTA, text=f"token{i} ") for i in range(deltas)
+    ]
+    text_events.append(StreamEvent(type=StreamEventType.MESSAGE_END))
+
+    append_turn(path, {"depth": 0, "events": [[delay, e.to_dict()] for e in tool_events]})
+    append_turn(path, {"depth": 1, "events": [[delay, e.to_dict()] for e in text_events]})
+
+
+async def run_session(
+    provider: ReplayProvider,
+    workspace: Path,
+    index: int,
+    coalesce_ms: float,
+    protocol: str,
+) -> tuple:
+    """Run one prompt and return (SSE events, SSE bytes, encode seconds)."""
+    handler = StreamingHandler(
+        provider=provider,
+        conversation=Conversation(session_id=f"bench-{index}", model="replay"),
+        tool_service=ToolExecutionService(workspace_path=workspace, session_id=f"bench-{index}"),
+        coalesce_interval=coalesce_ms / 1000,
+        stream_protocol=protocol,
+    )
+    count = 0
+    size = 0
+    encode = 0.0
+    async for event in handler.process_prompt("Summarize the notes."):
+        start = time.perf_counter()
+        size += len(event.sse_frame())
+        encode += time.perf_counter() - start
+        count += 1
+    return count, size, encode
+
+
+async def run(
+    sessions: int,
+    deltas: int,
+    speed: float,
+    delay: float,
+    coalesce_ms: float,
+    protocol: str,
+) -> None:
+    """Run all sessions concurrently and print throughput."""
+    initialize_tools()
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = Path(tmp)
+        (workspace / "notes.txt").write_text("remember the milk\n" * 20)
+        cassette = workspace / "cassette.jsonl"
+        write_cassette(cassette, deltas, delay)
+        provider = ReplayProvider(cassette=cassette, speed=speed)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(run_session(provider, workspace, i, coalesce_ms, protocol) for i in range(sessions))
+        )
+        elapsed = time.perf_counter() - start
+
+    events = sum(count for count, _, _ in results)
+    size = sum(size for _, size, _ in results)
+    encode = sum(seconds for _, _, seconds in results)
+    print(f"sessions:      {sessions}")
+    print(f"elapsed:       {elapsed * 1000:.1f} ms")
+    print(f"prompts/sec:   {sessions / elapsed:.1f}")
+    print(f"SSE events:    {events} ({events / elapsed:.0f}/sec)")
+    print(f"SSE bytes:     {size / 1024:.1f} KiB ({size / sessions / 1024:.1f} KiB/prompt)")
+    print(f"SSE encoding:  {encode * 1000:.1f} ms total")
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent sessions")
+    parser.add_argument("--deltas", type=int, default=200, help="text deltas per answer")
+    parser.add_argument("--speed", type=float, default=0, help="replay speed (0 = unthrottled)")
+    parser.add_argument("--delay", type=float, default=0.01, help="recorded delay per event")
+    parser.add_argument(
+        "--coalesce-ms", type=float, default=0, help="text delta coalescing interval (0 = off)"
+    )
+    parser.add_argument(
+        "--protocol",
+        choices=STREAM_PROTOCOLS,
+        default=STREAM_PROTOCOL_DELTA,
+        help="STREAM_CHUNK format",
+    )
+    args = parser.parse_args()
+
+    asyncio.run(run(
+        args.sessions, args.deltas, args.speed, args.delay, args.coalesce_ms, args.protocol
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+SSE vs WebSocket transport benchmark.
+
+Runs the same replayed prompt for many concurrent sessions and delivers the
+events twice: once per session the way the SSE endpoint does (one response
+following each session event log), once over a single multiplexed WebSocket
+connection (SessionMultiplexer with JSON and binary encodings). Each sink
+decodes frames like a client, and the WebSocket sink acks every half
+window. No network is involved, so the numbers compare the transports'
+framing and scheduling cost and the bytes each puts on the wire.
+
+Usage:
+    python -m benchmarks.bench_ws_vs_sse [--sessions 50] [--deltas 200] [--window 256]
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+from app.services.conversation_service import Conversation
+from app.services.event_log import event_log_service
+from app.services.llm.replay_provider import ReplayProvider
+from app.services.streaming_handler import StreamingHandler
+from app.services.tool_execution_service import ToolExecutionService
+from app.services.ws_multiplexer import (
+    ENCODING_BINARY,
+    ENCODING_JSON,
+    SessionMultiplexer,
+    decode_binary_event,
+)
+from app.tools import initialize_tools
+
+from benchmarks.bench_streaming_handler import write_cassette
+
+
+def handler_factory(provider: ReplayProvider, workspace: Path):
+    """Build create_streaming_handler replacements using the cassette."""
+
+    def create(session_id: str, workspace_path: Path, **kwargs) -> StreamingHandler:
+        return StreamingHandler(
+            provider=provider,
+            conversation=Conversation(session_id=session_id, model="replay"),
+            tool_service=ToolExecutionService(workspace_path=workspace, session_id=session_id),
+            coalesce_interval=0,
+        )
+
+    return create
+
+
+async def run_sse(create, workspace: Path, sessions: int) -> Dict[str, float]:
+    """One followed event log per session, as the SSE endpoint serves it."""
+
+    async def one(session_id: str) -> tuple:
+        log = event_log_service.get(session_id)
+        handler = create(session_id, workspace)
+        after = log.last_id
+        log.start_run(handler.process_prompt("Summarize the notes."))
+        frames = 0
+        size = 0
+        async for frame in log.follow(after, until_idle=True):
+            json.loads(frame[frame.index(b"data: ") + 6:])
+            frames += 1
+            size += len(frame)
+        event_log_service.discard(session_id)
+        return frames, size
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(f"sse-{uuid.uuid4()}") for _ in range(sessions)))
+    elapsed = time.perf_counter() - start
+    return {
+        "connections": sessions,
+        "elapsed": elapsed,
+        "frames": sum(frames for frames, _ in results),
+        "bytes": sum(size for _, size in results),
+    }
+
+
+async def run_ws(
+    create,
+    workspace: Path,
+    sessions: int,
+    encoding: str,
+    window: int,
+) -> Dict[str, float]:
+    """All sessions over one multiplexed connection, acking every half window."""
+    session_ids: List[str] = [f"ws-{uuid.uuid4()}" for _ in range(sessions)]
+    done = asyncio.Event()
+    finished = set()
+    stats = {"frames": 0, "bytes": 0}
+    unacked: Dict[str, int] = {}
+
+    async def send(frame) -> None:
+        if isinstance(frame, bytes):
+            event = decode_binary_event(frame)
+            by_number = {c.number: c.session_id for c in multiplexer.channels.values()}
+            session_id, event_id, kind = by_number[event["channel"]], event["id"], event["type"]
+        else:
+            message = json.loads(frame)
+            if "op" in message:
+                return
+            session_id, event_id = message["event"]["session_id"], message["id"]
+            kind = message["event"]["type"]
+            frame = frame.encode()
+        stats["frames"] += 1
+        stats["bytes"] += len(frame)
+
+        unacked[session_id] = unacked.get(session_id, 0) + 1
+        if event_id and unacked[session_id] >= window // 2:
+            unacked[session_id] = 0
+            await multiplexer.handle(json.dumps(
+                {"op": "ack", "channel": session_id, "event_id": event_id}
+            ))
+        if kind == "complete":
+            finished.add(session_id)
+            if len(finished) == sessions:
+                done.set()
+
+    multiplexer = SessionMultiplexer(
+        send,
+        lambda session_id: workspace,
+        encoding=encoding,
+        window=window,
+        max_channels=sessions,
+        create_handler=create,
+    )
+    start = time.perf_counter()
+    for session_id in session_ids:
+        await multiplexer.handle(json.dumps(
+            {"op": "prompt", "channel": session_id, "prompt": "Summarize the notes."}
+        ))
+    await done.wait()
+    elapsed = time.perf_counter() - start
+
+    await multiplexer.close()
+    for session_id in session_ids:
+        event_log_service.discard(session_id)
+    return {"connections": 1, "elapsed": elapsed, **stats}
+
+
+async def run(sessions: int, deltas: int, window: int) -> None:
+    """Run every transport over the same cassette and print a comparison."""
+    initialize_tools()
+    with tempfile.TemporaryDirectory() as tmp:
+        workspace = Path(tmp)
+        (workspace / "notes.txt").write_text("remember the milk\n" * 20)
+        cassette = workspace / "cassette.jsonl"
+        write_cassette(cassette, deltas, 0)
+        create = handler_factory(ReplayProvider(cassette=cassette, speed=0), workspace)
+
+        results = {
+            "SSE": await run_sse(create, workspace, sessions),
+            "WS json": await run_ws(create, workspace, sessions, ENCODING_JSON, window),
+            "WS binary": await run_ws(create, workspace, sessions, ENCODING_BINARY, window),
+        }
+
+    print(f"sessions: {sessions}, deltas: {deltas}, window: {window}")
+    print(f"{'transport':<10} {'conns':>5} {'elapsed ms':>10} {'events/sec':>11} {'KiB':>9} {'B/event':>8}")
+    for name, r in results.items():
+        print(
+            f"{name:<10} {r['connections']:>5} {r['elapsed'] * 1000:>10.1f} "
+            f"{r['frames'] / r['elapsed']:>11.0f} {r['bytes'] / 1024:>9.1f} "
+            f"{r['bytes'] / r['frames']:>8.1f}"
+        )
+
+
+def main() -> None:
+    """Parse arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent sessions")
+    parser.add_argument("--deltas", type=int, default=200, help="text deltas per answer")
+    parser.add_argument("--window", type=int, default=256, help="WebSocket channel window")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.sessions, args.deltas, args.window))
+
+
+if __name__ == "__main__":
+    main()
@@ -71,3 +71,19 @@ class TestProviderModels:
 
         # Should return 404 or 400
         assert response.status_code in [400, 404]
+
+
+@pytest.mark.unit
+class TestProviderRateLimits:
+    """Rate limiter state endpoint tests."""
+
+    def test_get_rate_limits(self, client):
+        """
+        GET /api/v1/providers/rate-limits returns limiter snapshots.
+        """
+        response = client.get("/api/v1/providers/rate-limits")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert "enabled" in data
+        assert isinstance(data["limiters"], list)
@@ -2,6 +2,9 @@
 Session API tests.
 """
 
+import json
+import time
+
 import pytest
 
 
@@ -115,3 +118,184 @@ class TestSessionMessages:
         # Response can be empty list or dict with messages key
         messages = data if isinstance(data, list) else data.get("messages", [])
         assert isinstance(messages, list)
+
+    def test_messages_survive_a_restart(self, client, test_session_data, monkeypatch, tmp_path):
+        """
+        Messages are read back from the database once the in-memory conversation is gone.
+        """
+        import app.api.sessions as module
+        from app.services.conversation_service import conversation_service
+        from app.services.message_store import message_store
+        from tests.conftest import StubProvider, make_handler, text_turn
+
+        def create(session_id, workspace_path, **kwargs):
+            conversation = conversation_service.get_or_create_conversation(session_id, model="stub-model")
+            return make_handler(StubProvider([text_turn("hi")]), tmp_path, conversation)
+
+        monkeypatch.setattr(module, "create_streaming_handler", create)
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+        written = message_store.stats.messages
+
+        client.post(f"/api/v1/sessions/{session_id}/prompt/stream", json={"prompt": "q"})
+        deadline = time.monotonic() + 2
+        while message_store.stats.messages < written + 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        conversation_service._conversations.clear()
+
+        response = client.get(f"/api/v1/sessions/{session_id}/messages")
+
+        assert [(m["role"], m["content"]) for m in response.json()] == [("user", "q"), ("assistant", "hi")]
+
+
+@pytest.mark.integration
+class TestSessionToolOutputs:
+    """Retrieval of elided tool outputs."""
+
+    def test_get_tool_output(self, client, test_session_data, tmp_path, monkeypatch):
+        import app.services.tool_output_store as module
+        from app.services.conversation_service import conversation_service
+
+        store = module.ToolOutputStore(tmp_path)
+        monkeypatch.setattr(module, "_store", store)
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+        conversation = conversation_service.get_or_create_conversation(session_id)
+        handle = store.put("full output")
+        other = store.put("another session's output")
+        message = conversation.add_user_message("q")
+        message.metadata["tool_output_handles"] = {"t1": handle}
+
+        response = client.get(f"/api/v1/sessions/{session_id}/tool-outputs/{handle}")
+        foreign = client.get(f"/api/v1/sessions/{session_id}/tool-outputs/{other}")
+
+        assert response.status_code == 200
+        assert response.text == "full output"
+        assert foreign.status_code == 404
+
+
+@pytest.mark.integration
+class TestPromptStream:
+    """Streaming prompt protocol negotiation."""
+
+    @pytest.fixture
+    def stub_handler(self, monkeypatch, tmp_path):
+        import app.api.sessions as module
+        from tests.conftest import StubProvider, make_handler, text_turn
+
+        requested = []
+
+        def create(session_id, workspace_path, **kwargs):
+            requested.append(kwargs["stream_protocol"])
+            handler = make_handler(StubProvider([text_turn("hi")]), tmp_path)
+            handler.stream_protocol = kwargs["stream_protocol"]
+            handler.coalesce_interval = 0
+            return handler
+
+        monkeypatch.setattr(module, "create_streaming_handler", create)
+        return requested
+
+    def _chunks(self, response):
+        events = [json.loads(line[6:]) for line in response.text.splitlines() if line.startswith("data: ")]
+        return [e["data"] for e in events if e["type"] == "stream_chunk"]
+
+    def test_delta_by_default(self, client, test_session_data, stub_handler):
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+
+        response = client.post(f"/api/v1/sessions/{session_id}/prompt/stream", json={"prompt": "q"})
+
+        assert response.headers["X-Stream-Protocol"] == "delta"
+        assert [c["seq"] for c in self._chunks(response)] == [0, 1]
+
+    def test_accumulated_on_request(self, client, test_session_data, stub_handler):
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+
+        response = client.post(
+            f"/api/v1/sessions/{session_id}/prompt/stream",
+            json={"prompt": "q"},
+            headers={"X-Stream-Protocol": "accumulated"},
+        )
+
+        assert response.headers["X-Stream-Protocol"] == "accumulated"
+        assert self._chunks(response) == [{"content": "hi", "accumulated": "hi"}]
+        assert stub_handler == ["accumulated"]
+
+    def test_resume_replays_missed_events(self, client, test_session_data, stub_handler):
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+        url = f"/api/v1/sessions/{session_id}/prompt/stream"
+
+        first = client.post(url, json={"prompt": "q"})
+        ids = [int(line[4:]) for line in first.text.splitlines() if line.startswith("id: ")]
+        resumed = client.post(url, json={"prompt": "q"}, headers={"Last-Event-ID": str(ids[1])})
+        finished = client.post(url, json={"prompt": "q"}, headers={"Last-Event-ID": str(ids[-1])})
+
+        assert ids == list(range(ids[0], ids[0] + len(ids)))
+        assert resumed.status_code == 200
+        assert resumed.text == "".join(first.text.partition(f"id: {ids[2]}\n")[1:])
+        assert finished.status_code == 404
+        assert len(stub_handler) == 1
+
+    def test_prompt_while_running_conflicts(self, client, test_session_data, stub_handler, monkeypatch):
+        from app.services.event_log import SessionEventLog
+
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+        monkeypatch.setattr(SessionEventLog, "running", property(lambda self: True))
+
+        response = client.post(f"/api/v1/sessions/{session_id}/prompt/stream", json={"prompt": "q"})
+
+        assert response.status_code == 409
+        assert stub_handler == []
+
+
+@pytest.mark.integration
+class TestAgentRuns:
+    """Background prompt runs."""
+
+    @pytest.fixture
+    def stub_handler(self, monkeypatch, tmp_path):
+        import app.api.sessions as module
+        from tests.conftest import StubProvider, make_handler, text_turn
+
+        def create(session_id, workspace_path, **kwargs):
+            handler = make_handler(StubProvider([text_turn("hi")]), tmp_path)
+            handler.conversation.session_id = session_id
+            handler.coalesce_interval = 0
+            return handler
+
+        monkeypatch.setattr(module, "create_streaming_handler", create)
+
+    def test_prompt_returns_a_run(self, client, test_session_data, stub_handler):
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+
+        response = client.post(f"/api/v1/sessions/{session_id}/prompt", json={"prompt": "q"})
+        assert response.status_code == 202
+        accepted = response.json()
+        run_url = f"/api/v1/sessions/{session_id}/runs/{accepted['run_id']}"
+
+        events = client.get(f"{run_url}/events")
+        run = client.get(run_url).json()
+        runs = client.get(f"/api/v1/sessions/{session_id}/runs").json()
+
+        frames = [json.loads(line[6:]) for line in events.text.splitlines() if line.startswith("data: ")]
+        assert accepted["status"] == "queued"
+        assert frames[-1]["type"] == "complete"
+        assert run["state"] == "done"
+        assert run["start_event_id"] == accepted["start_event_id"]
+        assert [r["run_id"] for r in runs] == [accepted["run_id"]]
+        assert client.get("/api/v1/sessions/run-metrics").json()["max_concurrent"] >= 0
+
+    def test_unknown_run(self, client, test_session_data):
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+
+        assert client.get(f"/api/v1/sessions/{session_id}/runs/nope").status_code == 404
+        assert client.post(f"/api/v1/sessions/{session_id}/runs/nope/cancel").status_code == 404
+
+    def test_permission_for_a_run_that_is_not_waiting(self, client, test_session_data, stub_handler):
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+        run_id = client.post(f"/api/v1/sessions/{session_id}/prompt", json={"prompt": "q"}).json()["run_id"]
+        run_url = f"/api/v1/sessions/{session_id}/runs/{run_id}"
+        client.get(f"{run_url}/events")
+
+        bad = client.post(f"{run_url}/permission", json={"permission_id": "p", "reply": "maybe"})
+        conflict = client.post(f"{run_url}/permission", json={"permission_id": "p", "reply": "deny"})
+
+        assert bad.status_code == 400
+        assert conflict.status_code == 409
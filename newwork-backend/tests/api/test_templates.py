@@ -0,0 +1,114 @@
+"""
+Template API tests.
+"""
+
+import json
+
+import pytest
+
+from app.models.template import Template
+from app.services.batch_run_service import BatchCheckpoint
+from app.services.llm import _PROVIDERS, register_provider
+
+from tests.conftest import StubProvider
+from tests.services.test_batch_run_service import echo
+
+
+@pytest.fixture
+def echo_provider(monkeypatch, tmp_path):
+    """Register the echo provider and keep checkpoints in tmp_path."""
+    from app.api import templates
+    from app.services.config_service import ConfigService, settings
+
+    register_provider(
+        "echo",
+        type("EchoProvider", (StubProvider,), {"provider_name": "echo", "reply": staticmethod(echo)}),
+    )
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_ENABLED", False)
+    monkeypatch.setattr(ConfigService, "get_api_key", staticmethod(lambda name: "key"))
+    monkeypatch.setattr(
+        templates,
+        "get_checkpoint",
+        lambda run_id, params: BatchCheckpoint(tmp_path / f"{run_id}.jsonl", params),
+    )
+    yield
+    _PROVIDERS.pop("echo", None)
+
+
+@pytest.fixture
+def review_template(db):
+    template = Template(id="tpl-1", title="Review", prompt="Review {file}")
+    db.add(template)
+    db.commit()
+    return template
+
+
+@pytest.mark.unit
+class TestTemplateBatchRun:
+    """Batch run endpoint tests."""
+
+    def test_batch_run_streams_ndjson(self, client, echo_provider, review_template):
+        response = client.post(
+            "/api/v1/templates/tpl-1/batch-run",
+            json={
+                "variable_sets": [{"file": "a.py"}, {"file": "b.py"}],
+                "provider": "echo",
+                "model": "echo",
+                "run_id": "run-1",
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0] == {"type": "start", "run_id": "run-1", "template_id": "tpl-1", "total": 2}
+        outputs = sorted(line["output"] for line in lines[1:-1])
+        assert outputs == ["echo: Review a.py", "echo: Review b.py"]
+        assert lines[-1]["type"] == "summary"
+        assert lines[-1]["completed"] == 2
+
+    def test_batch_run_resumes(self, client, echo_provider, review_template):
+        body = {"variable_sets": [{"file": "a.py"}], "provider": "echo", "run_id": "run-2"}
+        client.post("/api/v1/templates/tpl-1/batch-run", json=body)
+
+        response = client.post("/api/v1/templates/tpl-1/batch-run", json=body)
+
+        summary = json.loads(response.text.splitlines()[-1])
+        assert summary["resumed"] == 1
+        assert summary["completed"] == 0
+
+    def test_batch_run_refuses_resume_with_other_params(
+        self, client, echo_provider, review_template
+    ):
+        body = {"variable_sets": [{"file": "a.py"}], "provider": "echo", "run_id": "run-3"}
+        client.post("/api/v1/templates/tpl-1/batch-run", json=body)
+
+        response = client.post(
+            "/api/v1/templates/tpl-1/batch-run", json={**body, "temperature": 0.0}
+        )
+
+        assert response.status_code == 409
+
+    def test_batch_run_rejects_unsafe_run_id(self, client, echo_provider, review_template):
+        response = client.post(
+            "/api/v1/templates/tpl-1/batch-run",
+            json={"variable_sets": [{}], "provider": "echo", "run_id": "../escape"},
+        )
+
+        assert response.status_code == 422
+
+    def test_batch_run_unknown_template(self, client, echo_provider):
+        response = client.post(
+            "/api/v1/templates/missing/batch-run",
+            json={"variable_sets": [{}], "provider": "echo"},
+        )
+
+        assert response.status_code == 404
+
+
+@pytest.mark.unit
+def test_run_template_renders_prompt(client, review_template):
+    response = client.post("/api/v1/templates/tpl-1/run", json={"variables": {"file": "a.py"}})
+
+    assert response.status_code == 200
+    assert response.json()["prompt"] == "Review a.py"
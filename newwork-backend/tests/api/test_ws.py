@@ -0,0 +1,78 @@
+"""
+WebSocket endpoint tests.
+"""
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.services.ws_multiplexer import decode_binary_event
+
+
+@pytest.fixture
+def stub_handler(monkeypatch, tmp_path):
+    import app.services.ws_multiplexer as module
+    from tests.conftest import StubProvider, make_handler, text_turn
+
+    def create(session_id, workspace_path, **kwargs):
+        handler = make_handler(StubProvider([text_turn("hi")]), tmp_path)
+        handler.conversation.session_id = session_id
+        handler.coalesce_interval = 0
+        return handler
+
+    monkeypatch.setattr(module, "create_streaming_handler", create)
+
+
+@pytest.mark.integration
+class TestSessionSocket:
+    """Multiplexed session WebSocket."""
+
+    def test_prompt_over_socket(self, client, test_session_data, stub_handler):
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"op": "subscribe", "channel": session_id})
+            assert ws.receive_json()["op"] == "subscribed"
+            ws.send_json({"op": "prompt", "channel": session_id, "prompt": "q"})
+
+            frames = []
+            while not frames or frames[-1].get("event", {}).get("type") != "complete":
+                frames.append(ws.receive_json())
+
+        accepted = [f for f in frames if f.get("op") == "accepted"]
+        assert accepted == [{
+            "op": "accepted", "channel": session_id, "request": "prompt", "run_id": accepted[0]["run_id"],
+        }]
+        run = client.get(f"/api/v1/sessions/{session_id}/runs/{accepted[0]['run_id']}").json()
+        assert run["state"] == "done"
+        events = [f for f in frames if "event" in f]
+        ids = [e["id"] for e in events]
+        assert ids == list(range(ids[0], ids[0] + len(ids)))
+        assert all(e["event"]["session_id"] == session_id for e in events)
+
+    def test_binary_encoding(self, client, test_session_data, stub_handler):
+        session_id = client.post("/api/v1/sessions", json=test_session_data).json()["id"]
+
+        with client.websocket_connect("/ws?encoding=binary") as ws:
+            ws.send_json({"op": "subscribe", "channel": session_id})
+            number = ws.receive_json()["number"]
+            ws.send_json({"op": "prompt", "channel": session_id, "prompt": "q"})
+
+            events = []
+            while not events or events[-1]["type"] != "complete":
+                message = ws.receive()
+                if message.get("bytes") is not None:
+                    events.append(decode_binary_event(message["bytes"]))
+
+        assert {e["channel"] for e in events} == {number}
+
+    def test_unknown_session(self, client):
+        with client.websocket_connect("/ws") as ws:
+            ws.send_json({"op": "subscribe", "channel": "missing"})
+            reply = ws.receive_json()
+
+        assert reply == {"op": "error", "channel": "missing", "error": "Session not found"}
+
+    def test_unknown_encoding_is_refused(self, client):
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/ws?encoding=xml") as ws:
+                ws.receive_text()
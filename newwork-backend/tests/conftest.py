@@ -2,6 +2,8 @@
 Test configuration and fixtures.
 """
 
+import asyncio
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi.testclient import TestClient
@@ -17,6 +19,14 @@ from app.models.template import Template  # noqa: F401
 from app.models.workspace import Workspace  # noqa: F401
 from app.models.permission import Permission  # noqa: F401
 from app.models.skill import Skill  # noqa: F401
+from app.services.llm.base import (
+    ContentBlock,
+    LLMProvider,
+    LLMResponse,
+    ModelInfo,
+    StreamEvent,
+    StreamEventType,
+)
 
 # Test database URL (in-memory SQLite with shared cache for connection sharing)
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///file::memory:?cache=shared&uri=true"
@@ -145,3 +155,142 @@ async def created_session(client, test_session_data):
     response = client.post("/api/v1/sessions", json=test_session_data)
     assert response.status_code == 201
     return response.json()
+
+
+def text_turn(text):
+    """Stream events of a turn that answers with `text`."""
+    return [
+        StreamEvent(type=StreamEventType.MESSAGE_START),
+        StreamEvent(type=StreamEventType.TEXT_DELTA, text=text),
+        StreamEvent(type=StreamEventType.MESSAGE_END),
+    ]
+
+
+async def collect(agen):
+    """Drain an async generator into a list."""
+    return [item async for item in agen]
+
+
+class StubProvider(LLMProvider):
+    """
+    Configurable provider double.
+
+    stream_complete replays the scripted turns in order and answers with
+    `text` once they run out; complete answers with `reply`, a string or a
+    function of the last prompt, or with an empty response. The class
+    attributes are defaults, so subclasses built with type() can be
+    registered with register_provider.
+    """
+
+    provider_name = "stub"
+    text = "ok"  # Answer once the scripted turns run out
+    reply = None  # complete() answer
+    models = None  # Model catalog; a single stub-model by default
+    delay = 0.0  # Seconds before each streamed event and each completion
+    fail = False  # Fail every request
+
+    def __init__(
+        self,
+        turns=(),
+        *,
+        api_key="",
+        context_window=200000,
+        models=None,
+        reply=None,
+        delay=None,
+        fail_on=(),
+    ):
+        self.api_key = api_key
+        self.turns = list(turns)
+        self.context_window = context_window
+        if models is not None:
+            self.models = models
+        if reply is not None:
+            self.reply = reply
+        if delay is not None:
+            self.delay = delay
+        self.fail_on = set(fail_on)
+
+        self.requests = []  # stream_complete calls
+        self.completions = []  # complete calls
+        self.started = 0
+        self.cancelled = 0
+        self.closed = False
+        self.active = 0
+        self.peak = 0
+
+    async def complete(self, messages, model, **kwargs):
+        self.completions.append({"messages": messages, "model": model, **kwargs})
+        prompt = messages[-1].content if messages else ""
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        if self.fail or prompt in self.fail_on:
+            raise RuntimeError(f"cannot answer {prompt}")
+        if self.reply is None:
+            return LLMResponse(content=[], model=model)
+        text = self.reply(prompt) if callable(self.reply) else self.reply
+        return LLMResponse(
+            content=[ContentBlock(type="text", text=text)],
+            usage={"input_tokens": 3, "output_tokens": 2},
+            model=model,
+        )
+
+    async def stream_complete(self, messages, model, **kwargs):
+        self.requests.append({"messages": messages, "model": model, **kwargs})
+        self.started += 1
+        if self.turns:
+            turn = self.turns.pop(0)
+        elif self.fail:
+            turn = [
+                StreamEvent(type=StreamEventType.MESSAGE_START),
+                StreamEvent(type=StreamEventType.ERROR, error="upstream down"),
+            ]
+        else:
+            turn = text_turn(self.text)
+        try:
+            for event in turn:
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                yield event
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.closed = True
+
+    def get_available_models(self):
+        if self.models is not None:
+            return list(self.models)
+        return [
+            ModelInfo(
+                id="stub-model",
+                name="Stub",
+                provider=self.provider_name,
+                context_window=self.context_window,
+            )
+        ]
+
+    def supports_tools(self, model):
+        return True
+
+    def supports_vision(self, model):
+        return False
+
+
+def make_handler(provider, tmp_path, conversation=None):
+    """Create a streaming handler for a stub provider."""
+    from app.services.conversation_service import Conversation
+    from app.services.streaming_handler import StreamingHandler
+    from app.services.tool_execution_service import ToolExecutionService
+
+    conversation = conversation or Conversation(session_id="s1", model="stub-model")
+    return StreamingHandler(
+        provider=provider,
+        conversation=conversation,
+        tool_service=ToolExecutionService(workspace_path=tmp_path, session_id="s1"),
+    )
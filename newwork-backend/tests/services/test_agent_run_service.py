@@ -0,0 +1,236 @@
+"""
+Agent run service tests.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from app.services.agent_run_service import AgentRunService, RunRejectedError, RunState
+from app.services.event_log import event_log_service
+from app.services.llm.base import StreamEvent, StreamEventType, ToolUse
+from app.services.streaming_handler import SSEEventType
+from app.tools import initialize_tools
+
+from tests.conftest import StubProvider, make_handler, text_turn
+
+
+@pytest.fixture
+def sessions():
+    created = []
+
+    def new():
+        session_id = f"run-{uuid.uuid4().hex[:8]}"
+        created.append(session_id)
+        return session_id
+
+    yield new
+    for session_id in created:
+        event_log_service.discard(session_id)
+
+
+def handler_for(session_id, tmp_path, turns=None, delay=None):
+    handler = make_handler(StubProvider(turns or [text_turn("hi")], delay=delay), tmp_path)
+    handler.conversation.session_id = session_id
+    handler.coalesce_interval = 0
+    return handler
+
+
+def provider_calls(handler):
+    return len(handler.provider.requests)
+
+
+def write_turn(path):
+    tool_use = ToolUse(id="tu-1", name="write_file", arguments={"file_path": path, "content": "x"})
+    return [
+        StreamEvent(type=StreamEventType.MESSAGE_START),
+        StreamEvent(type=StreamEventType.TOOL_USE_END, tool_use=tool_use),
+        StreamEvent(type=StreamEventType.MESSAGE_END),
+    ]
+
+
+async def until(predicate, timeout=1.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+def logged(session_id, event_type=None):
+    entries = event_log_service.get(session_id).since(0)
+    events = [entry.encoded for entry in entries]
+    return [e for e in events if event_type is None or e.type == event_type]
+
+
+@pytest.mark.unit
+class TestAgentRunService:
+    """Background runs, their states and the concurrency limit."""
+
+    async def test_run_executes_without_a_client(self, sessions, tmp_path):
+        service = AgentRunService(max_concurrent=2)
+        session_id = sessions()
+        log = event_log_service.get(session_id)
+        log.resume_grace = 0
+
+        run = service.submit(session_id, handler_for(session_id, tmp_path), "q")
+        assert run.state == RunState.QUEUED
+        await run.task
+
+        assert run.state == RunState.DONE
+        assert run.started_at is not None and run.finished_at is not None
+        assert run.start_event_id == 0
+        assert logged(session_id, SSEEventType.COMPLETE)
+        assert service.get(run.id) is run
+        assert service.for_session(session_id) == [run]
+        assert run.to_dict()["state"] == "done"
+
+    async def test_attended_run_is_abandoned(self, sessions, tmp_path):
+        service = AgentRunService()
+        session_id = sessions()
+        event_log_service.get(session_id).resume_grace = 0
+        handler = handler_for(session_id, tmp_path, delay=0.05)
+
+        run = service.submit(session_id, handler, "q", detached=False)
+        await asyncio.gather(run.task, return_exceptions=True)
+
+        assert run.state == RunState.CANCELLED
+
+    async def test_concurrency_limit_queues_runs(self, sessions, tmp_path):
+        service = AgentRunService(max_concurrent=1)
+        first, second = sessions(), sessions()
+
+        a = service.submit(first, handler_for(first, tmp_path, delay=0.02), "a")
+        b = service.submit(second, handler_for(second, tmp_path, delay=0.02), "b")
+        await asyncio.sleep(0.01)
+
+        assert (a.state, b.state) == (RunState.RUNNING, RunState.QUEUED)
+        assert service.stats()["executing"] == 1
+        await asyncio.gather(a.task, b.task)
+
+        assert (a.state, b.state) == (RunState.DONE, RunState.DONE)
+        assert b.started_at >= a.finished_at
+        queued = logged(second, SSEEventType.STATUS)[0]
+        assert b'"status":"queued"' in bytes(queued.data)
+        assert service.stats()["executing"] == 0
+
+    async def test_cancelled_queued_run_gives_up_its_place(self, sessions, tmp_path):
+        service = AgentRunService(max_concurrent=1)
+        first, second, third = sessions(), sessions(), sessions()
+
+        a = service.submit(first, handler_for(first, tmp_path, delay=0.02), "a")
+        b = service.submit(second, handler_for(second, tmp_path), "b")
+        c = service.submit(third, handler_for(third, tmp_path), "c")
+        await asyncio.sleep(0)
+        assert service.cancel(b)
+        await asyncio.gather(a.task, b.task, c.task, return_exceptions=True)
+
+        assert [r.state for r in (a, b, c)] == [RunState.DONE, RunState.CANCELLED, RunState.DONE]
+        assert b.started_at is None
+        assert service.stats()["executing"] == 0
+
+    async def test_one_run_per_session(self, sessions, tmp_path):
+        service = AgentRunService()
+        session_id = sessions()
+
+        run = service.submit(session_id, handler_for(session_id, tmp_path, delay=0.01), "a")
+        with pytest.raises(RunRejectedError):
+            service.submit(session_id, handler_for(session_id, tmp_path), "b")
+        await run.task
+
+    async def test_permission_continues_the_run(self, sessions, tmp_path):
+        initialize_tools()
+        service = AgentRunService()
+        session_id = sessions()
+        handler = handler_for(session_id, tmp_path, turns=[write_turn("out.txt"), text_turn("done")])
+
+        run = service.submit(session_id, handler, "write it")
+        await until(lambda: run.state == RunState.WAITING_PERMISSION)
+        assert service.current(session_id) is run
+        assert service.stats()["executing"] == 0
+        (pending,) = handler.tool_service.get_pending_permissions()
+        with pytest.raises(RunRejectedError):
+            service.respond_permission(run, "nope", approved=True)
+
+        service.respond_permission(run, pending.id, approved=True)
+        await run.task
+
+        assert run.state == RunState.DONE
+        assert (tmp_path / "out.txt").read_text() == "x"
+        assert service.current(session_id) is None
+        assert provider_calls(handler) == 2
+        requested = logged(session_id, SSEEventType.PERMISSION_REQUEST)
+        assert [e.type for e in requested] == [SSEEventType.PERMISSION_REQUEST]
+        with pytest.raises(RunRejectedError):
+            service.respond_permission(run, pending.id, approved=True)
+
+    async def test_new_prompt_replaces_a_waiting_run(self, sessions, tmp_path):
+        initialize_tools()
+        service = AgentRunService()
+        session_id = sessions()
+        handler = handler_for(session_id, tmp_path, turns=[write_turn("out.txt"), text_turn("next")])
+        run = service.submit(session_id, handler, "write it")
+        await until(lambda: run.state == RunState.WAITING_PERMISSION)
+
+        second = service.submit(session_id, handler, "never mind")
+        await second.task
+
+        assert (run.state, second.state) == (RunState.CANCELLED, RunState.DONE)
+        assert not (tmp_path / "out.txt").exists()
+        assert not handler.tool_service.get_pending_permissions()
+        roles = [m.role.value for m in handler.conversation.messages]
+        assert roles == ["user", "assistant", "user", "assistant", "user", "assistant"]
+
+    async def test_drain_cancels_waiting_runs_at_once(self, sessions, tmp_path):
+        initialize_tools()
+        service = AgentRunService()
+        session_id = sessions()
+        handler = handler_for(session_id, tmp_path, turns=[write_turn("out.txt")])
+        run = service.submit(session_id, handler, "write it")
+        await until(lambda: run.state == RunState.WAITING_PERMISSION)
+
+        drained = await asyncio.wait_for(service.drain(timeout=30), 1)
+
+        assert drained == {"drained": 0, "cancelled": 1}
+        assert run.state == RunState.CANCELLED
+
+    async def test_drain_waits_then_cancels(self, sessions, tmp_path):
+        service = AgentRunService()
+        quick, slow = sessions(), sessions()
+        a = service.submit(quick, handler_for(quick, tmp_path), "a")
+        b = service.submit(slow, handler_for(slow, tmp_path, turns=[text_turn("x" * 10)], delay=5), "b")
+
+        drained = await service.drain(timeout=0.2)
+
+        assert drained == {"drained": 1, "cancelled": 1}
+        assert (a.state, b.state) == (RunState.DONE, RunState.CANCELLED)
+        assert not service.draining
+
+    async def test_no_new_runs_while_draining(self, sessions, tmp_path):
+        service = AgentRunService()
+        first, second = sessions(), sessions()
+        run = service.submit(first, handler_for(first, tmp_path, delay=0.05), "a")
+
+        drain = asyncio.create_task(service.drain(timeout=1))
+        await asyncio.sleep(0)
+        with pytest.raises(RunRejectedError):
+            service.submit(second, handler_for(second, tmp_path), "b")
+        await drain
+
+        assert run.state == RunState.DONE
+
+    async def test_history_keeps_recent_finished_runs(self, sessions, tmp_path):
+        service = AgentRunService(history=2)
+        runs = []
+        for _ in range(3):
+            session_id = sessions()
+            run = service.submit(session_id, handler_for(session_id, tmp_path), "q")
+            await run.task
+            runs.append(run)
+        session_id = sessions()
+        last = service.submit(session_id, handler_for(session_id, tmp_path), "q")
+        await last.task
+
+        assert service.get(runs[0].id) is None
+        assert [service.get(r.id) for r in runs[1:]] == runs[1:]
@@ -0,0 +1,135 @@
+"""
+Template batch run tests.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.batch_run_service import (
+    BatchCheckpoint,
+    BatchRunner,
+    CheckpointMismatchError,
+    get_checkpoint,
+    render_template,
+)
+
+from tests.conftest import StubProvider, collect
+
+
+def echo(prompt):
+    return f"echo: {prompt}"
+
+
+def asked(provider):
+    return [call["messages"][-1].content for call in provider.completions]
+
+
+@pytest.mark.unit
+def test_render_template():
+    assert render_template("Review {file} for {focus}", {"file": "a.py", "focus": 1}) == (
+        "Review a.py for 1"
+    )
+    assert render_template("no vars", None) == "no vars"
+
+
+@pytest.mark.unit
+class TestBatchRunner:
+    """Batch execution."""
+
+    async def test_runs_every_item_with_bounded_concurrency(self):
+        provider = StubProvider(reply=echo, delay=0.01)
+        runner = BatchRunner(provider=provider, model="echo", concurrency=3)
+        prompts = [f"p{i}" for i in range(10)]
+
+        results = await collect(runner.run(prompts))
+
+        assert sorted(r.index for r in results) == list(range(10))
+        assert all(r.output == f"echo: p{r.index}" for r in results)
+        assert provider.peak == 3
+        assert runner.totals["completed"] == 10
+        assert runner.totals["input_tokens"] == 30
+
+    async def test_failures_are_reported_per_item(self):
+        provider = StubProvider(reply=echo, fail_on={"p1"})
+        runner = BatchRunner(provider=provider, model="echo")
+
+        results = {r.index: r for r in await collect(runner.run(["p0", "p1", "p2"]))}
+
+        assert results[1].status == "failed"
+        assert "cannot answer" in results[1].error
+        assert results[0].status == results[2].status == "completed"
+        assert runner.totals["failed"] == 1
+
+    async def test_resume_skips_completed_items(self, tmp_path):
+        checkpoint = BatchCheckpoint(tmp_path / "run.jsonl")
+        prompts = ["p0", "p1", "p2"]
+
+        first = StubProvider(reply=echo, fail_on={"p1"})
+        await collect(BatchRunner(provider=first, model="echo", checkpoint=checkpoint).run(prompts))
+
+        second = StubProvider(reply=echo)
+        runner = BatchRunner(provider=second, model="echo", checkpoint=checkpoint)
+        results = {r.index: r for r in await collect(runner.run(prompts))}
+
+        assert asked(second) == ["p1"]
+        assert results[0].resumed and results[2].resumed
+        assert results[1].status == "completed" and not results[1].resumed
+        assert runner.totals == {
+            "completed": 1,
+            "failed": 0,
+            "resumed": 2,
+            "input_tokens": 3,
+            "output_tokens": 2,
+        }
+
+    async def test_changed_prompts_are_rerun(self, tmp_path):
+        checkpoint = BatchCheckpoint(tmp_path / "run.jsonl")
+        await collect(BatchRunner(provider=StubProvider(reply=echo), model="echo", checkpoint=checkpoint).run(["a"]))
+
+        provider = StubProvider(reply=echo)
+        results = await collect(
+            BatchRunner(provider=provider, model="echo", checkpoint=checkpoint).run(["b"])
+        )
+
+        assert asked(provider) == ["b"]
+        assert not results[0].resumed
+
+    async def test_corrupt_checkpoint_line_is_ignored(self, tmp_path):
+        path = tmp_path / "run.jsonl"
+        checkpoint = BatchCheckpoint(path)
+        await collect(BatchRunner(provider=StubProvider(reply=echo), model="echo", checkpoint=checkpoint).run(["a"]))
+        with open(path, "a") as f:
+            f.write('{"type": "item", "ind')
+
+        assert list(checkpoint.load()) == [0]
+
+    async def test_checkpoint_refuses_other_params(self, tmp_path):
+        path = tmp_path / "run.jsonl"
+        params = {"model": "echo", "temperature": 0.0}
+        checkpoint = BatchCheckpoint(path, params)
+        await collect(BatchRunner(provider=StubProvider(reply=echo), model="echo", checkpoint=checkpoint).run(["a"]))
+
+        BatchCheckpoint(path, dict(params)).check()
+        with pytest.raises(CheckpointMismatchError):
+            BatchCheckpoint(path, {**params, "temperature": 0.7}).load()
+
+    async def test_closing_the_stream_cancels_in_flight_items(self):
+        provider = StubProvider(reply=echo, delay=10)
+        runner = BatchRunner(provider=provider, model="echo", concurrency=2)
+        stream = runner.run(["a", "b", "c"])
+
+        task = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await stream.aclose()
+
+        assert provider.active == 0
+
+
+@pytest.mark.unit
+def test_get_checkpoint_rejects_unsafe_run_ids():
+    with pytest.raises(ValueError):
+        get_checkpoint("../../etc/passwd")
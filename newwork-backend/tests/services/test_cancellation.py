@@ -0,0 +1,286 @@
+"""
+Request cancellation tests.
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from app.services.cancellation import CancellationMetrics, cancel_on_disconnect
+from app.services.llm.base import StreamEvent, StreamEventType, ToolUse
+from app.services.streaming_handler import (
+    CANCELLED_RESPONSE,
+    CANCELLED_TOOL_RESULT,
+    SSEEventType,
+)
+from app.tools import (
+    BashTool,
+    Tool,
+    ToolCategory,
+    ToolContext,
+    ToolResult,
+    initialize_tools,
+    register_tool,
+    unregister_tool,
+)
+
+from tests.conftest import StubProvider, make_handler, text_turn
+
+
+class SleepTool(Tool):
+    """Tool that sleeps until cancelled."""
+
+    name = "sleep_tool"
+    description = "Sleeps"
+    category = ToolCategory.MCP
+    requires_permission = False
+
+    def __init__(self):
+        self.started = asyncio.Event()
+
+    @property
+    def input_schema(self):
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, arguments, context):
+        self.started.set()
+        await asyncio.sleep(30)
+        return ToolResult.success_result("slept")
+
+
+def tool_turn(*tool_uses):
+    events = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+    for tu in tool_uses:
+        events.append(StreamEvent(type=StreamEventType.TOOL_USE_END, tool_use=tu))
+    events.append(StreamEvent(type=StreamEventType.MESSAGE_END))
+    return events
+
+
+@pytest.fixture
+def sleep_tool():
+    initialize_tools()
+    tool = SleepTool()
+    register_tool(tool)
+    yield tool
+    unregister_tool(tool.name)
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    import app.services.streaming_handler as handler_module
+    import app.services.tool_execution_service as tool_module
+
+    metrics = CancellationMetrics()
+    monkeypatch.setattr(handler_module, "cancellation_metrics", metrics)
+    monkeypatch.setattr(tool_module, "cancellation_metrics", metrics)
+    return metrics
+
+
+async def consume(handler, prompt, until):
+    """Consume events until `until(event)` is true and return the generator."""
+    events = handler.process_prompt(prompt)
+    async for event in events:
+        if until(event):
+            return events
+    raise AssertionError("Condition never met")
+
+
+@pytest.mark.unit
+class TestHandlerCancellation:
+    """Cancelling a prompt mid-request."""
+
+    async def test_cancel_during_stream(self, tmp_path, metrics):
+        metrics.record_response(100)
+        turn = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+        turn += [StreamEvent(type=StreamEventType.TEXT_DELTA, text=f"w{i} ") for i in range(50)]
+        provider = StubProvider([turn], delay=0.01)
+        handler = make_handler(provider, tmp_path)
+        handler.coalesce_interval = 0
+
+        seen = []
+
+        async def run():
+            async for event in handler.process_prompt("hello"):
+                seen.append(event)
+
+        task = asyncio.create_task(run())
+        while not any(e.type == SSEEventType.STREAM_CHUNK for e in seen):
+            await asyncio.sleep(0.005)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        last = handler.conversation.messages[-1]
+        assert last.content.startswith("w0 ")
+        assert last.content.endswith(CANCELLED_RESPONSE)
+        assert last.metadata["status"] == "cancelled"
+        assert provider.closed
+        assert metrics.cancelled_requests == 1
+        assert metrics.cancelled_streams == 1
+        assert 0 < metrics.output_tokens_generated < 100
+        assert metrics.output_tokens_saved == 100 - metrics.output_tokens_generated
+
+    async def test_cancel_during_tools(self, tmp_path, sleep_tool, metrics):
+        metrics.record_tool("sleep_tool", 2.0)
+        uses = [ToolUse(id="t1", name="sleep_tool", arguments={}),
+                ToolUse(id="t2", name="sleep_tool", arguments={})]
+        handler = make_handler(StubProvider([tool_turn(*uses)]), tmp_path)
+
+        task = asyncio.create_task(consume(handler, "go", lambda e: False))
+        await sleep_tool.started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        messages = handler.conversation.messages
+        assert [m.role.value for m in messages] == ["user", "assistant", "user", "assistant"]
+        assert [r.tool_use_id for r in messages[2].tool_results] == ["t1", "t2"]
+        assert all(r.content == CANCELLED_TOOL_RESULT for r in messages[2].tool_results)
+        assert messages[3].content == CANCELLED_RESPONSE
+        # One tool stopped while running, one never started
+        assert metrics.cancelled_tools == 2
+        assert metrics.tool_seconds_saved > 3.5
+
+    async def test_client_closing_stream_records_cancellation(self, tmp_path, metrics):
+        turn = text_turn("partial")
+        turn.append(StreamEvent(type=StreamEventType.TEXT_DELTA, text=" more"))
+        handler = make_handler(StubProvider([turn], delay=0), tmp_path)
+        handler.coalesce_interval = 0
+
+        events = await consume(handler, "hi", lambda e: e.type == SSEEventType.STREAM_CHUNK)
+        await events.aclose()
+
+        assert handler.conversation.messages[-1].metadata["status"] == "cancelled"
+        assert metrics.cancelled_requests == 1
+
+    async def test_closing_after_completion_is_not_a_cancellation(self, tmp_path, metrics):
+        handler = make_handler(StubProvider([text_turn("done")]), tmp_path)
+
+        events = await consume(handler, "hi", lambda e: e.type == SSEEventType.COMPLETE)
+        await events.aclose()
+
+        assert handler.conversation.messages[-1].content == "done"
+        assert metrics.cancelled_requests == 0
+
+    async def test_closing_during_final_reply_is_not_a_cancellation(self, tmp_path, metrics):
+        handler = make_handler(StubProvider([text_turn("done")]), tmp_path)
+
+        events = await consume(
+            handler,
+            "hi",
+            lambda e: e.type == SSEEventType.MESSAGE and e.data["role"] == "assistant",
+        )
+        await events.aclose()
+
+        assert [m.content for m in handler.conversation.messages] == ["hi", "done"]
+        assert metrics.cancelled_requests == 0
+
+    async def test_cancel_after_permission_is_granted(self, tmp_path, sleep_tool, metrics, monkeypatch):
+        monkeypatch.setattr(sleep_tool, "requires_permission", True)
+        tool_use = ToolUse(id="t1", name="sleep_tool", arguments={})
+        handler = make_handler(StubProvider([tool_turn(tool_use)]), tmp_path)
+
+        events = []
+
+        async def run():
+            async for event in handler.process_prompt("go"):
+                events.append(event)
+
+        task = asyncio.create_task(run())
+        await asyncio.sleep(0.01)
+        (permission_id,) = [
+            e.data["permission_id"] for e in events if e.type == SSEEventType.PERMISSION_REQUEST
+        ]
+        assert handler.respond_permission(permission_id, approved=True)
+        await sleep_tool.started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        messages = handler.conversation.messages
+        assert [m.role.value for m in messages] == ["user", "assistant", "user", "assistant"]
+        assert messages[2].tool_results[0].content == CANCELLED_TOOL_RESULT
+        assert messages[3].metadata["status"] == "cancelled"
+        assert metrics.cancelled_requests == 1
+
+
+@pytest.mark.unit
+class TestCancelOnDisconnect:
+    """Watching the client connection."""
+
+    async def test_disconnect_cancels_block(self):
+        disconnected = False
+
+        async def is_disconnected():
+            return disconnected
+
+        async def later():
+            nonlocal disconnected
+            await asyncio.sleep(0.02)
+            disconnected = True
+
+        asyncio.create_task(later())
+        async with cancel_on_disconnect(is_disconnected, poll_interval=0.01) as watch:
+            await asyncio.sleep(5)
+
+        assert watch.disconnected
+        assert asyncio.current_task().cancelling() == 0
+
+    async def test_watcher_that_swallows_cancellation_does_not_hang(self):
+        async def is_disconnected():
+            try:
+                await asyncio.sleep(0.005)
+            except asyncio.CancelledError:
+                pass
+            return False
+
+        async def run():
+            async with cancel_on_disconnect(is_disconnected, poll_interval=0.01) as watch:
+                await asyncio.sleep(0.02)
+            return watch
+
+        watch = await asyncio.wait_for(run(), timeout=1)
+
+        assert not watch.disconnected
+
+    async def test_other_cancellation_propagates(self):
+        async def is_disconnected():
+            return False
+
+        async def run():
+            async with cancel_on_disconnect(is_disconnected, poll_interval=0.01):
+                await asyncio.sleep(5)
+
+        task = asyncio.create_task(run())
+        await asyncio.sleep(0.02)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+
+@pytest.mark.unit
+@pytest.mark.skipif(not hasattr(os, "killpg"), reason="POSIX process groups")
+async def test_bash_tool_kills_command_on_cancel(tmp_path):
+    pid_file = tmp_path / "pid"
+    context = ToolContext(workspace_path=tmp_path, session_id="s1")
+    task = asyncio.create_task(BashTool().execute(
+        {"command": f"sleep 30 & echo $! > {pid_file}; wait"}, context
+    ))
+    while not pid_file.exists() or not pid_file.read_text().strip():
+        await asyncio.sleep(0.01)
+    pid = int(pid_file.read_text())
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    await asyncio.sleep(0.05)
+    if os.path.exists(f"/proc/{pid}/stat"):
+        # Orphans may linger as zombies until init reaps them
+        with open(f"/proc/{pid}/stat") as f:
+            assert f.read().split(")")[-1].split()[0] == "Z"
+    else:
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
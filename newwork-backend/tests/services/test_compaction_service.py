@@ -0,0 +1,232 @@
+"""
+History compaction tests.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.compaction_service import (
+    HistoryCompactor,
+    render_transcript,
+    select_summary_model,
+)
+from app.services.conversation_service import (
+    COMPACTION_SUMMARY_ACK,
+    COMPACTION_SUMMARY_PREFIX,
+    Conversation,
+    ConversationService,
+)
+from app.services.llm.anthropic_provider import CLAUDE_MODELS
+from app.services.llm.base import MessageRole, ToolResult, ToolUse
+from app.services.llm.openai_provider import GPT_MODELS
+
+from tests.conftest import StubProvider, collect, make_handler, text_turn
+
+
+def summary_provider(turns=(), models=CLAUDE_MODELS, delay=None):
+    """Stub provider with a priced catalog that answers complete() with a summary."""
+    return StubProvider(turns, models=models, reply="Summary of turns.", delay=delay)
+
+
+def build_conversation(turns, size=400):
+    conv = Conversation(session_id="s1", model="claude-sonnet-4-20250514")
+    for i in range(turns):
+        conv.add_user_message(f"question {i} " + "x" * size)
+        conv.add_assistant_message(
+            "", tool_uses=[ToolUse(id=f"t{i}", name="read_file", arguments={"file_path": f"{i}.py"})]
+        )
+        conv.add_tool_results([ToolResult(tool_use_id=f"t{i}", content="y" * size)])
+        conv.add_assistant_message(f"answer {i}")
+    return conv
+
+
+@pytest.mark.unit
+class TestSummaryModel:
+    """Choice of the summarizer model."""
+
+    def test_picks_cheapest_catalog_model(self):
+        assert select_summary_model(
+            summary_provider(models=CLAUDE_MODELS), "claude-sonnet-4-20250514"
+        ) == "claude-3-5-haiku-20241022"
+        assert select_summary_model(summary_provider(models=GPT_MODELS), "gpt-4o") == "gpt-4o-mini"
+
+    def test_keeps_current_model_when_already_cheapest_or_unpriced(self):
+        assert select_summary_model(
+            summary_provider(models=GPT_MODELS), "gpt-4o-mini"
+        ) == "gpt-4o-mini"
+        assert select_summary_model(StubProvider([]), "stub-model") == "stub-model"
+
+    def test_configured_model_wins(self):
+        assert select_summary_model(
+            summary_provider(), "claude-sonnet-4-20250514", "claude-opus-4-20250514"
+        ) == "claude-opus-4-20250514"
+
+    def test_configured_model_must_be_served(self):
+        assert select_summary_model(
+            summary_provider(models=GPT_MODELS), "gpt-4o", "claude-opus-4-20250514"
+        ) == "gpt-4o-mini"
+
+    async def test_routed_summary_goes_to_the_serving_route(self):
+        from app.services.llm.router import RoutedProvider, RouteTarget
+
+        big = summary_provider(models=[m for m in CLAUDE_MODELS if "sonnet-4" in m.id])
+        small = summary_provider(models=[m for m in CLAUDE_MODELS if "haiku" in m.id])
+        routed = RoutedProvider([
+            RouteTarget("a", "claude-sonnet-4-20250514", big),
+            RouteTarget("b", "claude-3-5-haiku-20241022", small),
+        ], stats={})
+        conv = build_conversation(6)
+
+        result = await HistoryCompactor(threshold_tokens=0, keep_recent_turns=2).compact(conv, routed)
+
+        assert result.model == "claude-3-5-haiku-20241022"
+        assert big.completions == []
+        assert small.completions[0]["model"] == "claude-3-5-haiku-20241022"
+
+
+@pytest.mark.unit
+class TestHistoryCompactor:
+    """Summarizing older turns."""
+
+    def test_below_threshold_is_not_compacted(self):
+        compactor = HistoryCompactor(threshold_tokens=1_000_000, keep_recent_turns=2)
+        assert not compactor.should_compact(build_conversation(6))
+
+    def test_recent_turns_are_never_compacted(self):
+        compactor = HistoryCompactor(threshold_tokens=0, keep_recent_turns=6)
+        assert not compactor.should_compact(build_conversation(6))
+
+    async def test_compaction_replaces_old_turns_with_summary(self):
+        conv = build_conversation(6)
+        originals = list(conv.messages)
+        provider = summary_provider()
+        compactor = HistoryCompactor(threshold_tokens=0, keep_recent_turns=2)
+
+        result = await compactor.compact(conv, provider)
+
+        assert result.replaced_messages == 16
+        assert result.model == "claude-3-5-haiku-20241022"
+        assert result.saved_tokens > 0
+        assert len(conv.messages) == 2 + 8
+        summary, ack = conv.messages[:2]
+        assert summary.content.startswith(COMPACTION_SUMMARY_PREFIX)
+        assert summary.metadata["compaction"]["replaces"] == [m.id for m in originals[:16]]
+        assert conv.messages[2:] == originals[16:]
+
+        # Roles still alternate after the summary
+        assert [m.role for m in conv.messages[:3]] == [
+            MessageRole.USER,
+            MessageRole.ASSISTANT,
+            MessageRole.USER,
+        ]
+        assert ack.metadata["compaction"]["acknowledges"] == summary.id
+
+        request = provider.completions[0]
+        assert request["model"] == "claude-3-5-haiku-20241022"
+        assert request["temperature"] == 0.0
+        assert "question 0" in request["messages"][0].content
+
+    async def test_originals_stay_available(self):
+        conv = build_conversation(6)
+        originals = list(conv.messages)
+
+        await HistoryCompactor(threshold_tokens=0, keep_recent_turns=2).compact(conv, summary_provider())
+
+        assert conv.get_full_history() == originals
+        restored = Conversation.from_dict(conv.to_dict())
+        assert [m.id for m in restored.get_full_history()] == [m.id for m in originals]
+        assert restored.messages[0].metadata["compaction"]
+
+    async def test_second_compaction_folds_in_earlier_summary(self):
+        conv = build_conversation(6)
+        originals = list(conv.messages)
+        compactor = HistoryCompactor(threshold_tokens=0, keep_recent_turns=2)
+        provider = summary_provider()
+
+        await compactor.compact(conv, provider)
+        for i in range(6, 8):
+            conv.add_user_message(f"question {i}")
+            conv.add_assistant_message(f"answer {i}")
+        await compactor.compact(conv, provider)
+
+        transcript = provider.completions[1]["messages"][0].content
+        assert transcript.count("Earlier summary") == 1
+        assert COMPACTION_SUMMARY_ACK not in transcript
+        replaces = conv.messages[0].metadata["compaction"]["replaces"]
+        assert replaces == [m.id for m in originals]
+        assert conv.get_full_history()[:len(originals)] == originals
+
+    async def test_history_changed_during_compaction_is_left_alone(self):
+        conv = build_conversation(6)
+        compactor = HistoryCompactor(threshold_tokens=0, keep_recent_turns=2)
+        provider = summary_provider(delay=0.05)
+
+        task = asyncio.create_task(compactor.compact(conv, provider))
+        await asyncio.sleep(0)
+        conv.messages.pop(0)
+
+        assert await task is None
+        assert not conv.compacted_messages
+
+    def test_transcript_truncates_tool_results(self):
+        conv = build_conversation(1, size=5000)
+
+        transcript = render_transcript(conv.messages)
+
+        assert "Assistant called read_file" in transcript
+        assert "more characters]" in transcript
+        assert len(transcript) < 8000
+
+
+@pytest.mark.unit
+class TestBackgroundCompaction:
+    """Compaction scheduled between turns."""
+
+    @pytest.fixture
+    def compaction_settings(self, monkeypatch):
+        from app.services.config_service import settings
+
+        monkeypatch.setattr(settings, "COMPACTION_ENABLED", True)
+        monkeypatch.setattr(settings, "COMPACTION_THRESHOLD_TOKENS", 0)
+        monkeypatch.setattr(settings, "COMPACTION_KEEP_RECENT_TURNS", 2)
+        monkeypatch.setattr(settings, "COMPACTION_MODEL", "")
+
+    async def test_prompt_completes_before_compaction(self, tmp_path, compaction_settings):
+        from app.services.conversation_service import conversation_service
+
+        conv = build_conversation(4)
+        provider = summary_provider([text_turn("done")], delay=0.05)
+        handler = make_handler(provider, tmp_path, conv)
+
+        events = await collect(handler.process_prompt("next"))
+
+        # The summary is still pending when the turn completes
+        assert events[-1].type == "complete"
+        assert not conv.compacted_messages
+        assert len(provider.requests[0]["messages"]) == 4 * 4 + 1
+
+        await conversation_service.wait_for_compaction("s1")
+        assert conv.messages[0].metadata["compaction"]
+        assert len(conv.get_full_history()) == 4 * 4 + 2
+
+    async def test_disabled(self, monkeypatch):
+        from app.services.config_service import settings
+
+        monkeypatch.setattr(settings, "COMPACTION_ENABLED", False)
+        service = ConversationService()
+
+        assert service.schedule_compaction(build_conversation(6), summary_provider()) is None
+
+    async def test_one_compaction_per_session(self, compaction_settings):
+        service = ConversationService()
+        conv = build_conversation(6)
+        provider = summary_provider(delay=0.05)
+
+        first = service.schedule_compaction(conv, provider)
+        second = service.schedule_compaction(conv, provider)
+        await service.wait_for_compaction("s1")
+
+        assert first is not None
+        assert second is None
+        assert len(provider.completions) == 1
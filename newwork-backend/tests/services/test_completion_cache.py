@@ -0,0 +1,176 @@
+"""
+Completion cache tests.
+"""
+
+import time
+
+import pytest
+
+from app.services.llm.base import (
+    Message,
+    MessageRole,
+    StreamEvent,
+    StreamEventType,
+    ToolUse,
+)
+from app.services.llm.completion_cache import (
+    CachedProvider,
+    CompletionCache,
+    make_cache_key,
+)
+
+from tests.conftest import StubProvider, collect, text_turn
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CompletionCache(tmp_path / "cache.db", max_bytes=1_000_000, ttl_seconds=3600)
+    yield cache
+    cache.close()
+
+
+def _messages(text="hello"):
+    return [Message(role=MessageRole.USER, content=text)]
+
+
+def _key(messages, **overrides):
+    kwargs = dict(tools=None, max_tokens=100, temperature=0.0, system_prompt=None)
+    kwargs.update(overrides)
+    return make_cache_key("stream", "stub", "m", messages, **kwargs)
+
+
+@pytest.mark.unit
+class TestCacheKey:
+    """Request hashing."""
+
+    def test_identical_requests_share_key(self):
+        assert _key(_messages()) == _key(_messages())
+
+    def test_request_changes_change_key(self):
+        base = _key(_messages())
+
+        assert _key(_messages("other")) != base
+        assert _key(_messages(), max_tokens=200) != base
+        assert _key(_messages(), system_prompt="be brief") != base
+
+
+@pytest.mark.unit
+class TestCompletionCache:
+    """SQLite store behavior."""
+
+    def test_round_trip_and_counters(self, cache):
+        assert cache.get("k") is None
+        cache.put("k", {"a": 1})
+
+        assert cache.get("k") == {"a": 1}
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+
+    def test_expired_entries_are_dropped(self, tmp_path):
+        cache = CompletionCache(tmp_path / "ttl.db", max_bytes=1_000_000, ttl_seconds=0.01)
+        cache.put("k", [1])
+        time.sleep(0.02)
+
+        assert cache.get("k") is None
+        assert cache.get_stats()["entries"] == 0
+        cache.close()
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        cache = CompletionCache(tmp_path / "lru.db", max_bytes=250, ttl_seconds=3600)
+        cache.put("a", "x" * 100)
+        cache.put("b", "x" * 100)
+        cache.get("a")  # b is now least recently used
+        cache.put("c", "x" * 100)
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.get_stats()["bytes"] <= 250
+        cache.close()
+
+    def test_hits_defer_access_time_writes(self, cache):
+        cache.put("k", "v")
+        stored = cache.conn.execute("SELECT accessed_at FROM completions").fetchone()[0]
+        cache.get("k")
+
+        assert cache.conn.execute("SELECT accessed_at FROM completions").fetchone()[0] == stored
+        cache.put("other", "v")
+        row = cache.conn.execute("SELECT accessed_at FROM completions WHERE key = 'k'").fetchone()
+        assert row[0] > stored
+
+    async def test_async_access(self, cache):
+        await cache.aput("k", [1, 2])
+
+        assert await cache.aget("k") == [1, 2]
+
+    def test_persists_across_instances(self, tmp_path):
+        first = CompletionCache(tmp_path / "p.db", max_bytes=1_000_000, ttl_seconds=3600)
+        first.put("k", "v")
+        first.close()
+
+        second = CompletionCache(tmp_path / "p.db", max_bytes=1_000_000, ttl_seconds=3600)
+        assert second.get("k") == "v"
+        second.close()
+
+
+@pytest.mark.unit
+class TestCachedProvider:
+    """Provider wrapper behavior."""
+
+    async def test_stream_is_replayed_from_cache(self, cache):
+        turn = [
+            StreamEvent(type=StreamEventType.MESSAGE_START),
+            StreamEvent(type=StreamEventType.TEXT_DELTA, text="hi"),
+            StreamEvent(
+                type=StreamEventType.TOOL_USE_END,
+                tool_use=ToolUse(id="t1", name="read_file", arguments={"file_path": "a"}),
+            ),
+            StreamEvent(type=StreamEventType.MESSAGE_END, usage={"input_tokens": 5}),
+        ]
+        stub = StubProvider([turn])
+        provider = CachedProvider(stub, cache)
+
+        first = await collect(provider.stream_complete(_messages(), "m", temperature=0))
+        second = await collect(provider.stream_complete(_messages(), "m", temperature=0))
+
+        assert len(stub.requests) == 1
+        assert [e.type for e in second] == [e.type for e in first]
+        assert second[2].tool_use == turn[2].tool_use
+        assert second[-1].usage is None
+
+    async def test_non_deterministic_requests_bypass_cache(self, cache):
+        stub = StubProvider([text_turn("a"), text_turn("b")])
+        provider = CachedProvider(stub, cache)
+
+        await collect(provider.stream_complete(_messages(), "m", temperature=0.7))
+        await collect(provider.stream_complete(_messages(), "m", temperature=0.7))
+
+        assert len(stub.requests) == 2
+        assert cache.get_stats()["entries"] == 0
+
+    async def test_failed_streams_are_not_cached(self, cache):
+        failed = [
+            StreamEvent(type=StreamEventType.MESSAGE_START),
+            StreamEvent(type=StreamEventType.ERROR, error="boom"),
+        ]
+        stub = StubProvider([failed, text_turn("ok")])
+        provider = CachedProvider(stub, cache)
+
+        await collect(provider.stream_complete(_messages(), "m", temperature=0))
+        events = await collect(provider.stream_complete(_messages(), "m", temperature=0))
+
+        assert len(stub.requests) == 2
+        assert events[1].text == "ok"
+
+    async def test_complete_is_cached(self, cache):
+        stub = StubProvider(reply="answer")
+        provider = CachedProvider(stub, cache)
+
+        first = await provider.complete(_messages(), "m", temperature=0)
+        second = await provider.complete(_messages(), "m", temperature=0)
+
+        assert len(stub.completions) == 1
+        assert second.text == first.text == "answer"
+        assert second.usage is None
@@ -0,0 +1,170 @@
+"""
+Context budget tests.
+"""
+
+import pytest
+
+from app.services.context_budget import (
+    ContextBudget,
+    ContextBudgeter,
+    TokenCounter,
+)
+from app.services.conversation_service import Conversation
+from app.services.llm.base import ModelInfo, ToolResult, ToolUse
+
+
+def _budgeter():
+    return ContextBudgeter(counter=TokenCounter(encoding_name=None))
+
+
+def _conversation_with_turns(turns: int, text_size: int = 400) -> Conversation:
+    conv = Conversation(session_id="s1")
+    for i in range(turns):
+        conv.add_user_message(f"question {i} " + "x" * text_size)
+        tool_use = ToolUse(id=f"tu-{i}", name="read_file", arguments={"file_path": f"f{i}.py"})
+        conv.add_assistant_message("", tool_uses=[tool_use])
+        conv.add_tool_results([ToolResult(tool_use_id=f"tu-{i}", content="y" * text_size)])
+        conv.add_assistant_message(f"answer {i}")
+    return conv
+
+
+@pytest.mark.unit
+class TestTokenCounter:
+    """Token counting tests."""
+
+    def test_estimate_without_encoding(self):
+        counter = TokenCounter(encoding_name=None)
+
+        assert counter.count_text("") == 0
+        assert counter.count_text("abcd") == 1
+        assert counter.count_text("abcde") == 2
+
+    def test_encoding_is_only_loaded_explicitly(self, monkeypatch):
+        import app.services.context_budget as module
+
+        calls = []
+
+        class FakeTiktoken:
+            @staticmethod
+            def get_encoding(name):
+                calls.append(name)
+                raise OSError("offline")
+
+        monkeypatch.setattr(module, "tiktoken", FakeTiktoken)
+        monkeypatch.setattr(module, "TIKTOKEN_AVAILABLE", True)
+        counter = TokenCounter()
+
+        assert counter.count_text("abcd") == 1
+        assert calls == []
+        assert not counter.load()
+        assert not counter.load()
+        assert calls == ["cl100k_base"]
+        assert not counter.exact
+
+    def test_tool_count_is_memoized(self):
+        from app.services.llm.base import ToolDefinition
+
+        counter = TokenCounter(encoding_name=None)
+        tool = ToolDefinition(name="a", description="A", input_schema={"type": "object"})
+
+        first = counter.count_tools([tool])
+
+        assert first == tool.token_count(counter) > 0
+        tool.description = "A much longer description"
+        assert counter.count_tools([tool]) > first
+
+    def test_count_is_cached_on_message(self):
+        counter = TokenCounter(encoding_name=None)
+        conv = Conversation(session_id="s1")
+        msg = conv.add_user_message("hello world")
+
+        first = counter.count_message(msg)
+        assert msg._token_count == first
+
+        msg.tool_results.append(ToolResult(tool_use_id="t1", content="x" * 400))
+        assert counter.count_message(msg) == first
+
+        msg.invalidate_cache()
+        second = counter.count_message(msg)
+        assert second > first
+
+        msg.content = "y" * 400
+        assert counter.count_message(msg) > second
+
+
+@pytest.mark.unit
+class TestContextBudget:
+    """Budget derivation tests."""
+
+    def test_budget_from_model_info(self):
+        info = ModelInfo(id="m", name="M", provider="p", context_window=10000)
+        budget = ContextBudget.for_model(
+            info, max_output_tokens=1000, reserved_tokens=500, safety_margin=100
+        )
+
+        assert budget.available == 8400
+
+    def test_budget_for_unknown_model(self):
+        budget = ContextBudget.for_model(None, max_output_tokens=0, safety_margin=0)
+
+        assert budget.available == 128000
+
+
+@pytest.mark.unit
+class TestContextBudgeter:
+    """History trimming tests."""
+
+    def test_fits_returns_everything(self):
+        conv = _conversation_with_turns(3)
+        window = _budgeter().fit(conv.messages, ContextBudget(100000, 0, safety_margin=0))
+
+        assert window.messages == conv.messages
+        assert window.saved_tokens == 0
+
+    def test_drops_oldest_turns_first(self):
+        conv = _conversation_with_turns(5)
+        budgeter = _budgeter()
+        per_turn = sum(budgeter.counter.count_message(m) for m in conv.messages[:4])
+        budget = ContextBudget(per_turn * 2, 0, safety_margin=0)
+
+        window = budgeter.fit(conv.messages, budget)
+
+        assert window.messages == conv.messages[-8:]
+        assert window.dropped_messages == 12
+        assert window.total_tokens <= budget.available
+        assert window.saved_tokens == window.original_tokens - window.total_tokens
+
+    def test_keeps_tool_pairs_intact(self):
+        conv = _conversation_with_turns(6)
+        window = _budgeter().fit(conv.messages, ContextBudget(900, 0, safety_margin=0))
+
+        tool_use_ids = {tu.id for m in window.messages for tu in m.tool_uses}
+        tool_result_ids = {tr.tool_use_id for m in window.messages for tr in m.tool_results}
+        assert tool_use_ids == tool_result_ids
+        assert window.messages[0].role.value == "user"
+        assert not window.messages[0].tool_results
+
+    def test_elides_old_tool_results_in_current_turn(self):
+        conv = Conversation(session_id="s1")
+        conv.add_user_message("do the thing")
+        for i in range(4):
+            conv.add_assistant_message("", tool_uses=[ToolUse(id=f"t{i}", name="bash", arguments={})])
+            conv.add_tool_results([ToolResult(tool_use_id=f"t{i}", content="z" * 4000)])
+
+        window = _budgeter().fit(conv.messages, ContextBudget(1200, 0, safety_margin=0))
+
+        assert window.dropped_messages == 0
+        assert window.elided_results == 3
+        assert window.messages[-1] is conv.messages[-1]
+        assert "elided" in window.messages[2].tool_results[0].content
+        # Originals are untouched
+        assert conv.messages[2].tool_results[0].content == "z" * 4000
+
+    def test_trimming_is_deterministic(self):
+        conv = _conversation_with_turns(8)
+        budget = ContextBudget(1500, 0, safety_margin=0)
+
+        first = _budgeter().fit(conv.messages, budget)
+        second = _budgeter().fit(conv.messages, budget)
+
+        assert [m.id for m in first.messages] == [m.id for m in second.messages]
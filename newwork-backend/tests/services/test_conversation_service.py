@@ -0,0 +1,72 @@
+"""
+Conversation service tests.
+"""
+
+import pytest
+
+from app.services.conversation_service import Conversation
+from app.services.llm.base import Message, MessageRole, ToolResult, ToolUse
+
+
+@pytest.mark.unit
+class TestWireFormatCache:
+    """Memoized LLM message and provider payloads."""
+
+    def test_llm_message_is_memoized(self):
+        conv = Conversation(session_id="s1")
+        msg = conv.add_user_message("hello")
+
+        assert msg.to_llm_message() is msg.to_llm_message()
+
+    def test_provider_payload_is_memoized_per_format(self):
+        conv = Conversation(session_id="s1")
+        msg = conv.add_assistant_message(
+            "reading", tool_uses=[ToolUse(id="t1", name="read_file", arguments={"file_path": "a"})]
+        )
+        llm_message = msg.to_llm_message()
+
+        anthropic = llm_message.to_anthropic_format()
+        openai = llm_message.to_openai_format()
+
+        assert llm_message.to_anthropic_format() is anthropic
+        assert llm_message.to_openai_format() is openai
+        assert anthropic is not openai
+
+    def test_field_assignment_invalidates(self):
+        conv = Conversation(session_id="s1")
+        msg = conv.add_user_message("hello")
+        before = msg.to_llm_message().to_anthropic_format()
+
+        msg.content = "changed"
+
+        after = msg.to_llm_message().to_anthropic_format()
+        assert after is not before
+        assert after["content"] == "changed"
+
+    def test_in_place_mutation_requires_invalidate(self):
+        conv = Conversation(session_id="s1")
+        msg = conv.add_tool_results([ToolResult(tool_use_id="t1", content="one")])
+        msg.to_llm_message()
+
+        msg.tool_results.append(ToolResult(tool_use_id="t2", content="two"))
+        msg.invalidate_cache()
+
+        blocks = msg.to_llm_message().to_anthropic_format()["content"]
+        assert [b["tool_use_id"] for b in blocks] == ["t1", "t2"]
+
+    def test_message_assignment_invalidates_payload(self):
+        message = Message(role=MessageRole.USER, content="hi")
+        first = message.to_openai_format()
+
+        message.role = MessageRole.ASSISTANT
+
+        assert message.to_openai_format() is not first
+        assert message.to_openai_format()["role"] == "assistant"
+
+    def test_serialization_ignores_cache_fields(self):
+        conv = Conversation(session_id="s1")
+        conv.add_user_message("hello").to_llm_message()
+
+        restored = Conversation.from_dict(conv.to_dict())
+
+        assert restored.messages[0].to_dict() == conv.messages[0].to_dict()
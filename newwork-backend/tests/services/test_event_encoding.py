@@ -0,0 +1,90 @@
+"""
+Event encoding tests.
+"""
+
+import json
+
+import pytest
+
+import app.services.event_encoding as event_encoding
+from app.services.event_encoding import EncodedEvent, dumps, encode_event
+from app.services.event_service import BroadcastEvent, EventService
+from app.services.streaming_handler import SSEEvent, SSEEventType
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson" and not event_encoding.ORJSON_AVAILABLE:
+        pytest.skip("orjson is not installed")
+    if request.param == "json":
+        monkeypatch.setattr(event_encoding, "ORJSON_AVAILABLE", False)
+    return request.param
+
+
+@pytest.mark.unit
+class TestDumps:
+    """Serializing with and without orjson."""
+
+    def test_compact_utf8(self, encoder):
+        assert dumps({"a": [1, 2], "b": "héllo"}) == '{"a":[1,2],"b":"héllo"}'.encode()
+
+    def test_pretty(self, encoder):
+        assert json.loads(dumps({"a": 1}, pretty=True)) == {"a": 1}
+        assert b"\n  " in dumps({"a": 1}, pretty=True)
+
+    def test_values_orjson_rejects(self, encoder):
+        assert dumps({"big": 2**70, 1: "x"}) == b'{"big":1180591620717411303424,"1":"x"}'
+
+
+@pytest.mark.unit
+class TestEncodeEvent:
+    """The encoded envelope and its data slice."""
+
+    def test_payload_and_data(self, encoder):
+        encoded = encode_event("stream_chunk", {"text": 'a,"data":b'}, "s1", "2024-01-01T00:00:00")
+
+        assert json.loads(encoded.payload) == {
+            "type": "stream_chunk",
+            "data": {"text": 'a,"data":b'},
+            "session_id": "s1",
+            "timestamp": "2024-01-01T00:00:00",
+        }
+        assert json.loads(bytes(encoded.data)) == {"text": 'a,"data":b'}
+        assert EncodedEvent.from_payload(encoded.payload) == encoded
+
+    def test_sse_frames(self):
+        encoded = encode_event("status", {}, None, "t")
+
+        assert encoded.sse() == b"data: " + encoded.payload + b"\n\n"
+        assert encoded.sse(7) == b"id: 7\ndata: " + encoded.payload + b"\n\n"
+
+    def test_sse_event_is_encoded_once(self, monkeypatch):
+        event = SSEEvent(type=SSEEventType.STREAM_CHUNK, session_id="s1", data={"text": "a"})
+        calls = []
+        monkeypatch.setattr(event_encoding, "dumps", lambda obj, **kw: calls.append(obj) or b"{}")
+
+        first = event.encode()
+        event.id = 3
+
+        assert event.encode() is first
+        assert event.sse_frame().startswith(b"id: 3\n")
+        assert event.to_sse() == event.sse_frame().decode()
+        assert calls.count({"text": "a"}) == 1
+
+
+@pytest.mark.unit
+class TestBroadcastEncoding:
+    """Broadcast events are serialized once for all listeners."""
+
+    async def test_listeners_share_the_payload(self):
+        service = EventService()
+        first = service.register_listener("a")
+        second = service.register_listener("b")
+
+        await service.broadcast({"type": "status", "data": {"n": 1}})
+
+        a, b = first.get_nowait(), second.get_nowait()
+        assert isinstance(a, BroadcastEvent)
+        assert a is b
+        assert json.loads(a.payload) == a.event
+        assert "timestamp" in a.event
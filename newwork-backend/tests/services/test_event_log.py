@@ -0,0 +1,246 @@
+"""
+Session event log tests.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.services.event_log import (
+    EventLogService,
+    SessionEventLog,
+    follow_with_broadcasts,
+    parse_last_event_id,
+)
+from app.services.event_service import event_service
+from app.services.streaming_handler import SSEEvent, SSEEventType
+
+
+def chunk(text):
+    return SSEEvent(type=SSEEventType.STREAM_CHUNK, session_id="s1", data={"text": text})
+
+
+def frame_data(frame):
+    return json.loads(frame.split(b"data: ", 1)[1])
+
+
+def frame_id(frame):
+    return int(frame.split(b"\n", 1)[0].removeprefix(b"id: "))
+
+
+async def run_of(*texts, gate=None):
+    if gate is not None:
+        await gate.wait()
+    for text in texts:
+        yield chunk(text)
+
+
+async def take(agen, count):
+    frames = []
+    async for frame in agen:
+        frames.append(frame)
+        if len(frames) == count:
+            break
+    await agen.aclose()
+    return frames
+
+
+@pytest.mark.unit
+class TestSessionEventLog:
+    """Event IDs, memory limits and spilling."""
+
+    def test_parse_last_event_id(self):
+        assert parse_last_event_id(None) is None
+        assert parse_last_event_id(" 12 ") == 12
+        assert parse_last_event_id("-3") == 0
+        assert parse_last_event_id("abc") is None
+
+    async def test_append_assigns_ids(self):
+        log = SessionEventLog("s1")
+        event = chunk("a")
+
+        assert log.append(event) == 1
+        assert log.append(chunk("b")) == 2
+        assert event.id == 1
+        assert event.to_sse().startswith("id: 1\ndata: ")
+        assert chunk("c").to_sse().startswith("data: ")
+        assert [e.id for e in log.since(0)] == [1, 2]
+        assert [e.id for e in log.since(1)] == [2]
+        assert log.since(2) == []
+
+    async def test_memory_limits_without_spill(self):
+        log = SessionEventLog("s1", max_events=3)
+        for i in range(5):
+            log.append(chunk(str(i)))
+
+        assert log.first_id == 3
+        assert [e.id for e in log.since(0)] == [3, 4, 5]
+
+        small = SessionEventLog("s1", max_bytes=1)
+        small.append(chunk("a"))
+        small.append(chunk("b"))
+        assert [e.id for e in small.since(0)] == [2]
+        assert small.memory_bytes == len(small.since(0)[0].frame)
+
+    async def test_spilled_events_are_replayed(self, tmp_path):
+        log = SessionEventLog("s1", max_events=2, spill_dir=tmp_path)
+        for i in range(6):
+            log.append(chunk(str(i)))
+
+        assert log.first_id == 1
+        replayed = log.since(1)
+        assert [e.id for e in replayed] == [2, 3, 4, 5, 6]
+        assert [frame_data(e.frame)["data"]["text"] for e in replayed] == ["1", "2", "3", "4", "5"]
+        assert [bytes(e.encoded.data) for e in replayed] == [b'{"text":"%d"}' % i for i in range(1, 6)]
+
+    async def test_spill_rotation_bounds_disk_use(self, tmp_path):
+        log = SessionEventLog("s1", max_events=1, spill_dir=tmp_path, max_spill_bytes=600)
+        for i in range(30):
+            log.append(chunk(str(i)))
+
+        files = list(tmp_path.iterdir())
+        assert len(files) == 2
+        assert sum(f.stat().st_size for f in files) <= 600
+        first = log.first_id
+        assert 1 < first < 30
+        assert [e.id for e in log.since(0)] == list(range(first, 31))
+
+    async def test_close_removes_spill_files(self, tmp_path):
+        log = SessionEventLog("s1", max_events=1, spill_dir=tmp_path)
+        for i in range(3):
+            log.append(chunk(str(i)))
+        log.close()
+
+        assert list(tmp_path.iterdir()) == []
+        assert log.first_id == 3
+
+
+@pytest.mark.unit
+class TestFollow:
+    """Following the log while runs write to it."""
+
+    async def test_follow_replays_then_stops_when_idle(self):
+        log = SessionEventLog("s1")
+        log.append(chunk("a"))
+        task = log.start_run(run_of("b", "c"))
+
+        frames = [f async for f in log.follow(1, until_idle=True)]
+
+        assert task.done()
+        assert [frame_id(f) for f in frames] == [2, 3]
+        assert not log.running
+        assert log.followers == 0
+
+    async def test_resync_when_events_are_gone(self):
+        log = SessionEventLog("s1", max_events=2)
+        for i in range(5):
+            log.append(chunk(str(i)))
+
+        frames = [f async for f in log.follow(1, until_idle=True)]
+
+        status = frame_data(frames[0])
+        assert status["data"] == {"status": "resync", "first_event_id": 4, "last_event_id": 5}
+        assert [frame_id(f) for f in frames[1:]] == [4, 5]
+
+    async def test_resync_for_unknown_ids(self):
+        log = SessionEventLog("s1")
+        log.append(chunk("a"))
+
+        frames = [f async for f in log.follow(7, until_idle=True)]
+
+        assert frame_data(frames[0])["data"]["status"] == "resync"
+        assert len(frames) == 1
+
+    async def test_keepalive(self):
+        log = SessionEventLog("s1")
+
+        frames = await take(log.follow(0, keepalive=0.01), 1)
+
+        assert frame_data(frames[0])["data"] == {"status": "keepalive"}
+
+    async def test_run_survives_reconnect(self):
+        log = SessionEventLog("s1", resume_grace=5)
+        gate = asyncio.Event()
+        task = log.start_run(run_of("a", "b", gate=gate))
+
+        await take(log.follow(0, keepalive=0.01), 1)
+        gate.set()
+        frames = [f async for f in log.follow(0, until_idle=True)]
+
+        assert not task.cancelled()
+        assert [frame_id(f) for f in frames] == [1, 2]
+
+    async def test_abandoned_run_is_cancelled(self):
+        log = SessionEventLog("s1", resume_grace=0.01)
+        gate = asyncio.Event()
+        task = log.start_run(run_of("a", gate=gate))
+
+        await take(log.follow(0, keepalive=0.001), 1)
+        await asyncio.wait({task}, timeout=1)
+
+        assert task.cancelled()
+        assert not log.running
+
+    async def test_unfollowed_run_is_cancelled(self):
+        log = SessionEventLog("s1", resume_grace=0.01)
+        task = log.start_run(run_of("a", gate=asyncio.Event()))
+
+        await asyncio.wait({task}, timeout=1)
+
+        assert task.cancelled()
+
+    async def test_run_errors_are_logged(self):
+        log = SessionEventLog("s1")
+
+        async def failing():
+            yield chunk("a")
+            raise RuntimeError("boom")
+
+        log.start_run(failing())
+        frames = [f async for f in log.follow(0, until_idle=True)]
+
+        assert frame_data(frames[-1])["data"] == {"error": "boom"}
+
+    async def test_broadcasts_are_merged(self):
+        log = SessionEventLog("s1")
+        stream = follow_with_broadcasts(log, 0)
+        first = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+
+        await event_service.broadcast({"type": "message", "session_id": "other", "data": {}})
+        await event_service.broadcast({"type": "message", "session_id": "s1", "data": {"n": 1}})
+        assert frame_data(await asyncio.wait_for(first, 1))["data"] == {"n": 1}
+
+        log.append(chunk("a"))
+        second = await asyncio.wait_for(stream.__anext__(), 1)
+        await stream.aclose()
+
+        assert frame_id(second) == 1
+        assert log.followers == 0
+        assert not any(k.startswith("session_s1_") for k in event_service._listeners)
+
+
+@pytest.mark.unit
+class TestEventLogService:
+    """Log lookup and idle eviction."""
+
+    async def test_get_reuses_logs(self):
+        service = EventLogService()
+
+        assert service.get("s1") is service.get("s1")
+        assert service.get("s2") is not service.get("s1")
+
+    async def test_evicts_idle_logs_only(self):
+        service = EventLogService()
+        idle = service.get("idle")
+        busy = service.get("busy")
+        idle.append(chunk("a"))
+        busy.start_run(run_of("a", gate=asyncio.Event()))
+
+        now = idle._last_active + 1000
+        assert service.evict_idle(600, now=now) == 1
+        assert service.logs() == [busy]
+
+        service.discard("busy")
+        assert not service.logs()
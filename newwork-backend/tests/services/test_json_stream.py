@@ -0,0 +1,82 @@
+"""
+Incremental JSON parser tests.
+"""
+
+import json
+import random
+
+import pytest
+
+from app.services.llm.json_stream import IncrementalJSONParser
+
+
+def _feed_in_pieces(text, sizes):
+    parser = IncrementalJSONParser()
+    completed = []
+    i = 0
+    for size in sizes:
+        completed.extend(parser.feed(text[i:i + size]))
+        i += size
+    completed.extend(parser.feed(text[i:]))
+    return parser, completed
+
+
+@pytest.mark.unit
+class TestIncrementalJSONParser:
+    """Partial argument parsing."""
+
+    def test_fields_are_available_once_complete(self):
+        parser = IncrementalJSONParser()
+
+        assert parser.feed('{"file_path": "src/a.py", "cont') == ["file_path"]
+        assert parser.partial == {"file_path": "src/a.py"}
+        assert parser.feed('ent": "print(1)\\n"') == ["content"]
+        assert parser.feed("}") == []
+        assert parser.result() == {"file_path": "src/a.py", "content": "print(1)\n"}
+
+    def test_scalars_complete_at_delimiter(self):
+        parser = IncrementalJSONParser()
+
+        assert parser.feed('{"timeout": 12') == []
+        assert parser.feed("0, ") == ["timeout"]
+        assert parser.feed('"background": true}') == ["background"]
+        assert parser.partial == {"timeout": 120, "background": True}
+
+    def test_nested_values_and_tricky_strings(self):
+        doc = {
+            "command": 'echo "}{" \\ done',
+            "edits": [{"old": "]", "new": "[\"x\"]"}, None, -1.5e3],
+            "options": {"a": {"b": []}},
+            "unicode": "café ☃",
+        }
+        text = json.dumps(doc)
+        rng = random.Random(7)
+
+        for _ in range(50):
+            sizes = [rng.randint(1, 6) for _ in range(len(text))]
+            parser, completed = _feed_in_pieces(text, sizes)
+            assert completed == list(doc)
+            assert parser.partial == doc
+            assert parser.result() == doc
+
+    def test_empty_input(self):
+        parser = IncrementalJSONParser()
+
+        assert parser.result() == {}
+        assert parser.feed("{}") == []
+        assert parser.result() == {}
+
+    def test_non_object_input(self):
+        parser = IncrementalJSONParser()
+        parser.feed("[1, 2]")
+
+        assert not parser.is_object
+        assert parser.partial == {}
+        assert parser.result() == [1, 2]
+
+    def test_invalid_json_raises_on_result(self):
+        parser = IncrementalJSONParser()
+        parser.feed('{"a": ')
+
+        with pytest.raises(json.JSONDecodeError):
+            parser.result()
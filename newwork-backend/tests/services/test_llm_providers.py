@@ -120,3 +120,163 @@ class TestMessageTypes:
         assert msg.role == MessageRole.ASSISTANT
         assert isinstance(msg.content, list)
         assert len(msg.content) == 1
+
+
+class _FakeStream:
+    """Async context manager yielding scripted Anthropic stream events."""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for event in self.events:
+            yield event
+
+
+@pytest.mark.unit
+class TestAnthropicPromptCaching:
+    """Prompt caching breakpoints and cache usage reporting."""
+
+    def _provider(self, **kwargs):
+        from app.services.llm.anthropic_provider import AnthropicProvider
+
+        return AnthropicProvider(api_key="test-key", **kwargs)
+
+    def test_system_prompt_is_cacheable(self):
+        system = self._provider()._convert_system("You are helpful")
+
+        assert system == [
+            {"type": "text", "text": "You are helpful", "cache_control": {"type": "ephemeral"}}
+        ]
+
+    def test_last_tool_is_cacheable(self):
+        from app.services.llm.base import ToolDefinition
+
+        tools = [
+            ToolDefinition(name="a", description="A", input_schema={"type": "object"}),
+            ToolDefinition(name="b", description="B", input_schema={"type": "object"}),
+        ]
+
+        api_tools = self._provider()._convert_tools(tools)
+
+        assert "cache_control" not in api_tools[0]
+        assert api_tools[1]["cache_control"] == {"type": "ephemeral"}
+
+    def test_tool_payloads_are_reused(self):
+        from app.services.llm.base import ToolDefinition
+
+        tools = [ToolDefinition(name="a", description="A", input_schema={"type": "object"})]
+        provider = self._provider(prompt_caching=False)
+
+        first = provider._convert_tools(tools)
+
+        assert provider._convert_tools(list(tools)) is first
+
+    def test_last_message_is_cacheable(self):
+        messages = [
+            Message(role=MessageRole.USER, content="first"),
+            Message(role=MessageRole.ASSISTANT, content="second"),
+            Message(role=MessageRole.USER, content="third"),
+        ]
+
+        api_messages = self._provider()._convert_messages(messages)
+
+        assert api_messages[0]["content"] == "first"
+        assert api_messages[2]["content"] == [
+            {"type": "text", "text": "third", "cache_control": {"type": "ephemeral"}}
+        ]
+
+    def test_caching_can_be_disabled(self):
+        provider = self._provider(prompt_caching=False)
+        messages = [Message(role=MessageRole.USER, content="hi")]
+
+        assert provider._convert_system("sys") == "sys"
+        assert provider._convert_messages(messages) == [{"role": "user", "content": "hi"}]
+
+    async def test_stream_reports_cache_usage_on_message_end(self):
+        from app.services.llm.base import StreamEventType
+
+        provider = self._provider()
+        start_usage = MagicMock(
+            input_tokens=12,
+            output_tokens=1,
+            cache_creation_input_tokens=0,
+            cache_read_input_tokens=2048,
+        )
+        events = [
+            MagicMock(type="message_start", message=MagicMock(usage=start_usage)),
+            MagicMock(type="message_delta", usage=MagicMock(output_tokens=30)),
+            MagicMock(type="message_stop"),
+        ]
+        client = MagicMock()
+        client.messages.stream = MagicMock(return_value=_FakeStream(events))
+        provider._client = client
+
+        stream_events = [
+            e async for e in provider.stream_complete(
+                [Message(role=MessageRole.USER, content="hi")],
+                model="claude-sonnet-4-20250514",
+                system_prompt="sys",
+            )
+        ]
+
+        end = stream_events[-1]
+        assert end.type == StreamEventType.MESSAGE_END
+        assert end.usage == {
+            "input_tokens": 12,
+            "output_tokens": 30,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 2048,
+        }
+        sent = client.messages.stream.call_args.kwargs
+        assert sent["system"][0]["cache_control"] == {"type": "ephemeral"}
+
+
+@pytest.mark.unit
+class TestToolInputStreaming:
+    """Incremental tool argument parsing in provider streams."""
+
+    async def test_anthropic_stream_emits_partial_input(self):
+        from app.services.llm.anthropic_provider import AnthropicProvider
+        from app.services.llm.base import StreamEventType
+
+        provider = AnthropicProvider(api_key="test-key")
+        block = MagicMock(type="tool_use", id="tu-1")
+        block.name = "write_file"
+        fragments = ['{"file_path": "a.py"', ', "content": "x', 'y"}']
+        events = [MagicMock(type="content_block_start", content_block=block)]
+        events += [
+            MagicMock(type="content_block_delta", delta=MagicMock(type="input_json_delta", partial_json=f))
+            for f in fragments
+        ]
+        events.append(MagicMock(type="content_block_stop"))
+        client = MagicMock()
+        client.messages.stream = MagicMock(return_value=_FakeStream(events))
+        provider._client = client
+
+        stream_events = [
+            e async for e in provider.stream_complete(
+                [Message(role=MessageRole.USER, content="hi")],
+                model="claude-sonnet-4-20250514",
+            )
+        ]
+
+        deltas = [e for e in stream_events if e.type == StreamEventType.TOOL_USE_DELTA]
+        assert [d.tool_input_delta for d in deltas] == fragments
+        assert [d.partial_input for d in deltas] == [
+            {"file_path": "a.py"},
+            None,
+            {"file_path": "a.py", "content": "xy"},
+        ]
+        end = stream_events[-1]
+        assert end.type == StreamEventType.TOOL_USE_END
+        assert end.tool_use.arguments == {"file_path": "a.py", "content": "xy"}
@@ -0,0 +1,181 @@
+"""
+Message store tests.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import app.services.message_store as message_store_module
+from app.models.session import Message as MessageModel, Session as SessionModel
+from app.services.conversation_service import Conversation, ConversationService
+from app.services.llm.base import StreamEvent, StreamEventType, ToolResult as LLMToolResult, ToolUse
+from app.services.message_store import MessageStore
+
+from tests.conftest import StubProvider, collect, make_handler
+
+
+async def until(condition, timeout=2.0):
+    """Wait until `condition()` is true."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.005)
+
+
+@pytest.fixture
+def session_row(db):
+    session = SessionModel(id="s1", title="Test", provider="stub", model="stub-model")
+    db.add(session)
+    db.commit()
+    return session
+
+
+@pytest.fixture
+def store(session_row):
+    store = MessageStore(batch_size=100, flush_interval=60)
+    store.start()
+    return store
+
+
+def tracked(store, session_id="s1"):
+    conversation = Conversation(session_id=session_id, model="stub-model")
+    conversation.on_message = store.enqueue
+    return conversation
+
+
+def stored(db, session_id="s1"):
+    db.expire_all()
+    return db.query(MessageModel).filter(MessageModel.session_id == session_id).all()
+
+
+@pytest.mark.unit
+class TestWriteBehind:
+    """Batched writes on size, time and turn end."""
+
+    async def test_flush_on_batch_size(self, db, store):
+        store._batch_size = 3
+        conversation = tracked(store)
+
+        conversation.add_user_message("q")
+        conversation.add_assistant_message("a")
+        assert store.pending == 2 and stored(db) == []
+
+        conversation.add_user_message("q2")
+        await until(lambda: store.stats.batches == 1)
+
+        assert [row.content for row in stored(db)] == ["q", "a", "q2"]
+        assert store.stats.flushes == {"size": 1}
+
+    async def test_flush_on_interval(self, db, store):
+        store._flush_interval = 0.01
+        conversation = tracked(store)
+
+        conversation.add_user_message("q")
+        await until(lambda: store.stats.batches == 1)
+
+        assert [row.content for row in stored(db)] == ["q"]
+        assert store.stats.flushes == {"time": 1}
+
+    async def test_flush_at_turn_end_with_session_totals(self, db, store, tmp_path, monkeypatch):
+        monkeypatch.setattr(message_store_module, "message_store", store)
+        turn = [
+            StreamEvent(type=StreamEventType.MESSAGE_START),
+            StreamEvent(type=StreamEventType.TEXT_DELTA, text="hi"),
+            StreamEvent(
+                type=StreamEventType.MESSAGE_END,
+                usage={"input_tokens": 7, "output_tokens": 3},
+            ),
+        ]
+        handler = make_handler(StubProvider([turn]), tmp_path, tracked(store))
+
+        await collect(handler.process_prompt("q"))
+        await until(lambda: store.stats.batches == 1)
+
+        assert [(row.role, row.content) for row in stored(db)] == [("user", "q"), ("assistant", "hi")]
+        session = db.get(SessionModel, "s1")
+        assert (session.total_input_tokens, session.total_output_tokens) == (7, 3)
+        assert store.stats.flushes == {"turn": 1}
+
+    async def test_failed_batch_is_queued_again(self, db, store, monkeypatch):
+        conversation = tracked(store)
+        conversation.add_user_message("q")
+        write = store.write
+
+        def fail(rows, totals):
+            raise RuntimeError("disk full")
+
+        monkeypatch.setattr(store, "write", fail)
+        assert await store.flush() == 0
+        conversation.add_assistant_message("a")
+        monkeypatch.setattr(store, "write", write)
+
+        assert await store.flush() == 2
+        assert [row.content for row in stored(db)] == ["q", "a"]
+        assert store.stats.failures == 1
+
+    async def test_totals_roll_back_with_the_messages(self, db, store):
+        bad = {"id": "m1", "session_id": "s1", "role": None, "content": "x"}
+
+        with pytest.raises(IntegrityError):
+            store.write([bad], {"s1": (5, 5)})
+
+        session = db.get(SessionModel, "s1")
+        db.refresh(session)
+        assert (session.total_input_tokens, session.total_output_tokens) == (0, 0)
+
+    async def test_discard_drops_queued_messages(self, db, store):
+        tracked(store).add_user_message("q")
+        store.discard("s1")
+
+        assert await store.flush() == 0
+        assert stored(db) == []
+
+    async def test_inactive_store_queues_nothing(self, session_row):
+        store = MessageStore(batch_size=1, flush_interval=60)
+
+        tracked(store).add_user_message("q")
+
+        assert store.pending == 0
+
+
+@pytest.mark.unit
+class TestReload:
+    """Conversations loaded back after a restart."""
+
+    async def test_history_survives_a_restart(self, db, store, monkeypatch):
+        monkeypatch.setattr(message_store_module, "message_store", store)
+        before = ConversationService()
+        conversation = before.create_conversation("s1", model="stub-model")
+        conversation.add_user_message("read it")
+        conversation.add_assistant_message(
+            "", tool_uses=[ToolUse(id="t1", name="read_file", arguments={"path": "a.py"})]
+        )
+        conversation.add_tool_results([LLMToolResult(tool_use_id="t1", content="print()")])
+        conversation.add_assistant_message("done", tokens_used=4)
+        await store.close()
+        store.start()
+
+        loaded = ConversationService().get_conversation("s1")
+
+        expected = [dict(msg.to_dict(), metadata={}) for msg in conversation.messages]
+        assert [msg.to_dict() for msg in loaded.messages] == expected
+        assert loaded.total_output_tokens == 4
+        assert loaded.model == "stub-model"
+
+    async def test_new_messages_of_a_loaded_conversation_are_stored(self, db, store, monkeypatch):
+        monkeypatch.setattr(message_store_module, "message_store", store)
+        ConversationService().create_conversation("s1").add_user_message("first")
+        await store.flush()
+
+        ConversationService().get_conversation("s1").add_user_message("second")
+        await store.flush()
+
+        assert [row.content for row in stored(db)] == ["first", "second"]
+
+    async def test_session_without_messages(self, db, store, monkeypatch):
+        monkeypatch.setattr(message_store_module, "message_store", store)
+
+        assert ConversationService().get_conversation("s1") is None
+        assert ConversationService().get_conversation("missing") is None
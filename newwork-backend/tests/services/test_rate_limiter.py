@@ -0,0 +1,199 @@
+"""
+Provider rate limiter tests.
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.llm.base import (
+    InvalidRequestError,
+    LLMResponse,
+    Message,
+    MessageRole,
+    RateLimitError,
+    StreamEvent,
+    StreamEventType,
+)
+from app.services.llm.rate_limiter import (
+    ProviderRateLimiter,
+    RateLimitConfig,
+    RateLimitedProvider,
+    TokenBucket,
+    estimate_request_tokens,
+)
+
+from tests.conftest import StubProvider, collect, text_turn
+
+
+def _limiter(**overrides):
+    config = RateLimitConfig(
+        requests_per_minute=6000,
+        tokens_per_minute=1_000_000,
+        max_concurrency=4,
+        max_retries=3,
+        base_delay=0.01,
+        max_delay=0.1,
+    )
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return ProviderRateLimiter("stub", "key", config)
+
+
+def _rate_limited_turn(retry_after=None):
+    return [
+        StreamEvent(type=StreamEventType.MESSAGE_START),
+        StreamEvent(
+            type=StreamEventType.ERROR,
+            error="rate limited",
+            error_code="rate_limit",
+            retry_after=retry_after,
+        ),
+    ]
+
+
+@pytest.mark.unit
+class TestTokenBucket:
+    """Token bucket tests."""
+
+    def test_acquire_until_empty(self):
+        bucket = TokenBucket(capacity=2, refill_per_second=1)
+
+        assert bucket.try_acquire(1) == 0
+        assert bucket.try_acquire(1) == 0
+        assert bucket.try_acquire(1) > 0
+
+    def test_oversized_request_admitted_when_full(self):
+        bucket = TokenBucket(capacity=100, refill_per_second=10)
+
+        assert bucket.try_acquire(500) == 0
+        assert bucket.level < 0
+
+    def test_adjust_refunds_up_to_capacity(self):
+        bucket = TokenBucket(capacity=100, refill_per_second=10)
+        bucket.try_acquire(80)
+
+        bucket.adjust(-1000)
+
+        assert bucket.level == 100
+
+
+@pytest.mark.unit
+class TestProviderRateLimiter:
+    """Retry and limiting behavior."""
+
+    async def test_call_retries_rate_limit_errors(self):
+        limiter = _limiter()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise RateLimitError("slow down", provider="stub", retry_after=0.02)
+            return LLMResponse(content=[], usage={"input_tokens": 10, "output_tokens": 5})
+
+        start = time.monotonic()
+        result = await limiter.call(request, estimated_tokens=100)
+
+        assert isinstance(result, LLMResponse)
+        assert len(attempts) == 3
+        assert time.monotonic() - start >= 0.04
+        state = limiter.get_state()
+        assert state["total_retries"] == 2
+        assert state["total_rate_limited"] == 2
+        assert state["rate_scale"] < 1.0
+
+    async def test_call_does_not_retry_invalid_requests(self):
+        limiter = _limiter()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+            raise InvalidRequestError("bad", provider="stub")
+
+        with pytest.raises(InvalidRequestError):
+            await limiter.call(request, estimated_tokens=100)
+        assert len(attempts) == 1
+        assert limiter.get_state()["in_flight"] == 0
+
+    async def test_call_gives_up_after_max_retries(self):
+        limiter = _limiter(max_retries=1)
+
+        async def request():
+            raise RateLimitError("slow down", provider="stub")
+
+        with pytest.raises(RateLimitError):
+            await limiter.call(request, estimated_tokens=100)
+        assert limiter.total_retries == 1
+
+    async def test_stream_retries_before_content(self):
+        provider = StubProvider([_rate_limited_turn(), text_turn("hello")])
+        limiter = _limiter()
+        wrapped = RateLimitedProvider(provider, limiter)
+
+        events = await collect(wrapped.stream_complete([], "stub-model"))
+
+        types = [e.type for e in events]
+        assert types == [
+            StreamEventType.MESSAGE_START,
+            StreamEventType.TEXT_DELTA,
+            StreamEventType.MESSAGE_END,
+        ]
+        assert len(provider.requests) == 2
+        assert limiter.total_retries == 1
+
+    async def test_stream_error_after_content_is_passed_through(self):
+        turn = [
+            StreamEvent(type=StreamEventType.MESSAGE_START),
+            StreamEvent(type=StreamEventType.TEXT_DELTA, text="partial"),
+            StreamEvent(type=StreamEventType.ERROR, error="boom", error_code="unavailable"),
+        ]
+        provider = StubProvider([turn])
+        wrapped = RateLimitedProvider(provider, _limiter())
+
+        events = await collect(wrapped.stream_complete([], "stub-model"))
+
+        assert events[-1].type == StreamEventType.ERROR
+        assert len(provider.requests) == 1
+
+    async def test_concurrency_is_bounded(self):
+        limiter = _limiter(max_concurrency=2)
+        active = 0
+        peak = 0
+
+        async def request():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return LLMResponse(content=[])
+
+        await asyncio.gather(
+            *(limiter.call(request, estimated_tokens=10) for _ in range(6))
+        )
+
+        assert peak == 2
+        assert limiter.get_state()["in_flight"] == 0
+
+    async def test_requests_per_minute_limit_delays_excess(self):
+        limiter = _limiter(requests_per_minute=1200)  # 20 per second, burst of 1200
+        limiter.request_bucket.capacity = 1
+        limiter.request_bucket._level = 1
+
+        async def request():
+            return LLMResponse(content=[])
+
+        start = time.monotonic()
+        await limiter.call(request, estimated_tokens=1)
+        await limiter.call(request, estimated_tokens=1)
+
+        assert time.monotonic() - start >= 0.04
+
+
+@pytest.mark.unit
+def test_estimate_request_tokens():
+    messages = [Message(role=MessageRole.USER, content="x" * 400)]
+
+    assert estimate_request_tokens(messages, max_tokens=1000) == 1100
@@ -0,0 +1,200 @@
+"""
+Record/replay provider tests.
+"""
+
+import time
+
+import pytest
+
+from app.services.conversation_service import Conversation
+from app.services.llm import _PROVIDERS, get_provider
+from app.services.llm.base import (
+    ContentBlock,
+    Message,
+    MessageRole,
+    StreamEvent,
+    StreamEventType,
+    ToolResult,
+    ToolUse,
+)
+from app.services.llm.replay_provider import (
+    RecordingProvider,
+    ReplayProvider,
+    get_turn_depth,
+    load_cassette,
+)
+from app.services.streaming_handler import SSEEventType, StreamingHandler
+from app.services.tool_execution_service import ToolExecutionService
+from app.tools import initialize_tools
+
+from tests.conftest import StubProvider, collect, text_turn
+
+
+def tool_turn(tool_use):
+    return [
+        StreamEvent(type=StreamEventType.MESSAGE_START),
+        StreamEvent(type=StreamEventType.TEXT_DELTA, text="Reading."),
+        StreamEvent(
+            type=StreamEventType.TOOL_USE_START,
+            tool_use_id=tool_use.id,
+            tool_name=tool_use.name,
+        ),
+        StreamEvent(type=StreamEventType.TOOL_USE_END, tool_use=tool_use),
+        StreamEvent(type=StreamEventType.MESSAGE_END),
+    ]
+
+
+def _user(text):
+    return Message(role=MessageRole.USER, content=text)
+
+
+def _assistant(text):
+    return Message(role=MessageRole.ASSISTANT, content=text)
+
+
+def _tool_result():
+    return Message(
+        role=MessageRole.USER,
+        content=[
+            ContentBlock(type="tool_result", tool_result=ToolResult(tool_use_id="t1", content="x"))
+        ],
+    )
+
+
+async def _record(tmp_path, turns_by_request):
+    """Record stub turns for the given request message lists."""
+    cassette = tmp_path / "cassette.jsonl"
+    stub = StubProvider([turn for _, turn in turns_by_request])
+    recorder = RecordingProvider(stub, cassette)
+    for messages, _ in turns_by_request:
+        await collect(recorder.stream_complete(messages, "stub-model"))
+    return cassette
+
+
+@pytest.mark.unit
+def test_turn_depth():
+    assert get_turn_depth([_user("a")]) == 0
+    assert get_turn_depth([_user("a"), _assistant("b"), _tool_result()]) == 1
+    assert get_turn_depth([_user("a"), _assistant("b"), _user("c")]) == 0
+
+
+@pytest.mark.unit
+class TestRecordReplay:
+    """Recording and replaying streams."""
+
+    async def test_recording_captures_events_and_timings(self, tmp_path):
+        cassette = await _record(tmp_path, [([_user("hi")], text_turn("hello"))])
+
+        turns = load_cassette(cassette)
+        assert len(turns) == 1
+        assert turns[0]["depth"] == 0
+        delays = [delay for delay, _ in turns[0]["events"]]
+        assert all(delay >= 0 for delay in delays)
+        assert turns[0]["events"][1][1] == {"type": "text_delta", "text": "hello"}
+
+    async def test_failed_attempts_are_not_recorded(self, tmp_path):
+        failed = [
+            StreamEvent(type=StreamEventType.MESSAGE_START),
+            StreamEvent(type=StreamEventType.ERROR, error="overloaded"),
+        ]
+        cassette = await _record(
+            tmp_path, [([_user("hi")], failed), ([_user("hi")], text_turn("hello"))]
+        )
+
+        turns = load_cassette(cassette)
+        assert len(turns) == 1
+        assert turns[0]["events"][1][1]["text"] == "hello"
+
+    async def test_replay_matches_turns_by_depth(self, tmp_path):
+        tool_use = ToolUse(id="t1", name="read_file", arguments={"file_path": "a.txt"})
+        cassette = await _record(tmp_path, [
+            ([_user("read a")], tool_turn(tool_use)),
+            ([_user("read a"), _assistant("Reading."), _tool_result()], text_turn("done")),
+        ])
+        replay = ReplayProvider(cassette=cassette, speed=0)
+
+        # Two interleaved sessions at different depths
+        final = await collect(replay.stream_complete(
+            [_user("x"), _assistant("y"), _tool_result()], "any"
+        ))
+        first = await collect(replay.stream_complete([_user("x")], "any"))
+
+        assert first[3].tool_use == tool_use
+        assert final[1].text == "done"
+
+    async def test_replay_speed(self, tmp_path):
+        cassette = tmp_path / "slow.jsonl"
+        cassette.write_text(
+            '{"depth": 0, "events": [[0.0, {"type": "message_start"}], '
+            '[0.2, {"type": "text_delta", "text": "x"}], [0.0, {"type": "message_end"}]]}\n'
+        )
+
+        start = time.monotonic()
+        await collect(ReplayProvider(cassette=cassette, speed=4).stream_complete([], "m"))
+        fast = time.monotonic() - start
+
+        start = time.monotonic()
+        await collect(ReplayProvider(cassette=cassette, speed=0).stream_complete([], "m"))
+        unthrottled = time.monotonic() - start
+
+        assert 0.04 <= fast < 0.2
+        assert unthrottled < 0.04
+
+    async def test_complete_assembles_recorded_stream(self, tmp_path):
+        tool_use = ToolUse(id="t1", name="read_file", arguments={"file_path": "a.txt"})
+        cassette = await _record(tmp_path, [([_user("read a")], tool_turn(tool_use))])
+
+        response = await ReplayProvider(cassette=cassette, speed=0).complete([_user("q")], "m")
+
+        assert response.text == "Reading."
+        assert response.tool_uses == [tool_use]
+
+    async def test_replay_drives_the_tool_loop(self, tmp_path):
+        initialize_tools()
+        (tmp_path / "a.txt").write_text("file contents")
+        tool_use = ToolUse(id="t1", name="read_file", arguments={"file_path": "a.txt"})
+        cassette = await _record(tmp_path, [
+            ([_user("read a")], tool_turn(tool_use)),
+            ([_user("read a"), _assistant("Reading."), _tool_result()], text_turn("done")),
+        ])
+        handler = StreamingHandler(
+            provider=ReplayProvider(cassette=cassette, speed=0),
+            conversation=Conversation(session_id="s1", model="replay"),
+            tool_service=ToolExecutionService(workspace_path=tmp_path, session_id="s1"),
+        )
+
+        events = await collect(handler.process_prompt("read a"))
+
+        types = [e.type for e in events]
+        assert SSEEventType.TOOL_RESULT in types
+        assert types[-1] == SSEEventType.COMPLETE
+        assert events[-2].data["content"] == "done"
+
+
+@pytest.mark.unit
+def test_replay_provider_is_registered(tmp_path, monkeypatch):
+    from app.services.config_service import settings
+
+    cassette = tmp_path / "c.jsonl"
+    cassette.write_text('{"depth": 0, "events": []}\n')
+    monkeypatch.setattr(settings, "LLM_REPLAY_CASSETTE", str(cassette))
+
+    assert "replay" in _PROVIDERS
+    provider = get_provider("replay", "replay", use_cache=False)
+    assert isinstance(provider, ReplayProvider)
+
+
+@pytest.mark.unit
+def test_recorder_wraps_the_rate_limiter(tmp_path, monkeypatch):
+    from app.services.config_service import settings
+    from app.services.llm.rate_limiter import RateLimitedProvider
+    from app.services.llm.scheduled_provider import ScheduledProvider
+
+    monkeypatch.setattr(settings, "LLM_RECORD_CASSETTE", str(tmp_path / "c.jsonl"))
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_COMPLETION_CACHE_ENABLED", False)
+
+    provider = get_provider("anthropic", "sk-test", use_cache=False)
+    assert isinstance(provider, RecordingProvider)
+    assert isinstance(provider.provider, ScheduledProvider)
+    assert isinstance(provider.provider.provider, RateLimitedProvider)
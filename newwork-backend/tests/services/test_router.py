@@ -0,0 +1,199 @@
+"""
+Provider router tests.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.llm import _PROVIDERS, register_provider
+from app.services.llm.base import LLMResponse, ModelInfo, StreamEventType
+from app.services.llm.router import RoutedProvider, RouteStats, parse_routes
+
+from tests.conftest import StubProvider, collect
+
+
+@pytest.fixture
+def stub_providers(monkeypatch):
+    """Register stub providers and remove them afterwards."""
+    from app.services.config_service import settings
+
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_ENABLED", False)
+    registered = []
+
+    def register(name, **attrs):
+        models = [ModelInfo(id="m", name="M", provider=name, context_window=1000)]
+        cls = type(
+            f"Stub_{name}", (StubProvider,), {"provider_name": name, "models": models, **attrs}
+        )
+        register_provider(name, cls)
+        registered.append(name)
+        return name
+
+    yield register
+
+    for name in registered:
+        _PROVIDERS.pop(name, None)
+
+
+def _routed(names, **kwargs):
+    return RoutedProvider.from_routes(
+        [(name, "m") for name in names],
+        api_keys={name: f"key-{name}" for name in names},
+        stats={},
+        **kwargs,
+    )
+
+
+def _targets(routed):
+    return {t.provider_name: t.provider for t in routed.targets}
+
+
+@pytest.mark.unit
+class TestRouting:
+    """Target selection and failover."""
+
+    async def test_prefers_fastest_route(self, stub_providers):
+        slow = stub_providers("route-slow-a", delay=0.05, text="slow")
+        fast = stub_providers("route-fast-a", delay=0.0, text="fast")
+        routed = _routed([slow, fast])
+
+        # First two requests measure both routes
+        await collect(routed.stream_complete([], "m"))
+        await collect(routed.stream_complete([], "m"))
+        events = await collect(routed.stream_complete([], "m"))
+
+        assert routed.rank_targets()[0].provider_name == fast
+        assert events[1].text == "fast"
+
+    async def test_fails_over_on_error_before_content(self, stub_providers):
+        broken = stub_providers("route-broken-b", fail=True)
+        healthy = stub_providers("route-healthy-b", text="fine")
+        routed = _routed([broken, healthy])
+
+        events = await collect(routed.stream_complete([], "m"))
+
+        types = [e.type for e in events]
+        assert types == [
+            StreamEventType.MESSAGE_START,
+            StreamEventType.TEXT_DELTA,
+            StreamEventType.MESSAGE_END,
+        ]
+        assert events[1].text == "fine"
+        assert routed.stats[f"{broken}:m"].error_rate == 1.0
+
+    async def test_all_routes_failing_yields_error(self, stub_providers):
+        a = stub_providers("route-down-c1", fail=True)
+        b = stub_providers("route-down-c2", fail=True)
+        routed = _routed([a, b])
+
+        events = await collect(routed.stream_complete([], "m"))
+
+        assert events[-1].type == StreamEventType.ERROR
+
+    async def test_unhealthy_route_is_ranked_last(self, stub_providers):
+        a = stub_providers("route-flaky-d")
+        b = stub_providers("route-steady-d")
+        routed = _routed([a, b])
+        stats = RouteStats()
+        for _ in range(4):
+            stats.record_outcome(False)
+        routed.stats[f"{a}:m"] = stats
+
+        assert routed.rank_targets()[0].provider_name == b
+
+    async def test_complete_fails_over(self, stub_providers):
+        broken = stub_providers("route-broken-e", fail=True)
+        healthy = stub_providers("route-healthy-e")
+        routed = _routed([broken, healthy])
+
+        response = await routed.complete([], "m")
+
+        assert isinstance(response, LLMResponse)
+
+
+@pytest.mark.unit
+class TestHedging:
+    """Hedged requests."""
+
+    async def test_hedge_wins_and_loser_is_cancelled(self, stub_providers):
+        slow = stub_providers("route-slow-f", delay=1.0, text="slow")
+        fast = stub_providers("route-fast-f", delay=0.0, text="fast")
+        routed = _routed([slow, fast], hedge_delay=0.02)
+
+        events = await asyncio.wait_for(collect(routed.stream_complete([], "m")), 0.5)
+        await asyncio.sleep(0)
+
+        assert [e.text for e in events if e.type == StreamEventType.TEXT_DELTA] == ["fast"]
+        assert sum(e.type == StreamEventType.MESSAGE_START for e in events) == 1
+        providers = _targets(routed)
+        assert providers[slow].cancelled == 1
+        assert routed.stats[f"{fast}:m"].hedges_won == 1
+
+    async def test_losing_stream_is_closed_before_returning(self, stub_providers):
+        slow = stub_providers("route-slow-i", delay=1.0, text="slow")
+        fast = stub_providers("route-fast-i", delay=0.0, text="fast")
+        routed = _routed([slow, fast], hedge_delay=0.02)
+
+        await asyncio.wait_for(collect(routed.stream_complete([], "m")), 0.5)
+
+        # No extra loop iteration needed: the router awaited the cancelled stream
+        assert _targets(routed)[slow].cancelled == 1
+
+    async def test_no_hedge_when_first_token_is_fast(self, stub_providers):
+        first = stub_providers("route-first-g", delay=0.0)
+        second = stub_providers("route-second-g", delay=0.0)
+        routed = _routed([first, second], hedge_delay=0.2)
+
+        await collect(routed.stream_complete([], "m"))
+
+        assert _targets(routed)[second].started == 0
+
+
+@pytest.mark.unit
+class TestRoutedModelInfo:
+    """Model catalog of routed providers."""
+
+    def test_context_window_is_smallest_target(self, stub_providers):
+        a = stub_providers("route-info-h")
+        routed = _routed([a])
+
+        assert routed.get_model_info("m").context_window == 1000
+
+    def test_target_for_model(self, stub_providers):
+        a = stub_providers("route-model-j")
+        routed = RoutedProvider.from_routes(
+            [(a, "m"), (a, "m-mini")], api_keys={a: "key"}, stats={}
+        )
+
+        assert routed.target_for("m-mini").model == "m-mini"
+        assert routed.target_for("unknown") is None
+
+
+@pytest.mark.unit
+def test_parse_routes():
+    assert parse_routes("anthropic:claude, openai:gpt-4o") == [
+        ("anthropic", "claude"),
+        ("openai", "gpt-4o"),
+    ]
+    with pytest.raises(ValueError):
+        parse_routes("anthropic")
+
+
+@pytest.mark.unit
+def test_streaming_handler_routing(stub_providers, monkeypatch, tmp_path):
+    from app.services.config_service import ConfigService, settings
+    from app.services.streaming_handler import create_streaming_handler
+
+    a = stub_providers("route-handler-k1")
+    b = stub_providers("route-handler-k2")
+    monkeypatch.setattr(settings, "LLM_ROUTES", f"{a}:m,{b}:m2")
+    monkeypatch.setattr(ConfigService, "get_api_key", staticmethod(lambda name: "key"))
+
+    routed = create_streaming_handler("route-s1", tmp_path).provider
+    pinned = create_streaming_handler("route-s2", tmp_path, model="m2")
+
+    assert isinstance(routed, RoutedProvider)
+    assert create_streaming_handler("route-s3", tmp_path).provider is routed
+    assert pinned.provider is routed.target_for("m2").provider
+    assert pinned.conversation.model == "m2"
@@ -0,0 +1,355 @@
+"""
+Streaming handler tests.
+"""
+
+import asyncio
+import zlib
+
+import pytest
+
+from app.services.conversation_service import Conversation
+from app.services.llm.base import StreamEvent, StreamEventType, ToolUse
+from app.services.streaming_handler import (
+    STREAM_PROTOCOL_ACCUMULATED,
+    STREAM_PROTOCOL_DELTA,
+    SSEEventType,
+    TextChunkEncoder,
+    coalesce_text_deltas,
+    negotiate_stream_protocol,
+)
+from app.services.tool_execution_service import PERMISSION_DENIED_RESULT
+from app.tools import (
+    Tool,
+    ToolAccess,
+    ToolCategory,
+    ToolResult,
+    initialize_tools,
+    register_tool,
+    unregister_tool,
+)
+
+from tests.conftest import StubProvider, collect, make_handler, text_turn
+
+
+@pytest.mark.unit
+class TestContextBudgeting:
+    """Context window trimming in the prompt loop."""
+
+    async def test_complete_reports_no_savings_for_short_history(self, tmp_path):
+        handler = make_handler(StubProvider([text_turn("hi")]), tmp_path)
+
+        events = await collect(handler.process_prompt("hello"))
+
+        complete = events[-1]
+        assert complete.type == SSEEventType.COMPLETE
+        assert complete.data["context_tokens_saved"] == 0
+
+    async def test_old_turns_are_trimmed_and_reported(self, tmp_path):
+        conversation = Conversation(session_id="s1", model="stub-model")
+        for i in range(20):
+            conversation.add_user_message("q" * 4000)
+            conversation.add_assistant_message("a" * 4000)
+
+        provider = StubProvider([text_turn("done")], context_window=12000)
+        handler = make_handler(provider, tmp_path, conversation)
+        handler.max_output_tokens = 1000
+
+        events = await collect(handler.process_prompt("latest"))
+
+        sent = provider.requests[0]["messages"]
+        assert len(sent) < len(conversation.messages)
+        assert sent[-1].content == "latest"
+        assert events[-1].data["context_tokens_saved"] > 0
+
+
+@pytest.mark.unit
+class TestTokenUsage:
+    """Usage reporting from provider stream events."""
+
+    async def test_cache_usage_is_added_to_totals(self, tmp_path):
+        turn = text_turn("hi")
+        turn[-1] = StreamEvent(
+            type=StreamEventType.MESSAGE_END,
+            usage={
+                "input_tokens": 10,
+                "output_tokens": 5,
+                "cache_read_input_tokens": 300,
+                "cache_creation_input_tokens": 40,
+            },
+        )
+        handler = make_handler(StubProvider([turn]), tmp_path)
+
+        events = await collect(handler.process_prompt("hello"))
+
+        data = events[-1].data
+        assert data["total_input_tokens"] == 10
+        assert data["total_output_tokens"] == 5
+        assert data["total_cache_read_tokens"] == 300
+        assert data["total_cache_creation_tokens"] == 40
+
+
+async def timed_events(script):
+    """Yield (delay, event) pairs with the given delays."""
+    for delay, event in script:
+        await asyncio.sleep(delay)
+        yield event
+
+
+def delta(text):
+    return StreamEvent(type=StreamEventType.TEXT_DELTA, text=text)
+
+
+@pytest.mark.unit
+class TestTextCoalescing:
+    """Merging text deltas into SSE frames."""
+
+    async def test_burst_is_merged(self):
+        events = await collect(coalesce_text_deltas(
+            timed_events([(0, delta(str(i))) for i in range(10)]),
+            interval=0.05,
+            max_bytes=4096,
+        ))
+
+        assert [e.text for e in events] == ["0123456789"]
+
+    async def test_size_bound(self):
+        events = await collect(coalesce_text_deltas(
+            timed_events([(0, delta("abcd")) for _ in range(5)]),
+            interval=10,
+            max_bytes=8,
+        ))
+
+        assert [e.text for e in events] == ["abcdabcd", "abcdabcd", "abcd"]
+
+    async def test_time_bound(self):
+        events = await collect(coalesce_text_deltas(
+            timed_events([(0, delta("a")), (0, delta("b")), (0.1, delta("c"))]),
+            interval=0.02,
+            max_bytes=4096,
+        ))
+
+        assert [e.text for e in events] == ["ab", "c"]
+
+    async def test_other_events_flush_immediately(self):
+        start = StreamEvent(type=StreamEventType.TOOL_USE_START, tool_use_id="t1", tool_name="bash")
+        events = await collect(coalesce_text_deltas(
+            timed_events([(0, delta("a")), (0, delta("b")), (0, start), (0, delta("c"))]),
+            interval=10,
+            max_bytes=4096,
+        ))
+
+        assert [(e.type, e.text) for e in events] == [
+            (StreamEventType.TEXT_DELTA, "ab"),
+            (StreamEventType.TOOL_USE_START, None),
+            (StreamEventType.TEXT_DELTA, "c"),
+        ]
+
+    async def test_upstream_errors_propagate(self):
+        async def failing():
+            yield delta("a")
+            raise RuntimeError("boom")
+
+        frames = coalesce_text_deltas(failing(), interval=10, max_bytes=4096)
+
+        with pytest.raises(RuntimeError):
+            await collect(frames)
+
+    async def test_disabled(self):
+        events = await collect(coalesce_text_deltas(
+            timed_events([(0, delta("a")), (0, delta("b"))]),
+            interval=0,
+            max_bytes=4096,
+        ))
+
+        assert [e.text for e in events] == ["a", "b"]
+
+    async def test_handler_sends_fewer_chunks(self, tmp_path):
+        turn = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+        turn += [delta(f"w{i} ") for i in range(50)]
+        turn.append(StreamEvent(type=StreamEventType.MESSAGE_END))
+        handler = make_handler(StubProvider([turn]), tmp_path)
+        handler.coalesce_interval = 0.05
+
+        events = await collect(handler.process_prompt("hello"))
+
+        chunks = [e for e in events if e.type == SSEEventType.STREAM_CHUNK and e.data["content"]]
+        assert len(chunks) == 1
+        assert chunks[0].data["content"] == "".join(f"w{i} " for i in range(50))
+        assert handler.conversation.messages[-1].content == chunks[0].data["content"]
+
+
+def chunk_data(events):
+    return [e.data for e in events if e.type == SSEEventType.STREAM_CHUNK]
+
+
+@pytest.mark.unit
+class TestStreamProtocol:
+    """STREAM_CHUNK formats."""
+
+    def test_negotiation(self):
+        assert negotiate_stream_protocol(None) == STREAM_PROTOCOL_DELTA
+        assert negotiate_stream_protocol("Accumulated") == STREAM_PROTOCOL_ACCUMULATED
+        assert negotiate_stream_protocol("v9") == STREAM_PROTOCOL_DELTA
+
+    def test_delta_chunks_carry_checkpoints(self):
+        encoder = TextChunkEncoder(checkpoint_interval=2)
+
+        chunks = [encoder.chunk(t) for t in ["héllo ", "wor", "ld"]]
+        final = encoder.finish()
+
+        assert [c["seq"] for c in chunks] == [0, 1, 2]
+        assert all("accumulated" not in c for c in chunks)
+        assert "checkpoint" not in chunks[0]
+        head = "héllo wor".encode()
+        assert chunks[1]["checkpoint"] == {"bytes": len(head), "crc32": f"{zlib.crc32(head):08x}"}
+        full = "héllo world".encode()
+        assert final == {
+            "content": "",
+            "seq": 3,
+            "final": True,
+            "checkpoint": {"bytes": len(full), "crc32": f"{zlib.crc32(full):08x}"},
+        }
+
+    def test_nothing_to_finish(self):
+        assert TextChunkEncoder().finish() is None
+        encoder = TextChunkEncoder(protocol=STREAM_PROTOCOL_ACCUMULATED)
+        encoder.chunk("a")
+        assert encoder.finish() is None
+
+    async def test_handler_delta_protocol(self, tmp_path):
+        turn = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+        turn += [delta(f"w{i} ") for i in range(5)]
+        turn.append(StreamEvent(type=StreamEventType.MESSAGE_END))
+        handler = make_handler(StubProvider([turn]), tmp_path)
+        handler.coalesce_interval = 0
+
+        chunks = chunk_data(await collect(handler.process_prompt("hello")))
+
+        assert [c["seq"] for c in chunks] == list(range(6))
+        text = "".join(c["content"] for c in chunks)
+        assert text == handler.conversation.messages[-1].content
+        assert chunks[-1]["final"]
+        assert chunks[-1]["checkpoint"]["crc32"] == f"{zlib.crc32(text.encode()):08x}"
+
+    async def test_handler_accumulated_protocol(self, tmp_path):
+        turn = [StreamEvent(type=StreamEventType.MESSAGE_START), delta("a"), delta("b")]
+        handler = make_handler(StubProvider([turn]), tmp_path)
+        handler.coalesce_interval = 0
+        handler.stream_protocol = STREAM_PROTOCOL_ACCUMULATED
+
+        chunks = chunk_data(await collect(handler.process_prompt("hello")))
+
+        assert chunks == [
+            {"content": "a", "accumulated": "a"},
+            {"content": "b", "accumulated": "ab"},
+        ]
+
+
+def tool_turn(*tool_uses):
+    turn = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+    turn += [StreamEvent(type=StreamEventType.TOOL_USE_END, tool_use=tu) for tu in tool_uses]
+    turn.append(StreamEvent(type=StreamEventType.MESSAGE_END))
+    return turn
+
+
+class CountingRead(Tool):
+    """Read tool that counts its runs."""
+
+    name = "count_read"
+    description = "Counts"
+    category = ToolCategory.FILE
+    requires_permission = False
+    access = ToolAccess.READ
+
+    def __init__(self):
+        self.runs = 0
+
+    @property
+    def input_schema(self):
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, arguments, context):
+        self.runs += 1
+        return ToolResult.success_result("read")
+
+
+@pytest.fixture
+def counting_read():
+    initialize_tools()
+    tool = CountingRead()
+    register_tool(tool)
+    yield tool
+    unregister_tool(tool.name)
+
+
+async def answer_permission(handler, events, approved):
+    """Wait for the request's permission request, then answer it."""
+    while not [e for e in events if e.type == SSEEventType.PERMISSION_REQUEST]:
+        await asyncio.sleep(0.005)
+    request = [e for e in events if e.type == SSEEventType.PERMISSION_REQUEST][0]
+    assert handler.respond_permission(request.data["permission_id"], approved)
+    return request
+
+
+@pytest.mark.unit
+class TestPermissionSuspension:
+    """Tool calls that wait in place for a permission response."""
+
+    async def run_with_answer(self, handler, approved):
+        events = []
+
+        async def run():
+            async for event in handler.process_prompt("go"):
+                events.append(event)
+
+        task = asyncio.create_task(run())
+        request = await answer_permission(handler, events, approved)
+        await task
+        return events, request
+
+    async def test_approved_call_resumes_in_place(self, tmp_path, counting_read):
+        uses = [
+            ToolUse(id="r1", name="count_read", arguments={}),
+            ToolUse(id="w1", name="write_file", arguments={"file_path": "out.txt", "content": "x"}),
+        ]
+        provider = StubProvider([tool_turn(*uses), text_turn("done")])
+        handler = make_handler(provider, tmp_path)
+
+        events, request = await self.run_with_answer(handler, approved=True)
+
+        assert request.data["tool_use_id"] == "w1"
+        statuses = [e.data["status"] for e in events if e.type == SSEEventType.STATUS]
+        assert statuses == ["thinking", "executing_tools", "waiting_permission", "permission_granted", "thinking"]
+        assert events[-1].type == SSEEventType.COMPLETE
+        assert counting_read.runs == 1
+        assert (tmp_path / "out.txt").read_text() == "x"
+        assert len(provider.requests) == 2
+        roles = [m.role.value for m in handler.conversation.messages]
+        assert roles == ["user", "assistant", "user", "assistant"]
+        results = handler.conversation.messages[2].tool_results
+        assert [(r.tool_use_id, r.is_error) for r in results] == [("r1", False), ("w1", False)]
+
+    async def test_denied_call_gets_a_denied_result(self, tmp_path):
+        initialize_tools()
+        use = ToolUse(id="w1", name="write_file", arguments={"file_path": "out.txt", "content": "x"})
+        handler = make_handler(StubProvider([tool_turn(use), text_turn("ok")]), tmp_path)
+
+        events, _ = await self.run_with_answer(handler, approved=False)
+
+        assert not (tmp_path / "out.txt").exists()
+        assert "permission_denied" in [e.data.get("status") for e in events]
+        (result,) = handler.conversation.messages[2].tool_results
+        assert (result.tool_use_id, result.content) == ("w1", PERMISSION_DENIED_RESULT)
+        assert handler.conversation.messages[-1].content == "ok"
+
+    async def test_tool_loop_is_bounded(self, tmp_path, counting_read):
+        turns = [tool_turn(ToolUse(id=f"r{i}", name="count_read", arguments={})) for i in range(5)]
+        provider = StubProvider(turns)
+        handler = make_handler(provider, tmp_path)
+        handler.max_tool_iterations = 3
+
+        events = await collect(handler.process_prompt("go"))
+
+        assert len(provider.requests) == 3
+        assert counting_read.runs == 3
+        assert events[-1].type == SSEEventType.COMPLETE
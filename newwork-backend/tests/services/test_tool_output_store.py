@@ -0,0 +1,189 @@
+"""
+Stale tool output elision tests.
+"""
+
+import pytest
+
+from app.services.conversation_service import Conversation
+from app.services.llm.base import ToolResult, ToolUse
+from app.services.tool_output_store import ToolOutputElisionPolicy, ToolOutputStore
+from app.tools import ToolContext, initialize_tools, get_tool
+
+from tests.conftest import StubProvider, collect, make_handler, text_turn
+
+
+def add_tool_turn(conv, i, tool="read_file", content="x" * 5000, is_error=False):
+    conv.add_user_message(f"question {i}")
+    conv.add_assistant_message(
+        "", tool_uses=[ToolUse(id=f"t{i}", name=tool, arguments={})]
+    )
+    conv.add_tool_results([ToolResult(tool_use_id=f"t{i}", content=content, is_error=is_error)])
+    conv.add_assistant_message(f"answer {i}")
+
+
+def make_policy(tmp_path, **kwargs):
+    kwargs.setdefault("after_turns", 2)
+    kwargs.setdefault("min_chars", 1000)
+    return ToolOutputElisionPolicy(ToolOutputStore(tmp_path / "blobs"), **kwargs)
+
+
+@pytest.mark.unit
+class TestToolOutputStore:
+    """Content-addressed blob storage."""
+
+    def test_roundtrip_and_dedup(self, tmp_path):
+        store = ToolOutputStore(tmp_path)
+
+        handle = store.put("output")
+
+        assert store.put("output") == handle
+        assert store.get(handle) == "output"
+        assert len(list(tmp_path.rglob("*.txt"))) == 1
+
+    def test_unknown_or_malformed_handle(self, tmp_path):
+        store = ToolOutputStore(tmp_path)
+
+        assert store.get("0" * 32) is None
+        assert store.get("../../etc/passwd") is None
+
+
+@pytest.mark.unit
+class TestElisionPolicy:
+    """Replacing stale tool outputs in the LLM view."""
+
+    def test_recent_outputs_are_kept(self, tmp_path):
+        conv = Conversation(session_id="s1")
+        add_tool_turn(conv, 0)
+        add_tool_turn(conv, 1)
+
+        view, stats = make_policy(tmp_path).apply(conv.messages)
+
+        assert view == conv.messages
+        assert stats.results == 0
+
+    def test_stale_outputs_become_stubs(self, tmp_path):
+        conv = Conversation(session_id="s1")
+        for i, tool in enumerate(["read_file", "grep", "bash", "web_fetch", "read_file", "bash"]):
+            add_tool_turn(conv, i, tool=tool)
+        policy = make_policy(tmp_path)
+
+        view, stats = policy.apply(conv.messages)
+
+        # Four stale turns; grep is not an elided tool
+        assert stats.results == 3
+        assert stats.bytes_saved > 3 * 4000
+        assert stats.tokens_saved > 0
+        stub = view[2].tool_results[0].content
+        assert "read_file" in stub and "read_tool_output" in stub
+        assert view[18].tool_results[0].content == "x" * 5000
+
+        # The conversation keeps the full output and records the handle
+        original = conv.messages[2]
+        assert original.tool_results[0].content == "x" * 5000
+        handle = original.metadata["tool_output_handles"]["t0"]
+        assert policy.store.get(handle) == "x" * 5000
+        assert handle in stub
+
+    def test_small_and_error_outputs_are_kept(self, tmp_path):
+        conv = Conversation(session_id="s1")
+        add_tool_turn(conv, 0, content="short")
+        add_tool_turn(conv, 1, content="e" * 5000, is_error=True)
+        add_tool_turn(conv, 2)
+        add_tool_turn(conv, 3)
+
+        _, stats = make_policy(tmp_path).apply(conv.messages)
+
+        assert stats.results == 0
+
+    def test_views_are_reused(self, tmp_path):
+        conv = Conversation(session_id="s1")
+        for i in range(4):
+            add_tool_turn(conv, i)
+        policy = make_policy(tmp_path)
+
+        first, first_stats = policy.apply(conv.messages)
+        second, stats = policy.apply(conv.messages)
+
+        assert first[2] is second[2]
+        assert first[2].to_llm_message() is second[2].to_llm_message()
+        assert first_stats.results == 2
+        assert stats.results == 0
+
+    def test_stale_turns_are_elided_in_groups(self, tmp_path):
+        conv = Conversation(session_id="s1")
+        for i in range(4):
+            add_tool_turn(conv, i)
+        policy = make_policy(tmp_path)
+        before, _ = policy.apply(conv.messages)
+
+        # One more turn does not move the boundary, so the sent prefix is unchanged
+        add_tool_turn(conv, 4)
+        after, stats = policy.apply(conv.messages)
+
+        assert after[:16] == before
+        assert after[10].tool_results[0].content == "x" * 5000
+        assert stats.results == 0
+
+    def test_outputs_elided_before_a_restart_are_not_recounted(self, tmp_path):
+        conv = Conversation(session_id="s1")
+        for i in range(4):
+            add_tool_turn(conv, i)
+        make_policy(tmp_path).apply(conv.messages)
+
+        restored = Conversation.from_dict(conv.to_dict())
+        view, stats = make_policy(tmp_path).apply(restored.messages)
+
+        assert "elided" in view[2].tool_results[0].content
+        assert stats.results == 0
+
+
+@pytest.mark.unit
+class TestElisionInHandler:
+    """Savings reported by the prompt loop."""
+
+    async def test_complete_reports_savings(self, tmp_path):
+        conv = Conversation(session_id="s1", model="stub-model")
+        for i in range(3):
+            add_tool_turn(conv, i)
+        provider = StubProvider([text_turn("a"), text_turn("b")])
+        handler = make_handler(provider, tmp_path, conv)
+        handler.tool_output_policy = make_policy(tmp_path)
+
+        first = await collect(handler.process_prompt("next"))
+        second = await collect(handler.process_prompt("again"))
+
+        sent = provider.requests[0]["messages"]
+        assert "elided" in sent[2].content[0].tool_result.content
+        assert first[-1].data["tool_output_tokens_saved"] > 0
+        # Outputs elided by the first request are not counted again
+        assert second[-1].data["tool_output_bytes_saved"] == 0
+        assert conv.total_tool_output_bytes_saved == first[-1].data["tool_output_bytes_saved"]
+        assert second[-1].data["total_tool_output_tokens_saved"] == conv.total_tool_output_tokens_saved
+
+
+@pytest.mark.unit
+async def test_read_tool_output_tool(tmp_path, monkeypatch):
+    import app.services.tool_output_store as module
+    from app.services.conversation_service import conversation_service
+
+    initialize_tools()
+    store = ToolOutputStore(tmp_path)
+    monkeypatch.setattr(module, "_store", store)
+    handle = store.put("one\ntwo\nthree")
+    other = store.put("another session's output")
+    conv = conversation_service.create_conversation("s-read")
+    conv.add_user_message("q")
+    conv.messages[-1].metadata["tool_output_handles"] = {"t1": handle}
+    tool = get_tool("read_tool_output")
+    context = ToolContext(workspace_path=tmp_path, session_id="s-read")
+
+    try:
+        result = await tool.execute({"handle": handle, "offset": 2, "limit": 1}, context)
+        missing = await tool.execute({"handle": "0" * 32}, context)
+        foreign = await tool.execute({"handle": other}, context)
+    finally:
+        conversation_service.delete_conversation("s-read")
+
+    assert result.output == "two"
+    assert not missing.success
+    assert not foreign.success
@@ -0,0 +1,388 @@
+"""
+Tool call scheduler tests.
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.llm.base import StreamEvent, StreamEventType, ToolUse, ToolResult as LLMToolResult
+from app.services.streaming_handler import SSEEventType
+from app.services.tool_scheduler import (
+    SpeculativeToolCalls,
+    ToolBatchTiming,
+    ToolFootprint,
+    ToolSchedulerMetrics,
+    get_footprint,
+    run_tool_calls,
+)
+from app.tools import (
+    Tool,
+    ToolAccess,
+    ToolCategory,
+    ToolContext,
+    ToolResult,
+    initialize_tools,
+    register_tool,
+    unregister_tool,
+)
+
+from tests.conftest import StubProvider, collect, make_handler, text_turn
+
+
+class PathTool(Tool):
+    """Tool that sleeps and records the order calls start and finish in."""
+
+    description = "Sleeps on a path"
+    category = ToolCategory.FILE
+    requires_permission = False
+
+    def __init__(self, name, access, log):
+        self.name = name
+        self.access = access
+        self.log = log
+        self.active = 0
+        self.peak = 0
+
+    @property
+    def input_schema(self):
+        return {"type": "object", "properties": {"file_path": {"type": "string"}}}
+
+    async def execute(self, arguments, context):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.log.append(("start", arguments["id"]))
+        try:
+            await asyncio.sleep(arguments.get("delay", 0.02))
+        finally:
+            self.active -= 1
+        self.log.append(("end", arguments["id"]))
+        return ToolResult.success_result(arguments["id"])
+
+
+@pytest.fixture
+def tools():
+    initialize_tools()
+    log = []
+    registered = {
+        "peek": PathTool("peek", ToolAccess.READ, log),
+        "poke": PathTool("poke", ToolAccess.WRITE, log),
+        "shell": PathTool("shell", ToolAccess.EXCLUSIVE, log),
+    }
+    for tool in registered.values():
+        register_tool(tool)
+    yield registered, log
+    for name in registered:
+        unregister_tool(name)
+
+
+@pytest.fixture
+def context(tmp_path):
+    return ToolContext(workspace_path=tmp_path, session_id="s1")
+
+
+def call(name, call_id, path=None, **arguments):
+    arguments["id"] = call_id
+    if path is not None:
+        arguments["file_path"] = path
+    return ToolUse(id=call_id, name=name, arguments=arguments)
+
+
+async def execute(tool_use):
+    from app.tools import get_tool
+
+    result = await get_tool(tool_use.name).execute(tool_use.arguments, None)
+    return LLMToolResult(tool_use_id=tool_use.id, content=result.output)
+
+
+def starts_before(log, first, second):
+    return log.index(("end", first)) < log.index(("start", second))
+
+
+@pytest.mark.unit
+class TestFootprint:
+    """Classifying tool calls."""
+
+    def test_builtin_tools(self, context, tmp_path):
+        initialize_tools()
+
+        read = get_footprint(ToolUse(id="1", name="read_file", arguments={"file_path": "a.txt"}), context)
+        write = get_footprint(ToolUse(id="2", name="edit_file", arguments={"file_path": "a.txt"}), context)
+        grep = get_footprint(ToolUse(id="3", name="grep", arguments={"pattern": "x"}), context)
+        bash = get_footprint(ToolUse(id="4", name="bash", arguments={"command": "ls"}), context)
+        unknown = get_footprint(ToolUse(id="5", name="nope", arguments={}), context)
+
+        assert read == ToolFootprint(ToolAccess.READ, (tmp_path / "a.txt").resolve())
+        assert write == ToolFootprint(ToolAccess.WRITE, (tmp_path / "a.txt").resolve())
+        assert grep == ToolFootprint(ToolAccess.READ, None)
+        assert bash.access == unknown.access == ToolAccess.EXCLUSIVE
+
+    def test_paths_outside_the_workspace_cover_everything(self, context):
+        initialize_tools()
+
+        footprint = get_footprint(
+            ToolUse(id="1", name="write_file", arguments={"file_path": "/etc/passwd"}), context
+        )
+
+        assert footprint == ToolFootprint(ToolAccess.WRITE, None)
+
+    def test_conflicts(self, tmp_path):
+        a, b = tmp_path / "a", tmp_path / "b"
+        read = lambda p=None: ToolFootprint(ToolAccess.READ, p)  # noqa: E731
+        write = lambda p=None: ToolFootprint(ToolAccess.WRITE, p)  # noqa: E731
+
+        assert not read(a).conflicts_with(read(a))
+        assert not read().conflicts_with(read(b))
+        assert not write(a).conflicts_with(write(b))
+        assert not write(a).conflicts_with(read(b))
+        assert write(a).conflicts_with(write(a))
+        assert write(a).conflicts_with(read(a))
+        assert write(a / "x").conflicts_with(read(a))
+        assert write(a).conflicts_with(read())
+        assert ToolFootprint(ToolAccess.EXCLUSIVE).conflicts_with(read(a))
+
+
+@pytest.mark.unit
+class TestRunToolCalls:
+    """Scheduling a batch of calls."""
+
+    async def test_reads_run_concurrently(self, tools, context):
+        registered, _ = tools
+        uses = [call("peek", f"r{i}", f"f{i}.txt", delay=0.05) for i in range(8)]
+
+        results, timing = await run_tool_calls(uses, execute, context)
+
+        assert [r.content for r in results] == [f"r{i}" for i in range(8)]
+        assert registered["peek"].peak == 8
+        assert timing.calls == 8
+        assert timing.tool_seconds > 0.35
+        assert timing.wall_seconds < 0.2
+        assert timing.speedup > 2
+
+    async def test_max_concurrency(self, tools, context):
+        registered, _ = tools
+        uses = [call("peek", f"r{i}", f"f{i}.txt") for i in range(6)]
+
+        await run_tool_calls(uses, execute, context, max_concurrency=2)
+
+        assert registered["peek"].peak == 2
+
+    async def test_writes_to_one_path_are_serialized(self, tools, context):
+        registered, log = tools
+        uses = [
+            call("poke", "w1", "a.txt"),
+            call("peek", "r1", "a.txt"),
+            call("poke", "w2", "b.txt"),
+            call("poke", "w3", "./a.txt"),
+        ]
+
+        results, _ = await run_tool_calls(uses, execute, context)
+
+        assert [r.content for r in results] == ["w1", "r1", "w2", "w3"]
+        assert starts_before(log, "w1", "r1")
+        assert starts_before(log, "r1", "w3")
+        assert log.index(("start", "w2")) < log.index(("end", "w1"))
+
+    async def test_exclusive_calls_are_barriers(self, tools, context):
+        _, log = tools
+        uses = [
+            call("peek", "r1", "a.txt"),
+            call("shell", "s1"),
+            call("peek", "r2", "b.txt"),
+            call("shell", "s2"),
+        ]
+
+        await run_tool_calls(uses, execute, context)
+
+        assert [entry for entry in log if entry[0] == "start"] == [
+            ("start", "r1"), ("start", "s1"), ("start", "r2"), ("start", "s2"),
+        ]
+        assert starts_before(log, "r1", "s1")
+        assert starts_before(log, "s1", "r2")
+        assert starts_before(log, "r2", "s2")
+
+    async def test_results_keep_call_order(self, tools, context):
+        uses = [call("peek", "slow", "a", delay=0.05), call("peek", "fast", "b", delay=0)]
+        finished = []
+
+        results, _ = await run_tool_calls(
+            uses, execute, context, on_result=lambda tu, r: finished.append(tu.id)
+        )
+
+        assert finished == ["fast", "slow"]
+        assert [r.content for r in results] == ["slow", "fast"]
+
+    async def test_cancellation_stops_running_calls(self, tools, context):
+        registered, log = tools
+        uses = [call("peek", "r1", "a", delay=10), call("poke", "w1", "a")]
+
+        task = asyncio.create_task(run_tool_calls(uses, execute, context))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert log == [("start", "r1")]
+        assert registered["peek"].active == 0
+
+    def test_metrics(self):
+        metrics = ToolSchedulerMetrics()
+
+        metrics.record(ToolBatchTiming(calls=4, wall_seconds=1.0, tool_seconds=3.0))
+        metrics.record(ToolBatchTiming(calls=1, wall_seconds=1.0, tool_seconds=1.0))
+
+        assert metrics.to_dict() == {
+            "batches": 2,
+            "concurrent_batches": 1,
+            "tool_calls": 5,
+            "tool_wall_ms": 2000.0,
+            "tool_time_ms": 4000.0,
+            "speedup": 2.0,
+        }
+
+
+@pytest.mark.unit
+class TestHandlerToolScheduling:
+    """Tool calls of a streamed turn."""
+
+    async def test_turn_reports_tool_timing(self, tools, tmp_path):
+        registered, _ = tools
+        uses = [call("peek", f"r{i}", f"f{i}.txt", delay=0.05) for i in range(4)]
+        turn = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+        turn += [StreamEvent(type=StreamEventType.TOOL_USE_END, tool_use=tu) for tu in uses]
+        turn.append(StreamEvent(type=StreamEventType.MESSAGE_END))
+        handler = make_handler(StubProvider([turn, text_turn("done")]), tmp_path)
+
+        events = await collect(handler.process_prompt("read them"))
+
+        results = [e.data["tool_use_id"] for e in events if e.type == SSEEventType.TOOL_RESULT]
+        complete = events[-1].data
+        assert results == ["r0", "r1", "r2", "r3"]
+        assert registered["peek"].peak == 4
+        assert complete["tool_calls"] == 4
+        assert complete["tool_time_ms"] > 2 * complete["tool_wall_ms"]
+        tool_message = handler.conversation.messages[2]
+        assert [r.tool_use_id for r in tool_message.tool_results] == ["r0", "r1", "r2", "r3"]
+
+
+def speculative_turn(uses, tail=5, error=False):
+    """A turn whose tool_use blocks are followed by a streamed text tail."""
+    turn = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+    turn += [StreamEvent(type=StreamEventType.TOOL_USE_END, tool_use=tu) for tu in uses]
+    turn += [StreamEvent(type=StreamEventType.TEXT_DELTA, text="more ") for _ in range(tail)]
+    if error:
+        turn.append(StreamEvent(type=StreamEventType.ERROR, error="stream broke"))
+    else:
+        turn.append(StreamEvent(type=StreamEventType.MESSAGE_END))
+    return turn
+
+
+@pytest.mark.unit
+class TestSpeculativeToolCalls:
+    """Read-only tool calls started before their message ends."""
+
+    async def test_only_safe_calls_start_early(self, tools, context):
+        registered, log = tools
+        speculation = SpeculativeToolCalls(execute, context)
+
+        offered = [
+            speculation.offer(call("peek", "r1", "a.txt")),
+            speculation.offer(call("poke", "w1", "b.txt")),
+            speculation.offer(call("peek", "r2", "b.txt")),
+            speculation.offer(call("peek", "r3", "c.txt")),
+            speculation.offer(call("shell", "x1")),
+            speculation.offer(call("peek", "r4", "d.txt")),
+        ]
+        await asyncio.sleep(0.03)
+        started, stats = speculation.finish()
+
+        assert offered == [True, False, False, True, False, False]
+        assert set(started) == {"r1", "r3"}
+        assert (stats.turns, stats.calls) == (1, 2)
+        assert stats.saved_seconds >= 0.015
+        assert speculation.discard() == 0
+
+    async def test_batch_awaits_started_calls(self, tools, context):
+        registered, log = tools
+        speculation = SpeculativeToolCalls(execute, context)
+        uses = [call("peek", "r1", "a.txt"), call("poke", "w1", "a.txt"), call("peek", "r2", "b.txt")]
+        for tu in uses:
+            speculation.offer(tu)
+        started, _ = speculation.finish()
+
+        results, timing = await run_tool_calls(uses, execute, context, started=started)
+
+        assert [r.tool_use_id for r in results] == ["r1", "w1", "r2"]
+        assert log.count(("start", "r1")) == 1
+        assert starts_before(log, "r1", "w1")
+        assert timing.calls == 3 and timing.tool_seconds > 0.05
+
+    async def test_discard_cancels_running_calls(self, tools, context):
+        registered, log = tools
+        speculation = SpeculativeToolCalls(execute, context)
+        speculation.offer(call("peek", "r1", "a.txt", delay=1))
+        await asyncio.sleep(0)
+
+        assert speculation.discard() == 1
+        await asyncio.sleep(0)
+        assert registered["peek"].active == 0
+        assert ("end", "r1") not in log
+
+    async def test_disabled(self, tools, context):
+        speculation = SpeculativeToolCalls(execute, context, max_calls=0)
+
+        assert not speculation.offer(call("peek", "r1", "a.txt"))
+
+
+@pytest.mark.unit
+class TestHandlerSpeculation:
+    """Early tool calls of a streamed turn."""
+
+    async def test_tools_run_while_the_text_tail_streams(self, tools, tmp_path):
+        registered, log = tools
+        uses = [call("peek", f"r{i}", f"f{i}.txt", delay=0.02) for i in range(3)]
+        provider = StubProvider([speculative_turn(uses), text_turn("done")], delay=0.01)
+        handler = make_handler(provider, tmp_path)
+        handler.coalesce_interval = 0
+
+        events = await collect(handler.process_prompt("read them"))
+
+        executing = next(e for e in events if e.data.get("status") == "executing_tools")
+        assert executing.data["speculative_calls"] == 3
+        assert executing.data["latency_saved_ms"] > 0
+        results = [e.data["tool_use_id"] for e in events if e.type == SSEEventType.TOOL_RESULT]
+        assert results == ["r0", "r1", "r2"]
+        assert [e for e in log if e[0] == "start"] == [("start", f"r{i}") for i in range(3)]
+        complete = events[-1].data
+        assert complete["speculative_calls"] == 3
+        assert complete["speculative_saved_ms"] > 0
+        tool_message = handler.conversation.messages[2]
+        assert [r.tool_use_id for r in tool_message.tool_results] == ["r0", "r1", "r2"]
+
+    async def test_stream_error_discards_early_results(self, tools, tmp_path):
+        registered, log = tools
+        uses = [call("peek", "r1", "a.txt", delay=1)]
+        provider = StubProvider([speculative_turn(uses, tail=1, error=True)], delay=0.01)
+        handler = make_handler(provider, tmp_path)
+        handler.coalesce_interval = 0
+
+        events = await collect(handler.process_prompt("read it"))
+        await asyncio.sleep(0)
+
+        assert events[-1].type == SSEEventType.ERROR
+        assert not [e for e in events if e.type == SSEEventType.TOOL_RESULT]
+        assert ("start", "r1") in log and ("end", "r1") not in log
+        assert registered["peek"].active == 0
+        assert handler._speculation.discarded == 1
+
+    async def test_setting_disables_early_calls(self, tools, tmp_path):
+        registered, log = tools
+        uses = [call("peek", "r1", "a.txt")]
+        handler = make_handler(StubProvider([speculative_turn(uses), text_turn("done")]), tmp_path)
+        handler.speculative_tools = False
+
+        events = await collect(handler.process_prompt("read it"))
+
+        executing = next(e for e in events if e.data.get("status") == "executing_tools")
+        assert "speculative_calls" not in executing.data
+        assert events[-1].data["speculative_calls"] == 0
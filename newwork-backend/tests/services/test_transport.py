@@ -0,0 +1,98 @@
+"""
+Shared provider transport tests.
+"""
+
+import httpx
+import pytest
+
+from app.services.llm import transport
+from app.services.llm.anthropic_provider import AnthropicProvider
+from app.services.llm.deepseek_provider import DeepSeekProvider
+from app.services.llm.openai_provider import OpenAIProvider
+from app.services.llm.transport import (
+    TransportConfig,
+    close_http_clients,
+    get_http_client,
+    get_origin,
+    prewarm_http_clients,
+)
+
+
+@pytest.fixture(autouse=True)
+async def clean_clients():
+    yield
+    await close_http_clients()
+
+
+@pytest.mark.unit
+class TestHttpClients:
+    """Shared client registry."""
+
+    def test_origin(self):
+        assert get_origin("https://api.openai.com/v1") == "https://api.openai.com"
+        assert get_origin("http://localhost:8080/x/y") == "http://localhost:8080"
+
+    def test_client_shared_per_origin(self):
+        a = get_http_client("https://api.example.com/v1")
+        b = get_http_client("https://api.example.com/v2")
+        c = get_http_client("https://other.example.com")
+
+        assert a is b
+        assert a is not c
+
+    async def test_closed_client_is_replaced(self):
+        first = get_http_client("https://api.example.com")
+        await first.aclose()
+
+        assert get_http_client("https://api.example.com") is not first
+
+    async def test_pool_limits_are_applied(self):
+        config = TransportConfig(max_connections=7, max_keepalive_connections=3, http2=False)
+        client = get_http_client("https://api.example.com", config=config)
+
+        pool = client._transport._pool
+        assert pool._max_connections == 7
+        assert pool._max_keepalive_connections == 3
+
+    async def test_providers_share_pool(self):
+        first = AnthropicProvider(api_key="k1")
+        second = AnthropicProvider(api_key="k2")
+        openai = OpenAIProvider(api_key="k3")
+        deepseek = DeepSeekProvider(api_key="k4")
+
+        assert first.client._client is second.client._client
+        assert openai.client._client is not first.client._client
+        assert deepseek.client._client is not openai.client._client
+
+    async def test_provider_close_keeps_shared_pool_open(self):
+        provider = AnthropicProvider(api_key="k1")
+        shared = provider.client._client
+
+        await provider.close()
+
+        assert not shared.is_closed
+        await close_http_clients()
+        assert shared.is_closed
+
+
+@pytest.mark.unit
+async def test_prewarm_reports_reachable_origins():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.host == "down.example.com":
+            raise httpx.ConnectError("unreachable")
+        return httpx.Response(404)
+
+    mock = httpx.MockTransport(handler)
+    transport._http_clients["https://up.example.com"] = httpx.AsyncClient(transport=mock)
+    transport._http_clients["https://down.example.com"] = httpx.AsyncClient(transport=mock)
+
+    result = await prewarm_http_clients(
+        ["https://up.example.com/v1", "https://up.example.com/v2", "https://down.example.com"]
+    )
+
+    assert result == {"https://down.example.com": False, "https://up.example.com": True}
+    assert all(r.method == "HEAD" for r in requests)
+    assert len(requests) == 2
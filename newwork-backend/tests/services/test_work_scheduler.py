@@ -0,0 +1,290 @@
+"""
+Work scheduler tests.
+"""
+
+import asyncio
+
+import pytest
+
+import app.services.tool_execution_service as tool_execution_service
+from app.services.batch_run_service import BatchRunner
+from app.services.llm.base import ToolUse
+from app.services.llm.scheduled_provider import ScheduledProvider
+from app.services.tool_execution_service import ToolExecutionService
+from app.services.work_scheduler import (
+    Lane,
+    PoolScheduler,
+    WorkPool,
+    WorkScheduler,
+    bind_work,
+    current_work,
+    parse_flow_weights,
+    work_context,
+)
+from app.tools import (
+    Tool,
+    ToolCategory,
+    ToolResource,
+    ToolResult,
+    register_tool,
+    unregister_tool,
+)
+
+from tests.conftest import StubProvider, collect, make_handler, text_turn
+
+
+async def hold(pool, flow, lane, order, release, weight=1.0):
+    """Acquire a slot, record the grant, and hold it until `release` is set."""
+    await pool.acquire(flow, lane, weight)
+    order.append(flow)
+    await release.wait()
+    pool.release()
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class ScanTool(Tool):
+    """CPU tool that records how many calls run at once."""
+
+    name = "scan_test"
+    description = "Scans"
+    category = ToolCategory.SEARCH
+    requires_permission = False
+    resource = ToolResource.CPU
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    @property
+    def input_schema(self):
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, arguments, context):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return ToolResult.success_result("done")
+
+
+class WorkRecordingProvider(StubProvider):
+    """Stub that records the flow and lane each request runs in."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.work = []
+
+    async def complete(self, messages, model, **kwargs):
+        self.work.append(current_work())
+        return await super().complete(messages, model, **kwargs)
+
+    async def stream_complete(self, messages, model, **kwargs):
+        self.work.append(current_work())
+        async for event in super().stream_complete(messages, model, **kwargs):
+            yield event
+
+
+@pytest.mark.unit
+class TestPoolScheduler:
+    """Capacity, lanes and fair queuing of one pool."""
+
+    async def test_capacity_bounds_running_work(self):
+        pool = PoolScheduler(WorkPool.LLM, capacity=2)
+        order, release = [], asyncio.Event()
+
+        tasks = [asyncio.create_task(hold(pool, f"f{i}", Lane.INTERACTIVE, order, release)) for i in range(3)]
+        await settle()
+
+        assert (pool.running, pool.depth()) == (2, 1)
+        release.set()
+        await asyncio.gather(*tasks)
+        assert (pool.running, pool.depth()) == (0, 0)
+        assert sorted(order) == ["f0", "f1", "f2"]
+
+    async def test_interactive_lane_goes_first(self):
+        pool = PoolScheduler(WorkPool.LLM, capacity=1)
+        order, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(pool, "busy", Lane.INTERACTIVE, order, release))
+        await settle()
+
+        waiting = [
+            asyncio.create_task(hold(pool, "batch", Lane.BATCH, order, release)),
+            asyncio.create_task(hold(pool, "compaction", Lane.BACKGROUND, order, release)),
+            asyncio.create_task(hold(pool, "prompt", Lane.INTERACTIVE, order, release)),
+        ]
+        await settle()
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+        assert order == ["busy", "prompt", "compaction", "batch"]
+
+    async def test_busy_flow_queues_behind_others(self):
+        pool = PoolScheduler(WorkPool.LLM, capacity=1)
+        order, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(pool, "noisy", Lane.INTERACTIVE, order, release))
+        await settle()
+
+        waiting = [asyncio.create_task(hold(pool, "noisy", Lane.INTERACTIVE, order, release)) for _ in range(3)]
+        await settle()
+        waiting.append(asyncio.create_task(hold(pool, "quiet", Lane.INTERACTIVE, order, release)))
+        await settle()
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+        assert order.index("quiet") == 1
+
+    async def test_weights_share_slots(self):
+        pool = PoolScheduler(WorkPool.LLM, capacity=1)
+        order, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(pool, "start", Lane.INTERACTIVE, order, release))
+        await settle()
+
+        waiting = []
+        for _ in range(4):
+            waiting.append(asyncio.create_task(hold(pool, "heavy", Lane.INTERACTIVE, order, release, 2.0)))
+            waiting.append(asyncio.create_task(hold(pool, "light", Lane.INTERACTIVE, order, release)))
+        await settle()
+        release.set()
+        await asyncio.gather(first, *waiting)
+
+        served = order[1:5]
+        assert served.count("heavy") == 3 and served.count("light") == 1
+
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        pool = PoolScheduler(WorkPool.CPU, capacity=1)
+        order, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(pool, "a", Lane.INTERACTIVE, order, release))
+        await settle()
+        cancelled = asyncio.create_task(hold(pool, "b", Lane.INTERACTIVE, order, release))
+        last = asyncio.create_task(hold(pool, "c", Lane.INTERACTIVE, order, release))
+        await settle()
+
+        cancelled.cancel()
+        await settle()
+        assert pool.depth() == 1
+        release.set()
+        await asyncio.gather(first, cancelled, last, return_exceptions=True)
+
+        assert order == ["a", "c"]
+        assert pool.running == 0
+
+    async def test_metrics_record_waits_per_lane(self):
+        pool = PoolScheduler(WorkPool.LLM, capacity=1)
+        order, release = [], asyncio.Event()
+        first = asyncio.create_task(hold(pool, "a", Lane.INTERACTIVE, order, release))
+        await settle()
+        second = asyncio.create_task(hold(pool, "b", Lane.BATCH, order, release))
+        await settle()
+
+        assert pool.to_dict()["lanes"]["batch"]["depth"] == 1
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(first, second)
+
+        metrics = pool.to_dict()
+        assert metrics["lanes"]["interactive"] == {
+            "depth": 0, "granted": 1, "queued": 0, "avg_wait_ms": 0.0, "max_wait_ms": 0.0,
+        }
+        assert metrics["lanes"]["batch"]["queued"] == 1
+        assert metrics["lanes"]["batch"]["max_wait_ms"] >= 5
+
+    async def test_unlimited_capacity(self):
+        pool = PoolScheduler(WorkPool.LLM, capacity=0)
+        for i in range(50):
+            await pool.acquire(f"f{i}", Lane.BATCH)
+
+        assert (pool.running, pool.depth()) == (50, 0)
+
+
+@pytest.mark.unit
+class TestWorkContext:
+    """Flow and lane bound to tasks."""
+
+    async def test_tasks_inherit_and_override(self):
+        async def read():
+            return current_work()
+
+        bind_work("workspace:/w", Lane.INTERACTIVE)
+
+        assert await asyncio.create_task(read()) == ("workspace:/w", Lane.INTERACTIVE)
+        background = asyncio.create_task(read(), context=work_context(lane=Lane.BACKGROUND))
+        assert await background == ("workspace:/w", Lane.BACKGROUND)
+
+    def test_parse_flow_weights(self):
+        assert parse_flow_weights("workspace:/a=2, session:x=0.5,") == {
+            "workspace:/a": 2.0,
+            "session:x": 0.5,
+        }
+        with pytest.raises(ValueError):
+            parse_flow_weights("nope")
+        with pytest.raises(ValueError):
+            parse_flow_weights("a=0")
+
+
+@pytest.mark.unit
+class TestScheduledWork:
+    """Providers, tools and batch runs scheduled through the pools."""
+
+    async def test_stream_holds_its_slot_until_it_ends(self):
+        scheduler = WorkScheduler({WorkPool.LLM: 1})
+        provider = ScheduledProvider(StubProvider([text_turn("a"), text_turn("b")], delay=0.01), scheduler)
+        pool = scheduler.get_pool(WorkPool.LLM)
+
+        first = provider.stream_complete([], "stub-model")
+        await first.__anext__()
+        second = asyncio.create_task(collect(provider.stream_complete([], "stub-model")))
+        await settle()
+
+        assert (pool.running, pool.depth()) == (1, 1)
+        await first.aclose()
+        await second
+
+        assert pool.running == 0
+        assert scheduler.to_dict()["llm"]["lanes"]["interactive"]["queued"] == 1
+
+    async def test_handler_binds_its_session_flow(self, tmp_path, monkeypatch):
+        from app.services.config_service import settings
+
+        monkeypatch.setattr(settings, "SCHEDULER_FAIR_SHARE", "session")
+        stub = WorkRecordingProvider([text_turn("hi")])
+        handler = make_handler(ScheduledProvider(stub, WorkScheduler({WorkPool.LLM: 1})), tmp_path)
+        handler.lane = Lane.BACKGROUND
+
+        await collect(handler.process_prompt("q"))
+
+        assert stub.work == [("session:s1", Lane.BACKGROUND)]
+
+    async def test_cpu_tools_share_the_cpu_pool(self, tmp_path, monkeypatch):
+        scheduler = WorkScheduler({WorkPool.CPU: 1})
+        monkeypatch.setattr(tool_execution_service, "work_scheduler", scheduler)
+        tool = ScanTool()
+        register_tool(tool)
+        try:
+            service = ToolExecutionService(workspace_path=tmp_path, session_id="s1")
+            results = await asyncio.gather(*(
+                service.execute_tool(ToolUse(id=f"t{i}", name=tool.name, arguments={}))
+                for i in range(3)
+            ))
+        finally:
+            unregister_tool(tool.name)
+
+        assert all(not result.is_error for result in results)
+        assert tool.peak == 1
+        assert scheduler.get_pool(WorkPool.CPU).stats[Lane.INTERACTIVE].granted == 3
+
+    async def test_batch_items_run_in_the_batch_lane(self):
+        stub = WorkRecordingProvider(reply="ok")
+        runner = BatchRunner(
+            provider=ScheduledProvider(stub, WorkScheduler({WorkPool.LLM: 2})),
+            model="stub-model",
+            concurrency=2,
+            flow="batch:r1",
+        )
+
+        await collect(runner.run(["a", "b", "c"]))
+
+        assert stub.work == [("batch:r1", Lane.BATCH)] * 3
@@ -0,0 +1,251 @@
+"""
+WebSocket session multiplexer tests.
+"""
+
+import asyncio
+import json
+import uuid
+
+import pytest
+
+import app.services.ws_multiplexer as module
+from app.services.event_log import event_log_service
+from app.services.llm.base import StreamEvent, StreamEventType
+from app.services.streaming_handler import SSEEvent, SSEEventType
+from app.services.ws_multiplexer import (
+    ENCODING_BINARY,
+    SessionMultiplexer,
+    decode_binary_event,
+    encode_binary_event,
+    encode_json_event,
+)
+
+from tests.conftest import StubProvider, make_handler, text_turn
+
+
+def long_turn(count):
+    events = [StreamEvent(type=StreamEventType.MESSAGE_START)]
+    events += [StreamEvent(type=StreamEventType.TEXT_DELTA, text=f"w{i} ") for i in range(count)]
+    events.append(StreamEvent(type=StreamEventType.MESSAGE_END))
+    return events
+
+
+class Client:
+    """Collects the frames sent to one connection."""
+
+    def __init__(self, tmp_path, monkeypatch, turns=None, **kwargs):
+        self.frames = []
+        self.sessions = {}
+        self.turns = turns or (lambda: text_turn("hi"))
+
+        def create(session_id, workspace_path, **options):
+            handler = make_handler(StubProvider([self.turns()]), tmp_path)
+            handler.conversation.session_id = session_id
+            handler.coalesce_interval = 0
+            return handler
+
+        monkeypatch.setattr(module, "create_streaming_handler", create)
+        self.mux = SessionMultiplexer(self.send, self.sessions.get, **kwargs)
+
+    async def send(self, frame):
+        self.frames.append(frame)
+
+    def session(self, tmp_path):
+        session_id = str(uuid.uuid4())
+        self.sessions[session_id] = tmp_path
+        return session_id
+
+    async def request(self, op, channel, **data):
+        await self.mux.handle(json.dumps({"op": op, "channel": channel, **data}))
+
+    def replies(self, op=None):
+        replies = [json.loads(f) for f in self.frames if isinstance(f, str) and '"op"' in f[:8]]
+        return [r for r in replies if op is None or r["op"] == op]
+
+    def events(self, channel):
+        events = [json.loads(f) for f in self.frames if isinstance(f, str) and '"op"' not in f[:8]]
+        return [e for e in events if e["event"]["session_id"] == channel]
+
+    async def wait_for(self, condition, timeout=2):
+        async def poll():
+            while not condition():
+                await asyncio.sleep(0.005)
+        await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    client = Client(tmp_path, monkeypatch)
+    yield client
+
+
+def completed(events):
+    return any(e["event"]["type"] == SSEEventType.COMPLETE for e in events)
+
+
+@pytest.mark.unit
+class TestEncoding:
+    """Event frame encodings."""
+
+    def test_json_event_embeds_payload(self):
+        event = SSEEvent(type=SSEEventType.STATUS, session_id="s1", data={"a": 1}, id=3)
+        encoded = event.encode()
+
+        frame = json.loads(encode_json_event(3, encoded))
+
+        assert frame == {"id": 3, "event": json.loads(encoded.payload)}
+        assert json.loads(encode_json_event(None, encoded))["id"] is None
+
+    def test_binary_roundtrip_is_smaller(self):
+        event = SSEEvent(
+            type=SSEEventType.STREAM_CHUNK,
+            session_id=str(uuid.uuid4()),
+            data={"seq": 4, "text": "hello"},
+            id=42,
+        )
+        encoded = event.encode()
+
+        frame = encode_binary_event(5, 42, encoded)
+
+        assert decode_binary_event(frame) == {
+            "channel": 5,
+            "id": 42,
+            "type": "stream_chunk",
+            "data": {"seq": 4, "text": "hello"},
+        }
+        assert len(frame) < len(encode_json_event(42, encoded)) / 2
+
+    def test_unknown_encoding(self):
+        with pytest.raises(ValueError):
+            SessionMultiplexer(None, {}.get, encoding="xml")
+
+
+@pytest.mark.unit
+class TestSessionMultiplexer:
+    """Channels over one connection."""
+
+    async def test_prompt_streams_events(self, client, tmp_path):
+        session_id = client.session(tmp_path)
+
+        await client.request("prompt", session_id, prompt="q")
+        await client.wait_for(lambda: completed(client.events(session_id)))
+        await client.mux.close()
+
+        events = client.events(session_id)
+        assert [r["op"] for r in client.replies()] == ["accepted"]
+        ids = [e["id"] for e in events]
+        assert ids == list(range(ids[0], ids[0] + len(ids)))
+        assert events[0]["event"]["session_id"] == session_id
+        assert not event_log_service.get(session_id).running
+
+    async def test_sessions_share_the_connection(self, client, tmp_path):
+        first, second = client.session(tmp_path), client.session(tmp_path)
+
+        await client.request("prompt", first, prompt="a")
+        await client.request("prompt", second, prompt="b")
+        await client.wait_for(
+            lambda: completed(client.events(first)) and completed(client.events(second))
+        )
+        numbers = sorted(c.number for c in client.mux.channels.values())
+        await client.mux.close()
+
+        assert numbers == [1, 2]
+        assert client.mux.channels == {}
+        assert event_log_service.get(first).followers == 0
+
+    async def test_window_pauses_a_slow_channel_only(self, tmp_path, monkeypatch):
+        client = Client(tmp_path, monkeypatch, turns=lambda: long_turn(20), window=3)
+        slow, fast = client.session(tmp_path), client.session(tmp_path)
+
+        await client.request("prompt", slow, prompt="a")
+        await client.request("prompt", fast, prompt="b")
+        await client.wait_for(lambda: len(client.events(fast)) >= 3)
+        while not completed(client.events(fast)):
+            await client.request("ack", fast, event_id=client.events(fast)[-1]["id"])
+            await asyncio.sleep(0.01)
+
+        assert len(client.events(slow)) == 3
+        assert not completed(client.events(slow))
+
+        while not completed(client.events(slow)):
+            await client.request("ack", slow, event_id=client.events(slow)[-1]["id"])
+            await asyncio.sleep(0.01)
+        await client.mux.close()
+
+    async def test_binary_encoding(self, tmp_path, monkeypatch):
+        client = Client(tmp_path, monkeypatch, encoding=ENCODING_BINARY)
+        session_id = client.session(tmp_path)
+
+        await client.request("subscribe", session_id)
+        await client.request("prompt", session_id, prompt="q")
+        await client.wait_for(lambda: any(
+            isinstance(f, bytes) and decode_binary_event(f)["type"] == "complete"
+            for f in client.frames
+        ))
+        await client.mux.close()
+
+        number = client.replies("subscribed")[0]["number"]
+        events = [decode_binary_event(f) for f in client.frames if isinstance(f, bytes)]
+        assert {e["channel"] for e in events} == {number}
+        assert all(e["id"] for e in events)
+
+    async def test_subscribe_replays_from_last_event_id(self, client, tmp_path):
+        session_id = client.session(tmp_path)
+        await client.request("prompt", session_id, prompt="q")
+        await client.wait_for(lambda: completed(client.events(session_id)))
+        ids = [e["id"] for e in client.events(session_id)]
+        client.frames.clear()
+
+        await client.request("subscribe", session_id, last_event_id=ids[1])
+        await client.wait_for(lambda: completed(client.events(session_id)))
+        await client.mux.close()
+
+        assert [e["id"] for e in client.events(session_id)] == ids[2:]
+
+    async def test_prompt_while_running(self, tmp_path, monkeypatch):
+        client = Client(tmp_path, monkeypatch, turns=lambda: long_turn(200))
+        session_id = client.session(tmp_path)
+
+        await client.request("prompt", session_id, prompt="a")
+        await client.request("prompt", session_id, prompt="b")
+        await client.request("cancel", session_id)
+        log = event_log_service.get(session_id)
+        await client.wait_for(lambda: not log.running)
+        await client.mux.close()
+
+        assert [r["op"] for r in client.replies()] == ["accepted", "error", "cancelled"]
+        assert client.replies("error")[0]["request"] == "prompt"
+        assert client.replies("cancelled")[0]["running"] is True
+
+    async def test_errors(self, client, tmp_path):
+        session_id = client.session(tmp_path)
+
+        await client.mux.handle("not json")
+        await client.request("subscribe", "missing")
+        await client.request("launch", session_id)
+        await client.request("permission", session_id, permission_id="p1", approved=True)
+        await client.request("prompt", session_id)
+
+        errors = client.replies("error")
+        assert len(errors) == 5
+        assert errors[1]["error"] == "Session not found"
+        assert errors[2]["error"] == "Unknown op: launch"
+        assert errors[3]["request"] == "permission"
+        assert errors[4]["request"] == "prompt"
+        await client.mux.close()
+
+    async def test_channel_limit(self, tmp_path, monkeypatch):
+        client = Client(tmp_path, monkeypatch, max_channels=1)
+        first, second = client.session(tmp_path), client.session(tmp_path)
+
+        await client.request("subscribe", first)
+        await client.request("subscribe", first)
+        await client.request("subscribe", second)
+        await client.request("unsubscribe", first)
+        await client.request("subscribe", second)
+        await client.mux.close()
+
+        assert [r["op"] for r in client.replies()] == [
+            "subscribed", "subscribed", "error", "unsubscribed", "subscribed",
+        ]
+        assert client.replies("subscribed")[-1]["number"] == 1
@@ -0,0 +1,95 @@
+"""
+Tests for the tool registry.
+"""
+
+import pytest
+
+from app.tools import (
+    Tool,
+    ToolCategory,
+    ToolResult,
+    get_registry_version,
+    get_tool_definitions,
+    get_tool_payloads,
+    initialize_tools,
+    register_tool,
+    unregister_tool,
+)
+
+
+class CountingTool(Tool):
+    """Tool that counts how often its schema is built."""
+
+    name = "counting_tool"
+    description = "Counts schema builds"
+    category = ToolCategory.MCP
+    requires_permission = False
+
+    def __init__(self):
+        self.schema_builds = 0
+
+    @property
+    def input_schema(self):
+        self.schema_builds += 1
+        return {"type": "object", "properties": {}}
+
+    async def execute(self, arguments, context):
+        return ToolResult.success_result("ok")
+
+
+@pytest.fixture
+def counting_tool():
+    initialize_tools()
+    tool = CountingTool()
+    register_tool(tool)
+    yield tool
+    unregister_tool(tool.name)
+
+
+class TestToolRegistryCache:
+    """Versioned tool definition cache."""
+
+    def test_register_bumps_version(self):
+        initialize_tools()
+        before = get_registry_version()
+        tool = CountingTool()
+
+        register_tool(tool)
+        assert get_registry_version() == before + 1
+
+        register_tool(tool)
+        assert get_registry_version() == before + 1
+
+        unregister_tool(tool.name)
+        assert get_registry_version() == before + 2
+
+    def test_definitions_built_once_per_version(self, counting_tool):
+        first = get_tool_definitions()
+        second = get_tool_definitions()
+
+        assert first is second
+        assert counting_tool.schema_builds == 1
+        assert any(d.name == "counting_tool" for d in first)
+
+    def test_definitions_rebuilt_after_registry_change(self, counting_tool):
+        first = get_tool_definitions()
+
+        unregister_tool(counting_tool.name)
+        second = get_tool_definitions()
+        register_tool(counting_tool)
+
+        assert second is not first
+        assert all(d.name != "counting_tool" for d in second)
+
+    def test_payloads_cached_per_format(self, counting_tool):
+        anthropic = get_tool_payloads("anthropic")
+        openai = get_tool_payloads("openai")
+
+        assert get_tool_payloads("anthropic") is anthropic
+        assert anthropic[0]["name"] == openai[0]["function"]["name"]
+        assert "input_schema" in anthropic[0]
+        assert openai[0]["type"] == "function"
+
+    def test_unknown_format_rejected(self, counting_tool):
+        with pytest.raises(ValueError):
+            get_tool_payloads("unknown")